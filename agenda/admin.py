@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cita
+from .models import Cita, HorarioAtencion
 from usuarios.models import PerfilPaciente, PerfilOdontologo
 
 
@@ -71,3 +71,13 @@ class CitaAdmin(admin.ModelAdmin):
             return f"{obj.motivo[:50]}..."
         return obj.motivo
     motivo_corto.short_description = 'Motivo'
+
+
+@admin.register(HorarioAtencion)
+class HorarioAtencionAdmin(admin.ModelAdmin):
+    """
+    Horarios semanales de atención por odontólogo (usados en disponibilidad y ocupación).
+    """
+    list_display = ['odontologo', 'dia_semana', 'hora_inicio', 'hora_fin']
+    list_filter = ['dia_semana', 'odontologo']
+    ordering = ['odontologo', 'dia_semana', 'hora_inicio']
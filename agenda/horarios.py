@@ -0,0 +1,130 @@
+# agenda/horarios.py
+"""
+Horarios de atención de los odontólogos.
+
+Cada odontólogo tiene bloques semanales (HorarioAtencion); sin bloques los
+reportes usan el horario general de la clínica definido en settings y los
+endpoints de disponibilidad de la agenda sus ventanas fijas de siempre. Los bloques se
+representan como {dia_semana: [(hora_inicio, hora_fin), ...]} con
+dia_semana 0 = lunes, igual que date.weekday().
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+
+from .models import HorarioAtencion
+
+
+# Ventanas fijas de los endpoints de disponibilidad de la agenda, anteriores
+# a HorarioAtencion. Se conservan para los odontólogos sin bloques propios
+# para no cambiar los turnos que ya se ofrecían (todos los días de la semana).
+VENTANA_DISPONIBILIDAD = (time(9, 0), time(18, 0))
+VENTANA_HORARIOS_DISPONIBLES = (time(8, 0), time(18, 0))
+
+
+def _hora(valor):
+    return datetime.strptime(valor, '%H:%M').time()
+
+
+def horario_fijo(inicio, fin, dias=range(7)):
+    """Mismo bloque [(inicio, fin)] para cada día indicado."""
+    return {dia: [(inicio, fin)] for dia in dias}
+
+
+def horario_por_defecto():
+    """Horario general de la clínica: {dia_semana: [(inicio, fin)]}."""
+    bloque = (_hora(settings.AGENDA_HORA_INICIO), _hora(settings.AGENDA_HORA_FIN))
+    return {dia: [bloque] for dia in settings.AGENDA_DIAS_ATENCION}
+
+
+def _bloques_registrados(odontologo_ids):
+    """{odontologo_id: {dia_semana: [(inicio, fin)]}} solo con los bloques guardados."""
+    horarios = defaultdict(lambda: defaultdict(list))
+    bloques = (
+        HorarioAtencion.objects
+        .filter(odontologo_id__in=list(odontologo_ids))
+        .order_by('hora_inicio')
+        .values_list('odontologo_id', 'dia_semana', 'hora_inicio', 'hora_fin')
+    )
+    for odontologo_id, dia, inicio, fin in bloques:
+        horarios[odontologo_id][dia].append((inicio, fin))
+    return horarios
+
+
+def horarios_por_odontologo(odontologo_ids):
+    """
+    {odontologo_id: {dia_semana: [(inicio, fin), ...]}} en una sola consulta.
+    Los odontólogos sin bloques registrados reciben el horario por defecto.
+    """
+    horarios = _bloques_registrados(odontologo_ids)
+    defecto = horario_por_defecto()
+    return {
+        odontologo_id: dict(horarios[odontologo_id]) if odontologo_id in horarios else defecto
+        for odontologo_id in odontologo_ids
+    }
+
+
+def horario_odontologo(odontologo_id, ventana):
+    """
+    (horario, propio) de un odontólogo. Sin bloques registrados devuelve la
+    ventana (inicio, fin) indicada todos los días y propio=False.
+    """
+    horarios = _bloques_registrados([odontologo_id])
+    if odontologo_id in horarios:
+        return dict(horarios[odontologo_id]), True
+    return horario_fijo(*ventana), False
+
+
+def bloques_del_dia(horario, fecha):
+    """Bloques [(inicio, fin)] de una fecha según un horario semanal."""
+    return horario.get(fecha.weekday(), [])
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def minutos_bloque(inicio, fin):
+    return max(_minutos(fin) - _minutos(inicio), 0)
+
+
+def horas_disponibles(horario, desde, hasta):
+    """Horas de atención entre dos fechas (ambas incluidas)."""
+    minutos_por_dia = {
+        dia: sum(minutos_bloque(inicio, fin) for inicio, fin in bloques)
+        for dia, bloques in horario.items()
+    }
+    total = 0
+    fecha = desde
+    while fecha <= hasta:
+        total += minutos_por_dia.get(fecha.weekday(), 0)
+        fecha += timedelta(days=1)
+    return total / 60
+
+
+def minutos_en_hora(horario, dia_semana, hora):
+    """Minutos de atención de un día de la semana dentro de [hora:00, hora+1:00)."""
+    inicio_hora, fin_hora = hora * 60, (hora + 1) * 60
+    return sum(
+        max(min(_minutos(fin), fin_hora) - max(_minutos(inicio), inicio_hora), 0)
+        for inicio, fin in horario.get(dia_semana, [])
+    )
+
+
+def turnos(horario, fecha, intervalo_minutos=None, completos=True):
+    """
+    Horas de inicio ('HH:MM') de los turnos de una fecha. Con completos=True
+    el turno entero tiene que caber en el bloque; con False basta con que
+    empiece antes del fin (como las ventanas fijas anteriores).
+    """
+    intervalo = timedelta(minutes=intervalo_minutos or settings.AGENDA_DURACION_CITA_MINUTOS)
+    resultado = []
+    for inicio, fin in bloques_del_dia(horario, fecha):
+        actual = datetime.combine(fecha, inicio)
+        limite = datetime.combine(fecha, fin)
+        while actual < limite and (not completos or actual + intervalo <= limite):
+            resultado.append(actual.strftime('%H:%M'))
+            actual += intervalo
+    return resultado
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0003_cita_pagada'),
+        ('usuarios', '0004_usuario_fcm_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioAtencion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Día de la semana')),
+                ('hora_inicio', models.TimeField(verbose_name='Hora de inicio')),
+                ('hora_fin', models.TimeField(verbose_name='Hora de fin')),
+                ('odontologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios_atencion', to='usuarios.perfilodontologo', verbose_name='Odontólogo')),
+            ],
+            options={
+                'verbose_name': 'Horario de Atención',
+                'verbose_name_plural': 'Horarios de Atención',
+                'ordering': ['odontologo', 'dia_semana', 'hora_inicio'],
+                'indexes': [models.Index(fields=['odontologo', 'dia_semana'], name='agenda_hora_odontol_a10c00_idx')],
+            },
+        ),
+    ]
@@ -136,3 +136,50 @@ class Cita(models.Model):
     def requiere_pago(self):
         """Determina si la cita requiere pago"""
         return self.precio > 0 and not self.es_cita_plan
+
+
+class HorarioAtencion(models.Model):
+    """
+    Bloque de atención semanal de un odontólogo (ej: lunes 09:00-13:00).
+    Un día puede tener varios bloques (mañana y tarde). Si un odontólogo no
+    tiene bloques registrados se usa el horario general de la clínica
+    (AGENDA_HORA_INICIO / AGENDA_HORA_FIN / AGENDA_DIAS_ATENCION).
+    """
+    DIAS_SEMANA = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+    
+    odontologo = models.ForeignKey(
+        PerfilOdontologo,
+        on_delete=models.CASCADE,
+        related_name='horarios_atencion',
+        verbose_name='Odontólogo'
+    )
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA, verbose_name='Día de la semana')
+    hora_inicio = models.TimeField(verbose_name='Hora de inicio')
+    hora_fin = models.TimeField(verbose_name='Hora de fin')
+    
+    class Meta:
+        verbose_name = 'Horario de Atención'
+        verbose_name_plural = 'Horarios de Atención'
+        ordering = ['odontologo', 'dia_semana', 'hora_inicio']
+        indexes = [
+            models.Index(fields=['odontologo', 'dia_semana']),
+        ]
+    
+    def __str__(self):
+        return (
+            f"{self.odontologo.usuario.full_name} - {self.get_dia_semana_display()} "
+            f"{self.hora_inicio.strftime('%H:%M')}-{self.hora_fin.strftime('%H:%M')}"
+        )
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.hora_inicio and self.hora_fin and self.hora_fin <= self.hora_inicio:
+            raise ValidationError({'hora_fin': 'La hora de fin debe ser posterior a la de inicio'})
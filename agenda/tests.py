@@ -1,3 +1,169 @@
-from django.test import TestCase
+"""
+Tests de los horarios de atención (agenda/horarios.py) y de los endpoints
+de disponibilidad de la agenda.
+"""
 
-# Create your tests here.
+from datetime import date, time, timedelta
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from usuarios.models import Usuario
+
+from .horarios import bloques_del_dia, horario_fijo, turnos
+from .models import HorarioAtencion
+from .views import CitaViewSet
+
+LUNES = date(2025, 11, 17)
+DOMINGO = date(2025, 11, 23)
+
+
+class TurnosTests(SimpleTestCase):
+
+    horario = {
+        0: [(time(9, 0), time(12, 0)), (time(15, 0), time(17, 0))],
+        2: [(time(10, 0), time(11, 0))],
+    }
+
+    def test_bloques_del_dia_segun_dia_de_la_semana(self):
+        self.assertEqual(bloques_del_dia(self.horario, LUNES), self.horario[0])
+        self.assertEqual(bloques_del_dia(self.horario, LUNES + timedelta(days=2)), self.horario[2])
+        self.assertEqual(bloques_del_dia(self.horario, DOMINGO), [])
+
+    def test_turnos_recorren_cada_bloque(self):
+        self.assertEqual(
+            turnos(self.horario, LUNES, 60),
+            ['09:00', '10:00', '11:00', '15:00', '16:00']
+        )
+
+    def test_turnos_completos_caben_en_el_bloque(self):
+        self.assertEqual(turnos(self.horario, LUNES + timedelta(days=2), 45), ['10:00'])
+
+    def test_turnos_incompletos_solo_empiezan_antes_del_fin(self):
+        horario = horario_fijo(time(8, 0), time(10, 0))
+        self.assertEqual(
+            turnos(horario, DOMINGO, 45, completos=False),
+            ['08:00', '08:45', '09:30']
+        )
+
+    @override_settings(AGENDA_DURACION_CITA_MINUTOS=30)
+    def test_intervalo_por_defecto_desde_settings(self):
+        horario = horario_fijo(time(9, 0), time(10, 0))
+        self.assertEqual(turnos(horario, LUNES), ['09:00', '09:30'])
+
+    def test_dia_sin_bloques_no_tiene_turnos(self):
+        self.assertEqual(turnos(self.horario, DOMINGO, 30), [])
+
+
+class DisponibilidadAgendaTests(TenantTestCase):
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.nombre = 'Clínica de pruebas'
+        tenant.dominio = 'test'
+        tenant.activo = True
+
+    def setUp(self):
+        super().setUp()
+        ajustes = override_settings(
+            AGENDA_HORA_INICIO='09:00',
+            AGENDA_HORA_FIN='18:00',
+            AGENDA_DIAS_ATENCION=[0, 1, 2, 3, 4, 5],
+            AGENDA_DURACION_CITA_MINUTOS=30,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.usuario = Usuario.objects.create_user(
+            'odontologo@test.local', 'clave-segura',
+            nombre='Ana', apellido='Pérez',
+            tipo_usuario=Usuario.TipoUsuario.ODONTOLOGO, is_staff=True,
+        )
+        self.odontologo = self.usuario.perfil_odontologo
+        # Un domingo futuro (horarios_disponibles rechaza fechas pasadas)
+        hoy = timezone.now().date()
+        self.domingo = hoy + timedelta(days=6 - hoy.weekday() + 7)
+
+    def _get(self, accion, **params):
+        request = APIRequestFactory().get(f'/api/agenda/citas/{accion}/', params)
+        force_authenticate(request, user=self.usuario)
+        return CitaViewSet.as_view({'get': accion})(request)
+
+    # --- disponibilidad ----------------------------------------------------
+
+    def test_disponibilidad_sin_horario_propio_mantiene_9_a_18_todos_los_dias(self):
+        response = self._get(
+            'disponibilidad', fecha=self.domingo.isoformat(), odontologo_id=self.odontologo.pk
+        )
+
+        self.assertEqual(response.status_code, 200)
+        disponibles = response.data['horarios_disponibles']
+        self.assertEqual(disponibles[0], '09:00')
+        self.assertEqual(disponibles[-1], '17:30')
+        self.assertEqual(len(disponibles), 18)
+        self.assertEqual(response.data['horario_atencion']['inicio'], '09:00')
+        self.assertEqual(response.data['horario_atencion']['fin'], '18:00')
+
+    def test_disponibilidad_con_horario_propio(self):
+        HorarioAtencion.objects.create(
+            odontologo=self.odontologo, dia_semana=6, hora_inicio=time(10, 0), hora_fin=time(12, 0)
+        )
+
+        response = self._get(
+            'disponibilidad', fecha=self.domingo.isoformat(), odontologo_id=self.odontologo.pk
+        )
+
+        self.assertEqual(response.data['horarios_disponibles'], ['10:00', '10:30', '11:00', '11:30'])
+
+    def test_disponibilidad_dia_sin_bloques_propios(self):
+        HorarioAtencion.objects.create(
+            odontologo=self.odontologo, dia_semana=0, hora_inicio=time(9, 0), hora_fin=time(13, 0)
+        )
+
+        response = self._get(
+            'disponibilidad', fecha=self.domingo.isoformat(), odontologo_id=self.odontologo.pk
+        )
+
+        self.assertEqual(response.data['horarios_disponibles'], [])
+        self.assertIsNone(response.data['horario_atencion']['inicio'])
+
+    # --- horarios_disponibles ----------------------------------------------
+
+    def test_horarios_disponibles_sin_horario_propio_mantiene_8_a_18(self):
+        response = self._get(
+            'horarios_disponibles', fecha=self.domingo.isoformat(), odontologo=self.odontologo.pk
+        )
+
+        self.assertEqual(response.status_code, 200)
+        horas = [h['hora'] for h in response.data['horarios']]
+        self.assertEqual(horas[0], '08:00')
+        self.assertEqual(horas[-1], '17:30')
+        self.assertEqual(len(horas), 20)
+
+    def test_horarios_disponibles_sin_horario_propio_con_duracion_larga(self):
+        response = self._get(
+            'horarios_disponibles', fecha=self.domingo.isoformat(),
+            odontologo=self.odontologo.pk, duracion=45
+        )
+
+        horas = [h['hora'] for h in response.data['horarios']]
+        # Como antes: turnos que empiezan antes de las 18:00
+        self.assertEqual(horas[-1], '17:45')
+        self.assertEqual(len(horas), 14)
+
+    def test_horarios_disponibles_con_horario_propio(self):
+        HorarioAtencion.objects.create(
+            odontologo=self.odontologo, dia_semana=6, hora_inicio=time(9, 0), hora_fin=time(10, 0)
+        )
+
+        response = self._get(
+            'horarios_disponibles', fecha=self.domingo.isoformat(),
+            odontologo=self.odontologo.pk, duracion=45
+        )
+
+        self.assertEqual([h['hora'] for h in response.data['horarios']], ['09:00'])
+        self.assertEqual(
+            response.data['horarios'][0]['fecha_hora_completa'], f'{self.domingo.isoformat()}T09:00:00'
+        )
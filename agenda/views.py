@@ -1,10 +1,15 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 from datetime import timedelta, datetime, time
 from .models import Cita
+from .horarios import (
+    horario_odontologo, bloques_del_dia, turnos,
+    VENTANA_DISPONIBILIDAD, VENTANA_HORARIOS_DISPONIBLES
+)
 from .serializers import CitaSerializer, CitaListSerializer
 from tratamientos.models import ItemPlanTratamiento
 from historial_clinico.models import EpisodioAtencion, HistorialClinico
@@ -374,20 +379,12 @@ class CitaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Configuración de horario de atención (por defecto 9am a 6pm)
-        # TODO: En el futuro, esto debería venir de la configuración del odontólogo
-        hora_inicio = time(9, 0)  # 9:00 AM
-        hora_fin = time(18, 0)    # 6:00 PM
-        intervalo_minutos = 30    # Citas cada 30 minutos
-        
-        # Generar todos los horarios posibles
-        horarios_posibles = []
-        hora_actual = datetime.combine(fecha, hora_inicio)
-        hora_limite = datetime.combine(fecha, hora_fin)
-        
-        while hora_actual < hora_limite:
-            horarios_posibles.append(hora_actual.strftime('%H:%M'))
-            hora_actual += timedelta(minutes=intervalo_minutos)
+        # Horario de atención del odontólogo para ese día
+        # (HorarioAtencion propio o, si no tiene, 9:00 a 18:00 todos los días)
+        horario, propio = horario_odontologo(odontologo.pk, VENTANA_DISPONIBILIDAD)
+        bloques = bloques_del_dia(horario, fecha)
+        intervalo_minutos = settings.AGENDA_DURACION_CITA_MINUTOS
+        horarios_posibles = turnos(horario, fecha, intervalo_minutos, completos=propio)
         
         # Obtener citas ocupadas del odontólogo en esa fecha
         fecha_inicio = datetime.combine(fecha, time.min)
@@ -416,14 +413,18 @@ class CitaViewSet(viewsets.ModelViewSet):
             'fecha': fecha_str,
             'odontologo': {
                 'id': odontologo.usuario.id,  # ✅ FIX: odontologo.usuario.id (no odontologo.id)
-                'nombre_completo': odontologo.usuario.get_full_name(),
-                'especialidad': odontologo.especialidad if hasattr(odontologo, 'especialidad') else None
+                'nombre_completo': odontologo.usuario.full_name,
+                'especialidad': odontologo.especialidad.nombre if odontologo.especialidad else None
             },
             'horarios_disponibles': horarios_disponibles,
             'horarios_ocupados': horarios_ocupados,
             'horario_atencion': {
-                'inicio': hora_inicio.strftime('%H:%M'),
-                'fin': hora_fin.strftime('%H:%M'),
+                'inicio': bloques[0][0].strftime('%H:%M') if bloques else None,
+                'fin': bloques[-1][1].strftime('%H:%M') if bloques else None,
+                'bloques': [
+                    {'inicio': inicio.strftime('%H:%M'), 'fin': fin.strftime('%H:%M')}
+                    for inicio, fin in bloques
+                ],
                 'intervalo_minutos': intervalo_minutos
             },
             'total_disponibles': len(horarios_disponibles),
@@ -578,14 +579,10 @@ class CitaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Horario de atención: 8:00 AM a 6:00 PM
-        hora_inicio = time(8, 0)
-        hora_fin = time(18, 0)
+        # Horario de atención del odontólogo (o, si no tiene, 8:00 a 18:00 todos los días)
+        horario, propio = horario_odontologo(odontologo.pk, VENTANA_HORARIOS_DISPONIBLES)
         
         # Obtener citas existentes del odontólogo en esa fecha
-        inicio_dia = datetime.combine(fecha, hora_inicio)
-        fin_dia = datetime.combine(fecha, hora_fin)
-        
         citas_ocupadas = Cita.objects.filter(
             odontologo=odontologo,
             fecha_hora__date=fecha,
@@ -597,23 +594,14 @@ class CitaViewSet(viewsets.ModelViewSet):
             cita.strftime('%H:%M') for cita in citas_ocupadas
         }
         
-        # Generar slots de tiempo cada 30 minutos (o según duración especificada)
+        # Generar slots de tiempo según la duración dentro de los bloques de atención
         horarios = []
-        hora_actual = datetime.combine(fecha, hora_inicio)
-        hora_limite = datetime.combine(fecha, hora_fin)
-        
-        while hora_actual < hora_limite:
-            hora_str = hora_actual.strftime('%H:%M')
-            disponible = hora_str not in horas_ocupadas
-            
+        for hora_str in turnos(horario, fecha, duracion, completos=propio):
             horarios.append({
                 'hora': hora_str,
-                'disponible': disponible,
-                'fecha_hora_completa': hora_actual.isoformat()
+                'disponible': hora_str not in horas_ocupadas,
+                'fecha_hora_completa': datetime.combine(fecha, time.fromisoformat(hora_str)).isoformat()
             })
-            
-            # Avanzar según duración
-            hora_actual += timedelta(minutes=duracion)
         
         return Response({
             'fecha': fecha_str,
@@ -336,6 +336,110 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 SUPABASE_URL = config('SUPABASE_URL', default='')
 SUPABASE_KEY = config('SUPABASE_KEY', default='')
 
+# ============================================================================
+# CONFIGURACIÓN DE CACHÉ
+# ============================================================================
+# Con REDIS_URL usa django-redis; sin Redis cae a memoria local del proceso.
+# Las cachés de reportes y del catálogo de servicios necesitan Redis: con
+# memoria local cada worker tendría su propia versión de los datos, así que
+# sin REDIS_URL no se cachean (ver reportes/cache.py y tratamientos/catalogo.py)
+# y el 304 del catálogo por ETag también consulta la base.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'clinica',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # Si Redis se cae, la caché falla como "miss" en vez de error 500
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'clinica-dental',
+        }
+    }
+
+# Segundos que se guarda en caché la respuesta JSON de cada reporte
+REPORTES_CACHE_TIMEOUT = config('REPORTES_CACHE_TIMEOUT', default=300, cast=int)
+
+# Segundos que se guarda cada snapshot del catálogo de servicios (se descarta
+# antes si cambia la revisión del catálogo, ver tratamientos/catalogo.py)
+CATALOGO_CACHE_TIMEOUT = config('CATALOGO_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Exportaciones PDF/Excel con más filas que esto se convierten en trabajo
+# asíncrono (ver reportes/trabajos.py y el comando procesar_trabajos_reportes)
+REPORTES_FILAS_ASINCRONO = config('REPORTES_FILAS_ASINCRONO', default=2000, cast=int)
+
+# Horas que se conserva el archivo de un trabajo de reporte terminado
+REPORTES_TRABAJOS_EXPIRACION_HORAS = config('REPORTES_TRABAJOS_EXPIRACION_HORAS', default=24, cast=int)
+
+# Segundos de reserva de un trabajo de reporte en PROCESANDO. El worker la
+# renueva mientras lo ejecuta; si vence, el trabajo se vuelve a encolar.
+REPORTES_TRABAJOS_RESERVA_SEGUNDOS = config('REPORTES_TRABAJOS_RESERVA_SEGUNDOS', default=120, cast=int)
+
+# Escritura de la bitácora (ver reportes/auditoria.py):
+# 'sincrono' inserta en la request; 'buffer' inserta en lote tras el commit
+# desde un hilo de fondo (activarlo explícitamente en los servidores web).
+# Los tests lo controlan con la variable de entorno u override_settings.
+BITACORA_MODO = config('BITACORA_MODO', default='sincrono')
+# Entradas por bulk_create y segundos máximos entre escrituras
+BITACORA_LOTE = config('BITACORA_LOTE', default=100, cast=int)
+BITACORA_INTERVALO_SEGUNDOS = config('BITACORA_INTERVALO_SEGUNDOS', default=2.0, cast=float)
+# Tope de entradas en memoria por proceso; por encima se descartan (y se cuentan)
+BITACORA_MAXIMO_PENDIENTES = config('BITACORA_MAXIMO_PENDIENTES', default=10000, cast=int)
+# Particiones mensuales (comando mantener_particiones_bitacora): meses que se
+# crean por adelantado y meses completos que se conservan antes de archivar (0 = todos)
+BITACORA_PARTICIONES_FUTURAS = config('BITACORA_PARTICIONES_FUTURAS', default=3, cast=int)
+BITACORA_RETENCION_MESES = config('BITACORA_RETENCION_MESES', default=12, cast=int)
+
+# Horario general de atención (odontólogos sin HorarioAtencion propio).
+# Días: 0 = lunes ... 6 = domingo
+AGENDA_HORA_INICIO = config('AGENDA_HORA_INICIO', default='09:00')
+AGENDA_HORA_FIN = config('AGENDA_HORA_FIN', default='18:00')
+AGENDA_DIAS_ATENCION = config(
+    'AGENDA_DIAS_ATENCION', default='0,1,2,3,4,5',
+    cast=lambda v: [int(d) for d in v.split(',') if d.strip()]
+)
+# Duración de un turno de cita (para disponibilidad y ocupación)
+AGENDA_DURACION_CITA_MINUTOS = config('AGENDA_DURACION_CITA_MINUTOS', default=30, cast=int)
+
+# Importación de extractos bancarios (facturacion/conciliacion.py): filas máximas por archivo
+FACTURACION_IMPORTACION_MAX_FILAS = config('FACTURACION_IMPORTACION_MAX_FILAS', default=20000, cast=int)
+
+# ============================================================================
+# PASARELAS DE PAGO
+# ============================================================================
+STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
+PAYPAL_CLIENT_ID = config('PAYPAL_CLIENT_ID', default='')
+PAYPAL_SECRET = config('PAYPAL_SECRET', default='')
+PAYPAL_MODE = config('PAYPAL_MODE', default='sandbox')  # 'sandbox' o 'live'
+MERCADOPAGO_ACCESS_TOKEN = config('MERCADOPAGO_ACCESS_TOKEN', default='')
+
+# Webhooks (POST /api/tenants/webhooks/<proveedor>/, ver tenants/webhooks.py).
+# Con el secreto/ID configurado, confirmar_pago deja de consultar a la pasarela
+# y solo lee el estado local que aplica el worker procesar_eventos_pasarela.
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+PAYPAL_WEBHOOK_ID = config('PAYPAL_WEBHOOK_ID', default='')
+MERCADOPAGO_WEBHOOK_SECRET = config('MERCADOPAGO_WEBHOOK_SECRET', default='')
+# Antigüedad máxima (segundos) de la marca de tiempo de una firma
+PAGOS_WEBHOOK_TOLERANCIA_SEGUNDOS = config('PAGOS_WEBHOOK_TOLERANCIA_SEGUNDOS', default=300, cast=int)
+# Intentos del worker por evento antes de dejarlo en ERROR
+PAGOS_EVENTOS_MAX_INTENTOS = config('PAGOS_EVENTOS_MAX_INTENTOS', default=5, cast=int)
+
+# Pasarela local de pruebas: reemplaza a Stripe/PayPal/MercadoPago y acepta
+# webhooks firmados con PAGOS_FAKE_WEBHOOK_SECRET (comando simular_evento_pasarela).
+# Nunca activarla en producción.
+PAGOS_PASARELA_FAKE = config('PAGOS_PASARELA_FAKE', default=False, cast=bool)
+PAGOS_FAKE_WEBHOOK_SECRET = config('PAGOS_FAKE_WEBHOOK_SECRET', default='fake-webhook-secret')
+
 # --- Configuración de Logging ---
 # Para poder ver errores detallados en producción (Render)
 LOGGING = {
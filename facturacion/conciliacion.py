@@ -0,0 +1,433 @@
+# facturacion/conciliacion.py
+"""
+Importación de extractos bancarios y conciliación con facturas.
+
+Flujo (endpoint pagos/importar-extracto/):
+1. leer_extracto(): lee el CSV o Excel del banco y normaliza cada fila
+   (fecha, monto, referencia, descripción, NIT/CI). Los encabezados se
+   reconocen por alias y pueden venir después de unas filas de cabecera.
+2. conciliar(): empareja cada abono con una factura pendiente, en orden:
+     - referencia: "FAC-123", "Factura 123", "#123" en referencia o glosa;
+     - nit_ci: NIT/CI de la factura o CI del paciente (la factura más
+       antigua con saldo suficiente, o la que tenga el saldo exacto);
+     - monto: una única factura cuyo saldo es exactamente el abono.
+   Todo se resuelve en memoria con dos consultas (facturas pendientes y
+   filas ya importadas); el saldo se descuenta a medida que se asigna,
+   así un extracto no puede sobrepagar una factura.
+3. aplicar(): con las facturas afectadas bloqueadas, vuelve a buscar filas
+   ya importadas, crea los Pago con bulk_create y actualiza cada factura
+   una sola vez (bulk_update).
+
+Duplicados: cada fila lleva una huella (fecha, monto, referencia o glosa,
+NIT/CI y el número de repetición dentro del extracto) que se guarda en
+Pago.datos_pago['extracto']['huella']. Volver a subir el mismo extracto
+(o uno que se solape) rechaza las filas ya registradas aunque no traigan
+referencia; dos abonos idénticos del mismo extracto siguen siendo dos pagos.
+"""
+
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Factura, Pago
+
+EXTENSIONES_CSV = ('.csv', '.txt')
+EXTENSIONES_EXCEL = ('.xlsx', '.xlsm')
+
+# Filas iniciales donde se busca el encabezado (los bancos suelen poner
+# nombre de cuenta, período, etc. antes de la tabla)
+FILAS_BUSQUEDA_ENCABEZADO = 20
+
+ALIAS_COLUMNAS = {
+    'fecha': ('fecha', 'fecha_valor', 'fecha_operacion', 'fecha_transaccion', 'fecha_movimiento'),
+    'monto': ('monto', 'importe', 'abono', 'abonos', 'credito', 'creditos', 'haber', 'monto_bs', 'deposito'),
+    'referencia': ('referencia', 'ref', 'nro_referencia', 'comprobante', 'nro_operacion', 'numero_operacion', 'operacion'),
+    'descripcion': ('descripcion', 'concepto', 'glosa', 'detalle', 'observacion'),
+    'nit_ci': ('nit_ci', 'nit', 'ci', 'documento', 'nro_documento', 'carnet'),
+}
+
+CRITERIO_REFERENCIA = 'referencia'
+CRITERIO_NIT_CI = 'nit_ci'
+CRITERIO_MONTO = 'monto'
+
+_PATRON_FACTURA = re.compile(r'\b(?:FACTURA|FACT|FAC|FC)[-#:.\sNRO°º]*?(\d+)\b|#\s*(\d+)\b', re.IGNORECASE)
+_CENTAVOS = Decimal('0.01')
+
+
+# --- lectura ------------------------------------------------------------------
+
+def _clave(texto):
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+
+_COLUMNA_POR_ALIAS = {alias: columna for columna, alias_ in ALIAS_COLUMNAS.items() for alias in alias_}
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def parse_monto(valor):
+    """
+    Convierte un monto del extracto a Decimal. Acepta números de Excel y
+    textos como "1.234,56", "1,234.56", "Bs 1234.5" o "(150,00)" (negativo).
+    """
+    if valor is None or valor == '':
+        raise ValueError('monto vacío')
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return Decimal(str(valor)).quantize(_CENTAVOS)
+
+    texto = str(valor).strip()
+    negativo = texto.startswith('-') or (texto.startswith('(') and texto.endswith(')'))
+    texto = re.sub(r'[^\d,.]', '', texto)
+    if ',' in texto and '.' in texto:
+        # El último separador es el decimal
+        miles = ',' if texto.rfind('.') > texto.rfind(',') else '.'
+        texto = texto.replace(miles, '').replace(',', '.')
+    elif ',' in texto:
+        texto = texto.replace(',', '.') if re.search(r',\d{1,2}$', texto) else texto.replace(',', '')
+    elif texto.count('.') > 1:
+        texto = texto.replace('.', '')
+    try:
+        monto = Decimal(texto).quantize(_CENTAVOS)
+    except InvalidOperation:
+        raise ValueError(f'monto inválido: {valor}')
+    return -monto if negativo else monto
+
+
+def _filas_csv(archivo):
+    contenido = archivo.read()
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # Exportaciones de Excel en Windows
+            contenido = contenido.decode('latin-1')
+    try:
+        dialecto = csv.Sniffer().sniff(contenido[:4096], delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    return csv.reader(io.StringIO(contenido), dialecto)
+
+
+def _filas_excel(archivo):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    return libro.worksheets[0].iter_rows(values_only=True)
+
+
+def leer_extracto(archivo, nombre=None):
+    """
+    Lee el extracto (archivo subido o binario) y devuelve una lista de dicts
+    con numero_fila, fecha, monto (texto original), referencia, descripcion
+    y nit_ci. Lanza ValueError si el formato o las columnas no sirven.
+    """
+    nombre = (nombre or getattr(archivo, 'name', '') or '').lower()
+    if nombre.endswith(EXTENSIONES_CSV):
+        filas = _filas_csv(archivo)
+    elif nombre.endswith(EXTENSIONES_EXCEL):
+        try:
+            filas = _filas_excel(archivo)
+        except Exception as e:
+            raise ValueError(f'No se pudo leer el Excel: {e}')
+    else:
+        raise ValueError('Formato no soportado. Use CSV o Excel (.xlsx)')
+
+    maximo = settings.FACTURACION_IMPORTACION_MAX_FILAS
+    indices = None
+    registros = []
+    for numero, fila in enumerate(filas, start=1):
+        if indices is None:
+            columnas = {}
+            for posicion, celda in enumerate(fila or ()):
+                columna = _COLUMNA_POR_ALIAS.get(_clave(celda)) if celda is not None else None
+                if columna and columna not in columnas:
+                    columnas[columna] = posicion
+            if 'monto' in columnas:
+                indices = columnas
+            elif numero >= FILAS_BUSQUEDA_ENCABEZADO:
+                break
+            continue
+
+        valores = {
+            columna: (fila[posicion] if posicion < len(fila) else None)
+            for columna, posicion in indices.items()
+        }
+        if not any(_texto(v) for v in valores.values()):
+            continue
+        if len(registros) >= maximo:
+            raise ValueError(f'El extracto supera el máximo de {maximo} filas')
+
+        fecha = valores.get('fecha')
+        registros.append({
+            'numero_fila': numero,
+            'fecha': fecha.date().isoformat() if isinstance(fecha, datetime)
+            else fecha.isoformat() if isinstance(fecha, date) else _texto(fecha),
+            'monto': valores.get('monto'),
+            'referencia': _texto(valores.get('referencia')),
+            'descripcion': _texto(valores.get('descripcion')),
+            'nit_ci': _texto(valores.get('nit_ci')),
+        })
+
+    if indices is None:
+        raise ValueError(
+            'No se encontró la columna de monto. Columnas reconocidas: '
+            + ', '.join(alias[0] for alias in ALIAS_COLUMNAS.values())
+        )
+    return registros
+
+
+# --- conciliación -------------------------------------------------------------
+
+def _documento(valor):
+    return re.sub(r'[^0-9A-Z]', '', (valor or '').upper())
+
+
+def _facturas_referidas(registro):
+    texto = f"{registro['referencia']} {registro['descripcion']}"
+    return [int(a or b) for a, b in _PATRON_FACTURA.findall(texto)]
+
+
+def _rechazo(registro, motivo, monto=None):
+    return {
+        **registro,
+        'monto': str(monto) if monto is not None else _texto(registro['monto']),
+        'motivo': motivo,
+    }
+
+
+def _huellas(registros):
+    """
+    Huella de cada fila (en el mismo orden). Las filas idénticas del extracto
+    se distinguen por su número de repetición, así reimportar el mismo
+    archivo da las mismas huellas.
+    """
+    repeticiones = defaultdict(int)
+    huellas = []
+    for registro in registros:
+        try:
+            monto = str(parse_monto(registro['monto']))
+        except ValueError:
+            monto = _texto(registro['monto'])
+        base = '|'.join((
+            registro['fecha'],
+            monto,
+            _clave(registro['referencia'] or registro['descripcion']),
+            _documento(registro['nit_ci']),
+        ))
+        repeticiones[base] += 1
+        huellas.append(
+            hashlib.sha1(f'{base}#{repeticiones[base]}'.encode('utf-8')).hexdigest()
+        )
+    return huellas
+
+
+def _ya_importadas(referencias, huellas):
+    """(referencias, huellas) de las filas que ya tienen un Pago registrado."""
+    if not referencias and not huellas:
+        return set(), set()
+    existentes = (
+        Pago.objects
+        .filter(Q(referencia_transaccion__in=referencias) | Q(datos_pago__extracto__huella__in=huellas))
+        .values_list('referencia_transaccion', 'datos_pago__extracto__huella')
+    )
+    referencias_existentes, huellas_existentes = set(), set()
+    for referencia, huella in existentes:
+        if referencia in referencias:
+            referencias_existentes.add(referencia)
+        if huella:
+            huellas_existentes.add(huella)
+    return referencias_existentes, huellas_existentes
+
+
+def conciliar(registros):
+    """
+    Empareja los registros del extracto con facturas pendientes.
+
+    Devuelve (conciliadas, sin_conciliar). Cada conciliada incluye
+    factura_id, paciente_id, monto (Decimal), criterio y huella; cada no
+    conciliada, el motivo.
+    """
+    pendientes = {
+        f['id']: f for f in Factura.objects
+        .exclude(estado=Factura.EstadoFactura.ANULADA)
+        .filter(monto_pagado__lt=F('monto_total'))
+        .order_by('id')
+        .values('id', 'paciente_id', 'monto_total', 'monto_pagado', 'nit_ci', 'paciente__usuario__ci')
+    }
+    saldos = {fid: f['monto_total'] - f['monto_pagado'] for fid, f in pendientes.items()}
+
+    por_documento = defaultdict(list)
+    por_saldo = defaultdict(list)
+    for fid, f in pendientes.items():
+        for documento in {_documento(f['nit_ci']), _documento(f['paciente__usuario__ci'])} - {''}:
+            por_documento[documento].append(fid)
+        por_saldo[saldos[fid]].append(fid)
+
+    huellas = _huellas(registros)
+    importadas, huellas_importadas = _ya_importadas(
+        {r['referencia'] for r in registros if r['referencia']}, set(huellas)
+    )
+
+    conciliadas, sin_conciliar = [], []
+    for registro, huella in zip(registros, huellas):
+        try:
+            monto = parse_monto(registro['monto'])
+        except ValueError as e:
+            sin_conciliar.append(_rechazo(registro, str(e)))
+            continue
+        if monto <= 0:
+            sin_conciliar.append(_rechazo(registro, 'no es un abono', monto))
+            continue
+        if registro['referencia'] and registro['referencia'] in importadas:
+            sin_conciliar.append(_rechazo(registro, 'referencia ya importada', monto))
+            continue
+        if huella in huellas_importadas:
+            sin_conciliar.append(_rechazo(registro, 'fila ya importada', monto))
+            continue
+
+        factura_id, criterio, motivo = None, None, None
+
+        referidas = _facturas_referidas(registro)
+        for fid in referidas:
+            if fid in saldos and saldos[fid] >= monto:
+                factura_id, criterio = fid, CRITERIO_REFERENCIA
+                break
+        if factura_id is None and referidas:
+            motivo = f'factura #{referidas[0]} no está pendiente o el abono excede su saldo'
+
+        documento = _documento(registro['nit_ci'])
+        if factura_id is None and documento:
+            candidatas = [fid for fid in por_documento.get(documento, ()) if saldos[fid] >= monto]
+            exactas = [fid for fid in candidatas if saldos[fid] == monto]
+            if exactas or candidatas:
+                factura_id, criterio = (exactas or candidatas)[0], CRITERIO_NIT_CI
+            elif motivo is None:
+                motivo = f'sin facturas pendientes para NIT/CI {registro["nit_ci"]} con saldo suficiente'
+
+        if factura_id is None:
+            exactas = [fid for fid in por_saldo.get(monto, ()) if saldos[fid] == monto]
+            if len(exactas) == 1:
+                factura_id, criterio = exactas[0], CRITERIO_MONTO
+            elif exactas and motivo is None:
+                motivo = f'el monto coincide con {len(exactas)} facturas; indique la factura en la referencia'
+
+        if factura_id is None:
+            sin_conciliar.append(_rechazo(registro, motivo or 'ninguna factura pendiente coincide', monto))
+            continue
+
+        saldos[factura_id] -= monto
+        por_saldo[saldos[factura_id]].append(factura_id)
+        if registro['referencia']:
+            importadas.add(registro['referencia'])
+        conciliadas.append({
+            **registro,
+            'monto': monto,
+            'factura_id': factura_id,
+            'paciente_id': pendientes[factura_id]['paciente_id'],
+            'criterio': criterio,
+            'huella': huella,
+        })
+
+    return conciliadas, sin_conciliar
+
+
+# --- aplicación ---------------------------------------------------------------
+
+def aplicar(conciliadas, metodo_pago=Pago.MetodoPago.TRANSFERENCIA):
+    """
+    Registra los pagos conciliados en una transacción: bloquea las facturas
+    afectadas (en orden de id), vuelve a comprobar el saldo y las filas ya
+    importadas por si cambiaron desde la conciliación (otra importación
+    concurrente del mismo extracto), crea los Pago con bulk_create y
+    actualiza cada factura una sola vez.
+
+    Devuelve (aplicadas, rechazadas); las aplicadas llevan pago_id.
+    """
+    # bulk_create no pasa por Pago.save ni por los signals: el saldo se
+    # actualiza aquí y el resumen diario/caché se programan a mano.
+    from reportes import rollups
+    from reportes.cache import invalidar_tenant, schema_actual
+
+    ahora = timezone.now()
+    aplicadas, rechazadas = [], []
+    with transaction.atomic():
+        facturas = {
+            f.pk: f for f in Factura.objects.select_for_update()
+            .filter(pk__in={c['factura_id'] for c in conciliadas})
+            .order_by('pk')
+            .only('id', 'monto_total', 'monto_pagado', 'estado')
+        }
+        # Con las facturas bloqueadas, una importación concurrente que tocó
+        # las mismas facturas ya confirmó sus pagos: se ven aquí.
+        importadas, huellas_importadas = _ya_importadas(
+            {c['referencia'] for c in conciliadas if c['referencia']},
+            {c['huella'] for c in conciliadas if c.get('huella')}
+        )
+
+        pagos = []
+        for conciliada in conciliadas:
+            if conciliada['referencia'] in importadas or conciliada.get('huella') in huellas_importadas:
+                rechazadas.append(_rechazo(conciliada, 'fila ya importada', conciliada['monto']))
+                continue
+            factura = facturas.get(conciliada['factura_id'])
+            if (factura is None or factura.estado == Factura.EstadoFactura.ANULADA
+                    or factura.saldo_pendiente < conciliada['monto']):
+                rechazadas.append(_rechazo(
+                    conciliada, 'la factura cambió durante la importación', conciliada['monto']
+                ))
+                continue
+            factura.monto_pagado += conciliada['monto']
+            aplicadas.append(conciliada)
+            pagos.append(Pago(
+                tipo_pago=Pago.TipoPago.FACTURA,
+                factura_id=factura.pk,
+                paciente_id=conciliada['paciente_id'],
+                monto_pagado=conciliada['monto'],
+                metodo_pago=metodo_pago,
+                estado_pago=Pago.EstadoPago.COMPLETADO,
+                fecha_completado=ahora,
+                referencia_transaccion=conciliada['referencia'] or None,
+                descripcion=(conciliada['descripcion'] or f'Extracto bancario, fila {conciliada["numero_fila"]}')[:500],
+                datos_pago={
+                    'extracto': {
+                        'fila': conciliada['numero_fila'],
+                        'fecha': conciliada['fecha'],
+                        'criterio': conciliada['criterio'],
+                        'huella': conciliada.get('huella'),
+                    }
+                },
+            ))
+
+        Pago.objects.bulk_create(pagos, batch_size=500)
+        for conciliada, pago in zip(aplicadas, pagos):
+            conciliada['pago_id'] = pago.pk
+
+        afectadas = {pago.factura_id for pago in pagos}
+        modificadas = [f for f in facturas.values() if f.pk in afectadas]
+        for factura in modificadas:
+            factura.estado = Factura.estado_segun_pagos(factura.monto_pagado, factura.monto_total, factura.estado)
+        Factura.objects.bulk_update(modificadas, ['monto_pagado', 'estado'], batch_size=500)
+
+        if pagos:
+            rollups.programar_recalculo(rollups.TIPO_PAGOS, ahora)
+            schema = schema_actual()
+            transaction.on_commit(lambda: invalidar_tenant(schema))
+
+    return aplicadas, rechazadas
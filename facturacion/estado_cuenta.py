@@ -0,0 +1,104 @@
+# facturacion/estado_cuenta.py
+"""
+Libro de cuenta del paciente (facturas y pagos con saldo acumulado).
+
+Todo sale de una sola consulta: un CTE une las facturas (cargos) y los
+pagos completados de esas facturas (abonos); las funciones de ventana dan
+el saldo acumulado por fila y, con agregación condicional sobre la
+partición completa (OVER ()), los contadores y totales, que se leen de la
+primera fila.
+
+Las facturas anuladas no generan cargo ni se listan; sus pagos tampoco.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import Factura, Pago
+
+_SQL_LIBRO = """
+WITH movimientos AS (
+    SELECT 'FACTURA' AS tipo, 0 AS orden, f.id, f.fecha_emision AS fecha,
+           f.monto_total AS cargo, 0 AS abono, f.estado, f.id AS factura_id,
+           NULL AS metodo_pago, NULL AS referencia
+    FROM {factura} f
+    WHERE f.paciente_id = %(paciente)s AND f.estado <> %(anulada)s
+    UNION ALL
+    SELECT 'PAGO', 1, p.id, COALESCE(p.fecha_completado, p.fecha_pago),
+           0, p.monto_pagado, p.estado_pago, p.factura_id,
+           p.metodo_pago, p.referencia_transaccion
+    FROM {pago} p JOIN {factura} f ON f.id = p.factura_id
+    WHERE f.paciente_id = %(paciente)s AND f.estado <> %(anulada)s
+      AND p.estado_pago = %(completado)s
+)
+SELECT tipo, id, fecha, cargo, abono, estado, factura_id, metodo_pago, referencia,
+       SUM(cargo - abono) OVER (ORDER BY fecha, orden, id ROWS UNBOUNDED PRECEDING) AS saldo,
+       SUM(CASE WHEN tipo = 'FACTURA' THEN 1 ELSE 0 END) OVER () AS total_facturas,
+       SUM(CASE WHEN tipo = 'FACTURA' AND estado = %(pendiente)s THEN 1 ELSE 0 END) OVER () AS facturas_pendientes,
+       SUM(CASE WHEN tipo = 'FACTURA' AND estado = %(pagada)s THEN 1 ELSE 0 END) OVER () AS facturas_pagadas,
+       SUM(CASE WHEN tipo = 'PAGO' THEN 1 ELSE 0 END) OVER () AS total_pagos,
+       SUM(cargo) OVER () AS monto_total,
+       SUM(abono) OVER () AS monto_pagado
+FROM movimientos
+ORDER BY fecha, orden, id
+"""
+
+
+def _monto(valor):
+    return float(Decimal(str(valor or 0)).quantize(Decimal('0.01')))
+
+
+def _fecha(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def libro_paciente(paciente_id):
+    """
+    Devuelve {'resumen': {...}, 'movimientos': [...]} del paciente, en orden
+    cronológico, con el saldo acumulado en cada movimiento.
+    """
+    sql = _SQL_LIBRO.format(
+        factura=connection.ops.quote_name(Factura._meta.db_table),
+        pago=connection.ops.quote_name(Pago._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'paciente': paciente_id,
+            'anulada': Factura.EstadoFactura.ANULADA,
+            'pendiente': Factura.EstadoFactura.PENDIENTE,
+            'pagada': Factura.EstadoFactura.PAGADA,
+            'completado': Pago.EstadoPago.COMPLETADO,
+        })
+        columnas = [c[0] for c in cursor.description]
+        filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+    primera = filas[0] if filas else {}
+    monto_total = _monto(primera.get('monto_total'))
+    monto_pagado = _monto(primera.get('monto_pagado'))
+    resumen = {
+        'total_facturas': int(primera.get('total_facturas') or 0),
+        'facturas_pendientes': int(primera.get('facturas_pendientes') or 0),
+        'facturas_pagadas': int(primera.get('facturas_pagadas') or 0),
+        'total_pagos': int(primera.get('total_pagos') or 0),
+        'monto_total': monto_total,
+        'monto_pagado': monto_pagado,
+        'saldo_pendiente': round(monto_total - monto_pagado, 2),
+    }
+    movimientos = [
+        {
+            'tipo': fila['tipo'],
+            'id': fila['id'],
+            'fecha': _fecha(fila['fecha']),
+            'cargo': _monto(fila['cargo']),
+            'abono': _monto(fila['abono']),
+            'saldo': _monto(fila['saldo']),
+            'estado': fila['estado'],
+            'factura_id': fila['factura_id'],
+            'metodo_pago': fila['metodo_pago'],
+            'referencia': fila['referencia'],
+        }
+        for fila in filas
+    ]
+    return {'paciente_id': paciente_id, 'resumen': resumen, 'movimientos': movimientos}
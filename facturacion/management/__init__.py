@@ -0,0 +1 @@
+# Inicialización del módulo management
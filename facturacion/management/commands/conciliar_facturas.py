@@ -0,0 +1,158 @@
+"""
+Comando Django para conciliar el monto pagado de las facturas.
+
+Uso:
+    python manage.py conciliar_facturas                       # todas las clínicas, solo informe
+    python manage.py conciliar_facturas --tenant=clinica_demo
+    python manage.py conciliar_facturas --corregir
+    python manage.py conciliar_facturas --lote=1000 --mostrar=50
+
+Los pagos actualizan monto_pagado y estado de forma incremental
+(Pago.save → Factura.aplicar_pago). Este comando recalcula desde cero la
+suma de pagos COMPLETADO de cada factura, por lotes de ids, e informa las
+diferencias (deriva). Con --corregir las ajusta, con las filas del lote
+bloqueadas para no pisar pagos que se confirmen mientras tanto.
+"""
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from facturacion.models import Factura, Pago
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el monto pagado de las facturas e informa (o corrige) las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Facturas por lote (default: 500)'
+        )
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Corrige monto_pagado y estado de las facturas con diferencias'
+        )
+        parser.add_argument(
+            '--mostrar',
+            type=int,
+            default=20,
+            help='Máximo de facturas con diferencias a listar por clínica (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        modo = 'corrigiendo' if options['corregir'] else 'solo informe'
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Conciliando facturas en {len(schemas)} clínica(s) ({modo})...'
+        ))
+
+        total_deriva = 0
+        for schema in schemas:
+            with schema_context(schema):
+                total_deriva += self._conciliar(schema, options)
+
+        if total_deriva and not options['corregir']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {total_deriva} factura(s) con diferencias. Ejecutar con --corregir para ajustarlas.'
+            ))
+        self.stdout.write(self.style.SUCCESS('✅ Conciliación finalizada.'))
+
+    def _conciliar(self, schema, options):
+        pagado_real = Coalesce(
+            Subquery(
+                Pago.objects.filter(
+                    factura=OuterRef('pk'),
+                    estado_pago=Pago.EstadoPago.COMPLETADO,
+                )
+                .order_by()
+                .values('factura')
+                .annotate(total=Sum('monto_pagado'))
+                .values('total')
+            ),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+
+        revisadas = 0
+        deriva = []
+        ultimo_id = 0
+        while True:
+            ids = list(
+                Factura.objects.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+            revisadas += len(ids)
+
+            with transaction.atomic():
+                facturas = Factura.objects.filter(id__in=ids).order_by('id')
+                if options['corregir']:
+                    facturas = facturas.select_for_update()
+                filas = facturas.annotate(pagado_real=pagado_real).values(
+                    'id', 'monto_pagado', 'monto_total', 'estado', 'pagado_real'
+                )
+
+                ajustes = []
+                for fila in filas:
+                    estado = Factura.estado_segun_pagos(
+                        fila['pagado_real'], fila['monto_total'], fila['estado']
+                    )
+                    if fila['monto_pagado'] != fila['pagado_real'] or fila['estado'] != estado:
+                        deriva.append((fila, estado))
+                        ajustes.append(Factura(
+                            id=fila['id'], monto_pagado=fila['pagado_real'], estado=estado
+                        ))
+
+                if options['corregir'] and ajustes:
+                    Factura.objects.bulk_update(ajustes, ['monto_pagado', 'estado'])
+
+        for fila, estado in deriva[:options['mostrar']]:
+            diferencia = fila['monto_pagado'] - fila['pagado_real']
+            cambio_estado = f', estado {fila["estado"]} → {estado}' if fila['estado'] != estado else ''
+            self.stdout.write(
+                f'  🔍 [{schema}] Factura #{fila["id"]}: registrado Bs. {fila["monto_pagado"]}, '
+                f'pagos Bs. {fila["pagado_real"]} (diferencia {diferencia:+}){cambio_estado}'
+            )
+        if len(deriva) > options['mostrar']:
+            self.stdout.write(f'  ... y {len(deriva) - options["mostrar"]} más')
+
+        suma = sum((abs(fila['monto_pagado'] - fila['pagado_real']) for fila, _ in deriva), Decimal('0'))
+        mensaje = (
+            f'[{schema}] {revisadas} factura(s) revisadas, {len(deriva)} con diferencias '
+            f'(Bs. {suma} en total)'
+        )
+        if not deriva:
+            self.stdout.write(self.style.SUCCESS(f'✅ {mensaje}'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f'🔧 {mensaje}, corregidas'))
+        else:
+            self.stdout.write(self.style.WARNING(f'⚠️ {mensaje}'))
+        return len(deriva)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0002_pago_cita_pago_datos_pago_pago_descripcion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['referencia_transaccion'], name='pago_referencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(models.F('datos_pago__extracto__huella'), name='pago_huella_extracto_idx'),
+        ),
+    ]
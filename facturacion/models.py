@@ -1,9 +1,12 @@
 # facturacion/models.py
 
-from django.db import models
-from django.conf import settings
+from collections import defaultdict
 from decimal import Decimal
 
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.conf import settings
+
 # Importamos los modelos que necesitamos
 from usuarios.models import PerfilPaciente
 from tratamientos.models import Presupuesto
@@ -84,16 +87,53 @@ class Factura(models.Model):
     def __str__(self):
         return f"Factura #{self.id} - {self.paciente.usuario.full_name if self.paciente else 'Sin paciente'} (Bs. {self.monto_total})"
 
+    @classmethod
+    def estado_segun_pagos(cls, monto_pagado, monto_total, estado_actual):
+        """Estado que corresponde a lo pagado (una factura anulada sigue anulada)."""
+        if estado_actual == cls.EstadoFactura.ANULADA:
+            return estado_actual
+        if monto_pagado >= monto_total:
+            return cls.EstadoFactura.PAGADA
+        return cls.EstadoFactura.PENDIENTE
+
     def actualizar_estado_pago(self):
         """
         Actualiza el estado de la factura basado en los pagos.
         """
-        if self.monto_pagado >= self.monto_total:
-            self.estado = self.EstadoFactura.PAGADA
-        else:
-            self.estado = self.EstadoFactura.PENDIENTE
+        self.estado = self.estado_segun_pagos(self.monto_pagado, self.monto_total, self.estado)
         self.save()
 
+    @classmethod
+    def aplicar_pago(cls, factura_id, delta, instancia=None):
+        """
+        Suma `delta` (negativo al anular) a monto_pagado y ajusta el estado en
+        un único UPDATE con F(), con la fila bloqueada (select_for_update):
+        confirmaciones concurrentes de distintos pagos no se pisan.
+
+        Si se pasa la instancia en memoria, se actualizan sus valores.
+        """
+        with transaction.atomic(savepoint=False):
+            actual = (
+                cls.objects.select_for_update()
+                .values('monto_pagado', 'monto_total', 'estado')
+                .get(pk=factura_id)
+            )
+            cls.objects.filter(pk=factura_id).update(
+                monto_pagado=F('monto_pagado') + delta,
+                # En el SET, F('monto_pagado') es el valor anterior a este UPDATE
+                estado=Case(
+                    When(estado=cls.EstadoFactura.ANULADA, then=F('estado')),
+                    When(monto_total__lte=F('monto_pagado') + delta, then=Value(cls.EstadoFactura.PAGADA)),
+                    default=Value(cls.EstadoFactura.PENDIENTE),
+                ),
+            )
+
+        if instancia is not None:
+            instancia.monto_pagado = actual['monto_pagado'] + delta
+            instancia.estado = cls.estado_segun_pagos(
+                instancia.monto_pagado, actual['monto_total'], actual['estado']
+            )
+
     @classmethod
     def crear_desde_presupuesto(cls, presupuesto, nit_ci=None, razon_social=None):
         """
@@ -259,6 +299,11 @@ class Pago(models.Model):
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
         ordering = ['-fecha_pago']
+        indexes = [
+            # Detección de filas ya importadas de extractos (conciliacion.py)
+            models.Index(fields=['referencia_transaccion'], name='pago_referencia_idx'),
+            models.Index(F('datos_pago__extracto__huella'), name='pago_huella_extracto_idx'),
+        ]
 
     def __str__(self):
         if self.tipo_pago == self.TipoPago.FACTURA and self.factura:
@@ -269,15 +314,61 @@ class Pago(models.Model):
             return f"Pago de Bs. {self.monto_pagado} para Plan #{self.plan_tratamiento.id}"
         return f"Pago de Bs. {self.monto_pagado} ({self.get_tipo_pago_display()})"
 
+    def _estado_guardado(self):
+        """
+        Valores persistidos del pago, con la fila bloqueada. Quedan en
+        _valores_guardados para el resumen diario de pagos (reportes/signals.py).
+        """
+        self._valores_guardados = None
+        if self._state.adding or not self.pk:
+            return None
+        self._valores_guardados = (
+            Pago.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values('estado_pago', 'monto_pagado', 'factura_id', 'fecha_pago', 'metodo_pago')
+            .first()
+        )
+        return self._valores_guardados
+
+    def _aplicar_a_facturas(self, anterior, actual):
+        """
+        Aplica a cada factura la diferencia entre lo que el pago aportaba
+        antes (`anterior`) y lo que aporta ahora (`actual`). Solo los pagos
+        COMPLETADO cuentan como pagado.
+        """
+        deltas = defaultdict(Decimal)
+        for fila, signo in ((anterior, -1), (actual, 1)):
+            if fila and fila['estado_pago'] == self.EstadoPago.COMPLETADO and fila['factura_id']:
+                deltas[fila['factura_id']] += signo * Decimal(str(fila['monto_pagado']))
+
+        for factura_id, delta in deltas.items():
+            if delta:
+                instancia = self.factura if Pago.factura.is_cached(self) and self.factura_id == factura_id else None
+                Factura.aplicar_pago(factura_id, delta, instancia=instancia)
+
     def save(self, *args, **kwargs):
         """
-        Al guardar un pago, actualiza el total pagado en la factura si aplica.
+        Al guardar un pago, aplica a la factura solo el cambio que produce en
+        lo pagado (al completarse, anularse o cambiar de monto/factura), de
+        forma incremental y con bloqueo. La fila del pago se bloquea primero:
+        dos confirmaciones simultáneas del mismo pago no lo cuentan dos veces.
         """
-        super().save(*args, **kwargs)
-        
-        # Solo recalcular si el pago está completado y tiene factura
-        if self.estado_pago == self.EstadoPago.COMPLETADO and self.factura:
-            self.factura.recalcular_monto_pagado()
+        with transaction.atomic():
+            anterior = self._estado_guardado()
+            super().save(*args, **kwargs)
+            self._aplicar_a_facturas(anterior, {
+                'estado_pago': self.estado_pago,
+                'monto_pagado': self.monto_pagado,
+                'factura_id': self.factura_id,
+            })
+
+    def delete(self, *args, **kwargs):
+        """Al eliminar un pago completado, se descuenta de su factura."""
+        with transaction.atomic():
+            anterior = self._estado_guardado()
+            resultado = super().delete(*args, **kwargs)
+            self._aplicar_a_facturas(anterior, None)
+        return resultado
     
     def marcar_completado(self):
         """
@@ -296,7 +387,9 @@ class Pago(models.Model):
 # Agregar método a Factura para recalcular
 def recalcular_monto_pagado(self):
     """
-    Recalcula el monto pagado basado en pagos completados.
+    Recalcula el monto pagado desde cero sumando los pagos completados.
+    Los pagos ya mantienen el saldo de forma incremental (Pago.save); esto
+    queda para conciliación (comando conciliar_facturas, acción del admin).
     """
     total_pagado = self.pagos.filter(estado_pago=Pago.EstadoPago.COMPLETADO).aggregate(
         total=models.Sum('monto_pagado')
@@ -0,0 +1,39 @@
+# facturacion/pasarela.py
+"""
+Aplica el resultado de una pasarela de pago (Stripe, PayPal, MercadoPago)
+a un Pago del tenant actual.
+
+Lo usan el endpoint pagos/{id}/confirmar/ (verificación síncrona, cuando el
+proveedor no tiene webhook configurado) y el worker de webhooks
+(tenants/webhooks.py). Es idempotente: la fila se bloquea y el estado se
+relee antes de cambiarlo, así que un webhook repetido o un poll concurrente
+no confirman dos veces el mismo pago.
+"""
+
+from django.db import transaction
+
+from .models import Pago
+
+ESTADOS_ABIERTOS = (Pago.EstadoPago.PENDIENTE, Pago.EstadoPago.PROCESANDO)
+
+
+def aplicar_resultado(pago_id, exitoso, datos):
+    """
+    Marca el pago COMPLETADO (y la cita como pagada) o FALLIDO si todavía
+    está pendiente. Devuelve el Pago si cambió de estado, None si ya estaba
+    resuelto.
+    """
+    with transaction.atomic():
+        pago = Pago.objects.select_for_update().get(pk=pago_id)
+        if pago.estado_pago not in ESTADOS_ABIERTOS:
+            return None
+
+        pago.datos_pago = {**(pago.datos_pago or {}), **datos}
+        if exitoso:
+            if datos.get('payment_intent'):
+                pago.payment_intent_id = datos['payment_intent']
+            pago.marcar_completado()
+        else:
+            pago.estado_pago = Pago.EstadoPago.FALLIDO
+            pago.save()
+    return pago
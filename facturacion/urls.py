@@ -39,6 +39,7 @@ FACTURAS:
 - POST /api/facturacion/facturas/{id}/marcar-pagada/ - Marcar como pagada
 - POST /api/facturacion/facturas/{id}/cancelar/     - Cancelar factura
 - GET /api/facturacion/facturas/reporte-financiero/ - Reporte financiero
+- GET /api/facturacion/facturas/libro-cuenta/       - Libro de cuenta con saldo acumulado (ETag)
 
 PAGOS CON STRIPE:
 - POST /api/facturacion/pagos/crear-pago-cita/      - Crear pago para cita
@@ -47,6 +48,7 @@ PAGOS CON STRIPE:
 - POST /api/facturacion/pagos/{id}/confirmar/       - Confirmar pago (webhook)
 - GET /api/facturacion/pagos/{id}/estado/           - Verificar estado de pago
 - GET /api/facturacion/pagos/                       - Listar historial de pagos
+- POST /api/facturacion/pagos/importar-extracto/    - Importar extracto bancario y conciliar (admin)
 
 CASOS DE USO:
 - CU30: Generar factura desde presupuesto
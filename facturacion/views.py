@@ -2,19 +2,25 @@
 from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Sum
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from datetime import datetime, timedelta
 from .models import Factura, Pago
+from .estado_cuenta import libro_paciente
 from .serializers import (
     FacturaSerializer, FacturaCreateSerializer, FacturaListSerializer,
     PagoSerializer, PagoCreateSerializer
 )
 from usuarios.models import PerfilPaciente
+from usuarios.accesos import AlcanceOdontologoMixin, es_admin, tiene_acceso
 from reportes.models import BitacoraAccion
+from reportes.aggregations import resumen_facturas
+from reportes.cache import etag_contenido
 
 
-class FacturaViewSet(viewsets.ModelViewSet):
+class FacturaViewSet(AlcanceOdontologoMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de facturas (CU30-CU33)
     - Admins: Ven todas las facturas del tenant
@@ -38,18 +44,14 @@ class FacturaViewSet(viewsets.ModelViewSet):
         user = self.request.user
         queryset = Factura.objects.all().select_related('presupuesto', 'paciente')
         
+        # Doctor ve facturas de sus pacientes (los odontólogos también son staff)
+        if hasattr(user, 'perfil_odontologo'):
+            return self.filtrar_por_odontologo(queryset, user.perfil_odontologo)
+        
         # Admin ve todas las facturas
-        if user.is_staff:
+        if es_admin(user):
             return queryset
         
-        # Doctor ve facturas de sus pacientes
-        if hasattr(user, 'perfil_odontologo'):
-            # Obtener pacientes del doctor
-            pacientes_ids = PerfilPaciente.objects.filter(
-                historialclinico__episodioatencion__odontologo=user.perfil_odontologo
-            ).values_list('usuario_id', flat=True).distinct()
-            return queryset.filter(paciente__usuario_id__in=pacientes_ids)
-        
         # Paciente solo ve sus facturas
         if hasattr(user, 'perfil_paciente'):
             return queryset.filter(paciente=user.perfil_paciente)
@@ -171,13 +173,20 @@ class FacturaViewSet(viewsets.ModelViewSet):
         # Obtener facturas del paciente
         queryset = self.get_queryset().filter(paciente=request.user.perfil_paciente)
         
-        # Calcular totales
-        total_facturas = queryset.count()
-        facturas_pendientes = queryset.filter(estado='PENDIENTE').count()
-        facturas_pagadas = queryset.filter(estado='PAGADA').count()
+        # Contadores y totales en una sola consulta (agregación condicional)
+        totales = queryset.aggregate(
+            total_facturas=Count('id'),
+            facturas_pendientes=Count('id', filter=Q(estado='PENDIENTE')),
+            facturas_pagadas=Count('id', filter=Q(estado='PAGADA')),
+            monto_total=Sum('monto_total'),
+            monto_pagado=Sum('monto_pagado'),
+        )
+        total_facturas = totales['total_facturas']
+        facturas_pendientes = totales['facturas_pendientes']
+        facturas_pagadas = totales['facturas_pagadas']
         
-        monto_total = queryset.aggregate(total=Sum('monto_total'))['total'] or 0
-        monto_pagado = queryset.aggregate(total=Sum('monto_pagado'))['total'] or 0
+        monto_total = totales['monto_total'] or 0
+        monto_pagado = totales['monto_pagado'] or 0
         saldo_pendiente = monto_total - monto_pagado
         
         return Response({
@@ -208,6 +217,53 @@ class FacturaViewSet(viewsets.ModelViewSet):
             ).data
         })
     
+    @action(detail=False, methods=['get'], url_path='libro-cuenta')
+    def libro_cuenta(self, request):
+        """
+        GET /api/facturacion/facturas/libro-cuenta/
+        GET /api/facturacion/facturas/libro-cuenta/?paciente=<id>   (admin / odontólogo)
+        
+        Libro de cuenta del paciente: contadores, totales y la lista
+        cronológica de facturas y pagos con saldo acumulado, en una sola
+        consulta (ver facturacion/estado_cuenta.py).
+        
+        Responde con ETag; si el cliente envía If-None-Match con el mismo
+        valor y nada cambió, devuelve 304 sin cuerpo.
+        """
+        user = request.user
+        if hasattr(user, 'perfil_paciente'):
+            paciente_id = user.perfil_paciente.pk
+        else:
+            paciente_id = request.query_params.get('paciente', '')
+            if not paciente_id.isdigit():
+                return Response(
+                    {'error': 'Indique el paciente (?paciente=<id>)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            paciente_id = int(paciente_id)
+            if hasattr(user, 'perfil_odontologo'):
+                visible = tiene_acceso(user.perfil_odontologo, paciente_id)
+            elif es_admin(user):
+                visible = PerfilPaciente.objects.filter(pk=paciente_id).exists()
+            else:
+                visible = False
+            if not visible:
+                return Response(
+                    {'error': 'Paciente no encontrado'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        
+        libro = libro_paciente(paciente_id)
+        etag = quote_etag(etag_contenido(libro))
+        
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(libro)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
     @action(detail=False, methods=['get'])
     def mis_facturas(self, request):
         """
@@ -274,44 +330,35 @@ class FacturaViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Calcular estadísticas
-        total_facturas = queryset.count()
-        facturas_pendientes = queryset.filter(estado='pendiente').count()
-        facturas_pagadas = queryset.filter(estado='pagada').count()
-        facturas_canceladas = queryset.filter(estado='cancelada').count()
+        # Calcular estadísticas en una sola consulta
+        resumen, consultas = resumen_facturas(queryset)
+        monto_total_facturado = resumen['total_facturado']
+        monto_total_pagado = resumen['total_pagado']
         
-        monto_total_facturado = queryset.aggregate(
-            total=Sum('monto_total')
-        )['total'] or 0
-        
-        monto_total_pagado = queryset.aggregate(
-            total=Sum('monto_pagado')
-        )['total'] or 0
-        
-        monto_pendiente = monto_total_facturado - monto_total_pagado
-        
-        return Response({
+        response = Response({
             'periodo': {
                 'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
                 'fecha_fin': fecha_fin.isoformat() if fecha_fin else None
             },
             'resumen': {
-                'total_facturas': total_facturas,
-                'facturas_pendientes': facturas_pendientes,
-                'facturas_pagadas': facturas_pagadas,
-                'facturas_canceladas': facturas_canceladas,
+                'total_facturas': resumen['numero_facturas'],
+                'facturas_pendientes': resumen['facturas_pendientes'],
+                'facturas_pagadas': resumen['facturas_pagadas'],
+                'facturas_canceladas': resumen['facturas_anuladas'],
                 'monto_total_facturado': float(monto_total_facturado),
                 'monto_total_pagado': float(monto_total_pagado),
-                'monto_pendiente': float(monto_pendiente),
+                'monto_pendiente': float(resumen['saldo_pendiente']),
                 'porcentaje_cobrado': round(
                     (monto_total_pagado / monto_total_facturado * 100) if monto_total_facturado > 0 else 0,
                     2
                 )
             }
         })
+        response['X-Report-Queries'] = consultas
+        return response
 
 
-class PagoViewSet(viewsets.ModelViewSet):
+class PagoViewSet(AlcanceOdontologoMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de pagos
     - Admins: Ven todos los pagos del tenant
@@ -321,6 +368,7 @@ class PagoViewSet(viewsets.ModelViewSet):
     queryset = Pago.objects.all()
     serializer_class = PagoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    campos_paciente_alcance = ('factura__paciente', 'paciente')
     
     def get_serializer_class(self):
         """Seleccionar serializer según la acción"""
@@ -333,21 +381,14 @@ class PagoViewSet(viewsets.ModelViewSet):
         user = self.request.user
         queryset = Pago.objects.all().select_related('factura', 'factura__paciente', 'paciente', 'cita', 'plan_tratamiento')
         
+        # Doctor ve pagos de facturas de sus pacientes (los odontólogos también son staff)
+        if hasattr(user, 'perfil_odontologo'):
+            return self.filtrar_por_odontologo(queryset, user.perfil_odontologo)
+        
         # Admin ve todos los pagos
-        if user.is_staff:
+        if es_admin(user):
             return queryset
         
-        # Doctor ve pagos de facturas de sus pacientes
-        if hasattr(user, 'perfil_odontologo'):
-            # Obtener pacientes del doctor
-            pacientes_ids = PerfilPaciente.objects.filter(
-                historialclinico__episodioatencion__odontologo=user.perfil_odontologo
-            ).values_list('usuario_id', flat=True).distinct()
-            return queryset.filter(
-                Q(factura__paciente__usuario_id__in=pacientes_ids) |
-                Q(paciente__usuario_id__in=pacientes_ids)
-            )
-        
         # Paciente solo ve sus pagos
         if hasattr(user, 'perfil_paciente'):
             return queryset.filter(
@@ -361,17 +402,17 @@ class PagoViewSet(viewsets.ModelViewSet):
         """Registrar nuevo pago"""
         factura = serializer.validated_data['factura']
         
-        # Verificar que la factura no esté cancelada
-        if factura.estado == 'cancelada':
+        # Verificar que la factura no esté anulada
+        if factura.estado == Factura.EstadoFactura.ANULADA:
             raise serializers.ValidationError(
-                "No se pueden registrar pagos en facturas canceladas"
+                "No se pueden registrar pagos en facturas anuladas"
             )
         
         # Verificar que no se exceda el monto total
         monto = serializer.validated_data['monto_pagado']
         nuevo_monto_pagado = factura.monto_pagado + monto
         
-        if nuevo_monto_pagado > factura.total:
+        if nuevo_monto_pagado > factura.monto_total:
             raise serializers.ValidationError(
                 f"El pago excede el saldo pendiente. "
                 f"Máximo permitido: ${factura.saldo_pendiente:.2f}"
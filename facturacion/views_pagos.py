@@ -6,34 +6,50 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
-from django.utils import timezone
+from rest_framework.parsers import MultiPartParser, FormParser
 from django.db import transaction
 from decimal import Decimal
+import time
 
 from .models import Pago, Factura
 from .serializers import PagoSerializer
+from . import conciliacion, pasarela
 from agenda.models import Cita
 from tratamientos.models import PlanDeTratamiento
 from usuarios.models import PerfilPaciente
-from tenants.payment_handlers import get_payment_handler
+from usuarios.accesos import AlcanceOdontologoMixin, es_admin
+from tenants.payment_handlers import get_payment_handler, webhooks_activos
+from reportes.models import BitacoraAccion
 
 
-class PagoViewSet(viewsets.ModelViewSet):
+class PagoViewSet(AlcanceOdontologoMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar pagos con Stripe.
+    - Admins: Ven todos los pagos del tenant
+    - Doctores: Ven pagos de sus pacientes (factura o pago directo)
+    - Pacientes: Solo ven sus propios pagos
     """
     serializer_class = PagoSerializer
     permission_classes = [IsAuthenticated]
+    campos_paciente_alcance = ('factura__paciente', 'paciente')
     
     def get_queryset(self):
         user = self.request.user
+        queryset = Pago.objects.all()
         
         # Si es paciente, solo sus pagos
         if hasattr(user, 'perfil_paciente'):
-            return Pago.objects.filter(paciente=user.perfil_paciente)
+            return queryset.filter(paciente=user.perfil_paciente)
         
-        # Admin y odontólogos ven todos
-        return Pago.objects.all()
+        # Si es odontólogo (aunque sea staff), solo pagos de sus pacientes
+        if hasattr(user, 'perfil_odontologo'):
+            return self.filtrar_por_odontologo(queryset, user.perfil_odontologo)
+        
+        # Admin ve todos los pagos
+        if es_admin(user):
+            return queryset
+        
+        return queryset.none()
     
     @action(detail=False, methods=['post'], url_path='crear-pago-cita')
     def crear_pago_cita(self, request):
@@ -238,6 +254,9 @@ class PagoViewSet(viewsets.ModelViewSet):
         
         POST /api/facturacion/pagos/{id}/confirmar/
         GET  /api/facturacion/pagos/{id}/confirmar/?session_id=cs_xxx
+        
+        Si la pasarela tiene webhook configurado devuelve el estado local
+        (202 mientras se espera el evento); si no, verifica con la pasarela.
         """
         pago = self.get_object()
         
@@ -248,6 +267,15 @@ class PagoViewSet(viewsets.ModelViewSet):
                 'pago_id': pago.id
             })
         
+        if webhooks_activos(pago.metodo_pago):
+            # El resultado lo aplica el worker de webhooks (procesar_eventos_pasarela):
+            # el poll solo lee el estado local, sin llamar a la pasarela
+            return Response({
+                'message': 'Esperando la confirmación de la pasarela',
+                'estado': pago.estado_pago,
+                'pago_id': pago.id
+            }, status=status.HTTP_202_ACCEPTED)
+        
         # Obtener session_id
         session_id = request.GET.get('session_id') or request.data.get('session_id') or pago.transaccion_id
         
@@ -262,19 +290,18 @@ class PagoViewSet(viewsets.ModelViewSet):
             handler = get_payment_handler(pago.metodo_pago)
             success, payment_data = handler.verify_payment(session_id)
             
+            # No-op si otro proceso (webhook, poll concurrente) ya lo aplicó
+            actualizado = pasarela.aplicar_resultado(pago.id, success, payment_data)
+            if actualizado is None:
+                pago.refresh_from_db()
+                return Response({
+                    'message': 'Pago ya procesado',
+                    'estado': pago.estado_pago,
+                    'pago_id': pago.id
+                })
+            pago = actualizado
+            
             if success:
-                with transaction.atomic():
-                    pago.estado_pago = Pago.EstadoPago.COMPLETADO
-                    pago.fecha_completado = timezone.now()
-                    pago.payment_intent_id = payment_data.get('payment_intent')
-                    pago.datos_pago.update(payment_data)
-                    pago.save()
-                    
-                    # Marcar cita como pagada si aplica
-                    if pago.cita:
-                        pago.cita.pagada = True
-                        pago.cita.save()
-                
                 return Response({
                     'success': True,
                     'pago_id': pago.id,
@@ -284,10 +311,6 @@ class PagoViewSet(viewsets.ModelViewSet):
                     'message': 'Pago procesado exitosamente'
                 })
             else:
-                pago.estado_pago = Pago.EstadoPago.FALLIDO
-                pago.datos_pago.update(payment_data)
-                pago.save()
-                
                 return Response({
                     'success': False,
                     'error': 'Pago no exitoso',
@@ -336,3 +359,85 @@ class PagoViewSet(viewsets.ModelViewSet):
             }
         
         return Response(data)
+    
+    @action(
+        detail=False, methods=['post'], url_path='importar-extracto',
+        parser_classes=[MultiPartParser, FormParser]
+    )
+    def importar_extracto(self, request):
+        """
+        Importar un extracto bancario (CSV o Excel) y conciliar los abonos
+        con facturas pendientes (solo admin). Ver facturacion/conciliacion.py.
+        
+        POST /api/facturacion/pagos/importar-extracto/  (multipart)
+            archivo:      extracto .csv / .xlsx (columnas: fecha, monto,
+                          referencia, descripcion/glosa, nit/ci)
+            simular:      "true" solo devuelve el informe, sin registrar pagos
+            metodo_pago:  default TRANSFERENCIA
+        """
+        if not es_admin(request.user):
+            return Response(
+                {'error': 'Solo los administradores pueden importar extractos'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response(
+                {'error': 'Debe adjuntar el extracto en el campo "archivo"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        metodo_pago = request.data.get('metodo_pago') or Pago.MetodoPago.TRANSFERENCIA
+        if metodo_pago not in Pago.MetodoPago.values:
+            return Response(
+                {'error': f'metodo_pago inválido: {metodo_pago}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        simular = str(request.data.get('simular', '')).lower() in ('1', 'true', 'si', 'sí')
+        
+        inicio = time.perf_counter()
+        try:
+            registros = conciliacion.leer_extracto(archivo)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        conciliadas, sin_conciliar = conciliacion.conciliar(registros)
+        if not simular and conciliadas:
+            conciliadas, rechazadas = conciliacion.aplicar(conciliadas, metodo_pago)
+            sin_conciliar.extend(rechazadas)
+        
+        monto_conciliado = sum((c['monto'] for c in conciliadas), Decimal('0'))
+        por_criterio = {}
+        for c in conciliadas:
+            por_criterio[c['criterio']] = por_criterio.get(c['criterio'], 0) + 1
+        resumen = {
+            'filas': len(registros),
+            'conciliadas': len(conciliadas),
+            'sin_conciliar': len(sin_conciliar),
+            'monto_conciliado': str(monto_conciliado),
+            'facturas_afectadas': len({c['factura_id'] for c in conciliadas}),
+            'por_criterio': por_criterio,
+            'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+        }
+        
+        if not simular and conciliadas:
+            BitacoraAccion.registrar(
+                usuario=request.user,
+                accion='CREAR',
+                descripcion=(
+                    f'Importó extracto {archivo.name}: {len(conciliadas)} pago(s) por '
+                    f'Bs. {monto_conciliado}, {len(sin_conciliar)} fila(s) sin conciliar'
+                ),
+                detalles={k: v for k, v in resumen.items() if k != 'duracion_ms'}
+            )
+        
+        for c in conciliadas:
+            c['monto'] = str(c['monto'])
+        
+        return Response({
+            'simulado': simular,
+            'resumen': resumen,
+            'conciliadas': conciliadas,
+            'sin_conciliar': sin_conciliar,
+        })
@@ -8,12 +8,18 @@ Este módulo implementa el MODELO HÍBRIDO:
 - Si un episodio SÍ está vinculado a un plan → actualiza automáticamente el progreso del plan
 """
 
-from django.db.models.signals import post_save
+import logging
+
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
+from tratamientos import progreso
+
 from .models import EpisodioAtencion
 
+logger = logging.getLogger(__name__)
+
 
 @receiver(post_save, sender=EpisodioAtencion)
 def actualizar_plan_tratamiento_al_guardar_episodio(sender, instance, created, **kwargs):
@@ -24,8 +30,7 @@ def actualizar_plan_tratamiento_al_guardar_episodio(sender, instance, created, *
     1. Verifica si el episodio está vinculado a un ItemPlanTratamiento
     2. Si SÍ:
        - Actualiza el estado del ítem de PENDIENTE → EN_PROGRESO
-       - Actualiza el estado del plan general
-       - Registra fecha_realizada cuando el ítem se marca como completado
+       - Programa el recálculo del estado del plan (al hacer commit)
     3. Si NO:
        - No hace nada (episodio simple independiente)
     
@@ -37,79 +42,44 @@ def actualizar_plan_tratamiento_al_guardar_episodio(sender, instance, created, *
     """
     
     # Verificar si este episodio está vinculado a un ítem del plan
-    if not instance.item_plan_tratamiento:
+    if not instance.item_plan_tratamiento_id:
         # Es un episodio simple (independiente) - no hacer nada
         return
     
     # Este episodio SÍ está vinculado a un plan de tratamiento
     item_plan = instance.item_plan_tratamiento
-    plan = item_plan.plan
     
     # ============================================================================
     # PASO 1: Actualizar estado del ItemPlanTratamiento
     # ============================================================================
     
-    if created:
-        # Es el primer episodio vinculado a este ítem
-        print(f"📋 Nuevo episodio vinculado al ítem: {item_plan.servicio.nombre}")
-        
-        # Si el ítem estaba PENDIENTE, pasarlo a EN_PROGRESO
-        if item_plan.estado == 'PENDIENTE':
-            item_plan.estado = 'EN_PROGRESO'
-            item_plan.save(update_fields=['estado'])
-            print(f"   ✅ Ítem actualizado: PENDIENTE → EN_PROGRESO")
-    
-    # ============================================================================
-    # PASO 2: Verificar si el ítem debe marcarse como COMPLETADO
-    # ============================================================================
-    
-    # Por ahora, asumimos que UN episodio = ítem completado
-    # (A futuro puedes agregar un campo "marcar_como_completado" en el episodio)
-    
-    # Si el ítem ya está COMPLETADO, no hacer nada más
-    if item_plan.estado == 'COMPLETADO':
-        return
-    
-    # Si hay un campo especial en el episodio que indica "completar ítem"
-    # o si quieres marcar manualmente, puedes agregar lógica aquí
-    # Por ahora, dejamos que el odontólogo marque manualmente desde el admin o API
+    # Si es el primer episodio y el ítem estaba PENDIENTE, pasarlo a EN_PROGRESO
+    # (su post_save programa el recálculo del plan)
+    if created and item_plan.estado == 'PENDIENTE':
+        item_plan.estado = 'EN_PROGRESO'
+        item_plan.save(update_fields=['estado'])
+        logger.info(f"✅ Ítem #{item_plan.id} actualizado: PENDIENTE → EN_PROGRESO")
     
     # ============================================================================
-    # PASO 3: Actualizar el estado general del PlanDeTratamiento
+    # PASO 2: Actualizar el estado general del PlanDeTratamiento
     # ============================================================================
     
-    # Llamar al método que recalcula el progreso del plan
-    plan.actualizar_progreso()
-    
-    print(f"   📊 Plan actualizado: {plan.titulo}")
-    print(f"   📈 Progreso: {plan.porcentaje_completado}%")
+    # Un solo recálculo por plan al confirmar la transacción (ver tratamientos/progreso.py)
+    progreso.programar(item_plan.plan_id)
 
 
 @receiver(post_save, sender='tratamientos.ItemPlanTratamiento')
-def actualizar_plan_al_cambiar_item(sender, instance, created, **kwargs):
+@receiver(post_delete, sender='tratamientos.ItemPlanTratamiento')
+def actualizar_plan_al_cambiar_item(sender, instance, **kwargs):
     """
-    Signal que se ejecuta cuando se actualiza el estado de un ItemPlanTratamiento.
+    Signal que se ejecuta cuando se crea, actualiza o elimina un ItemPlanTratamiento.
     
     Esto maneja los casos donde el odontólogo marca manualmente un ítem como COMPLETADO
-    desde el admin o desde la API (sin pasar por un episodio).
-    
-    Flujo:
-    1. Si el ítem cambió a COMPLETADO → Actualizar plan
-    2. Recalcular porcentaje de progreso
-    3. Si todos los ítems están completados → Marcar plan como COMPLETADO
+    desde el admin o desde la API (sin pasar por un episodio). La fecha_realizada la
+    fija ItemPlanTratamiento.save; aquí solo se programa el recálculo del plan, que
+    se agrupa con el resto de cambios de la transacción.
     """
-    
-    if not created:
-        # Es una actualización (no creación)
-        plan = instance.plan
-        
-        # Si el ítem fue marcado como COMPLETADO y no tiene fecha_realizada
-        if instance.estado == 'COMPLETADO' and not instance.fecha_realizada:
-            instance.fecha_realizada = timezone.now()
-            instance.save(update_fields=['fecha_realizada'])
-        
-        # Actualizar progreso del plan
-        plan.actualizar_progreso()
+    progreso.programar(instance.plan_id)
 
 
 # ============================================================================
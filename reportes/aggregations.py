@@ -0,0 +1,316 @@
+# reportes/aggregations.py
+"""
+Motor de agregación de KPIs para los reportes.
+
+Cada bloque de indicadores se expresa como agregados condicionales
+(``Count(filter=...)``, ``Sum(..., filter=...)``) sobre un solo modelo, y
+todos los bloques registrados se resuelven juntos en una única consulta:
+
+    SELECT * FROM (SELECT COUNT(...) FILTER (...), ... FROM agenda_cita) t0,
+                  (SELECT SUM(...) FILTER (...), ... FROM facturacion_factura) t1,
+                  ...
+
+Cada subconsulta es un agregado sin GROUP BY, por lo que siempre devuelve
+exactamente una fila; el producto de todas ellas también es una sola fila.
+"""
+
+import logging
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta, date
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, Sum, Avg, Q, F, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from agenda.models import Cita
+from tratamientos.models import ItemPlanTratamiento, PlanDeTratamiento
+from facturacion.models import Factura, Pago
+from usuarios.models import PerfilPaciente, PerfilOdontologo
+
+logger = logging.getLogger(__name__)
+
+CERO = Decimal('0.00')
+
+
+class ContadorConsultas:
+    """Cuenta las consultas SQL ejecutadas mientras está activo."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def contar_consultas():
+    """
+    Context manager que cuenta las consultas ejecutadas en la conexión actual.
+
+    Uso:
+        with contar_consultas() as contador:
+            ...
+        contador.total
+    """
+    contador = ContadorConsultas()
+    with connection.execute_wrapper(contador):
+        yield contador
+
+
+def inicio_de_dia(dia):
+    """Datetime (aware) del inicio del día en la zona horaria actual."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def rango_mes(anio, mes):
+    """Devuelve (inicio, fin) aware del mes; fin es exclusivo."""
+    inicio = date(anio, mes, 1)
+    siguiente = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return inicio_de_dia(inicio), inicio_de_dia(siguiente)
+
+
+def rango_anio(anio):
+    """Devuelve (inicio, fin) aware del año; fin es exclusivo."""
+    return inicio_de_dia(date(anio, 1, 1)), inicio_de_dia(date(anio + 1, 1, 1))
+
+
+def suma_decimal(expresion, **extra):
+    """Sum de montos que devuelve 0.00 en vez de NULL cuando no hay filas."""
+    return Coalesce(
+        Sum(expresion, **extra),
+        Value(CERO),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+class KPIAggregator:
+    """
+    Acumula bloques de agregados condicionales y los resuelve en un solo viaje
+    a la base de datos.
+
+    Uso:
+        agg = KPIAggregator()
+        agg.agregar(Cita.objects.all(), citas_hoy=Count('id', filter=Q(...)))
+        agg.agregar(Factura.objects.all(), saldo=suma_decimal(F('monto_total') - F('monto_pagado')))
+        valores = agg.ejecutar()   # {'citas_hoy': 5, 'saldo': Decimal('260.00')}
+        agg.consultas              # 1
+    """
+
+    def __init__(self):
+        self._bloques = []
+        self.consultas = 0
+
+    def agregar(self, queryset, **agregados):
+        """Registra un bloque de agregados sobre ``queryset``."""
+        if not agregados:
+            raise ValueError('Debe indicar al menos un agregado')
+        self._bloques.append((queryset, agregados))
+        return self
+
+    def _sql_bloque(self, queryset, agregados):
+        # Agrupar por una constante no genera GROUP BY: el agregado se calcula
+        # sobre todas las filas y la subconsulta devuelve siempre una fila.
+        qs = (
+            queryset.order_by()
+            .annotate(_bloque=Value(1))
+            .values('_bloque')
+            .annotate(**agregados)
+            .values(*agregados.keys())
+        )
+        return qs.query.sql_with_params()
+
+    def ejecutar(self):
+        """Ejecuta todos los bloques en una sola consulta y devuelve un dict."""
+        if not self._bloques:
+            return {}
+
+        partes, params = [], []
+        for i, (queryset, agregados) in enumerate(self._bloques):
+            sql, bloque_params = self._sql_bloque(queryset, agregados)
+            partes.append(f'({sql}) AS kpi_{i}')
+            params.extend(bloque_params)
+
+        with contar_consultas() as contador:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM ' + ', '.join(partes), params)
+                columnas = [col[0] for col in cursor.description]
+                fila = cursor.fetchone()
+        self.consultas += contador.total
+
+        valores = dict(zip(columnas, fila))
+        # Aplicar los conversores de los campos de salida (ej. Decimal en SQLite)
+        resultado = {}
+        for queryset, agregados in self._bloques:
+            for nombre, expresion in agregados.items():
+                valor = valores.get(nombre)
+                campo = getattr(expresion, 'output_field', None)
+                if valor is not None and isinstance(campo, DecimalField):
+                    valor = Decimal(str(valor))
+                resultado[nombre] = valor
+        return resultado
+
+
+# ============================================================================
+# KPIs predefinidos
+# ============================================================================
+
+def kpis_dashboard(hoy=None):
+    """
+    Calcula los KPIs del dashboard principal en una sola consulta.
+
+    Devuelve (kpis, consultas) donde kpis contiene los mismos campos que
+    expone ``ReportesViewSet.dashboard_kpis``.
+    """
+    hoy = hoy or timezone.localdate()
+    inicio_hoy, fin_hoy = inicio_de_dia(hoy), inicio_de_dia(hoy + timedelta(days=1))
+    inicio_mes, fin_mes = rango_mes(hoy.year, hoy.month)
+
+    agg = KPIAggregator()
+    agg.agregar(
+        PerfilPaciente.objects.all(),
+        total_pacientes=Count('pk', filter=Q(usuario__is_active=True)),
+        pacientes_nuevos_mes=Count(
+            'pk', filter=Q(usuario__date_joined__gte=inicio_mes, usuario__date_joined__lt=fin_mes)
+        ),
+    )
+    agg.agregar(
+        Cita.objects.filter(fecha_hora__gte=inicio_hoy, fecha_hora__lt=fin_hoy),
+        citas_hoy=Count('id', filter=Q(estado__in=['CONFIRMADA', 'ATENDIDA'])),
+    )
+    agg.agregar(
+        Pago.objects.filter(
+            estado_pago='COMPLETADO', fecha_pago__gte=inicio_mes, fecha_pago__lt=fin_mes
+        ),
+        ingresos_mes=suma_decimal('monto_pagado'),
+    )
+    filtro_mes = Q(fecha_emision__gte=inicio_mes, fecha_emision__lt=fin_mes)
+    agg.agregar(
+        Factura.objects.all(),
+        saldo_pendiente=suma_decimal(
+            F('monto_total') - F('monto_pagado'), filter=Q(estado='PENDIENTE')
+        ),
+        facturado_mes=suma_decimal('monto_total', filter=filtro_mes),
+        facturas_mes=Count('id', filter=filtro_mes),
+        facturas_vencidas=Count(
+            'id', filter=Q(estado='PENDIENTE', fecha_emision__lt=inicio_mes)
+        ),
+    )
+    agg.agregar(
+        PlanDeTratamiento.objects.all(),
+        tratamientos_activos=Count(
+            'id', filter=Q(estado__in=['en_progreso', 'propuesto', 'aprobado'])
+        ),
+        planes_completados=Count(
+            'id', filter=Q(
+                estado='completado',
+                fecha_creacion__gte=inicio_mes, fecha_creacion__lt=fin_mes
+            )
+        ),
+    )
+    agg.agregar(
+        ItemPlanTratamiento.objects.filter(
+            estado='COMPLETADO', fecha_realizada__gte=inicio_mes, fecha_realizada__lt=fin_mes
+        ),
+        total_procedimientos=Count('id'),
+    )
+
+    v = agg.ejecutar()
+    facturas_mes = v.pop('facturas_mes')
+    facturado_mes = v.pop('facturado_mes')
+    v['promedio_factura'] = (facturado_mes / facturas_mes) if facturas_mes else CERO
+    return v, agg.consultas
+
+
+def estadisticas_generales(hoy=None):
+    """
+    Calcula las estadísticas generales del sistema en una sola consulta.
+
+    Devuelve (datos, consultas) con los campos de
+    ``ReportesViewSet.estadisticas_generales``.
+    """
+    hoy = hoy or timezone.localdate()
+    inicio_mes, fin_mes = rango_mes(hoy.year, hoy.month)
+
+    agg = KPIAggregator()
+    agg.agregar(
+        PerfilPaciente.objects.all(),
+        total_pacientes_activos=Count('pk', filter=Q(usuario__is_active=True)),
+        pacientes_nuevos_mes=Count(
+            'pk', filter=Q(usuario__date_joined__gte=inicio_mes, usuario__date_joined__lt=fin_mes)
+        ),
+    )
+    agg.agregar(
+        PerfilOdontologo.objects.filter(usuario__is_active=True),
+        total_odontologos=Count('pk'),
+    )
+    agg.agregar(
+        Cita.objects.filter(fecha_hora__gte=inicio_mes, fecha_hora__lt=fin_mes),
+        total_citas_mes=Count('id'),
+        citas_completadas=Count('id', filter=Q(estado='ATENDIDA')),
+        citas_pendientes=Count('id', filter=Q(estado__in=['PENDIENTE', 'CONFIRMADA'])),
+        citas_canceladas=Count('id', filter=Q(estado='CANCELADA')),
+        citas_efectivas=Count('id', filter=Q(estado__in=['CONFIRMADA', 'ATENDIDA'])),
+    )
+    agg.agregar(
+        PlanDeTratamiento.objects.all(),
+        planes_completados=Count('id', filter=Q(estado='completado')),
+        planes_activos=Count(
+            'id', filter=Q(estado__in=['en_progreso', 'propuesto', 'aprobado'])
+        ),
+    )
+    agg.agregar(
+        ItemPlanTratamiento.objects.filter(estado='COMPLETADO'),
+        total_procedimientos=Count('id'),
+    )
+    agg.agregar(
+        Pago.objects.filter(
+            estado_pago='COMPLETADO', fecha_pago__gte=inicio_mes, fecha_pago__lt=fin_mes
+        ),
+        ingresos_mes_actual=suma_decimal('monto_pagado'),
+    )
+    filtro_mes = Q(fecha_emision__gte=inicio_mes, fecha_emision__lt=fin_mes)
+    agg.agregar(
+        Factura.objects.all(),
+        monto_pendiente=suma_decimal(F('monto_total') - F('monto_pagado'), filter=filtro_mes),
+        facturas_vencidas=Count(
+            'id', filter=Q(estado='PENDIENTE', monto_pagado__lt=F('monto_total'))
+        ),
+        promedio_factura=Coalesce(
+            Avg('monto_total'), Value(CERO),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+    )
+
+    v = agg.ejecutar()
+    total_citas_mes = v.pop('total_citas_mes')
+    citas_efectivas = v.pop('citas_efectivas')
+    v['citas_mes_actual'] = total_citas_mes - v['citas_canceladas']
+    v['tasa_ocupacion'] = round(
+        (citas_efectivas / total_citas_mes * 100) if total_citas_mes > 0 else 0, 2
+    )
+    return v, agg.consultas
+
+
+def resumen_facturas(queryset):
+    """
+    Resumen financiero de un queryset de facturas en una sola consulta.
+
+    Devuelve (resumen, consultas) con contadores por estado y montos
+    facturado/pagado/pendiente.
+    """
+    agg = KPIAggregator()
+    agg.agregar(
+        queryset,
+        numero_facturas=Count('id'),
+        facturas_pendientes=Count('id', filter=Q(estado='PENDIENTE')),
+        facturas_pagadas=Count('id', filter=Q(estado='PAGADA')),
+        facturas_anuladas=Count('id', filter=Q(estado='ANULADA')),
+        total_facturado=suma_decimal('monto_total'),
+        total_pagado=suma_decimal('monto_pagado'),
+    )
+    v = agg.ejecutar()
+    v['saldo_pendiente'] = v['total_facturado'] - v['total_pagado']
+    return v, agg.consultas
@@ -0,0 +1,250 @@
+# reportes/auditoria.py
+"""
+Escritura de la bitácora (BitacoraAccion.registrar) con buffer en memoria.
+
+Antes cada acción auditada hacía un INSERT síncrono dentro de la request.
+Ahora, en modo 'buffer':
+
+1. registrar() arma la instancia y la encola con transaction.on_commit():
+   si la transacción de la request se revierte, la entrada se descarta
+   igual que antes se revertía el INSERT.
+2. Un hilo de fondo por proceso escribe las entradas con bulk_create
+   (una consulta por lote y por tenant) cada BITACORA_INTERVALO_SEGUNDOS
+   o en cuanto se juntan BITACORA_LOTE entradas.
+3. Al terminar el proceso (atexit) se escribe lo pendiente.
+
+Las entradas guardan el schema del tenant activo al encolar, y fecha_hora
+se fija en ese momento (no al escribir el lote).
+
+BITACORA_MODO='sincrono' (el default) conserva el INSERT inmediato; los
+tests y scripts lo usan, y los servidores web activan 'buffer' explícitamente.
+Si el buffer supera BITACORA_MAXIMO_PENDIENTES se descartan entradas
+nuevas en vez de crecer sin límite; estadisticas() expone los contadores.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from .cache import schema_actual
+
+logger = logging.getLogger(__name__)
+
+MODO_SINCRONO = 'sincrono'
+MODO_BUFFER = 'buffer'
+
+
+def modo():
+    return getattr(settings, 'BITACORA_MODO', MODO_SINCRONO)
+
+
+class BufferBitacora:
+    """Buffer de entradas de bitácora por proceso, agrupadas por schema."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._pendientes = defaultdict(list)   # schema -> [(encolada_en, instancia)]
+        self._total_pendientes = 0
+        self._hilo = None
+        self._pid = None
+        self._contadores = self._contadores_iniciales()
+
+    @staticmethod
+    def _contadores_iniciales():
+        return {
+            'encoladas': 0,
+            'escritas': 0,
+            'descartadas': 0,
+            'lotes': 0,
+            'errores': 0,
+            'demoradas': 0,
+            'demora_maxima_segundos': 0.0,
+            'ultimo_vaciado': None,
+        }
+
+    @property
+    def lote(self):
+        return max(1, getattr(settings, 'BITACORA_LOTE', 100))
+
+    @property
+    def intervalo(self):
+        return max(0.1, getattr(settings, 'BITACORA_INTERVALO_SEGUNDOS', 2.0))
+
+    @property
+    def maximo(self):
+        return getattr(settings, 'BITACORA_MAXIMO_PENDIENTES', 10000)
+
+    # --- encolar ----------------------------------------------------------
+
+    def encolar(self, instancia):
+        """Agrega la entrada al buffer cuando la transacción actual confirma."""
+        schema = schema_actual()
+        transaction.on_commit(lambda: self._agregar(schema, instancia))
+
+    def _agregar(self, schema, instancia):
+        self._asegurar_hilo()
+        with self._lock:
+            if self._total_pendientes >= self.maximo:
+                self._contadores['descartadas'] += 1
+                descartar = True
+            else:
+                self._pendientes[schema].append((time.monotonic(), instancia))
+                self._total_pendientes += 1
+                self._contadores['encoladas'] += 1
+                descartar = False
+            lleno = self._total_pendientes >= self.lote
+
+        if descartar:
+            logger.warning(
+                '⚠️ Bitácora: buffer lleno (%s pendientes), entrada descartada: %s',
+                self.maximo, instancia.descripcion
+            )
+        elif lleno:
+            self._despertar.set()
+
+    # --- hilo de fondo ----------------------------------------------------
+
+    def _asegurar_hilo(self):
+        pid = os.getpid()
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and self._pid == pid:
+                return
+            if self._pid not in (None, pid):
+                # Proceso hijo tras un fork: lo heredado pertenece al padre
+                self._pendientes = defaultdict(list)
+                self._total_pendientes = 0
+                self._contadores = self._contadores_iniciales()
+            self._pid = pid
+            self._hilo = threading.Thread(
+                target=self._bucle, name='bitacora-buffer', daemon=True
+            )
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            except Exception:
+                logger.exception('❌ Bitácora: error inesperado al vaciar el buffer')
+            finally:
+                # El hilo tiene su propia conexión: no dejarla abierta entre lotes
+                connection.close()
+
+    # --- escritura --------------------------------------------------------
+
+    def vaciar(self):
+        """Escribe todo lo pendiente. Devuelve el número de entradas escritas."""
+        with self._lock:
+            pendientes = self._pendientes
+            self._pendientes = defaultdict(list)
+            self._total_pendientes = 0
+
+        escritas = 0
+        for schema, entradas in pendientes.items():
+            for inicio in range(0, len(entradas), self.lote):
+                escritas += self._escribir(schema, entradas[inicio:inicio + self.lote])
+        return escritas
+
+    def _escribir(self, schema, entradas):
+        from .models import BitacoraAccion
+
+        ahora = time.monotonic()
+        demoras = [ahora - encolada for encolada, _ in entradas]
+        instancias = [instancia for _, instancia in entradas]
+        escritas = 0
+        errores = 0
+
+        with schema_context(schema):
+            try:
+                BitacoraAccion.objects.bulk_create(instancias)
+                escritas = len(instancias)
+            except Exception:
+                logger.exception(
+                    '❌ Bitácora: falló bulk_create de %s entradas en %s; reintentando una a una',
+                    len(instancias), schema
+                )
+                errores += 1
+                # Una entrada inválida no debe tirar el lote completo
+                for instancia in instancias:
+                    try:
+                        instancia.pk = None
+                        instancia.save(force_insert=True)
+                        escritas += 1
+                    except Exception:
+                        logger.exception('❌ Bitácora: entrada descartada: %s', instancia.descripcion)
+
+        with self._lock:
+            c = self._contadores
+            c['escritas'] += escritas
+            c['descartadas'] += len(instancias) - escritas
+            c['lotes'] += 1
+            c['errores'] += errores
+            c['demoradas'] += sum(1 for d in demoras if d > self.intervalo * 2)
+            c['demora_maxima_segundos'] = round(max([c['demora_maxima_segundos']] + demoras), 3)
+            c['ultimo_vaciado'] = timezone.now().isoformat()
+        return escritas
+
+    # --- observabilidad ---------------------------------------------------
+
+    def estadisticas(self):
+        """Contadores del proceso actual (cada worker tiene los suyos)."""
+        with self._lock:
+            return {
+                'modo': modo(),
+                'pid': os.getpid(),
+                'pendientes': self._total_pendientes,
+                'lote': self.lote,
+                'intervalo_segundos': self.intervalo,
+                'maximo_pendientes': self.maximo,
+                'hilo_activo': bool(self._hilo and self._hilo.is_alive()),
+                **self._contadores,
+            }
+
+
+buffer = BufferBitacora()
+
+
+def registrar(instancia):
+    """
+    Guarda una instancia de BitacoraAccion según BITACORA_MODO.
+    En modo buffer la instancia se devuelve sin pk.
+    """
+    if instancia.fecha_hora is None:
+        instancia.fecha_hora = timezone.now()
+    if modo() == MODO_SINCRONO:
+        instancia.save()
+    else:
+        buffer.encolar(instancia)
+    return instancia
+
+
+def vaciar():
+    """Fuerza la escritura de las entradas pendientes (tests, comandos)."""
+    return buffer.vaciar()
+
+
+def estadisticas():
+    return buffer.estadisticas()
+
+
+@atexit.register
+def _vaciar_al_salir():
+    if buffer._total_pendientes:
+        try:
+            escritas = buffer.vaciar()
+            logger.info('📝 Bitácora: %s entradas escritas al cerrar el proceso', escritas)
+        except Exception:
+            logger.exception('❌ Bitácora: no se pudieron escribir las entradas pendientes al salir')
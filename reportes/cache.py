@@ -0,0 +1,158 @@
+# reportes/cache.py
+"""
+Caché de reportes por tenant con invalidación por escritura.
+
+La clave de cada reporte combina: schema del tenant + endpoint + parámetros
+normalizados + versión del tenant. La versión es un contador por tenant que
+se incrementa (signals en reportes/signals.py) cada vez que se escriben
+modelos que alimentan los reportes; al cambiar la versión, todas las
+entradas anteriores de ese tenant dejan de usarse y expiran solas.
+
+Las respuestas llevan la cabecera X-Report-Cache: HIT | MISS.
+
+Requiere una caché compartida entre procesos (Redis, con REDIS_URL). Con la
+caché en memoria del proceso (LocMemCache, sin REDIS_URL) la invalidación
+de un worker o de un comando (procesar_trabajos_reportes,
+reconstruir_resumenes) no llega a los demás workers, así que en ese caso
+los reportes no se cachean.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Cabeceras de la respuesta original que se guardan junto con los datos
+CABECERAS_CACHEADAS = ('X-Report-Source', 'X-Next-Cursor')
+
+# Formatos que generan archivos; no se cachean
+FORMATOS_EXPORTACION = ('pdf', 'excel', 'csv')
+
+# Backends cuya caché vive dentro de cada proceso (o no guarda nada)
+BACKENDS_NO_COMPARTIDOS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_compartida():
+    """True si la caché default la comparten todos los procesos (p. ej. Redis)."""
+    return settings.CACHES['default']['BACKEND'] not in BACKENDS_NO_COMPARTIDOS
+
+
+def schema_actual():
+    """Schema del tenant activo en la conexión."""
+    return getattr(connection, 'schema_name', 'public')
+
+
+def _clave_version(schema, espacio):
+    return f'{espacio}:version:{schema}'
+
+
+def version_tenant(schema=None, espacio='reportes'):
+    """
+    Versión actual del tenant en el espacio de caché dado (por defecto, los
+    reportes; tratamientos/catalogo.py usa el espacio 'catalogo').
+    """
+    schema = schema or schema_actual()
+    clave = _clave_version(schema, espacio)
+    version = cache.get(clave)
+    if version is None:
+        # Partir de un valor basado en el tiempo: si la clave de versión fue
+        # desalojada, no se reutilizan entradas viejas con la versión 1.
+        version = int(time.time() * 1000)
+        cache.add(clave, version, timeout=None)
+        version = cache.get(clave, version)
+    return version
+
+
+def invalidar_tenant(schema=None, espacio='reportes'):
+    """Incrementa la versión del tenant (invalida todas sus entradas del espacio)."""
+    schema = schema or schema_actual()
+    clave = _clave_version(schema, espacio)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        # La clave no existe todavía (o fue desalojada)
+        version = int(time.time() * 1000)
+        cache.set(clave, version, timeout=None)
+        return version
+
+
+def etag_contenido(datos):
+    """ETag del contenido serializable a JSON: cambia solo si cambia algún dato."""
+    contenido = json.dumps(datos, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.md5(contenido, usedforsecurity=False).hexdigest()
+
+
+def normalizar_parametros(query_params):
+    """
+    Representación canónica de los query params: ordenados, sin vacíos y
+    sin distinguir mayúsculas en los nombres.
+    """
+    pares = []
+    for nombre in query_params.keys():
+        valores = sorted(v.strip() for v in query_params.getlist(nombre) if v and v.strip())
+        if valores:
+            pares.append((nombre.lower(), ','.join(valores)))
+    return '&'.join(f'{n}={v}' for n, v in sorted(pares))
+
+
+def clave_reporte(endpoint, query_params, schema=None):
+    """Clave de caché de un reporte para el tenant y versión actuales."""
+    schema = schema or schema_actual()
+    params = normalizar_parametros(query_params)
+    digest = hashlib.md5(params.encode('utf-8')).hexdigest()
+    return f'reportes:{schema}:v{version_tenant(schema)}:{endpoint}:{digest}'
+
+
+def cache_reporte(func):
+    """
+    Decorador para acciones de ReportesViewSet: guarda la respuesta JSON en
+    caché y la devuelve mientras no cambie la versión del tenant.
+    Las exportaciones (?formato=pdf/excel/csv) no se cachean, y nada se
+    cachea si la caché no es compartida entre procesos.
+    """
+    @functools.wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        formato = request.query_params.get('formato', '').lower()
+        if formato in FORMATOS_EXPORTACION or not cache_compartida():
+            return func(self, request, *args, **kwargs)
+
+        clave = clave_reporte(func.__name__, request.query_params)
+        guardado = cache.get(clave)
+        if guardado is not None:
+            response = Response(guardado['data'])
+            for nombre, valor in guardado['headers'].items():
+                response[nombre] = valor
+            response['X-Report-Cache'] = 'HIT'
+            return response
+
+        response = func(self, request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            try:
+                cache.set(
+                    clave,
+                    {
+                        'data': response.data,
+                        'headers': {
+                            nombre: response[nombre]
+                            for nombre in CABECERAS_CACHEADAS if response.has_header(nombre)
+                        },
+                    },
+                    timeout=settings.REPORTES_CACHE_TIMEOUT
+                )
+            except Exception as e:
+                logger.error(f"❌ No se pudo guardar en caché el reporte {func.__name__}: {e}")
+            response['X-Report-Cache'] = 'MISS'
+        return response
+
+    return wrapper
@@ -0,0 +1,305 @@
+"""
+Comando Django que mide el rendimiento de todos los reportes de ReportesViewSet.
+
+Uso:
+    python manage.py benchmark_reportes --tenant=bench_100k
+    python manage.py benchmark_reportes --tenant=bench_100k --repeticiones=5 --formatos=json,csv
+    python manage.py benchmark_reportes --tenant=bench_100k --acciones=dashboard_kpis,reporte_pacientes
+    python manage.py benchmark_reportes --tenant=bench_100k --comparar=benchmarks/a1b2c3d.json
+
+Por cada acción GET de ReportesViewSet (y cada formato) registra:
+- tiempo_ms: min / mediana / max de N ejecuciones con la caché invalidada
+- cache_ms: una ejecución más con la caché caliente
+- consultas: número de consultas SQL de una ejecución en frío
+- memoria_pico_kb: pico de memoria Python (tracemalloc, ejecución aparte)
+- bytes: tamaño de la respuesta
+
+Los resultados se guardan en JSON (por defecto benchmarks/<commit>.json)
+para comparar entre commits con --comparar.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from agenda.models import Cita
+from facturacion.models import Factura, Pago
+from tratamientos.models import ItemPlanTratamiento
+from usuarios.models import Usuario, PerfilPaciente
+from reportes.aggregations import contar_consultas
+from reportes.cache import invalidar_tenant
+from reportes.models import BitacoraAccion
+from reportes.trabajos import construir_request
+from reportes.views import ReportesViewSet
+
+# Variaciones adicionales a medir por acción (además de los parámetros por defecto)
+VARIANTES = {
+    'tendencia_citas': [{'granularidad': 'semana', 'dias': '365'}],
+    'reporte_ingresos_diarios': [{'granularidad': 'mes'}],
+    'reporte_pacientes': [{'limite': '100', 'ordenar': '-total_gastado'}],
+    'reporte_tratamientos': [{'agrupar': 'estado'}],
+    'reporte_servicios_populares': [{'agrupar': 'categoria'}],
+}
+
+# Regresión a partir de la cual se resalta una acción al comparar
+UMBRAL_REGRESION = 0.20
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo, consultas y memoria de cada reporte y guarda los resultados en JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            required=True,
+            help='Schema del tenant a medir'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Ejecuciones en frío por acción (default: 3)'
+        )
+        parser.add_argument(
+            '--acciones',
+            type=str,
+            help='Acciones separadas por coma (default: todas)'
+        )
+        parser.add_argument(
+            '--formatos',
+            type=str,
+            default='json',
+            help='Formatos a medir separados por coma: json,csv,excel,pdf (default: json)'
+        )
+        parser.add_argument(
+            '--usuario',
+            type=str,
+            help='Email del usuario que ejecuta los reportes (default: primer admin)'
+        )
+        parser.add_argument(
+            '--salida',
+            type=str,
+            help='Archivo JSON de resultados (default: benchmarks/<commit>.json)'
+        )
+        parser.add_argument(
+            '--comparar',
+            type=str,
+            help='JSON de una corrida anterior para mostrar diferencias'
+        )
+
+    def handle(self, *args, **options):
+        schema = options['tenant']
+        clinica = Clinica.objects.filter(schema_name=schema).first()
+        if clinica is None:
+            raise CommandError(f'No existe el tenant "{schema}"')
+
+        formatos = [f.strip() for f in options['formatos'].split(',') if f.strip()]
+        acciones = self._acciones(options['acciones'])
+        commit = self._commit()
+
+        with schema_context(schema):
+            usuario = self._usuario(options['usuario'])
+            resultado = {
+                'commit': commit,
+                'fecha': timezone.now().isoformat(),
+                'tenant': schema,
+                'entorno': {
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'volumen': {
+                    'pacientes': PerfilPaciente.objects.count(),
+                    'citas': Cita.objects.count(),
+                    'items_plan': ItemPlanTratamiento.objects.count(),
+                    'facturas': Factura.objects.count(),
+                    'pagos': Pago.objects.count(),
+                    'bitacora': BitacoraAccion.objects.count(),
+                },
+                'repeticiones': options['repeticiones'],
+                'resultados': [],
+            }
+            self.stdout.write(self.style.WARNING(
+                f'⏳ Benchmark de {len(acciones)} reporte(s) en {schema} '
+                f'({", ".join(f"{v} {k}" for k, v in resultado["volumen"].items())})'
+            ))
+
+            for accion in acciones:
+                for parametros in [{}] + VARIANTES.get(accion, []):
+                    for formato in formatos:
+                        medicion = self._medir(
+                            clinica, usuario, accion, parametros, formato, options['repeticiones']
+                        )
+                        resultado['resultados'].append(medicion)
+                        self._imprimir(medicion)
+
+        salida = options['salida'] or os.path.join('benchmarks', f'{commit or "sin-commit"}.json')
+        os.makedirs(os.path.dirname(salida) or '.', exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'✅ Resultados guardados en {salida}'))
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultado)
+
+    # --- preparación ------------------------------------------------------
+
+    def _acciones(self, filtro):
+        disponibles = [
+            accion.__name__ for accion in ReportesViewSet.get_extra_actions()
+            if not accion.detail and 'get' in accion.mapping
+        ]
+        if not filtro:
+            return disponibles
+        pedidas = [a.strip() for a in filtro.split(',') if a.strip()]
+        desconocidas = set(pedidas) - set(disponibles)
+        if desconocidas:
+            raise CommandError(f'Acciones desconocidas: {", ".join(sorted(desconocidas))}')
+        return pedidas
+
+    def _usuario(self, email):
+        if email:
+            usuario = Usuario.objects.filter(email=email).first()
+        else:
+            usuario = (
+                Usuario.objects.filter(is_active=True, tipo_usuario=Usuario.TipoUsuario.ADMIN)
+                .order_by('id').first()
+                or Usuario.objects.filter(is_active=True, is_staff=True).order_by('id').first()
+            )
+        if usuario is None:
+            raise CommandError('No hay un usuario administrador en el tenant (use --usuario)')
+        return usuario
+
+    def _commit(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except Exception:
+            return None
+
+    # --- medición ---------------------------------------------------------
+
+    def _ejecutar(self, clinica, usuario, accion, parametros):
+        """Ejecuta la acción completa (incluida la serialización) y devuelve (status, bytes)."""
+        vista = ReportesViewSet.as_view({'get': accion})
+        response = vista(construir_request(usuario, clinica, {k: [v] for k, v in parametros.items()}))
+        if response.streaming:
+            tamano = sum(len(bloque) for bloque in response.streaming_content)
+        else:
+            if hasattr(response, 'render'):
+                response.render()
+            tamano = len(response.content)
+        response.close()
+        return response.status_code, tamano
+
+    def _medir(self, clinica, usuario, accion, parametros, formato, repeticiones):
+        parametros = dict(parametros)
+        if formato != 'json':
+            parametros['formato'] = formato
+
+        tiempos = []
+        consultas = None
+        status_code, tamano = None, 0
+        error = None
+        try:
+            for _ in range(repeticiones):
+                invalidar_tenant(clinica.schema_name)
+                with contar_consultas() as contador:
+                    inicio = time.perf_counter()
+                    status_code, tamano = self._ejecutar(clinica, usuario, accion, parametros)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                consultas = contador.total
+
+            # Caché caliente (solo aplica a JSON; las exportaciones no se cachean)
+            inicio = time.perf_counter()
+            self._ejecutar(clinica, usuario, accion, parametros)
+            cache_ms = (time.perf_counter() - inicio) * 1000
+
+            # Memoria en una ejecución aparte: tracemalloc distorsiona los tiempos
+            invalidar_tenant(clinica.schema_name)
+            tracemalloc.start()
+            try:
+                self._ejecutar(clinica, usuario, accion, parametros)
+                _, pico = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            cache_ms, pico = None, 0
+
+        return {
+            'accion': accion,
+            'parametros': parametros,
+            'formato': formato,
+            'status': status_code,
+            'error': error,
+            'tiempo_ms': {
+                'min': round(min(tiempos), 2),
+                'mediana': round(statistics.median(tiempos), 2),
+                'max': round(max(tiempos), 2),
+            } if tiempos else None,
+            'cache_ms': round(cache_ms, 2) if cache_ms is not None else None,
+            'consultas': consultas,
+            'memoria_pico_kb': round(pico / 1024, 1),
+            'bytes': tamano,
+        }
+
+    # --- salida -----------------------------------------------------------
+
+    @staticmethod
+    def _clave(medicion):
+        parametros = '&'.join(f'{k}={v}' for k, v in sorted(medicion['parametros'].items()))
+        return f"{medicion['accion']}?{parametros}" if parametros else medicion['accion']
+
+    def _imprimir(self, medicion):
+        clave = self._clave(medicion)
+        if medicion['error'] or medicion['status'] != 200:
+            detalle = medicion['error'] or f"HTTP {medicion['status']}"
+            self.stdout.write(self.style.ERROR(f'❌ {clave}: {detalle}'))
+            return
+        self.stdout.write(
+            f'📊 {clave:<60} {medicion["tiempo_ms"]["mediana"]:>9.1f} ms '
+            f'{medicion["consultas"]:>4} consultas '
+            f'{medicion["memoria_pico_kb"]:>10.1f} KB'
+        )
+
+    def _comparar(self, ruta, actual):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                anterior = json.load(archivo)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+
+        previos = {self._clave(m): m for m in anterior.get('resultados', []) if m.get('tiempo_ms')}
+        self.stdout.write(self.style.WARNING(
+            f'\n🔍 Comparación {anterior.get("commit")} → {actual["commit"]}'
+        ))
+        for medicion in actual['resultados']:
+            clave = self._clave(medicion)
+            previo = previos.get(clave)
+            if not previo or not medicion['tiempo_ms']:
+                continue
+            antes = previo['tiempo_ms']['mediana']
+            ahora = medicion['tiempo_ms']['mediana']
+            cambio = (ahora - antes) / antes if antes else 0
+            linea = (
+                f'{clave:<60} {antes:>9.1f} → {ahora:>9.1f} ms ({cambio:+.0%}) '
+                f'consultas {previo["consultas"]} → {medicion["consultas"]}'
+            )
+            if cambio > UMBRAL_REGRESION:
+                self.stdout.write(self.style.ERROR(f'🔺 {linea}'))
+            elif cambio < -UMBRAL_REGRESION:
+                self.stdout.write(self.style.SUCCESS(f'🔻 {linea}'))
+            else:
+                self.stdout.write(f'   {linea}')
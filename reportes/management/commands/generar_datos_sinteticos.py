@@ -0,0 +1,135 @@
+"""
+Comando Django para generar un tenant con datos sintéticos a escala.
+
+Uso:
+    python manage.py generar_datos_sinteticos --tenant=bench_100k --escala=100k --crear-tenant
+    python manage.py generar_datos_sinteticos --tenant=bench_1m --escala=1m --lote=10000
+    python manage.py generar_datos_sinteticos --tenant=bench_1k --escala=1k --semilla=7
+
+La escala es el número de citas; el resto de tablas se dimensiona a partir
+de ella (ver reportes/sinteticos.py). Inserta con bulk_create, reconstruye
+los resúmenes diarios, el índice odontólogo ↔ paciente y los totales de los
+planes e invalida la caché de reportes del tenant.
+Usar un tenant dedicado para benchmarks: los datos no se limpian solos.
+"""
+
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica, Domain
+from reportes import sinteticos
+from reportes.cache import invalidar_tenant
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos (bulk_create) en un tenant para medir reportes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            required=True,
+            help='Schema del tenant destino (ej: bench_100k)'
+        )
+        parser.add_argument(
+            '--escala',
+            type=str,
+            default='1k',
+            help='Número de citas: 1k, 100k, 1m o un entero (default: 1k)'
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla aleatoria; misma semilla = mismos datos (default: 42)'
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=730,
+            help='Días de historia hacia atrás (default: 730)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=5000,
+            help='Filas por bulk_create (default: 5000)'
+        )
+        parser.add_argument(
+            '--crear-tenant',
+            action='store_true',
+            help='Crea la clínica (y su schema) si no existe'
+        )
+        parser.add_argument(
+            '--sin-resumenes',
+            action='store_true',
+            help='No reconstruir los resúmenes diarios al terminar'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            escala = sinteticos.parse_escala(options['escala'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        schema = options['tenant']
+        clinica = Clinica.objects.filter(schema_name=schema).first()
+        if clinica is None:
+            if not options['crear_tenant']:
+                raise CommandError(f'No existe el tenant "{schema}". Use --crear-tenant para crearlo.')
+            clinica = self._crear_tenant(schema)
+
+        volumen = sinteticos.volumenes(escala)
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Generando datos sintéticos en {schema}: '
+            + ', '.join(f'{cantidad} {tabla}' for tabla, cantidad in volumen.items())
+        ))
+
+        inicio = time.monotonic()
+        with schema_context(schema):
+            generador = sinteticos.GeneradorSintetico(
+                escala,
+                semilla=options['semilla'],
+                dias=options['dias'],
+                lote=options['lote'],
+                progreso=self.stdout.write,
+            )
+            with transaction.atomic():
+                insertados = generador.generar()
+            invalidar_tenant(schema)
+
+        segundos = time.monotonic() - inicio
+        total = sum(insertados.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} filas insertadas en {segundos:.1f}s ({total / max(segundos, 0.001):.0f} filas/s)'
+        ))
+        for tabla, cantidad in insertados.items():
+            self.stdout.write(f'   {tabla}: {cantidad}')
+
+        if not options['sin_resumenes']:
+            call_command('reconstruir_resumenes', tenant=schema, stdout=self.stdout)
+        # bulk_create no dispara los signals del índice odontólogo ↔ paciente
+        call_command('reconstruir_accesos_pacientes', tenant=schema, stdout=self.stdout)
+        # ni ItemPlanTratamiento.save, que mantiene los totales de los planes
+        call_command('recalcular_totales_planes', tenant=schema, stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'🔑 Usuarios con password "{sinteticos.PASSWORD}" (@{sinteticos.DOMINIO_EMAIL}). '
+            f'Siguiente paso: python manage.py benchmark_reportes --tenant={schema}'
+        ))
+
+    def _crear_tenant(self, schema):
+        self.stdout.write(f'🏥 Creando tenant {schema}...')
+        clinica = Clinica.objects.create(
+            schema_name=schema,
+            nombre=f'Benchmark {schema}',
+            dominio=schema.replace('_', '-'),
+            estado='ACTIVA',
+            activo=True,
+        )
+        Domain.objects.create(domain=f'{schema.replace("_", "-")}.localhost', tenant=clinica, is_primary=True)
+        return clinica
@@ -0,0 +1,139 @@
+"""
+Comando Django para mantener las particiones mensuales de la bitácora.
+
+Uso:
+    python manage.py mantener_particiones_bitacora                      # todas las clínicas
+    python manage.py mantener_particiones_bitacora --tenant=clinica_demo
+    python manage.py mantener_particiones_bitacora --retencion-meses=24 --meses-futuros=6
+    python manage.py mantener_particiones_bitacora --solo-desvincular
+    python manage.py mantener_particiones_bitacora --dry-run
+
+Por cada clínica:
+1. Crea las particiones del mes actual y de los próximos N meses (si la
+   partición DEFAULT tenía filas de esos meses, las mueve).
+2. Las particiones de meses fuera de la retención se desenganchan y se
+   archivan como JSONL comprimido en el storage
+   (bitacora_archivo/<schema>/<particion>.jsonl.gz) antes de eliminarlas.
+   Con --solo-desvincular quedan como tablas sueltas sin archivar.
+
+Pensado para un cron mensual (o diario; es idempotente). Solo PostgreSQL.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from reportes import particiones
+
+
+class Command(BaseCommand):
+    help = 'Crea particiones futuras de la bitácora y archiva las que superan la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--meses-futuros',
+            type=int,
+            default=settings.BITACORA_PARTICIONES_FUTURAS,
+            help=f'Meses por adelantado a crear (default: {settings.BITACORA_PARTICIONES_FUTURAS})'
+        )
+        parser.add_argument(
+            '--retencion-meses',
+            type=int,
+            default=settings.BITACORA_RETENCION_MESES,
+            help=(
+                'Meses completos a conservar además del actual; 0 = no archivar '
+                f'(default: {settings.BITACORA_RETENCION_MESES})'
+            )
+        )
+        parser.add_argument(
+            '--solo-desvincular',
+            action='store_true',
+            help='Desengancha las particiones vencidas sin archivarlas ni eliminarlas'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra lo que se haría sin modificar nada'
+        )
+
+    def handle(self, *args, **options):
+        if not particiones.soportado():
+            raise CommandError('El particionado de la bitácora requiere PostgreSQL')
+        if options['meses_futuros'] < 0 or options['retencion_meses'] < 0:
+            raise CommandError('--meses-futuros y --retencion-meses no pueden ser negativos')
+
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Manteniendo particiones de la bitácora en {len(schemas)} clínica(s) '
+            f'(retención: {options["retencion_meses"] or "sin límite"} meses)...'
+        ))
+
+        for schema in schemas:
+            with schema_context(schema):
+                self._mantener(schema, options)
+
+        self.stdout.write(self.style.SUCCESS('✅ Mantenimiento de particiones finalizado.'))
+
+    def _mantener(self, schema, options):
+        with connection.cursor() as cursor:
+            if not particiones.es_particionada(cursor):
+                self.stdout.write(self.style.ERROR(
+                    f'❌ [{schema}] la bitácora no está particionada (falta aplicar la migración 0005 de reportes)'
+                ))
+                return
+
+            vencidas = particiones.particiones_vencidas(cursor, options['retencion_meses'])
+
+            if options['dry_run']:
+                existentes = {nombre for nombre, _ in particiones.listar_particiones(cursor)}
+                mes = particiones.mes_actual()
+                faltantes = []
+                for _ in range(options['meses_futuros'] + 1):
+                    if particiones.nombre_particion(mes) not in existentes:
+                        faltantes.append(particiones.nombre_particion(mes))
+                    mes = particiones.sumar_meses(mes, 1)
+                self.stdout.write(
+                    f'🔍 [{schema}] crearía: {", ".join(faltantes) or "-"}; '
+                    f'{"desengancharía" if options["solo_desvincular"] else "archivaría"}: '
+                    f'{", ".join(nombre for nombre, _ in vencidas) or "-"}'
+                )
+                return
+
+            creadas = particiones.asegurar_particiones(cursor, options['meses_futuros'])
+            for nombre in creadas:
+                self.stdout.write(f'🆕 [{schema}] partición creada: {nombre}')
+
+            for nombre, mes in vencidas:
+                filas, ruta = particiones.archivar_particion(
+                    cursor, nombre, schema, archivar=not options['solo_desvincular']
+                )
+                if ruta:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'📦 [{schema}] {mes:%Y-%m}: {filas} registro(s) archivados en {ruta}'
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'🔌 [{schema}] {mes:%Y-%m}: {nombre} desenganchada ({filas} registros)'
+                    ))
+
+            pendientes = particiones.filas_en_default(cursor)
+            if pendientes:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️ [{schema}] {pendientes} registro(s) en {particiones.PARTICION_DEFAULT} '
+                    '(fechas fuera de las particiones mensuales)'
+                ))
@@ -0,0 +1,107 @@
+"""
+Comando Django que procesa la cola de trabajos de reportes (TrabajoReporte).
+
+Uso:
+    python manage.py procesar_trabajos_reportes                    # loop continuo
+    python manage.py procesar_trabajos_reportes --una-vez          # vacía la cola y termina (cron)
+    python manage.py procesar_trabajos_reportes --tenant=clinica_demo --intervalo=5
+
+Se pueden levantar varios workers en paralelo: cada trabajo se reclama con
+SELECT ... FOR UPDATE SKIP LOCKED, así que dos workers nunca toman el mismo.
+En cada vuelta también reencola los trabajos cuya reserva venció (worker
+caído; ver REPORTES_TRABAJOS_RESERVA_SEGUNDOS) y purga archivos expirados.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from reportes import trabajos
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de reportes en segundo plano de todas las clínicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos pendientes y termina'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=10,
+            help='Segundos de espera cuando no hay trabajos (default: 10)'
+        )
+        parser.add_argument(
+            '--max-trabajos',
+            type=int,
+            default=0,
+            help='Termina tras procesar N trabajos (default: 0 = sin límite)'
+        )
+
+    def handle(self, *args, **options):
+        worker = trabajos.identificador_worker()
+        procesados = 0
+
+        self.stdout.write(self.style.WARNING(f'⏳ Worker de reportes {worker} iniciado...'))
+
+        try:
+            while True:
+                procesados_vuelta = 0
+                for clinica in self._clinicas(options['tenant']):
+                    with schema_context(clinica.schema_name):
+                        self._mantenimiento(clinica)
+                        while True:
+                            if options['max_trabajos'] and procesados >= options['max_trabajos']:
+                                break
+                            trabajo = trabajos.reclamar_siguiente(worker)
+                            if trabajo is None:
+                                break
+                            self._procesar(clinica, trabajo)
+                            procesados += 1
+                            procesados_vuelta += 1
+
+                if options['una_vez'] or (options['max_trabajos'] and procesados >= options['max_trabajos']):
+                    break
+                if not procesados_vuelta:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Worker detenido'))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Worker finalizado: {procesados} trabajo(s) procesado(s).'))
+
+    def _clinicas(self, schema):
+        clinicas = Clinica.objects.exclude(schema_name='public').filter(activo=True)
+        if schema:
+            clinicas = clinicas.filter(schema_name=schema)
+        return list(clinicas)
+
+    def _mantenimiento(self, clinica):
+        reencolados = trabajos.reencolar_colgados()
+        expirados = trabajos.purgar_expirados()
+        if reencolados or expirados:
+            self.stdout.write(
+                f'🧹 [{clinica.schema_name}] {reencolados} reencolado(s), {expirados} expirado(s)'
+            )
+
+    def _procesar(self, clinica, trabajo):
+        self.stdout.write(f'📄 [{clinica.schema_name}] Trabajo #{trabajo.id}: {trabajo.endpoint} ({trabajo.formato})')
+        inicio = time.monotonic()
+        trabajos.ejecutar(trabajo, clinica)
+        segundos = time.monotonic() - inicio
+
+        if trabajo.estado == 'COMPLETADO':
+            self.stdout.write(self.style.SUCCESS(
+                f'   ✅ {trabajo.nombre_archivo} ({trabajo.tamano_bytes} bytes, {segundos:.1f}s)'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f'   ❌ {trabajo.error}'))
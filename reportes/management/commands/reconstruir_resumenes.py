@@ -0,0 +1,129 @@
+"""
+Comando Django para reconstruir las tablas de resumen diario de reportes.
+
+Uso:
+    python manage.py reconstruir_resumenes                       # todo, todas las clínicas
+    python manage.py reconstruir_resumenes --tenant=clinica_demo
+    python manage.py reconstruir_resumenes --desde=2025-01-01 --hasta=2025-03-31
+    python manage.py reconstruir_resumenes --tipo=pagos
+
+Sin --desde/--hasta reconstruye todo el historial y marca el resumen como
+completo; desde ese momento los signals lo mantienen al día. Conviene
+ejecutarlo después de cargas masivas (bulk_create/update no disparan signals).
+"""
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min, Max
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from agenda.models import Cita
+from facturacion.models import Pago
+from reportes import rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de citas y pagos para un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Fecha inicial YYYY-MM-DD (default: primer registro)'
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            help='Fecha final YYYY-MM-DD (default: último registro)'
+        )
+        parser.add_argument(
+            '--tipo',
+            choices=['citas', 'pagos', 'todos'],
+            default='todos',
+            help='Resumen a reconstruir (default: todos)'
+        )
+        parser.add_argument(
+            '--dias-por-lote',
+            type=int,
+            default=90,
+            help='Días procesados por transacción (default: 90)'
+        )
+
+    def handle(self, *args, **options):
+        desde = self._parse_fecha(options['desde'], '--desde')
+        hasta = self._parse_fecha(options['hasta'], '--hasta')
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        tipos = [rollups.TIPO_CITAS, rollups.TIPO_PAGOS] if options['tipo'] == 'todos' else [options['tipo']]
+
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Reconstruyendo resúmenes ({", ".join(tipos)}) en {len(schemas)} clínica(s)...'
+        ))
+
+        for schema in schemas:
+            with schema_context(schema):
+                for tipo in tipos:
+                    self._reconstruir_tipo(schema, tipo, desde, hasta, options['dias_por_lote'])
+
+        self.stdout.write(self.style.SUCCESS('✅ Reconstrucción de resúmenes finalizada.'))
+
+    def _parse_fecha(self, valor, nombre):
+        if not valor:
+            return None
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'{nombre} inválido. Use YYYY-MM-DD')
+
+    def _limites(self, tipo):
+        """Primer y último día con datos en la tabla origen."""
+        if tipo == rollups.TIPO_CITAS:
+            limites = Cita.objects.aggregate(inicio=Min('fecha_hora'), fin=Max('fecha_hora'))
+        else:
+            limites = Pago.objects.aggregate(inicio=Min('fecha_pago'), fin=Max('fecha_pago'))
+        if not limites['inicio']:
+            return None, None
+        return timezone.localdate(limites['inicio']), timezone.localdate(limites['fin'])
+
+    def _reconstruir_tipo(self, schema, tipo, desde, hasta, dias_por_lote):
+        completo = desde is None and hasta is None
+        primero, ultimo = self._limites(tipo)
+
+        inicio = desde or primero
+        fin = hasta or ultimo
+        total_filas = 0
+
+        if inicio and fin:
+            actual = inicio
+            while actual <= fin:
+                fin_lote = min(actual + timedelta(days=dias_por_lote - 1), fin)
+                total_filas += rollups.reconstruir(tipo, actual, fin_lote)
+                actual = fin_lote + timedelta(days=1)
+
+        if completo:
+            rollups.registrar_cobertura(tipo)
+        elif inicio and fin:
+            rollups.registrar_cobertura(tipo, inicio, fin)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'📊 [{schema}] {tipo}: {total_filas} fila(s) de resumen '
+            f'({inicio or "-"} → {fin or "-"})'
+        ))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0001_initial'),
+        ('usuarios', '0004_usuario_fcm_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoberturaResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('citas', 'Citas'), ('pagos', 'Pagos')], max_length=10, unique=True)),
+                ('desde', models.DateField(blank=True, null=True)),
+                ('hasta', models.DateField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Cobertura de Resumen',
+                'verbose_name_plural': 'Coberturas de Resumen',
+                'db_table': 'reportes_cobertura_resumen',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioPagos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True)),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Pagos',
+                'verbose_name_plural': 'Resúmenes Diarios de Pagos',
+                'db_table': 'reportes_resumen_diario_pagos',
+                'ordering': ['fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'metodo_pago'), name='uniq_resumen_pagos_dia_metodo')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioCitas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True)),
+                ('estado', models.CharField(max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('odontologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_citas', to='usuarios.perfilodontologo')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Citas',
+                'verbose_name_plural': 'Resúmenes Diarios de Citas',
+                'db_table': 'reportes_resumen_diario_citas',
+                'ordering': ['fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'odontologo', 'estado'), name='uniq_resumen_citas_dia_odontologo_estado')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0003_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bitacoraaccion',
+            name='fecha_hora',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
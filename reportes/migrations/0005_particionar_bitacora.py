@@ -0,0 +1,153 @@
+# Particionado mensual de reportes_bitacora_accion (solo PostgreSQL).
+# El estado de Django no cambia: la tabla se reconstruye con SQL.
+#
+# El SQL queda congelado en esta migración (no importa reportes.particiones):
+# cambios posteriores en ese módulo no deben alterar una migración ya aplicada.
+
+from datetime import date, datetime, time
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLA = 'reportes_bitacora_accion'
+PARTICION_DEFAULT = f'{TABLA}_default'
+MESES_FUTUROS = 3
+
+
+def _sumar_meses(mes, cantidad):
+    indice = mes.year * 12 + mes.month - 1 + cantidad
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _literal(mes):
+    return f"'{timezone.make_aware(datetime.combine(mes, time.min)).isoformat()}'"
+
+
+def _existe(cursor, nombre):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [nombre])
+    return cursor.fetchone()[0]
+
+
+def _es_particionada(cursor):
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", [TABLA]
+    )
+    fila = cursor.fetchone()
+    return bool(fila and fila[0])
+
+
+def _crear_particiones(cursor, desde):
+    """Una partición por mes desde `desde` hasta MESES_FUTUROS meses adelante."""
+    hoy = timezone.localdate()
+    ultimo = _sumar_meses(date(hoy.year, hoy.month, 1), MESES_FUTUROS)
+    mes = desde
+    while mes <= ultimo:
+        nombre = f'{TABLA}_p{mes.year}_{mes.month:02d}'
+        siguiente = _sumar_meses(mes, 1)
+        cursor.execute(
+            f'CREATE TABLE {nombre} PARTITION OF {TABLA} '
+            f'FOR VALUES FROM ({_literal(mes)}) TO ({_literal(siguiente)})'
+        )
+        mes = siguiente
+
+
+def _reconstruir(cursor, particionar):
+    """
+    Reconstruye TABLA como particionada (o de vuelta a tabla normal),
+    copiando filas, índices, FKs y el contador del id.
+    """
+    legado = f'{TABLA}_legado'
+
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [TABLA]
+    )
+    nombre_pk = cursor.fetchone()[0]
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() '
+        'AND tablename = %s AND indexname <> %s',
+        [TABLA, nombre_pk]
+    )
+    indices = [fila[0] for fila in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [TABLA]
+    )
+    foraneas = cursor.fetchall()
+    cursor.execute(
+        'SELECT is_identity = %s FROM information_schema.columns '
+        "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'",
+        ['YES', TABLA]
+    )
+    identity = cursor.fetchone()[0]
+    cursor.execute('SELECT min(fecha_hora) FROM ' + TABLA)
+    minimo = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {legado}')
+    cursor.execute(f'ALTER TABLE {legado} RENAME CONSTRAINT {nombre_pk} TO {legado}_pkey')
+
+    if particionar:
+        cursor.execute(
+            f'CREATE TABLE {TABLA} (LIKE {legado} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            'PARTITION BY RANGE (fecha_hora)'
+        )
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre_pk} PRIMARY KEY (id, fecha_hora)')
+        cursor.execute(f'CREATE TABLE {PARTICION_DEFAULT} PARTITION OF {TABLA} DEFAULT')
+        hoy = timezone.localdate()
+        desde = date(hoy.year, hoy.month, 1)
+        if minimo:
+            local = timezone.localtime(minimo)
+            desde = date(local.year, local.month, 1)
+        _crear_particiones(cursor, desde)
+    else:
+        cursor.execute(f'CREATE TABLE {TABLA} (LIKE {legado} INCLUDING DEFAULTS INCLUDING IDENTITY)')
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre_pk} PRIMARY KEY (id)')
+
+    cursor.execute(f'INSERT INTO {TABLA} OVERRIDING SYSTEM VALUE SELECT * FROM {legado}')
+
+    if identity:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT max(id) FROM {TABLA}), 0) + 1, false)",
+            [TABLA]
+        )
+    else:
+        # Columna serial: la secuencia pertenece a la tabla vieja y se borraría con ella
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [legado])
+        secuencia = cursor.fetchone()[0]
+        if secuencia:
+            cursor.execute(f'ALTER SEQUENCE {secuencia} OWNED BY {TABLA}.id')
+
+    cursor.execute(f'DROP TABLE {legado} CASCADE')
+    for definicion in indices:
+        cursor.execute(definicion)
+    for nombre, definicion in foraneas:
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}')
+
+
+def particionar_bitacora(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if _existe(cursor, TABLA) and not _es_particionada(cursor):
+            _reconstruir(cursor, particionar=True)
+
+
+def desparticionar_bitacora(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if _existe(cursor, TABLA) and _es_particionada(cursor):
+            _reconstruir(cursor, particionar=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0004_bitacora_fecha_hora_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_bitacora, desparticionar_bitacora),
+    ]
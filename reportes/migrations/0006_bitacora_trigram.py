@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:18
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+def crear_extension_trigram(apps, schema_editor):
+    # En public: con django-tenants el search_path de cada tenant incluye
+    # public, así todos los schemas ven gin_trgm_ops.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reportes', '0005_particionar_bitacora'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_extension_trigram, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bitacoraaccion',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('descripcion'), name='gin_trgm_ops'), name='bitacora_descripcion_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacoraaccion',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(models.Func('ip_address', function='HOST', output_field=models.TextField())), name='gin_trgm_ops'), name='bitacora_ip_trgm'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:27
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def reservar_en_proceso(apps, schema_editor):
+    # Los trabajos tomados antes de existir la reserva conservan el criterio
+    # anterior: se reencolan 30 minutos después de iniciados.
+    TrabajoReporte = apps.get_model('reportes', 'TrabajoReporte')
+    TrabajoReporte.objects.filter(estado='PROCESANDO', iniciado__isnull=False).update(
+        reservado_hasta=F('iniciado') + timedelta(minutes=30)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0006_bitacora_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='reservado_hasta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(reservar_en_proceso, migrations.RunPython.noop),
+    ]
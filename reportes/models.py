@@ -2,8 +2,12 @@ from django.db import models
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import Func
+from django.db.models.functions import Upper
 
 
 class BitacoraAccion(models.Model):
@@ -68,9 +72,9 @@ class BitacoraAccion(models.Model):
         help_text='Información adicional en formato JSON'
     )
     
-    # Fecha y hora de la acción
+    # Fecha y hora de la acción (se fija al registrar, no al escribir el lote)
     fecha_hora = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         db_index=True
     )
     
@@ -97,6 +101,20 @@ class BitacoraAccion(models.Model):
             models.Index(fields=['-fecha_hora']),
             models.Index(fields=['usuario', '-fecha_hora']),
             models.Index(fields=['accion', '-fecha_hora']),
+            # Trigram (pg_trgm) para las búsquedas icontains: Django las traduce a
+            # UPPER(descripcion) LIKE / UPPER(HOST(ip_address)) LIKE, por eso
+            # el índice es sobre esas mismas expresiones.
+            GinIndex(
+                OpClass(Upper('descripcion'), name='gin_trgm_ops'),
+                name='bitacora_descripcion_trgm',
+            ),
+            GinIndex(
+                OpClass(
+                    Upper(Func('ip_address', function='HOST', output_field=models.TextField())),
+                    name='gin_trgm_ops',
+                ),
+                name='bitacora_ip_trgm',
+            ),
         ]
     
     def __str__(self):
@@ -107,7 +125,11 @@ class BitacoraAccion(models.Model):
     @classmethod
     def registrar(cls, usuario, accion, descripcion, content_object=None, detalles=None, ip_address=None, user_agent=None):
         """
-        Método auxiliar para crear registros de bitácora fácilmente
+        Método auxiliar para crear registros de bitácora fácilmente.
+        
+        La escritura pasa por reportes.auditoria: con BITACORA_MODO='buffer'
+        (default) se inserta en lote después del commit y la instancia
+        devuelta todavía no tiene pk; con 'sincrono' se guarda al momento.
         
         Ejemplo:
             BitacoraAccion.registrar(
@@ -131,6 +153,183 @@ class BitacoraAccion(models.Model):
         if content_object:
             bitacora.content_object = content_object
         
-        bitacora.save()
-        return bitacora
+        from .auditoria import registrar
+        return registrar(bitacora)
+
+
+
+# ============================================================================
+# TABLAS DE RESUMEN (ROLLUPS) PARA REPORTES
+# ============================================================================
+
+class ResumenDiarioCitas(models.Model):
+    """
+    Cantidad de citas por día, odontólogo y estado.
+    
+    Se mantiene desde los signals de Cita (ver reportes/rollups.py) y se
+    reconstruye con: python manage.py reconstruir_resumenes
+    """
+    fecha = models.DateField(db_index=True)
+    odontologo = models.ForeignKey(
+        'usuarios.PerfilOdontologo',
+        on_delete=models.CASCADE,
+        related_name='resumenes_citas'
+    )
+    estado = models.CharField(max_length=20)
+    cantidad = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'reportes_resumen_diario_citas'
+        verbose_name = 'Resumen Diario de Citas'
+        verbose_name_plural = 'Resúmenes Diarios de Citas'
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'odontologo', 'estado'],
+                name='uniq_resumen_citas_dia_odontologo_estado'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.odontologo_id} - {self.estado}: {self.cantidad}"
 
+
+class ResumenDiarioPagos(models.Model):
+    """
+    Total de pagos COMPLETADOS por día y método de pago.
+    
+    Se mantiene desde los signals de Pago (ver reportes/rollups.py).
+    """
+    fecha = models.DateField(db_index=True)
+    metodo_pago = models.CharField(max_length=20)
+    cantidad = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'reportes_resumen_diario_pagos'
+        verbose_name = 'Resumen Diario de Pagos'
+        verbose_name_plural = 'Resúmenes Diarios de Pagos'
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'metodo_pago'],
+                name='uniq_resumen_pagos_dia_metodo'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.metodo_pago}: {self.total}"
+
+
+class CoberturaResumen(models.Model):
+    """
+    Rango de fechas en el que un resumen está completo.
+    
+    Lo registra el comando reconstruir_resumenes y lo extienden los signals
+    al reconstruir un día cercano al rango (ver rollups.extender_cobertura).
+    Una reconstrucción total deja desde/hasta en NULL (cubre todo). Los
+    reportes solo leen de los resúmenes si el rango pedido está cubierto.
+    """
+    TIPO_CHOICES = [
+        ('citas', 'Citas'),
+        ('pagos', 'Pagos'),
+    ]
+    
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, unique=True)
+    desde = models.DateField(null=True, blank=True)
+    hasta = models.DateField(null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'reportes_cobertura_resumen'
+        verbose_name = 'Cobertura de Resumen'
+        verbose_name_plural = 'Coberturas de Resumen'
+    
+    def __str__(self):
+        return f"{self.tipo}: {self.desde or '-∞'} → {self.hasta or '∞'}"
+    
+    def cubre(self, desde, hasta):
+        """True si [desde, hasta] está dentro del rango cubierto."""
+        if self.desde and desde < self.desde:
+            return False
+        if self.hasta and hasta > self.hasta:
+            return False
+        return True
+
+
+# ============================================================================
+# TRABAJOS DE REPORTES ASÍNCRONOS
+# ============================================================================
+
+def ruta_archivo_trabajo(instance, filename):
+    """Los archivos generados se guardan separados por tenant."""
+    from django.db import connection
+    schema = getattr(connection, 'schema_name', 'public')
+    return f'reportes/{schema}/{instance.creado:%Y/%m}/{filename}'
+
+
+class TrabajoReporte(models.Model):
+    """
+    Exportación de reporte (PDF/Excel/CSV) ejecutada en segundo plano.
+    
+    Se crea desde POST /api/reportes/trabajos/ o automáticamente cuando una
+    exportación supera REPORTES_FILAS_ASINCRONO filas. El comando
+    procesar_trabajos_reportes los toma con SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('FALLIDO', 'Fallido'),
+        ('EXPIRADO', 'Expirado'),
+    ]
+    
+    FORMATO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('excel', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+    
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='trabajos_reportes'
+    )
+    
+    # Qué reporte ejecutar: '<recurso>.<accion>', ej. 'reportes.reporte_pacientes'
+    endpoint = models.CharField(max_length=100)
+    parametros = models.JSONField(default=dict, blank=True)
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    # Reserva del worker: la renueva mientras ejecuta el trabajo; si vence,
+    # el worker murió y el trabajo vuelve a PENDIENTE
+    reservado_hasta = models.DateTimeField(null=True, blank=True)
+    
+    # Archivo generado
+    archivo = models.FileField(upload_to=ruta_archivo_trabajo, null=True, blank=True)
+    nombre_archivo = models.CharField(max_length=255, blank=True, default='')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    tamano_bytes = models.BigIntegerField(null=True, blank=True)
+    
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'reportes_trabajo_reporte'
+        verbose_name = 'Trabajo de Reporte'
+        verbose_name_plural = 'Trabajos de Reportes'
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['estado', 'creado']),
+            models.Index(fields=['usuario', '-creado']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.endpoint} ({self.formato}) - {self.estado}"
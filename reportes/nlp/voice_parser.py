@@ -6,296 +6,308 @@ Ejemplos:
 - "dame las citas del 1 al 5 de septiembre"
 - "mostrar facturas de la semana pasada"
 - "reportes de tratamientos del mes actual"
+
+El parser no guarda estado por llamada (es seguro entre hilos): los patrones
+se compilan una sola vez al importar el módulo, las palabras clave se buscan
+con un único regex combinado sobre el texto sin tildes, y las interpretaciones
+se cachean (LRU) por comando normalizado + fecha del día.
 """
 
-import re
-from datetime import datetime, timedelta
-from dateutil import parser
-from dateutil.relativedelta import relativedelta
 import calendar
 import logging
+import re
+import unicodedata
+from datetime import date, timedelta
+from functools import lru_cache
+
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Interpretaciones cacheadas por proceso
+TAMANO_CACHE = 2048
 
-class VoiceReportParser:
-    """Parser de comandos de voz para reportes."""
-    
-    # Meses en español
-    MESES = {
-        'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
-        'mayo': 5, 'junio': 6, 'julio': 7, 'agosto': 8,
-        'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
-    }
-    
-    # Tipos de reportes reconocidos
-    TIPOS_REPORTE = {
-        'citas': ['cita', 'citas', 'agenda', 'agendas', 'consulta', 'consultas'],
-        'facturas': ['factura', 'facturas', 'pago', 'pagos', 'cobro', 'cobros'],
-        'tratamientos': ['tratamiento', 'tratamientos', 'plan', 'planes', 'servicio', 'servicios'],
-        'pacientes': ['paciente', 'pacientes', 'cliente', 'clientes'],
-        'ingresos': ['ingreso', 'ingresos', 'ganancia', 'ganancias', 'venta', 'ventas'],
-        'inventario': ['inventario', 'stock', 'insumo', 'insumos', 'material', 'materiales']
+# Meses en español
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
+    'mayo': 5, 'junio': 6, 'julio': 7, 'agosto': 8,
+    'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+
+# Tipos de reportes reconocidos (el orden define la prioridad)
+TIPOS_REPORTE = {
+    'citas': ['cita', 'citas', 'agenda', 'agendas', 'consulta', 'consultas'],
+    'facturas': ['factura', 'facturas', 'pago', 'pagos', 'cobro', 'cobros'],
+    'tratamientos': ['tratamiento', 'tratamientos', 'plan', 'planes', 'servicio', 'servicios'],
+    'pacientes': ['paciente', 'pacientes', 'cliente', 'clientes'],
+    'ingresos': ['ingreso', 'ingresos', 'ganancia', 'ganancias', 'venta', 'ventas'],
+    'inventario': ['inventario', 'stock', 'insumo', 'insumos', 'material', 'materiales']
+}
+
+# Períodos relativos por frase (el orden define la prioridad)
+PERIODOS = {
+    'esta_semana': ['esta semana'],
+    'semana_pasada': ['semana pasada', 'ultima semana'],
+    'este_mes': ['este mes', 'mes actual'],
+    'mes_pasado': ['mes pasado', 'ultimo mes'],
+    'hoy': ['hoy'],
+    'ayer': ['ayer'],
+}
+
+# Estados (el orden define la prioridad)
+ESTADOS = {
+    'pendiente': ['pendiente', 'pendientes'],
+    'completado': ['completado', 'completados', 'completada'],
+    'cancelado': ['cancelado', 'cancelados', 'cancelada'],
+}
+
+
+def quitar_tildes(texto):
+    """'Últimos días, año' -> 'Ultimos dias, ano' (incluye la ñ)."""
+    descompuesto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in descompuesto if unicodedata.category(c) != 'Mn')
+
+
+def normalizar(texto):
+    """Clave de caché: minúsculas y espacios colapsados (conserva tildes para los nombres)."""
+    return ' '.join(texto.lower().split())
+
+
+def _construir_matcher():
+    """
+    Un único regex con todas las palabras clave; cada coincidencia se
+    traduce a (categoría, valor, prioridad). Las alternativas van de la más
+    larga a la más corta para que 'citas' gane sobre 'cita'.
+    """
+    claves = {}
+    for categoria, grupos in (('tipo', TIPOS_REPORTE), ('periodo', PERIODOS), ('estado', ESTADOS)):
+        for prioridad, (valor, palabras) in enumerate(grupos.items()):
+            for palabra in palabras:
+                claves[palabra] = (categoria, valor, prioridad)
+    alternativas = [re.escape(p) for p in sorted(claves, key=len, reverse=True)]
+    # Los meses van como palabra completa: 'mayo' no debe coincidir dentro de 'mayores'
+    for mes in MESES:
+        claves[mes] = ('mes', MESES[mes], MESES[mes])
+    alternativas += [rf'\b{mes}\b' for mes in MESES]
+    return re.compile('|'.join(alternativas)), claves
+
+
+_MATCHER, _CLAVES = _construir_matcher()
+
+# Patrones con grupos (sobre el texto sin tildes)
+# "del 1 al 5 de septiembre"
+_PATRON_RANGO_MES = re.compile(r'del?\s+(\d{1,2})\s+al?\s+(\d{1,2})\s+de\s+(\w+)')
+# "del 25 de agosto al 5 de septiembre"
+_PATRON_RANGO_MESES = re.compile(r'del?\s+(\d{1,2})\s+de\s+(\w+)\s+al?\s+(\d{1,2})\s+de\s+(\w+)')
+# "últimos 7 días"
+_PATRON_ULTIMOS_DIAS = re.compile(r'ultimos?\s+(\d+)\s+dias?')
+# "mayor a 1000", "más de 200" / "menor a 500"
+_PATRON_MONTO_MAYOR = re.compile(r'(?:mayor|mas)\s+(?:a|de|que)\s+(\d+)')
+_PATRON_MONTO_MENOR = re.compile(r'(?:menor|menos)\s+(?:a|de|que)\s+(\d+)')
+# "del paciente Juan Pérez" (sobre el texto con tildes: el nombre se usa para filtrar)
+_PATRON_PACIENTE = re.compile(
+    r'(?:del?|de la)\s+paciente\s+([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)',
+    re.IGNORECASE
+)
+
+
+def _palabras_clave(texto):
+    """{categoría: (prioridad, valor)} con la coincidencia de mayor prioridad de cada una."""
+    encontradas = {}
+    for coincidencia in _MATCHER.finditer(texto):
+        categoria, valor, prioridad = _CLAVES[coincidencia.group(0)]
+        actual = encontradas.get(categoria)
+        if actual is None or prioridad < actual[0]:
+            encontradas[categoria] = (prioridad, valor)
+    return encontradas
+
+
+def _rango_periodo(periodo, hoy):
+    if periodo == 'esta_semana':
+        inicio = hoy - timedelta(days=hoy.weekday())
+        return inicio, inicio + timedelta(days=6)
+    if periodo == 'semana_pasada':
+        inicio = hoy - timedelta(days=hoy.weekday() + 7)
+        return inicio, inicio + timedelta(days=6)
+    if periodo == 'este_mes':
+        return hoy.replace(day=1), hoy.replace(day=calendar.monthrange(hoy.year, hoy.month)[1])
+    if periodo == 'mes_pasado':
+        fin = hoy.replace(day=1) - timedelta(days=1)
+        return fin.replace(day=1), fin
+    if periodo == 'hoy':
+        return hoy, hoy
+    # ayer
+    ayer = hoy - timedelta(days=1)
+    return ayer, ayer
+
+
+def _extraer_fechas(texto, claves, hoy):
+    """(fecha_inicio, fecha_fin) según el primer patrón que aplique."""
+    match = _PATRON_RANGO_MES.search(texto)
+    if match and match.group(3) in MESES:
+        try:
+            mes = MESES[match.group(3)]
+            return date(hoy.year, mes, int(match.group(1))), date(hoy.year, mes, int(match.group(2)))
+        except ValueError:
+            pass  # Día inexistente ("31 de febrero"): probar los demás patrones
+
+    match = _PATRON_RANGO_MESES.search(texto)
+    if match and match.group(2) in MESES and match.group(4) in MESES:
+        try:
+            return (
+                date(hoy.year, MESES[match.group(2)], int(match.group(1))),
+                date(hoy.year, MESES[match.group(4)], int(match.group(3))),
+            )
+        except ValueError:
+            pass
+
+    if 'periodo' in claves:
+        return _rango_periodo(claves['periodo'][1], hoy)
+
+    match = _PATRON_ULTIMOS_DIAS.search(texto)
+    if match:
+        return hoy - timedelta(days=int(match.group(1))), hoy
+
+    if 'mes' in claves:
+        mes = claves['mes'][1]
+        return date(hoy.year, mes, 1), date(hoy.year, mes, calendar.monthrange(hoy.year, mes)[1])
+
+    # Si no se detecta ninguna fecha, usar un rango amplio (últimos 6 meses)
+    return hoy - timedelta(days=180), hoy
+
+
+def _extraer_filtros(texto, texto_con_tildes, claves):
+    filtros = {}
+    if 'estado' in claves:
+        filtros['estado'] = claves['estado'][1]
+
+    match = _PATRON_PACIENTE.search(texto_con_tildes)
+    if match:
+        filtros['paciente_nombre'] = match.group(1).title()
+
+    match = _PATRON_MONTO_MAYOR.search(texto)
+    if match:
+        filtros['monto_minimo'] = float(match.group(1))
+
+    match = _PATRON_MONTO_MENOR.search(texto)
+    if match:
+        filtros['monto_maximo'] = float(match.group(1))
+    return filtros
+
+
+def _generar_interpretacion(tipo_reporte, fecha_inicio, fecha_fin, filtros):
+    """Genera una descripción legible de lo que se interpretó."""
+    partes = [f"Reporte de {tipo_reporte}"]
+
+    if fecha_inicio and fecha_fin:
+        if fecha_inicio == fecha_fin:
+            partes.append(f"del {fecha_inicio.strftime('%d/%m/%Y')}")
+        elif (fecha_fin - fecha_inicio).days > 150:
+            # Rango muy amplio: indica búsqueda general
+            partes.append("(todos los registros disponibles)")
+        else:
+            partes.append(
+                f"desde el {fecha_inicio.strftime('%d/%m/%Y')} "
+                f"hasta el {fecha_fin.strftime('%d/%m/%Y')}"
+            )
+
+    if filtros.get('estado'):
+        partes.append(f"con estado: {filtros['estado']}")
+    if filtros.get('paciente_nombre'):
+        partes.append(f"del paciente: {filtros['paciente_nombre']}")
+    if filtros.get('monto_minimo'):
+        partes.append(f"con monto mayor a ${filtros['monto_minimo']}")
+    if filtros.get('monto_maximo'):
+        partes.append(f"con monto menor a ${filtros['monto_maximo']}")
+
+    return " ".join(partes)
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def _interpretar(normalizado, hoy):
+    """
+    Interpretación de un comando ya normalizado. La fecha del día es parte
+    de la clave: "esta semana" cambia de significado al día siguiente.
+    """
+    texto = quitar_tildes(normalizado)
+    claves = _palabras_clave(texto)
+
+    tipo_reporte = claves['tipo'][1] if 'tipo' in claves else 'citas'
+    fecha_inicio, fecha_fin = _extraer_fechas(texto, claves, hoy)
+    filtros = _extraer_filtros(texto, normalizado, claves)
+
+    return {
+        'tipo_reporte': tipo_reporte,
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else None,
+        'filtros': filtros,
+        'interpretacion': _generar_interpretacion(tipo_reporte, fecha_inicio, fecha_fin, filtros),
     }
-    
-    def __init__(self):
-        self.texto_original = ""
-        self.tipo_reporte = None
-        self.fecha_inicio = None
-        self.fecha_fin = None
-        self.filtros_adicionales = {}
-    
-    def parse(self, texto):
+
+
+class VoiceReportParser:
+    """
+    Parser de comandos de voz para reportes.
+
+    Sin estado por llamada: una misma instancia (o la del módulo) puede
+    usarse desde varios hilos.
+    """
+
+    MESES = MESES
+    TIPOS_REPORTE = TIPOS_REPORTE
+
+    def parse(self, texto, hoy=None):
         """
         Procesa el texto de entrada y extrae información del reporte.
-        
+
         Args:
             texto (str): Comando de voz transcrito
-            
+            hoy (date): Fecha de referencia (default: hoy en la zona horaria actual)
+
         Returns:
             dict: Información parseada del reporte
         """
-        self.texto_original = texto.lower().strip()
-        
-        logger.info(f"🎤 Procesando comando: '{texto}'")
-        
-        # 1. Detectar tipo de reporte
-        self.tipo_reporte = self._detectar_tipo_reporte()
-        
-        # 2. Extraer fechas
-        self._extraer_fechas()
-        
-        # 3. Extraer filtros adicionales
-        self._extraer_filtros()
-        
-        resultado = {
+        interpretacion = _interpretar(normalizar(texto), hoy or timezone.localdate())
+        logger.debug(f"🎤 '{texto}' -> {interpretacion['interpretacion']}")
+        # Copia: el dict cacheado se comparte entre llamadas
+        return {
             'texto_original': texto,
-            'tipo_reporte': self.tipo_reporte,
-            'fecha_inicio': self.fecha_inicio.isoformat() if self.fecha_inicio else None,
-            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None,
-            'filtros': self.filtros_adicionales,
-            'interpretacion': self._generar_interpretacion()
+            **interpretacion,
+            'filtros': dict(interpretacion['filtros']),
         }
-        
-        logger.info(f"✅ Resultado: {resultado}")
-        
-        return resultado
-    
-    def _detectar_tipo_reporte(self):
-        """Detecta qué tipo de reporte se está solicitando."""
-        for tipo, palabras_clave in self.TIPOS_REPORTE.items():
-            for palabra in palabras_clave:
-                if palabra in self.texto_original:
-                    return tipo
-        
-        # Si no se detecta, asumir 'citas' como default
-        return 'citas'
-    
-    def _extraer_fechas(self):
-        """Extrae fechas del texto en lenguaje natural."""
-        texto = self.texto_original
-        hoy = datetime.now().date()
-        
-        # Patrón: "del X al Y de MES"
-        # Ejemplos: "del 1 al 5 de septiembre", "del 10 al 15 de diciembre"
-        patron_rango_mes = r'del?\s+(\d{1,2})\s+al?\s+(\d{1,2})\s+de\s+(\w+)'
-        match = re.search(patron_rango_mes, texto)
-        
-        if match:
-            dia_inicio = int(match.group(1))
-            dia_fin = int(match.group(2))
-            mes_nombre = match.group(3)
-            
-            # Obtener número de mes
-            mes = self.MESES.get(mes_nombre)
-            
-            if mes:
-                # Determinar el año (si el mes ya pasó este año, asumir año siguiente)
-                anio = hoy.year
-                if mes < hoy.month or (mes == hoy.month and dia_inicio < hoy.day):
-                    # Si hablan de un mes pasado, podría ser el año actual o pasado
-                    # Por simplicidad, usar año actual
-                    pass
-                
-                self.fecha_inicio = datetime(anio, mes, dia_inicio).date()
-                self.fecha_fin = datetime(anio, mes, dia_fin).date()
-                
-                logger.info(f"📅 Rango detectado: {self.fecha_inicio} a {self.fecha_fin}")
-                return
-        
-        # Patrón: "del X de MES al Y de MES"
-        # Ejemplo: "del 25 de agosto al 5 de septiembre"
-        patron_rango_meses = r'del?\s+(\d{1,2})\s+de\s+(\w+)\s+al?\s+(\d{1,2})\s+de\s+(\w+)'
-        match = re.search(patron_rango_meses, texto)
-        
-        if match:
-            dia_inicio = int(match.group(1))
-            mes_inicio_nombre = match.group(2)
-            dia_fin = int(match.group(3))
-            mes_fin_nombre = match.group(4)
-            
-            mes_inicio = self.MESES.get(mes_inicio_nombre)
-            mes_fin = self.MESES.get(mes_fin_nombre)
-            
-            if mes_inicio and mes_fin:
-                anio = hoy.year
-                self.fecha_inicio = datetime(anio, mes_inicio, dia_inicio).date()
-                self.fecha_fin = datetime(anio, mes_fin, dia_fin).date()
-                
-                logger.info(f"📅 Rango detectado: {self.fecha_inicio} a {self.fecha_fin}")
-                return
-        
-        # Patrón: "esta semana"
-        if 'esta semana' in texto:
-            inicio_semana = hoy - timedelta(days=hoy.weekday())
-            self.fecha_inicio = inicio_semana
-            self.fecha_fin = inicio_semana + timedelta(days=6)
-            logger.info(f"📅 Esta semana: {self.fecha_inicio} a {self.fecha_fin}")
-            return
-        
-        # Patrón: "semana pasada"
-        if 'semana pasada' in texto or 'última semana' in texto:
-            inicio_semana_pasada = hoy - timedelta(days=hoy.weekday() + 7)
-            self.fecha_inicio = inicio_semana_pasada
-            self.fecha_fin = inicio_semana_pasada + timedelta(days=6)
-            logger.info(f"📅 Semana pasada: {self.fecha_inicio} a {self.fecha_fin}")
-            return
-        
-        # Patrón: "este mes"
-        if 'este mes' in texto or 'mes actual' in texto:
-            self.fecha_inicio = hoy.replace(day=1)
-            ultimo_dia = calendar.monthrange(hoy.year, hoy.month)[1]
-            self.fecha_fin = hoy.replace(day=ultimo_dia)
-            logger.info(f"📅 Este mes: {self.fecha_inicio} a {self.fecha_fin}")
-            return
-        
-        # Patrón: "mes pasado"
-        if 'mes pasado' in texto or 'último mes' in texto:
-            primer_dia_mes_pasado = (hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
-            ultimo_dia_mes_pasado = hoy.replace(day=1) - timedelta(days=1)
-            self.fecha_inicio = primer_dia_mes_pasado
-            self.fecha_fin = ultimo_dia_mes_pasado
-            logger.info(f"📅 Mes pasado: {self.fecha_inicio} a {self.fecha_fin}")
-            return
-        
-        # Patrón: "hoy"
-        if 'hoy' in texto:
-            self.fecha_inicio = hoy
-            self.fecha_fin = hoy
-            logger.info(f"📅 Hoy: {self.fecha_inicio}")
-            return
-        
-        # Patrón: "ayer"
-        if 'ayer' in texto:
-            ayer = hoy - timedelta(days=1)
-            self.fecha_inicio = ayer
-            self.fecha_fin = ayer
-            logger.info(f"📅 Ayer: {self.fecha_inicio}")
-            return
-        
-        # Patrón: "últimos X días"
-        patron_ultimos_dias = r'(?:últimos?|ultimo)\s+(\d+)\s+días?'
-        match = re.search(patron_ultimos_dias, texto)
-        if match:
-            dias = int(match.group(1))
-            self.fecha_inicio = hoy - timedelta(days=dias)
-            self.fecha_fin = hoy
-            logger.info(f"📅 Últimos {dias} días: {self.fecha_inicio} a {self.fecha_fin}")
-            return
-        
-        # Patrón: mes específico "de enero", "en febrero"
-        for mes_nombre, mes_num in self.MESES.items():
-            if mes_nombre in texto:
-                anio = hoy.year
-                self.fecha_inicio = datetime(anio, mes_num, 1).date()
-                ultimo_dia = calendar.monthrange(anio, mes_num)[1]
-                self.fecha_fin = datetime(anio, mes_num, ultimo_dia).date()
-                logger.info(f"📅 Mes {mes_nombre}: {self.fecha_inicio} a {self.fecha_fin}")
-                return
-        
-        # Si no se detecta ninguna fecha, usar un rango amplio (últimos 6 meses)
-        logger.warning("⚠️ No se detectó fecha específica, usando últimos 6 meses")
-        self.fecha_inicio = hoy - timedelta(days=180)  # 6 meses atrás
-        self.fecha_fin = hoy
-    
-    def _extraer_filtros(self):
-        """Extrae filtros adicionales del texto."""
-        texto = self.texto_original
-        
-        # Detectar estado (pendiente, completado, cancelado)
-        if 'pendiente' in texto or 'pendientes' in texto:
-            self.filtros_adicionales['estado'] = 'pendiente'
-        elif 'completado' in texto or 'completados' in texto or 'completada' in texto:
-            self.filtros_adicionales['estado'] = 'completado'
-        elif 'cancelado' in texto or 'cancelados' in texto or 'cancelada' in texto:
-            self.filtros_adicionales['estado'] = 'cancelado'
-        
-        # Detectar nombre de paciente (muy básico)
-        # Patrón: "del paciente Juan", "de la paciente María"
-        patron_paciente = r'(?:del?|de la)\s+paciente\s+([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)'
-        match = re.search(patron_paciente, texto, re.IGNORECASE)
-        if match:
-            self.filtros_adicionales['paciente_nombre'] = match.group(1).title()
-        
-        # Detectar monto (para facturas)
-        # Patrón: "mayor a 1000", "menor a 500", "más de 200"
-        patron_monto = r'(?:mayor|mas|más)\s+(?:a|de|que)\s+(\d+)'
-        match = re.search(patron_monto, texto)
-        if match:
-            self.filtros_adicionales['monto_minimo'] = float(match.group(1))
-        
-        patron_monto_menor = r'(?:menor|menos)\s+(?:a|de|que)\s+(\d+)'
-        match = re.search(patron_monto_menor, texto)
-        if match:
-            self.filtros_adicionales['monto_maximo'] = float(match.group(1))
-    
-    def _generar_interpretacion(self):
-        """Genera una descripción legible de lo que se interpretó."""
-        partes = []
-        
-        # Tipo de reporte
-        partes.append(f"Reporte de {self.tipo_reporte}")
-        
-        # Fechas
-        if self.fecha_inicio and self.fecha_fin:
-            if self.fecha_inicio == self.fecha_fin:
-                partes.append(f"del {self.fecha_inicio.strftime('%d/%m/%Y')}")
-            else:
-                # Verificar si es un rango muy amplio (indica búsqueda general)
-                dias_diferencia = (self.fecha_fin - self.fecha_inicio).days
-                if dias_diferencia > 150:  # Más de 5 meses = búsqueda general
-                    partes.append("(todos los registros disponibles)")
-                else:
-                    partes.append(
-                        f"desde el {self.fecha_inicio.strftime('%d/%m/%Y')} "
-                        f"hasta el {self.fecha_fin.strftime('%d/%m/%Y')}"
-                    )
-        
-        # Filtros
-        if self.filtros_adicionales.get('estado'):
-            partes.append(f"con estado: {self.filtros_adicionales['estado']}")
-        
-        if self.filtros_adicionales.get('paciente_nombre'):
-            partes.append(f"del paciente: {self.filtros_adicionales['paciente_nombre']}")
-        
-        if self.filtros_adicionales.get('monto_minimo'):
-            partes.append(f"con monto mayor a ${self.filtros_adicionales['monto_minimo']}")
-        
-        if self.filtros_adicionales.get('monto_maximo'):
-            partes.append(f"con monto menor a ${self.filtros_adicionales['monto_maximo']}")
-        
-        return " ".join(partes)
+
+    def parse_lote(self, textos, hoy=None):
+        """Interpreta varios comandos con la misma fecha de referencia."""
+        hoy = hoy or timezone.localdate()
+        return [self.parse(texto, hoy=hoy) for texto in textos]
+
+    @staticmethod
+    def cache_info():
+        """Aciertos/fallos de la caché de interpretaciones del proceso."""
+        info = _interpretar.cache_info()
+        return {
+            'aciertos': info.hits,
+            'fallos': info.misses,
+            'tamano': info.currsize,
+            'maximo': info.maxsize,
+        }
+
+    @staticmethod
+    def limpiar_cache():
+        _interpretar.cache_clear()
+
+
+_parser = VoiceReportParser()
 
 
 def parse_voice_command(texto):
     """
     Función helper para parsear comandos de voz.
-    
+
     Args:
         texto (str): Comando de voz transcrito
-        
+
     Returns:
         dict: Información parseada
     """
-    parser = VoiceReportParser()
-    return parser.parse(texto)
+    return _parser.parse(texto)
@@ -0,0 +1,236 @@
+# reportes/paginacion.py
+"""
+Paginación por cursor (keyset) para reportes con orden configurable.
+
+En vez de OFFSET (que obliga a la BD a recorrer y descartar todas las filas
+anteriores), cada página filtra a partir del último registro devuelto:
+
+    ORDER BY columna, pk  +  WHERE (columna > v) OR (columna = v AND pk > id)
+
+El cursor es opaco para el cliente: base64 de [valor_columna, pk].
+Las columnas usadas para ordenar no deben ser NULL (usar Coalesce).
+
+KeysetPagination adapta lo mismo a un pagination_class de DRF (sin
+COUNT(*) por página; total aproximado opcional del planner).
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import connection
+from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+LIMITE_MAXIMO = 1000
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder recorta los datetime a milisegundos; el cursor
+    necesita el valor exacto para no repetir ni saltar filas."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valor, pk):
+    crudo = json.dumps([valor, pk], cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve (valor, pk). ValueError si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valor, pk = json.loads(base64.urlsafe_b64decode(token + relleno).decode('utf-8'))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    return valor, pk
+
+
+def parse_orden(valor, columnas, default):
+    """
+    '-total_gastado' -> ('total_gastado', True). ValueError si la columna
+    no está entre las permitidas.
+    """
+    valor = (valor or default).strip()
+    descendente = valor.startswith('-')
+    columna = valor.lstrip('-')
+    if columna not in columnas:
+        raise ValueError(f"Orden inválido: '{columna}'. Use: {', '.join(columnas)}")
+    return columna, descendente
+
+
+def parse_limite(valor, default=100):
+    """Tamaño de página entre 1 y LIMITE_MAXIMO. ValueError si no es entero."""
+    if valor in (None, ''):
+        return default
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError('limite debe ser un número entero')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def ordenar(queryset, campo, descendente, pk='pk'):
+    """Orden total (campo, pk) requerido por el keyset."""
+    prefijo = '-' if descendente else ''
+    return queryset.order_by(f'{prefijo}{campo}', f'{prefijo}{pk}')
+
+
+def _campo_modelo(queryset, campo):
+    """Campo (o output_field de la anotación) por el que se ordena; None si no se resuelve."""
+    anotacion = queryset.query.annotations.get(campo)
+    if anotacion is not None:
+        return anotacion.output_field
+    opts = queryset.model._meta
+    resultado = None
+    try:
+        for parte in campo.split('__'):
+            resultado = opts.pk if parte == 'pk' else opts.get_field(parte)
+            if resultado.is_relation and resultado.related_model:
+                opts = resultado.related_model._meta
+    except FieldDoesNotExist:
+        return None
+    return resultado if hasattr(resultado, 'to_python') else None
+
+
+def _convertir(queryset, campo, valor):
+    """
+    Convierte un valor del cursor al tipo de la columna. Un cursor alterado
+    (p. ej. 'zzz' en una fecha) da ValueError en vez de un error de la BD.
+    """
+    if valor is None:
+        raise ValueError('Cursor inválido')
+    modelo = _campo_modelo(queryset, campo)
+    if modelo is None:
+        return valor
+    try:
+        return modelo.to_python(valor)
+    except (DjangoValidationError, TypeError, ValueError):
+        raise ValueError('Cursor inválido')
+
+
+def aplicar_cursor(queryset, campo, descendente, cursor, pk='pk'):
+    """Filtra las filas posteriores al cursor según el orden (campo, pk)."""
+    valor, ultimo_pk = decodificar_cursor(cursor)
+    valor = _convertir(queryset, campo, valor)
+    ultimo_pk = _convertir(queryset, pk, ultimo_pk)
+    op = 'lt' if descendente else 'gt'
+    return queryset.filter(
+        Q(**{f'{campo}__{op}': valor}) | Q(**{campo: valor, f'{pk}__{op}': ultimo_pk})
+    )
+
+
+def _valor(fila, campo):
+    return fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+
+
+def paginar(queryset, campo, descendente, limite, cursor=None, pk='pk'):
+    """
+    Devuelve (filas, siguiente_cursor) de un queryset de modelos o .values()
+    (que incluya `campo` y `pk`). Una sola consulta: pide limite + 1 filas
+    para saber si hay más.
+    """
+    queryset = ordenar(queryset, campo, descendente, pk)
+    if cursor:
+        queryset = aplicar_cursor(queryset, campo, descendente, cursor, pk)
+
+    filas = list(queryset[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(_valor(ultima, campo), _valor(ultima, pk))
+    return filas, siguiente
+
+
+def total_estimado(queryset):
+    """
+    Filas estimadas por el planner (EXPLAIN) en vez de COUNT(*): no recorre
+    la tabla. Fuera de PostgreSQL devuelve el conteo exacto.
+    """
+    queryset = queryset.order_by()
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (campo, pk) para ViewSets de DRF.
+
+    ?limite=N      tamaño de página (1..LIMITE_MAXIMO)
+    ?cursor=...    valor de `siguiente_cursor` de la página anterior
+    ?total=1       agrega `total_aproximado` (estimación del planner)
+
+    Solo avanza: para volver atrás el cliente guarda los cursores previos.
+    """
+    campo = 'fecha_hora'
+    descendente = True
+    page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            limite = parse_limite(request.query_params.get('limite'), self.page_size)
+            consulta = ordenar(queryset, self.campo, self.descendente)
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                consulta = aplicar_cursor(consulta, self.campo, self.descendente, cursor)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+
+        self.total_aproximado = None
+        if request.query_params.get('total') in ('1', 'true', 'aprox'):
+            self.total_aproximado = total_estimado(queryset)
+
+        filas = list(consulta[:limite + 1])
+        self.siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            ultima = filas[-1]
+            self.siguiente = codificar_cursor(getattr(ultima, self.campo), ultima.pk)
+        return filas
+
+    def get_next_link(self):
+        if not self.siguiente:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', self.siguiente)
+
+    def get_paginated_response(self, data):
+        contenido = {
+            'next': self.get_next_link(),
+            'siguiente_cursor': self.siguiente,
+            'results': data,
+        }
+        if self.total_aproximado is not None:
+            contenido['total_aproximado'] = self.total_aproximado
+        response = Response(contenido)
+        if self.siguiente:
+            response['X-Next-Cursor'] = self.siguiente
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'siguiente_cursor': {'type': 'string', 'nullable': True},
+                'total_aproximado': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,199 @@
+# reportes/particiones.py
+"""
+Particionado mensual de la bitácora (PostgreSQL, particionado declarativo).
+
+reportes_bitacora_accion es una tabla PARTITION BY RANGE (fecha_hora) con
+una partición por mes (reportes_bitacora_accion_pAAAA_MM) y una partición
+DEFAULT que recibe lo que caiga fuera de los meses creados. Un filtro por
+fecha_hora (rango, no fecha_hora__date) solo lee las particiones del rango.
+
+Notas:
+- PostgreSQL exige que la PK incluya la columna de partición: en la BD la
+  PK es (id, fecha_hora). Para Django `id` sigue siendo la PK (el identity
+  la mantiene única).
+- El comando mantener_particiones_bitacora crea los meses siguientes y
+  archiva (JSONL comprimido en el storage, por tenant) y elimina los meses
+  fuera de BITACORA_RETENCION_MESES.
+- Todas las funciones operan sobre el schema activo de la conexión.
+"""
+
+import gzip
+import logging
+import re
+import tempfile
+from datetime import date
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .aggregations import rango_mes
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'reportes_bitacora_accion'
+PARTICION_DEFAULT = f'{TABLA}_default'
+_PATRON_PARTICION = re.compile(rf'^{TABLA}_p(\d{{4}})_(\d{{2}})$')
+
+
+# --- utilidades de meses -----------------------------------------------------
+
+def sumar_meses(mes, cantidad):
+    """Primer día del mes desplazado `cantidad` meses."""
+    indice = mes.year * 12 + mes.month - 1 + cantidad
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def mes_actual():
+    hoy = timezone.localdate()
+    return date(hoy.year, hoy.month, 1)
+
+
+def nombre_particion(mes):
+    return f'{TABLA}_p{mes.year}_{mes.month:02d}'
+
+
+def _literal(valor):
+    # Los límites se generan aquí (nunca vienen del usuario)
+    return f"'{valor.isoformat()}'"
+
+
+# --- consultas al catálogo ---------------------------------------------------
+
+def soportado():
+    return connection.vendor == 'postgresql'
+
+
+def _existe(cursor, nombre):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [nombre])
+    return cursor.fetchone()[0]
+
+
+def es_particionada(cursor):
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", [TABLA]
+    )
+    fila = cursor.fetchone()
+    return bool(fila and fila[0])
+
+
+def listar_particiones(cursor):
+    """[(nombre, mes)] de las particiones mensuales, ordenadas por mes."""
+    cursor.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        [TABLA]
+    )
+    particiones = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = _PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            particiones.append((nombre, date(int(coincidencia[1]), int(coincidencia[2]), 1)))
+    return sorted(particiones, key=lambda p: p[1])
+
+
+def filas_en_default(cursor):
+    cursor.execute(f'SELECT count(*) FROM {PARTICION_DEFAULT}')
+    return cursor.fetchone()[0]
+
+
+# --- creación de particiones -------------------------------------------------
+
+def crear_particion(cursor, mes):
+    """
+    Crea la partición del mes si no existe. Si la partición DEFAULT ya tiene
+    filas de ese mes, las mueve a la nueva partición. Devuelve True si la creó.
+    """
+    nombre = nombre_particion(mes)
+    if _existe(cursor, nombre):
+        return False
+
+    inicio, fin = rango_mes(mes.year, mes.month)
+    limites = f'FOR VALUES FROM ({_literal(inicio)}) TO ({_literal(fin)})'
+    rango = f'fecha_hora >= {_literal(inicio)} AND fecha_hora < {_literal(fin)}'
+
+    with transaction.atomic():
+        tiene_default = _existe(cursor, PARTICION_DEFAULT)
+        if tiene_default:
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFAULT} WHERE {rango})')
+            mover = cursor.fetchone()[0]
+        else:
+            mover = False
+
+        if not mover:
+            cursor.execute(f'CREATE TABLE {nombre} PARTITION OF {TABLA} {limites}')
+            return True
+
+        # PostgreSQL no deja crear una partición cuyo rango tiene filas en la
+        # DEFAULT: se desengancha, se mueven las filas y se vuelve a enganchar.
+        cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFAULT}')
+        cursor.execute(f'CREATE TABLE {nombre} PARTITION OF {TABLA} {limites}')
+        cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {PARTICION_DEFAULT} WHERE {rango}')
+        cursor.execute(f'DELETE FROM {PARTICION_DEFAULT} WHERE {rango}')
+        cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFAULT} DEFAULT')
+        logger.info(f"📦 Filas de {mes:%Y-%m} movidas de {PARTICION_DEFAULT} a {nombre}")
+    return True
+
+
+def asegurar_particiones(cursor, meses_futuros, desde=None):
+    """Crea las particiones desde `desde` (default: mes actual) hasta N meses adelante."""
+    mes = desde or mes_actual()
+    ultimo = sumar_meses(mes_actual(), meses_futuros)
+    creadas = []
+    while mes <= ultimo:
+        if crear_particion(cursor, mes):
+            creadas.append(nombre_particion(mes))
+        mes = sumar_meses(mes, 1)
+    return creadas
+
+
+# --- archivado y retención ---------------------------------------------------
+
+def particiones_vencidas(cursor, retencion_meses):
+    """Particiones de meses anteriores al período de retención."""
+    if not retencion_meses:
+        return []
+    limite = sumar_meses(mes_actual(), -retencion_meses)
+    return [(nombre, mes) for nombre, mes in listar_particiones(cursor) if mes < limite]
+
+
+def ruta_archivo(schema, nombre):
+    return f'bitacora_archivo/{schema}/{nombre}.jsonl.gz'
+
+
+def archivar_particion(cursor, nombre, schema, archivar=True):
+    """
+    Desengancha la partición. Con archivar=True exporta sus filas a JSONL
+    comprimido en el storage y elimina la tabla; si no, la deja como tabla
+    suelta (fuera de las consultas de la bitácora).
+
+    Devuelve (filas, ruta_guardada).
+    """
+    with transaction.atomic():
+        cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+        cursor.execute(f'SELECT count(*) FROM {nombre}')
+        filas = cursor.fetchone()[0]
+        if not archivar:
+            return filas, None
+
+        with tempfile.TemporaryFile() as tmp:
+            # Cursor del lado del servidor: un mes de bitácora no pasa entero por memoria
+            with gzip.GzipFile(fileobj=tmp, mode='wb') as comprimido, \
+                    connection.chunked_cursor() as lector:
+                lector.execute(
+                    f'SELECT row_to_json(t)::text FROM {nombre} t ORDER BY fecha_hora, id'
+                )
+                while True:
+                    bloque = lector.fetchmany(2000)
+                    if not bloque:
+                        break
+                    comprimido.write(''.join(f'{linea}\n' for (linea,) in bloque).encode('utf-8'))
+            tmp.seek(0)
+            ruta = default_storage.save(ruta_archivo(schema, nombre), File(tmp))
+
+        cursor.execute(f'DROP TABLE {nombre}')
+    return filas, ruta
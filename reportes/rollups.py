@@ -0,0 +1,320 @@
+# reportes/rollups.py
+"""
+Mantenimiento de las tablas de resumen diario (rollups) de reportes.
+
+- ResumenDiarioCitas: citas por día, odontólogo y estado.
+- ResumenDiarioPagos: pagos COMPLETADOS por día y método de pago.
+
+Los signals de Cita y Pago (reportes/signals.py) aplican a los resúmenes
+solo la diferencia que produce cada escritura (-1 en la clave anterior, +1
+en la nueva), dentro de la misma transacción. Si el día todavía no está
+cubierto, se reconstruye al confirmar la transacción y la cobertura se
+extiende hasta ese día (ver extender_cobertura). Las escrituras masivas
+(QuerySet.update, bulk_create) no disparan signals: después de ese tipo de
+cargas hay que ejecutar ``python manage.py reconstruir_resumenes``.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from agenda.models import Cita
+from facturacion.models import Pago
+
+from .aggregations import inicio_de_dia
+from .models import ResumenDiarioCitas, ResumenDiarioPagos, CoberturaResumen
+
+logger = logging.getLogger(__name__)
+
+TIPO_CITAS = 'citas'
+TIPO_PAGOS = 'pagos'
+
+# Días que como máximo se reconstruyen para extender la cobertura hasta el
+# día de un cambio (una cita agendada meses adelante no reconstruye el hueco)
+DIAS_MAXIMOS_EXTENSION = 31
+
+
+def _rango_datetime(desde, hasta):
+    return {
+        'gte': inicio_de_dia(desde),
+        'lt': inicio_de_dia(hasta + timedelta(days=1)),
+    }
+
+
+def _calcular_citas(desde, hasta):
+    rango = _rango_datetime(desde, hasta)
+    filas = (
+        Cita.objects
+        .filter(fecha_hora__gte=rango['gte'], fecha_hora__lt=rango['lt'])
+        .order_by()
+        .annotate(dia=TruncDate('fecha_hora'))
+        .values('dia', 'odontologo_id', 'estado')
+        .annotate(n=Count('id'))
+    )
+    return [
+        ResumenDiarioCitas(
+            fecha=f['dia'], odontologo_id=f['odontologo_id'],
+            estado=f['estado'], cantidad=f['n']
+        )
+        for f in filas
+    ]
+
+
+def _calcular_pagos(desde, hasta):
+    rango = _rango_datetime(desde, hasta)
+    filas = (
+        Pago.objects
+        .filter(
+            estado_pago='COMPLETADO',
+            fecha_pago__gte=rango['gte'], fecha_pago__lt=rango['lt']
+        )
+        .order_by()
+        .annotate(dia=TruncDate('fecha_pago'))
+        .values('dia', 'metodo_pago')
+        .annotate(n=Count('id'), total=Sum('monto_pagado'))
+    )
+    return [
+        ResumenDiarioPagos(
+            fecha=f['dia'], metodo_pago=f['metodo_pago'],
+            cantidad=f['n'], total=f['total']
+        )
+        for f in filas
+    ]
+
+
+def _dia(fecha_hora):
+    return timezone.localdate(fecha_hora) if timezone.is_aware(fecha_hora) else fecha_hora.date()
+
+
+def _aporte_cita(valores):
+    """(clave, deltas) con que una cita cuenta en el resumen."""
+    if not (valores['fecha_hora'] and valores['odontologo_id']):
+        return None
+    clave = (_dia(valores['fecha_hora']), valores['odontologo_id'], valores['estado'])
+    return clave, {'cantidad': 1}
+
+
+def _aporte_pago(valores):
+    """(clave, deltas) con que un pago cuenta en el resumen (solo COMPLETADO)."""
+    if valores['estado_pago'] != Pago.EstadoPago.COMPLETADO or not valores['fecha_pago']:
+        return None
+    clave = (_dia(valores['fecha_pago']), valores['metodo_pago'])
+    return clave, {'cantidad': 1, 'total': Decimal(str(valores['monto_pagado']))}
+
+
+_CONFIG = {
+    TIPO_CITAS: {
+        'modelo': ResumenDiarioCitas,
+        'calcular': _calcular_citas,
+        'claves': ['fecha', 'odontologo', 'estado'],
+        'columnas_clave': ['fecha', 'odontologo_id', 'estado'],
+        'valores': ['cantidad'],
+        'campos_origen': ['fecha_hora', 'odontologo_id', 'estado'],
+        'aporte': _aporte_cita,
+    },
+    TIPO_PAGOS: {
+        'modelo': ResumenDiarioPagos,
+        'calcular': _calcular_pagos,
+        'claves': ['fecha', 'metodo_pago'],
+        'columnas_clave': ['fecha', 'metodo_pago'],
+        'valores': ['cantidad', 'total'],
+        'campos_origen': ['fecha_pago', 'metodo_pago', 'estado_pago', 'monto_pagado'],
+        'aporte': _aporte_pago,
+    },
+}
+
+
+def reconstruir(tipo, desde, hasta):
+    """
+    Recalcula el resumen ``tipo`` para [desde, hasta] desde las tablas origen.
+
+    Usa una consulta agrupada para todo el rango, borra las filas del rango y
+    las vuelve a insertar (con upsert por si un signal concurrente ya insertó
+    alguna). Devuelve la cantidad de filas de resumen escritas.
+    """
+    config = _CONFIG[tipo]
+    modelo = config['modelo']
+    filas = config['calcular'](desde, hasta)
+
+    with transaction.atomic():
+        modelo.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        modelo.objects.bulk_create(
+            filas,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=config['claves'],
+            update_fields=config['valores'],
+        )
+    return len(filas)
+
+
+def _extender(cobertura, dia):
+    """
+    Reconstruye el hueco entre la cobertura y `dia` (incluido) y lo suma a la
+    cobertura. Si el hueco supera DIAS_MAXIMOS_EXTENSION no hace nada.
+    """
+    if cobertura.hasta is not None and dia > cobertura.hasta:
+        desde, hasta = cobertura.hasta + timedelta(days=1), dia
+    elif cobertura.desde is not None and dia < cobertura.desde:
+        desde, hasta = dia, cobertura.desde - timedelta(days=1)
+    else:
+        return False
+    if (hasta - desde).days >= DIAS_MAXIMOS_EXTENSION:
+        return False
+
+    reconstruir(cobertura.tipo, desde, hasta)
+    cobertura.desde = None if cobertura.desde is None else min(cobertura.desde, desde)
+    cobertura.hasta = None if cobertura.hasta is None else max(cobertura.hasta, hasta)
+    cobertura.save(update_fields=['desde', 'hasta', 'actualizado'])
+    return True
+
+
+def extender_cobertura(tipo, dia):
+    """
+    Reconstruye `dia` y lo deja cubierto: si no hay cobertura se crea con ese
+    solo día; si está cerca del rango cubierto se reconstruyen también los
+    días intermedios y el rango se extiende hasta él.
+    """
+    with transaction.atomic():
+        cobertura = CoberturaResumen.objects.select_for_update().filter(tipo=tipo).first()
+        if cobertura is None:
+            reconstruir(tipo, dia, dia)
+            CoberturaResumen.objects.create(tipo=tipo, desde=dia, hasta=dia)
+        elif cobertura.cubre(dia, dia):
+            reconstruir(tipo, dia, dia)
+        elif not _extender(cobertura, dia):
+            # Lejos del rango cubierto: el día queda correcto pero sin cubrir
+            reconstruir(tipo, dia, dia)
+
+
+def registrar_cobertura(tipo, desde=None, hasta=None):
+    """
+    Registra el rango reconstruido. Si se solapa o es contiguo con el rango
+    ya cubierto se unen; si no, el nuevo rango reemplaza al anterior.
+    desde/hasta en None significan 'sin límite'.
+    """
+    cobertura, creada = CoberturaResumen.objects.get_or_create(
+        tipo=tipo, defaults={'desde': desde, 'hasta': hasta}
+    )
+    if creada:
+        return cobertura
+
+    contiguo = (
+        (cobertura.hasta is None or desde is None or desde <= cobertura.hasta + timedelta(days=1))
+        and (cobertura.desde is None or hasta is None or hasta >= cobertura.desde - timedelta(days=1))
+    )
+    if contiguo:
+        cobertura.desde = None if (desde is None or cobertura.desde is None) else min(desde, cobertura.desde)
+        cobertura.hasta = None if (hasta is None or cobertura.hasta is None) else max(hasta, cobertura.hasta)
+    else:
+        cobertura.desde, cobertura.hasta = desde, hasta
+    cobertura.save()
+    return cobertura
+
+
+def resumen_disponible(tipo, desde, hasta):
+    """True si el resumen ``tipo`` está completo para todo [desde, hasta]."""
+    cobertura = CoberturaResumen.objects.filter(tipo=tipo).first()
+    return bool(cobertura and cobertura.cubre(desde, hasta))
+
+
+def recalcular_dia(tipo, dia):
+    """Reconstruye un solo día de un resumen y extiende la cobertura (signals)."""
+    try:
+        extender_cobertura(tipo, dia)
+    except Exception as e:
+        # Un fallo en el resumen no debe romper la operación principal;
+        # el comando reconstruir_resumenes lo corrige.
+        logger.error(f"❌ Error actualizando resumen {tipo} del {dia}: {e}", exc_info=True)
+
+
+def programar_recalculo(tipo, *fechas_hora):
+    """
+    Programa la reconstrucción de los días de ``fechas_hora`` cuando se
+    confirme la transacción actual (inmediato si no hay transacción abierta).
+    Para cargas masivas que no disparan signals.
+    """
+    dias = {_dia(fh) for fh in fechas_hora if fh}
+    for dia in dias:
+        transaction.on_commit(lambda dia=dia: recalcular_dia(tipo, dia))
+
+
+def valores_origen(tipo, instancia=None, pk=None):
+    """
+    Valores de la cita/pago que definen su aporte al resumen: los de la
+    instancia en memoria o, con `pk`, los guardados en la base.
+    """
+    campos = _CONFIG[tipo]['campos_origen']
+    if pk is not None:
+        modelo = Cita if tipo == TIPO_CITAS else Pago
+        return modelo.objects.filter(pk=pk).values(*campos).first()
+    return {campo: getattr(instancia, campo) for campo in campos}
+
+
+def _sumar(tipo, clave, deltas):
+    """
+    Suma `deltas` a la fila `clave` del resumen. Los incrementos son un
+    upsert (INSERT ... ON CONFLICT DO UPDATE con la suma); los decrementos,
+    un UPDATE con F(). Devuelve False si la fila a decrementar no existe o
+    quedaría en negativo (el resumen del día no estaba al día).
+    """
+    config = _CONFIG[tipo]
+    modelo = config['modelo']
+    if all(delta >= 0 for delta in deltas.values()):
+        q = connection.ops.quote_name
+        tabla = q(modelo._meta.db_table)
+        columnas = config['columnas_clave'] + list(deltas)
+        sql = (
+            f"INSERT INTO {tabla} ({', '.join(q(c) for c in columnas)}) "
+            f"VALUES ({', '.join(['%s'] * len(columnas))}) "
+            f"ON CONFLICT ({', '.join(q(c) for c in config['columnas_clave'])}) DO UPDATE SET "
+            + ', '.join(f'{q(c)} = {tabla}.{q(c)} + EXCLUDED.{q(c)}' for c in deltas)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*clave, *deltas.values()])
+        return True
+
+    filtro = dict(zip(config['columnas_clave'], clave))
+    filtro['cantidad__gte'] = max(-deltas.get('cantidad', 0), 0)
+    return modelo.objects.filter(**filtro).update(
+        **{campo: F(campo) + delta for campo, delta in deltas.items()}
+    ) > 0
+
+
+def aplicar_cambio(tipo, anterior, actual):
+    """
+    Aplica al resumen la diferencia entre el aporte anterior y el actual de
+    una cita/pago (None si no existía o ya no existe). Los días cubiertos se
+    ajustan en la transacción en curso; los demás (o un ajuste que no cuadra)
+    se reconstruyen al confirmarla.
+    """
+    config = _CONFIG[tipo]
+    cambios = defaultdict(lambda: defaultdict(int))
+    for valores, signo in ((anterior, -1), (actual, 1)):
+        aporte = config['aporte'](valores) if valores else None
+        if aporte:
+            clave, deltas = aporte
+            for campo, delta in deltas.items():
+                cambios[clave][campo] += signo * delta
+
+    cambios = {
+        clave: dict(deltas) for clave, deltas in cambios.items()
+        if any(deltas.values())
+    }
+    if not cambios:
+        return
+
+    cobertura = CoberturaResumen.objects.filter(tipo=tipo).first()
+    a_reconstruir = set()
+    for clave, deltas in cambios.items():
+        dia = clave[0]
+        if not (cobertura and cobertura.cubre(dia, dia)) or not _sumar(tipo, clave, deltas):
+            a_reconstruir.add(dia)
+    for dia in a_reconstruir:
+        transaction.on_commit(lambda dia=dia: recalcular_dia(tipo, dia))
@@ -1,7 +1,7 @@
 # reportes/serializers.py
 
 from rest_framework import serializers
-from .models import BitacoraAccion
+from .models import BitacoraAccion, TrabajoReporte
 
 class ReporteSimpleSerializer(serializers.Serializer):
     """
@@ -217,3 +217,54 @@ class BitacoraSerializer(serializers.ModelSerializer):
         if obj.content_type:
             return obj.content_type.model
         return None
+
+
+class TrabajoReporteSerializer(serializers.ModelSerializer):
+    """
+    Serializer para trabajos de reportes asíncronos.
+    
+    Incluye la URL de descarga cuando el archivo está listo.
+    """
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TrabajoReporte
+        fields = [
+            'id',
+            'endpoint',
+            'parametros',
+            'formato',
+            'estado',
+            'estado_display',
+            'intentos',
+            'error',
+            'nombre_archivo',
+            'tamano_bytes',
+            'url_descarga',
+            'creado',
+            'iniciado',
+            'finalizado',
+            'expira'
+        ]
+        read_only_fields = fields
+    
+    def get_url_descarga(self, obj):
+        """URL de descarga (solo si el trabajo terminó y no expiró)"""
+        if obj.estado != 'COMPLETADO':
+            return None
+        path = f'/api/reportes/trabajos/{obj.id}/descargar/'
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
+
+
+class TrabajoReporteCreateSerializer(serializers.Serializer):
+    """
+    Datos para encolar un reporte:
+    {"endpoint": "reporte-pacientes", "formato": "excel", "parametros": {"orden": "nombre"}}
+    """
+    endpoint = serializers.CharField(
+        help_text="Reporte a ejecutar: 'reporte-pacientes', 'reportes.dashboard_kpis', 'bitacora.exportar'"
+    )
+    formato = serializers.ChoiceField(choices=['pdf', 'excel', 'csv'])
+    parametros = serializers.DictField(required=False, default=dict)
@@ -1,14 +1,22 @@
 """
-Signals para registrar automáticamente acciones en la bitácora.
+Signals para registrar automáticamente acciones en la bitácora
+y mantener las tablas de resumen diario de reportes.
 
 NOTA: Los signals de user_logged_in y user_logged_out no funcionan con JWT.
 El registro de login se hace directamente en CustomTokenObtainPairView.
 """
 
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.db import transaction
 from reportes.models import BitacoraAccion
+from reportes import rollups
+from reportes.cache import invalidar_tenant, schema_actual
+from agenda.models import Cita, HorarioAtencion
+from facturacion.models import Pago, Factura
+from tratamientos.models import PlanDeTratamiento, ItemPlanTratamiento
+from inventario.models import Insumo
 
 
 # Los signals de login/logout están desactivados porque se usa JWT
@@ -33,3 +41,75 @@ def get_client_ip(request):
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
+
+
+# ============================================================================
+# RESÚMENES DIARIOS (ROLLUPS)
+# ============================================================================
+
+@receiver(pre_save, sender=Cita)
+def guardar_valores_anteriores_cita(sender, instance, **kwargs):
+    """Guarda fecha, odontólogo y estado previos de la cita para el resumen."""
+    instance._resumen_anterior = (
+        rollups.valores_origen(rollups.TIPO_CITAS, pk=instance.pk) if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_resumen_citas(sender, instance, **kwargs):
+    """Mueve la cita de su clave anterior del resumen (día, odontólogo, estado) a la actual."""
+    rollups.aplicar_cambio(
+        rollups.TIPO_CITAS,
+        getattr(instance, '_resumen_anterior', None),
+        rollups.valores_origen(rollups.TIPO_CITAS, instance)
+    )
+
+
+@receiver(post_delete, sender=Cita)
+def descontar_resumen_citas(sender, instance, **kwargs):
+    """Descuenta la cita borrada del resumen."""
+    rollups.aplicar_cambio(rollups.TIPO_CITAS, rollups.valores_origen(rollups.TIPO_CITAS, instance), None)
+
+
+@receiver(post_save, sender=Pago)
+def actualizar_resumen_pagos(sender, instance, **kwargs):
+    """
+    Aplica al resumen el cambio del pago (al completarse, anularse o cambiar
+    de monto o método). Pago.save ya leyó los valores anteriores con la fila
+    bloqueada (_valores_guardados).
+    """
+    rollups.aplicar_cambio(
+        rollups.TIPO_PAGOS,
+        getattr(instance, '_valores_guardados', None),
+        rollups.valores_origen(rollups.TIPO_PAGOS, instance)
+    )
+
+
+@receiver(post_delete, sender=Pago)
+def descontar_resumen_pagos(sender, instance, **kwargs):
+    """Descuenta el pago borrado del resumen."""
+    rollups.aplicar_cambio(rollups.TIPO_PAGOS, rollups.valores_origen(rollups.TIPO_PAGOS, instance), None)
+
+
+# ============================================================================
+# INVALIDACIÓN DE LA CACHÉ DE REPORTES
+# ============================================================================
+
+MODELOS_REPORTES = (Cita, Pago, Factura, PlanDeTratamiento, ItemPlanTratamiento, Insumo, HorarioAtencion)
+
+
+def invalidar_cache_reportes(sender, instance, **kwargs):
+    """Invalida la caché de reportes del tenant al confirmar la transacción."""
+    schema = schema_actual()
+    transaction.on_commit(lambda: invalidar_tenant(schema))
+
+
+for _modelo in MODELOS_REPORTES:
+    post_save.connect(
+        invalidar_cache_reportes, sender=_modelo,
+        dispatch_uid=f'invalidar_cache_reportes_save_{_modelo.__name__}'
+    )
+    post_delete.connect(
+        invalidar_cache_reportes, sender=_modelo,
+        dispatch_uid=f'invalidar_cache_reportes_delete_{_modelo.__name__}'
+    )
@@ -0,0 +1,355 @@
+# reportes/sinteticos.py
+"""
+Generador de datos sintéticos para medir el rendimiento de los reportes.
+
+A diferencia de scripts_poblacion/ (que crea fila por fila con el ORM y
+dispara signals), aquí todo se inserta con bulk_create por lotes, así que
+1M de citas se generan en minutos. Los volúmenes salen de un factor de
+escala expresado en número de citas:
+
+    escala=1_000      ->    125 pacientes,   100 planes,    250 facturas
+    escala=100_000    -> 12.500 pacientes, 10.000 planes, 25.000 facturas
+    escala=1_000_000  -> 125.000 pacientes, ...
+
+Los datos son deterministas para una misma semilla. bulk_create no dispara
+signals: al terminar hay que reconstruir los resúmenes diarios e invalidar
+la caché de reportes (el comando generar_datos_sinteticos lo hace).
+
+Usar siempre un tenant dedicado: no hay limpieza selectiva.
+"""
+
+import logging
+import random
+import re
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from agenda.models import Cita, MOTIVOS_CITA_CHOICES
+from facturacion.models import Factura, Pago
+from inventario.models import CategoriaInsumo, Insumo
+from reportes.models import BitacoraAccion
+from tratamientos.models import (
+    CategoriaServicio, Servicio, PlanDeTratamiento, ItemPlanTratamiento
+)
+from usuarios.models import Usuario, PerfilPaciente, PerfilOdontologo
+
+logger = logging.getLogger(__name__)
+
+DOMINIO_EMAIL = 'sintetico.local'
+PASSWORD = 'sintetico123'
+
+NOMBRES = ['Ana', 'Luis', 'María', 'Carlos', 'Sofía', 'Jorge', 'Lucía', 'Diego', 'Valeria', 'Pedro']
+APELLIDOS = ['Rojas', 'Vargas', 'Flores', 'Mamani', 'Quispe', 'Gutiérrez', 'Suárez', 'Torres']
+
+
+def parse_escala(valor):
+    """'1k' -> 1000, '100k' -> 100000, '1m' -> 1000000, '2500' -> 2500."""
+    coincidencia = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*', str(valor))
+    if not coincidencia:
+        raise ValueError(f"Escala inválida: '{valor}'. Use p. ej. 1k, 100k, 1m")
+    numero, sufijo = coincidencia.groups()
+    multiplicador = {'': 1, 'k': 1_000, 'm': 1_000_000}[sufijo.lower()]
+    escala = int(float(numero) * multiplicador)
+    if escala < 1:
+        raise ValueError('La escala debe ser mayor a 0')
+    return escala
+
+
+def volumenes(escala):
+    """Cantidad de filas por tabla para un número de citas."""
+    return {
+        'odontologos': min(max(3, escala // 2_000), 200),
+        'pacientes': max(10, escala // 8),
+        'citas': escala,
+        'planes': max(5, escala // 10),
+        'facturas': max(5, escala // 4),
+        'bitacora': max(10, escala // 2),
+    }
+
+
+@contextmanager
+def sin_auto_now_add(*campos):
+    """
+    Desactiva auto_now_add en (modelo, campo) para poder insertar fechas
+    históricas con bulk_create.
+    """
+    originales = []
+    for modelo, nombre in campos:
+        campo = modelo._meta.get_field(nombre)
+        originales.append((campo, campo.auto_now_add))
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, valor in originales:
+            campo.auto_now_add = valor
+
+
+class GeneradorSintetico:
+    """
+    Inserta un tenant completo de datos sintéticos.
+
+    generador = GeneradorSintetico(escala=100_000, semilla=42)
+    generador.generar()          # -> {'citas': 100000, 'pacientes': 12500, ...}
+    """
+
+    def __init__(self, escala, semilla=42, dias=730, lote=5_000, progreso=None):
+        self.escala = escala
+        self.volumen = volumenes(escala)
+        self.random = random.Random(semilla)
+        self.lote = lote
+        self.progreso = progreso or (lambda mensaje: logger.info(mensaje))
+        self.ahora = timezone.now()
+        self.inicio = self.ahora - timedelta(days=dias)
+        self.dias = dias
+        # Prefijo para que dos corridas en el mismo tenant no choquen en emails/códigos
+        self.prefijo = f'{semilla}{self.ahora:%H%M%S}'
+        self.insertados = {}
+
+    # --- utilidades -------------------------------------------------------
+
+    def _lotes(self, total):
+        """Rangos [inicio, fin) de tamaño self.lote."""
+        for inicio in range(0, total, self.lote):
+            yield inicio, min(inicio + self.lote, total)
+
+    def _insertar(self, modelo, objetos, clave):
+        creados = modelo.objects.bulk_create(objetos, batch_size=self.lote)
+        self.insertados[clave] = self.insertados.get(clave, 0) + len(creados)
+        return creados
+
+    def _fecha_pasada(self):
+        """Fecha/hora aleatoria en horario de atención dentro de la ventana."""
+        dia = self.inicio + timedelta(days=self.random.randrange(self.dias))
+        hora = self.random.randrange(9 * 2, 18 * 2)  # medias horas de 9:00 a 17:30
+        return timezone.make_aware(
+            datetime.combine(timezone.localtime(dia).date(), time(hora // 2, (hora % 2) * 30))
+        )
+
+    def _nombre(self):
+        return self.random.choice(NOMBRES), self.random.choice(APELLIDOS)
+
+    # --- generación -------------------------------------------------------
+
+    def generar(self):
+        campos_fecha = (
+            (Usuario, 'date_joined'),
+            (PlanDeTratamiento, 'fecha_creacion'),
+            (ItemPlanTratamiento, 'creado'),
+            (Factura, 'fecha_emision'),
+            (Pago, 'fecha_pago'),
+        )
+        with sin_auto_now_add(*campos_fecha):
+            self._catalogos()
+            self._usuarios()
+            self._citas()
+            self._planes()
+            self._facturas()
+            self._bitacora()
+        return self.insertados
+
+    def _catalogos(self):
+        categorias = self._insertar(CategoriaServicio, [
+            CategoriaServicio(nombre=f'Categoría {self.prefijo}-{i}', orden=i) for i in range(6)
+        ], 'categorias_servicio')
+        self.servicios = self._insertar(Servicio, [
+            Servicio(
+                categoria=categorias[i % len(categorias)],
+                codigo_servicio=f'SIN-{self.prefijo}-{i:03d}',
+                nombre=f'Servicio sintético {i}',
+                precio_base=Decimal(self.random.randrange(20, 600)),
+                tiempo_estimado=self.random.choice([30, 45, 60, 90]),
+            )
+            for i in range(30)
+        ], 'servicios')
+
+        categorias_insumo = self._insertar(CategoriaInsumo, [
+            CategoriaInsumo(nombre=f'Insumos {self.prefijo}-{i}') for i in range(5)
+        ], 'categorias_insumo')
+        insumos = []
+        for i in range(60):
+            costo = Decimal(self.random.randrange(1, 200))
+            insumos.append(Insumo(
+                categoria=categorias_insumo[i % len(categorias_insumo)],
+                codigo=f'INS-{self.prefijo}-{i:03d}',
+                nombre=f'Insumo sintético {i}',
+                precio_costo=costo,
+                precio_venta=costo * Decimal('1.30'),
+                stock_actual=Decimal(self.random.randrange(0, 500)),
+                stock_minimo=Decimal(self.random.randrange(5, 50)),
+            ))
+        self._insertar(Insumo, insumos, 'insumos')
+        self.progreso('📦 Catálogos creados')
+
+    def _usuarios(self):
+        password = make_password(PASSWORD)
+
+        def usuarios(tipo, cantidad, etiqueta):
+            creados = []
+            for desde, hasta in self._lotes(cantidad):
+                lote = []
+                for i in range(desde, hasta):
+                    nombre, apellido = self._nombre()
+                    lote.append(Usuario(
+                        email=f'{etiqueta}{self.prefijo}_{i}@{DOMINIO_EMAIL}',
+                        nombre=nombre,
+                        apellido=apellido,
+                        telefono=f'7{self.random.randrange(1_000_000, 9_999_999)}',
+                        tipo_usuario=tipo,
+                        is_staff=tipo == Usuario.TipoUsuario.ODONTOLOGO,
+                        password=password,
+                        date_joined=self._fecha_pasada(),
+                    ))
+                creados.extend(u.pk for u in self._insertar(Usuario, lote, 'usuarios'))
+            return creados
+
+        # Administrador con el que el benchmark ejecuta los reportes
+        self._insertar(Usuario, [Usuario(
+            email=f'admin{self.prefijo}@{DOMINIO_EMAIL}', nombre='Admin', apellido='Benchmark',
+            tipo_usuario=Usuario.TipoUsuario.ADMIN, is_staff=True, password=password,
+            date_joined=self.inicio,
+        )], 'usuarios')
+
+        ids = usuarios(Usuario.TipoUsuario.ODONTOLOGO, self.volumen['odontologos'], 'odontologo')
+        self._insertar(PerfilOdontologo, [PerfilOdontologo(usuario_id=pk) for pk in ids], 'odontologos')
+        self.odontologos = ids
+
+        ids = usuarios(Usuario.TipoUsuario.PACIENTE, self.volumen['pacientes'], 'paciente')
+        for desde, hasta in self._lotes(len(ids)):
+            self._insertar(PerfilPaciente, [
+                PerfilPaciente(
+                    usuario_id=pk,
+                    fecha_de_nacimiento=(self.ahora - timedelta(days=self.random.randrange(6_000, 30_000))).date(),
+                )
+                for pk in ids[desde:hasta]
+            ], 'pacientes')
+        self.pacientes = ids
+        self.progreso(f'👥 {len(self.odontologos)} odontólogos y {len(self.pacientes)} pacientes')
+
+    def _citas(self):
+        motivos = [codigo for codigo, _ in MOTIVOS_CITA_CHOICES]
+        pesos_motivo = [45, 10, 20, 15, 10]
+        for desde, hasta in self._lotes(self.volumen['citas']):
+            lote = []
+            for _ in range(desde, hasta):
+                # 90% en el pasado, 10% agendadas en los próximos 30 días
+                if self.random.random() < 0.9:
+                    fecha_hora = self._fecha_pasada()
+                    estado = self.random.choices(
+                        ['ATENDIDA', 'CANCELADA', 'CONFIRMADA', 'PENDIENTE'], [70, 15, 5, 10]
+                    )[0]
+                else:
+                    fecha_hora = self.ahora + timedelta(
+                        days=self.random.randrange(1, 30), minutes=30 * self.random.randrange(0, 18)
+                    )
+                    estado = self.random.choice(['PENDIENTE', 'CONFIRMADA'])
+                lote.append(Cita(
+                    paciente_id=self.random.choice(self.pacientes),
+                    odontologo_id=self.random.choice(self.odontologos),
+                    fecha_hora=fecha_hora,
+                    motivo_tipo=self.random.choices(motivos, pesos_motivo)[0],
+                    motivo='Cita sintética',
+                    estado=estado,
+                    pagada=estado == 'ATENDIDA' and self.random.random() < 0.8,
+                ))
+            self._insertar(Cita, lote, 'citas')
+            self.progreso(f'📅 Citas: {hasta}/{self.volumen["citas"]}')
+
+    def _planes(self):
+        estados_plan = [e for e, _ in PlanDeTratamiento.EstadoPlan.choices if e != 'aprobado']
+        for desde, hasta in self._lotes(self.volumen['planes']):
+            planes = self._insertar(PlanDeTratamiento, [
+                PlanDeTratamiento(
+                    paciente_id=self.random.choice(self.pacientes),
+                    odontologo_id=self.random.choice(self.odontologos),
+                    titulo=f'Plan sintético {i}',
+                    estado=self.random.choice(estados_plan),
+                    fecha_creacion=self._fecha_pasada(),
+                )
+                for i in range(desde, hasta)
+            ], 'planes')
+
+            items = []
+            for plan in planes:
+                for orden in range(1, self.random.randint(1, 5) + 1):
+                    servicio = self.random.choice(self.servicios)
+                    completado = plan.estado == 'completado' or (
+                        plan.estado == 'en_progreso' and self.random.random() < 0.5
+                    )
+                    items.append(ItemPlanTratamiento(
+                        plan=plan,
+                        servicio=servicio,
+                        precio_servicio_snapshot=servicio.precio_base,
+                        precio_materiales_fijos_snapshot=Decimal(self.random.randrange(0, 40)),
+                        estado='COMPLETADO' if completado else 'PENDIENTE',
+                        orden=orden,
+                        fecha_realizada=plan.fecha_creacion + timedelta(days=7 * orden) if completado else None,
+                        creado=plan.fecha_creacion,
+                    ))
+            self._insertar(ItemPlanTratamiento, items, 'items_plan')
+            self.progreso(f'🦷 Planes: {hasta}/{self.volumen["planes"]}')
+
+    def _facturas(self):
+        metodos = [m for m, _ in Pago.MetodoPago.choices]
+        for desde, hasta in self._lotes(self.volumen['facturas']):
+            facturas = []
+            for _ in range(desde, hasta):
+                total = Decimal(self.random.randrange(5_000, 200_000)) / 100
+                estado = self.random.choices(['PAGADA', 'PENDIENTE', 'ANULADA'], [60, 30, 10])[0]
+                if estado == 'PAGADA':
+                    pagado = total
+                elif estado == 'PENDIENTE' and self.random.random() < 0.4:
+                    pagado = (total * Decimal(self.random.randrange(10, 90)) / 100).quantize(Decimal('0.01'))
+                else:
+                    pagado = Decimal('0.00')
+                facturas.append(Factura(
+                    paciente_id=self.random.choice(self.pacientes),
+                    monto_total=total,
+                    monto_pagado=pagado,
+                    estado=estado,
+                    fecha_emision=self._fecha_pasada(),
+                ))
+            facturas = self._insertar(Factura, facturas, 'facturas')
+
+            pagos = []
+            for factura in facturas:
+                if not factura.monto_pagado:
+                    continue
+                # Pagada en una o dos cuotas
+                cuotas = [factura.monto_pagado]
+                if factura.monto_pagado > 100 and self.random.random() < 0.3:
+                    primera = (factura.monto_pagado / 2).quantize(Decimal('0.01'))
+                    cuotas = [primera, factura.monto_pagado - primera]
+                for n, monto in enumerate(cuotas):
+                    fecha = min(factura.fecha_emision + timedelta(days=n * 15), self.ahora)
+                    pagos.append(Pago(
+                        factura=factura,
+                        paciente_id=factura.paciente_id,
+                        monto_pagado=monto,
+                        metodo_pago=self.random.choice(metodos),
+                        estado_pago='COMPLETADO',
+                        fecha_pago=fecha,
+                        fecha_completado=fecha,
+                    ))
+            self._insertar(Pago, pagos, 'pagos')
+            self.progreso(f'💵 Facturas: {hasta}/{self.volumen["facturas"]}')
+
+    def _bitacora(self):
+        acciones = [a for a, _ in BitacoraAccion.ACCION_CHOICES]
+        usuarios = self.odontologos + self.pacientes[:1_000]
+        for desde, hasta in self._lotes(self.volumen['bitacora']):
+            self._insertar(BitacoraAccion, [
+                BitacoraAccion(
+                    usuario_id=self.random.choice(usuarios),
+                    accion=self.random.choice(acciones),
+                    descripcion=f'Acción sintética {i}',
+                    fecha_hora=self._fecha_pasada(),
+                    ip_address=f'10.0.{self.random.randrange(256)}.{self.random.randrange(256)}',
+                )
+                for i in range(desde, hasta)
+            ], 'bitacora')
+        self.progreso(f'📝 Bitácora: {self.volumen["bitacora"]} registros')
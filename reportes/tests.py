@@ -1,3 +1,89 @@
-from django.test import TestCase
+"""
+Tests del endpoint de reportes por voz (reportes/voice_views.py): filtros
+por estado y token de continuación; y de la exportación CSV en streaming.
+"""
 
-# Create your tests here.
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .utils import StreamingCSVReport
+from .voice_views import VIGENCIA_CONTINUACION, VoiceReportQueryView
+
+
+def _estados_filtrados(queryset):
+    return [
+        hijo.rhs for hijo in queryset.query.where.children
+        if getattr(hijo.lhs, 'target', None) is not None and hijo.lhs.target.name == 'estado'
+    ]
+
+
+class FiltroEstadoVozTests(SimpleTestCase):
+
+    def setUp(self):
+        self.vista = VoiceReportQueryView()
+
+    def test_estados_de_citas_usan_los_del_modelo(self):
+        esperados = {'pendiente': 'PENDIENTE', 'completado': 'ATENDIDA', 'cancelado': 'CANCELADA'}
+        for estado, esperado in esperados.items():
+            with self.subTest(estado=estado):
+                queryset = self.vista._consulta_citas(None, {'estado': estado})[0]
+                self.assertEqual(_estados_filtrados(queryset), [esperado])
+
+    def test_estados_de_facturas_usan_los_del_modelo(self):
+        esperados = {'pendiente': 'PENDIENTE', 'completado': 'PAGADA', 'cancelado': 'ANULADA'}
+        for estado, esperado in esperados.items():
+            with self.subTest(estado=estado):
+                queryset = self.vista._consulta_facturas(None, {'estado': estado})[0]
+                self.assertEqual(_estados_filtrados(queryset), [esperado])
+
+    def test_estado_desconocido_no_devuelve_filas(self):
+        queryset = self.vista._consulta_citas(None, {'estado': 'reprogramado'})[0]
+        self.assertTrue(queryset.query.is_empty())
+
+
+class ContinuacionVozTests(SimpleTestCase):
+
+    def setUp(self):
+        self.vista = VoiceReportQueryView()
+
+    def test_token_vigente_devuelve_interpretacion_y_cursor(self):
+        token = self.vista._continuacion({'tipo_reporte': 'citas'}, 'cursor-1')
+        self.assertEqual(self.vista._leer_continuacion(token), ({'tipo_reporte': 'citas'}, 'cursor-1'))
+
+    def test_token_alterado_es_invalido(self):
+        token = self.vista._continuacion({'tipo_reporte': 'citas'}, 'cursor-1')
+        with self.assertRaisesMessage(ValueError, 'inválido'):
+            self.vista._leer_continuacion(token[:-2] + 'xx')
+
+    def test_token_vencido(self):
+        emitido = time.time() - VIGENCIA_CONTINUACION - 1
+        with mock.patch('django.core.signing.time.time', return_value=emitido):
+            token = self.vista._continuacion({'tipo_reporte': 'citas'}, 'cursor-1')
+        with self.assertRaisesMessage(ValueError, 'vencido'):
+            self.vista._leer_continuacion(token)
+
+
+class ExportacionCSVTests(SimpleTestCase):
+
+    def _csv(self, headers, rows):
+        response = StreamingCSVReport('Prueba', headers, rows).generate()
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_celdas_que_empiezan_como_formula_quedan_como_texto(self):
+        contenido = self._csv(
+            ['nombre', 'nota'],
+            [['=HYPERLINK("http://x")', '+1'], ['-2+3', '@SUM(A1)'], ['Ana', 'normal']],
+        )
+        self.assertEqual(contenido.splitlines(), [
+            'nombre,nota',
+            '"\'=HYPERLINK(""http://x"")",\'+1',
+            "'-2+3,'@SUM(A1)",
+            'Ana,normal',
+        ])
+
+    def test_numeros_negativos_no_se_modifican(self):
+        contenido = self._csv(['monto'], [[-50], [Decimal('-12.50')]])
+        self.assertEqual(contenido.splitlines(), ['monto', '-50', '-12.50'])
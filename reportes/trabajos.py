@@ -0,0 +1,302 @@
+# reportes/trabajos.py
+"""
+Cola de trabajos de reportes en segundo plano.
+
+Flujo:
+1. encolar() crea un TrabajoReporte PENDIENTE (desde la API o desde
+   _export_report cuando el reporte supera REPORTES_FILAS_ASINCRONO filas).
+2. El comando procesar_trabajos_reportes reclama trabajos con
+   SELECT ... FOR UPDATE SKIP LOCKED (varios workers no se pisan),
+   ejecuta la acción del ViewSet con una request interna y guarda el
+   archivo en el storage, separado por tenant. Mientras lo ejecuta, un
+   hilo renueva la reserva del trabajo (reservado_hasta); solo si la
+   reserva vence (el worker murió) el trabajo vuelve a la cola.
+3. El cliente consulta el estado y descarga el archivo hasta que expira.
+"""
+
+import logging
+import os
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_tenants.utils import schema_context
+
+from .models import TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+# Recursos que pueden ejecutarse como trabajo: nombre -> ViewSet
+RECURSOS = {
+    'reportes': 'reportes.views.ReportesViewSet',
+    'bitacora': 'reportes.views.BitacoraViewSet',
+}
+
+FORMATOS = ('pdf', 'excel', 'csv')
+
+
+def identificador_worker():
+    """host:pid del proceso actual."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def acciones_disponibles():
+    """
+    Acciones GET exportables por recurso: {'reportes': {'dashboard-kpis': 'dashboard_kpis', ...}}
+    Se aceptan tanto el url_path como el nombre del método.
+    """
+    disponibles = {}
+    for recurso, ruta in RECURSOS.items():
+        vista = import_string(ruta)
+        acciones = {}
+        for accion in vista.get_extra_actions():
+            if accion.detail or 'get' not in accion.mapping:
+                continue
+            acciones[accion.url_path] = accion.__name__
+            acciones[accion.__name__] = accion.__name__
+        disponibles[recurso] = acciones
+    return disponibles
+
+
+def normalizar_endpoint(valor):
+    """
+    Convierte 'reporte-pacientes', 'reportes/reporte-pacientes' o
+    'bitacora.exportar' en '<recurso>.<metodo>'. ValueError si no existe.
+    """
+    valor = (valor or '').strip().strip('/')
+    if '.' in valor:
+        recurso, accion = valor.split('.', 1)
+    elif '/' in valor:
+        recurso, accion = valor.split('/', 1)
+    else:
+        recurso, accion = 'reportes', valor
+
+    acciones = acciones_disponibles().get(recurso, {})
+    if accion not in acciones:
+        raise ValueError(f"Reporte desconocido: '{valor}'")
+    return f'{recurso}.{acciones[accion]}'
+
+
+def encolar(usuario, endpoint, parametros, formato):
+    """Crea un trabajo PENDIENTE. Los parámetros se guardan como listas."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: '{formato}'. Use {', '.join(FORMATOS)}")
+
+    if isinstance(parametros, QueryDict):
+        parametros = {k: parametros.getlist(k) for k in parametros.keys()}
+    parametros = {
+        k: v if isinstance(v, list) else [v]
+        for k, v in (parametros or {}).items()
+        if k != 'formato'
+    }
+
+    trabajo = TrabajoReporte.objects.create(
+        usuario=usuario,
+        endpoint=normalizar_endpoint(endpoint),
+        parametros=parametros,
+        formato=formato,
+    )
+    logger.info(f"📥 Trabajo de reporte #{trabajo.id} encolado: {trabajo.endpoint} ({formato})")
+    return trabajo
+
+
+def _vencimiento_reserva():
+    return timezone.now() + timedelta(seconds=settings.REPORTES_TRABAJOS_RESERVA_SEGUNDOS)
+
+
+def reclamar_siguiente(worker=None):
+    """
+    Toma el trabajo PENDIENTE más antiguo y lo marca PROCESANDO, reservado
+    para este worker durante REPORTES_TRABAJOS_RESERVA_SEGUNDOS.
+
+    FOR UPDATE SKIP LOCKED hace que workers concurrentes salten las filas
+    que otro ya está reclamando en vez de esperar. Devuelve None si no hay.
+    """
+    with transaction.atomic():
+        trabajo = (
+            TrabajoReporte.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado='PENDIENTE')
+            .order_by('creado')
+            .first()
+        )
+        if trabajo is None:
+            return None
+        trabajo.estado = 'PROCESANDO'
+        trabajo.iniciado = timezone.now()
+        trabajo.intentos += 1
+        trabajo.worker = worker or identificador_worker()
+        trabajo.reservado_hasta = _vencimiento_reserva()
+        trabajo.save(update_fields=['estado', 'iniciado', 'intentos', 'worker', 'reservado_hasta'])
+    return trabajo
+
+
+def renovar_reserva(trabajo):
+    """
+    Extiende la reserva del trabajo si sigue PROCESANDO en este worker.
+    False si ya no le pertenece (se reencoló o lo tomó otro worker).
+    """
+    return bool(
+        TrabajoReporte.objects
+        .filter(pk=trabajo.pk, estado='PROCESANDO', worker=trabajo.worker)
+        .update(reservado_hasta=_vencimiento_reserva())
+    )
+
+
+@contextmanager
+def latido(trabajo, schema):
+    """
+    Renueva la reserva del trabajo desde un hilo mientras dura el bloque
+    (cuatro veces por período de reserva).
+    """
+    parar = threading.Event()
+    intervalo = max(settings.REPORTES_TRABAJOS_RESERVA_SEGUNDOS / 4, 1)
+
+    def bucle():
+        try:
+            with schema_context(schema):
+                while not parar.wait(intervalo):
+                    if not renovar_reserva(trabajo):
+                        logger.warning(f"⚠️ Trabajo de reporte #{trabajo.id}: se perdió la reserva del worker")
+                        return
+        except Exception:
+            logger.exception(f"❌ Trabajo de reporte #{trabajo.id}: error al renovar la reserva")
+        finally:
+            # El hilo tiene su propia conexión
+            connection.close()
+
+    hilo = threading.Thread(target=bucle, name=f'reporte-{trabajo.id}-latido', daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def construir_request(usuario, tenant, parametros):
+    """
+    HttpRequest GET interna para ejecutar una acción de reporte fuera del
+    ciclo HTTP (worker de trabajos, benchmark). `parametros` es un dict de
+    listas de valores.
+    """
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    params = QueryDict(mutable=True)
+    for nombre, valores in parametros.items():
+        params.setlist(nombre, [str(v) for v in valores])
+    http_request.GET = params
+    http_request.META['QUERY_STRING'] = params.urlencode()
+    http_request.META['SERVER_NAME'] = 'worker'
+    http_request.META['SERVER_PORT'] = '80'
+    http_request.tenant = tenant
+    # Evita que _export_report vuelva a convertir la petición en trabajo
+    http_request.en_segundo_plano = True
+    # DRF autentica la request con este usuario (mismos permisos que en la API)
+    http_request._force_auth_user = usuario
+    return http_request
+
+
+def _request_interna(trabajo, tenant):
+    """Request GET equivalente a la que originó el trabajo."""
+    parametros = dict(trabajo.parametros)
+    parametros['formato'] = [trabajo.formato]
+    return construir_request(trabajo.usuario, tenant, parametros)
+
+
+def ejecutar(trabajo, tenant):
+    """
+    Ejecuta el trabajo y guarda el archivo. Marca COMPLETADO o FALLIDO.
+    """
+    recurso, accion = trabajo.endpoint.split('.', 1)
+    vista = import_string(RECURSOS[recurso]).as_view({'get': accion})
+
+    try:
+        # La reserva se renueva mientras se genera el archivo
+        with latido(trabajo, tenant.schema_name):
+            response = vista(_request_interna(trabajo, tenant))
+
+            if response.status_code != 200 or not response.has_header('Content-Disposition'):
+                if hasattr(response, 'render'):
+                    response.render()
+                raise RuntimeError(
+                    f'El reporte respondió {response.status_code}: {getattr(response, "content", b"")[:500]!r}'
+                )
+
+            nombre = _nombre_desde_respuesta(response) or f'reporte_{trabajo.id}'
+            with tempfile.TemporaryFile() as tmp:
+                if response.streaming:
+                    for bloque in response.streaming_content:
+                        tmp.write(bloque)
+                else:
+                    tmp.write(response.content)
+                response.close()
+                tmp.seek(0)
+                trabajo.archivo.save(nombre, File(tmp), save=False)
+                trabajo.tamano_bytes = trabajo.archivo.size
+
+        ahora = timezone.now()
+        trabajo.nombre_archivo = nombre
+        trabajo.content_type = response['Content-Type']
+        trabajo.estado = 'COMPLETADO'
+        trabajo.error = ''
+        trabajo.finalizado = ahora
+        trabajo.expira = ahora + timedelta(hours=settings.REPORTES_TRABAJOS_EXPIRACION_HORAS)
+        trabajo.reservado_hasta = None
+        trabajo.save()
+        logger.info(f"✅ Trabajo de reporte #{trabajo.id} completado ({trabajo.tamano_bytes} bytes)")
+
+    except Exception as e:
+        logger.error(f"❌ Trabajo de reporte #{trabajo.id} falló: {e}", exc_info=True)
+        trabajo.estado = 'FALLIDO'
+        trabajo.error = str(e)[:2000]
+        trabajo.finalizado = timezone.now()
+        trabajo.reservado_hasta = None
+        trabajo.save(update_fields=['estado', 'error', 'finalizado', 'reservado_hasta'])
+
+    return trabajo
+
+
+def _nombre_desde_respuesta(response):
+    disposicion = response.get('Content-Disposition', '')
+    if "filename*=utf-8''" in disposicion:
+        return unquote(disposicion.split("filename*=utf-8''", 1)[1].split(';')[0])
+    if 'filename="' in disposicion:
+        return disposicion.split('filename="', 1)[1].split('"', 1)[0]
+    return ''
+
+
+def reencolar_colgados(max_intentos=3):
+    """
+    Devuelve a PENDIENTE los trabajos PROCESANDO cuya reserva venció (el
+    worker murió sin renovarla); los que ya agotaron los intentos quedan
+    FALLIDO. Un trabajo largo con su worker vivo no se reencola.
+    """
+    colgados = TrabajoReporte.objects.filter(estado='PROCESANDO', reservado_hasta__lt=timezone.now())
+    colgados.filter(intentos__gte=max_intentos).update(
+        estado='FALLIDO', error='Se agotaron los intentos (worker interrumpido)',
+        finalizado=timezone.now(), reservado_hasta=None
+    )
+    return colgados.filter(intentos__lt=max_intentos).update(estado='PENDIENTE', reservado_hasta=None)
+
+
+def purgar_expirados():
+    """Borra los archivos vencidos y marca los trabajos como EXPIRADO."""
+    expirados = TrabajoReporte.objects.filter(estado='COMPLETADO', expira__lt=timezone.now())
+    total = 0
+    for trabajo in expirados.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.estado = 'EXPIRADO'
+        trabajo.save(update_fields=['estado', 'archivo'])
+        total += 1
+    return total
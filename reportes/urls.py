@@ -2,13 +2,14 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReportesViewSet, BitacoraViewSet
-from .voice_views import VoiceReportQueryView
+from .views import ReportesViewSet, BitacoraViewSet, TrabajoReporteViewSet
+from .voice_views import VoiceReportQueryView, VoiceReportBatchView
 
 # Configurar router para API REST de reportes
 router = DefaultRouter()
 router.register(r'reportes', ReportesViewSet, basename='reportes')
 router.register(r'bitacora', BitacoraViewSet, basename='bitacora')
+router.register(r'trabajos', TrabajoReporteViewSet, basename='trabajos-reportes')
 
 urlpatterns = [
     # API REST endpoints
@@ -16,6 +17,7 @@ urlpatterns = [
     
     # Endpoint para reportes por voz con NLP
     path('voice-query/', VoiceReportQueryView.as_view(), name='voice-query'),
+    path('voice-query/batch/', VoiceReportBatchView.as_view(), name='voice-query-batch'),
 ]
 
 """
@@ -27,23 +29,46 @@ REPORTES BÁSICOS CON EXPORTACIÓN PDF/EXCEL:
 - GET /api/reportes/reportes/tendencia-citas/?dias=15                 - Gráfico de citas por día
 - GET /api/reportes/reportes/top-procedimientos/?limite=5             - Procedimientos más realizados
 - GET /api/reportes/reportes/ocupacion-odontologos/?mes=2025-11       - Tasa ocupación por doctor
+- GET /api/reportes/reportes/mapa-ocupacion/?mes=2025-11&odontologo=12 - Utilización día × hora
 - GET /api/reportes/reportes/reporte-financiero/?periodo=2025-11      - Resumen financiero detallado
 
 NUEVOS REPORTES DINÁMICOS (CU37 - Personalización Total):
 - GET /api/reportes/reportes/reporte-pacientes/?activo=true&desde=2025-01-01&formato=excel
-- GET /api/reportes/reportes/reporte-tratamientos/?estado=EN_PROGRESO&formato=pdf
+- GET /api/reportes/reportes/reporte-pacientes/?ordenar=-total_gastado&limite=100&cursor=<X-Next-Cursor>
+- GET /api/reportes/reportes/reporte-tratamientos/?estado=en_progreso&desde=2025-01-01&formato=pdf
+- GET /api/reportes/reportes/reporte-tratamientos/?agrupar=estado
 - GET /api/reportes/reportes/reporte-inventario/?stock_bajo=true&categoria=FARMACO&formato=excel
 - GET /api/reportes/reportes/reporte-citas-odontologo/?mes=2025-11&estado=COMPLETADA&formato=pdf
 - GET /api/reportes/reportes/reporte-ingresos-diarios/?desde=2025-11-01&hasta=2025-11-30&formato=excel
 - GET /api/reportes/reportes/reporte-servicios-populares/?limite=20&formato=pdf
+- GET /api/reportes/reportes/reporte-servicios-populares/?agrupar=categoria&desde=2025-01-01&hasta=2025-06-30
 
 BITÁCORA/AUDITORÍA (CU39 - Implementado):
 - GET /api/reportes/bitacora/ - Lista todas las acciones registradas
 - GET /api/reportes/bitacora/?usuario=1&accion=CREAR&desde=2025-01-01&hasta=2025-12-31
-  Filtros: usuario, accion, desde, hasta, modelo, ip, descripcion
+  Filtros: usuario, accion, desde, hasta, modelo, ip, descripcion, search
+- GET /api/reportes/bitacora/?limite=100&cursor=<siguiente_cursor>&total=1 - Paginación por cursor
 - GET /api/reportes/bitacora/estadisticas/?dias=7 - Estadísticas de actividad
+- GET /api/reportes/bitacora/estado-buffer/ - Contadores del buffer de escritura (staff)
 - GET /api/reportes/bitacora/exportar/?formato=excel&desde=2025-01-01 - Exportar bitácora
 
+TRABAJOS EN SEGUNDO PLANO (reportes grandes):
+- POST /api/reportes/trabajos/ - Encolar {"endpoint": "reporte-pacientes", "formato": "excel", "parametros": {}}
+- GET /api/reportes/trabajos/ - Mis trabajos (?estado=PENDIENTE)
+- GET /api/reportes/trabajos/{id}/ - Estado del trabajo (polling)
+- GET /api/reportes/trabajos/{id}/descargar/ - Descargar el archivo (410 si expiró)
+  Las exportaciones PDF/Excel con más de REPORTES_FILAS_ASINCRONO filas
+  responden 202 con el trabajo creado en lugar del archivo.
+  Worker: python manage.py procesar_trabajos_reportes
+
+REPORTES POR VOZ:
+- POST /api/reportes/voice-query/ - {"texto": "citas de la semana pasada", "limite": 100}
+  Resumen con totales de todo el período; datos paginados:
+  {"continuacion": "<paginacion.siguiente>"} para la página siguiente
+  {"texto": "...", "formato": "excel"} exporta todo el resultado (csv/excel en streaming)
+- POST /api/reportes/voice-query/batch/ - {"textos": [...], "fecha_referencia": "2025-09-15"}
+  Solo interpreta (sin datos): corpus de regresión y benchmarks del parser
+
 FORMATOS DE EXPORTACIÓN (CU38 - 100% Implementado):
 TODOS los reportes soportan exportación añadiendo el parámetro ?formato=
 - formato=json (por defecto)
@@ -1,6 +1,8 @@
 """
 Utilidades para generación de reportes en diferentes formatos
 """
+import csv
+import tempfile
 from io import BytesIO
 from datetime import datetime
 from reportlab.lib import colors
@@ -10,9 +12,10 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
 
 
 class PDFReportGenerator:
@@ -308,6 +311,163 @@ class ExcelReportGenerator:
         return response
 
 
+def _nombre_archivo(title, extension):
+    return f"{title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+# Caracteres con los que una hoja de cálculo interpreta la celda como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celda_csv(valor):
+    """
+    Texto que empieza como fórmula se antepone con una comilla simple, así
+    Excel/LibreOffice lo muestran como texto en vez de evaluarlo
+    (inyección de fórmulas). Números y demás tipos quedan igual.
+    """
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+class StreamingCSVReport:
+    """
+    Exportación CSV en streaming (memoria constante).
+    
+    Las filas se escriben a medida que se leen del iterable, así que se puede
+    pasar directamente un queryset.iterator(chunk_size=...).
+    """
+    
+    def __init__(self, title, headers, rows):
+        """
+        Args:
+            title: Título del reporte (se usa en el nombre del archivo)
+            headers: Lista con los nombres de columna
+            rows: Iterable de listas/tuplas con los valores de cada fila
+        """
+        self.title = title
+        self.headers = headers
+        self.rows = rows
+    
+    def _lineas(self):
+        writer = csv.writer(_Eco())
+        # BOM para que Excel detecte UTF-8 (tildes y ñ)
+        yield '\ufeff'
+        yield writer.writerow([_celda_csv(valor) for valor in self.headers])
+        for row in self.rows:
+            yield writer.writerow([_celda_csv(valor) for valor in row])
+    
+    def generate(self):
+        """Retorna un StreamingHttpResponse con el CSV"""
+        response = StreamingHttpResponse(self._lineas(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{_nombre_archivo(self.title, "csv")}"'
+        return response
+
+
+class StreamingExcelReportGenerator:
+    """
+    Generador Excel en modo write-only de openpyxl (memoria constante).
+    
+    A diferencia de ExcelReportGenerator, las filas se vuelcan a disco a
+    medida que se agregan y los estilos son estilos con nombre registrados
+    una sola vez en el libro.
+    """
+    
+    def __init__(self, title, tenant_name="Clínica Dental"):
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet(title=title[:31])
+        self.title = title
+        self.tenant_name = tenant_name
+        self._setup_styles()
+    
+    def _setup_styles(self):
+        """Registra los estilos con nombre del libro"""
+        borde = Side(style='thin')
+        estilos = [
+            NamedStyle(
+                name='reporte_titulo',
+                font=Font(name='Arial', size=16, bold=True, color='1e3a8a')
+            ),
+            NamedStyle(
+                name='reporte_subtitulo',
+                font=Font(name='Arial', size=12, bold=True, color='3b82f6')
+            ),
+            NamedStyle(
+                name='reporte_nota',
+                font=Font(name='Arial', size=9, italic=True)
+            ),
+            NamedStyle(
+                name='reporte_encabezado',
+                font=Font(name='Arial', size=11, bold=True, color='FFFFFF'),
+                fill=PatternFill(start_color='1e3a8a', end_color='1e3a8a', fill_type='solid'),
+                alignment=Alignment(horizontal='center', vertical='center'),
+                border=Border(left=borde, right=borde, top=borde, bottom=borde)
+            ),
+            NamedStyle(
+                name='reporte_celda',
+                font=Font(name='Arial', size=10),
+                alignment=Alignment(horizontal='left', vertical='center'),
+                border=Border(left=borde, right=borde, top=borde, bottom=borde)
+            ),
+        ]
+        for estilo in estilos:
+            self.workbook.add_named_style(estilo)
+    
+    def _cell(self, value, style):
+        cell = WriteOnlyCell(self.worksheet, value=value)
+        cell.style = style
+        return cell
+    
+    def set_column_widths(self, widths):
+        """Define anchos de columna (debe llamarse antes de escribir filas)"""
+        for col_idx, width in enumerate(widths, start=1):
+            self.worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+    
+    def add_header(self):
+        """Añade encabezado al reporte"""
+        self.worksheet.append([self._cell(self.tenant_name, 'reporte_titulo')])
+        self.worksheet.append([self._cell(self.title, 'reporte_subtitulo')])
+        self.worksheet.append([self._cell(
+            f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 'reporte_nota'
+        )])
+        self.worksheet.append([])
+    
+    def add_key_metrics(self, metrics):
+        """Añade métricas clave como tabla Métrica/Valor"""
+        self.add_rows(['Métrica', 'Valor'], ([k, v] for k, v in metrics.items()))
+        self.worksheet.append([])
+    
+    def add_rows(self, headers, rows):
+        """
+        Añade una tabla consumiendo ``rows`` de a una fila.
+        
+        Args:
+            headers: Lista con los nombres de columna
+            rows: Iterable de listas/tuplas (puede ser un iterator de queryset)
+        """
+        self.worksheet.append([self._cell(h, 'reporte_encabezado') for h in headers])
+        for row in rows:
+            self.worksheet.append([self._cell(value, 'reporte_celda') for value in row])
+    
+    def generate(self):
+        """Guarda el libro en un archivo temporal y lo devuelve en streaming"""
+        archivo = tempfile.TemporaryFile()
+        self.workbook.save(archivo)
+        archivo.seek(0)
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=_nombre_archivo(self.title, 'xlsx'),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+
 def format_currency(value):
     """Formatea un valor como moneda"""
     if value is None:
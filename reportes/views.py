@@ -1,12 +1,21 @@
 # reportes/views.py
 
 import logging
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count, Sum, Avg, Q, F, Max, Min
+from django.db.models import (
+    Count, Sum, Q, F, Max, Min, OuterRef, Subquery, Value,
+    CharField, DateField, DecimalField, IntegerField
+)
+from django.db.models.functions import Coalesce, Concat, ExtractHour, ExtractIsoWeekDay
+from django.conf import settings
+from django.http import FileResponse
 from django.utils import timezone
+from collections import Counter
 from datetime import timedelta, date
 from decimal import Decimal
 
@@ -14,10 +23,14 @@ from decimal import Decimal
 logger = logging.getLogger(__name__)
 
 # Importamos los modelos que vamos a consultar
-from agenda.models import Cita
-from tratamientos.models import ItemPlanTratamiento, Servicio, PlanDeTratamiento
+from agenda.models import Cita, HorarioAtencion, MOTIVOS_CITA_CHOICES
+from agenda.horarios import (
+    horarios_por_odontologo, minutos_en_hora,
+    horas_disponibles as horas_disponibles_periodo
+)
+from tratamientos.models import ItemPlanTratamiento, PlanDeTratamiento
 from facturacion.models import Factura, Pago
-from usuarios.models import Usuario, PerfilPaciente, PerfilOdontologo
+from usuarios.models import PerfilPaciente, PerfilOdontologo
 from inventario.models import Insumo, CategoriaInsumo
 from historial_clinico.models import DocumentoClinico, HistorialClinico
 
@@ -27,12 +40,209 @@ from .serializers import (
     ReporteTendenciaSerializer,
     ReporteFinancieroSerializer,
     ReporteEstadisticasGeneralesSerializer,
-    BitacoraSerializer
+    BitacoraSerializer,
+    TrabajoReporteSerializer,
+    TrabajoReporteCreateSerializer
 )
 
 # Importamos las utilidades de exportación
-from .utils import PDFReportGenerator, ExcelReportGenerator, format_currency, format_date
-from .models import BitacoraAccion
+from .utils import (
+    PDFReportGenerator, StreamingExcelReportGenerator, StreamingCSVReport,
+    format_currency, format_date
+)
+from .models import BitacoraAccion, ResumenDiarioCitas, ResumenDiarioPagos, TrabajoReporte
+from . import aggregations, auditoria, series, rollups, trabajos, paginacion
+from .cache import cache_reporte
+
+
+# Columnas de reporte_pacientes (también válidas para ?ordenar=)
+COLUMNAS_PACIENTES = (
+    'nombre', 'email', 'telefono', 'fecha_nacimiento', 'fecha_registro',
+    'activo', 'total_citas', 'total_gastado',
+)
+
+
+def _anotar_pacientes(queryset):
+    """
+    Anota cada paciente con sus columnas de reporte. Citas y facturas se
+    agregan en subconsultas (no JOIN + GROUP BY) para que un COUNT no
+    multiplique la SUMA del otro. Las columnas nulas se normalizan con
+    Coalesce porque la paginación por cursor no admite NULL.
+    """
+    citas = (
+        Cita.objects.filter(paciente=OuterRef('pk'))
+        .order_by().values('paciente')
+        .annotate(total=Count('id')).values('total')
+    )
+    gastado = (
+        Factura.objects.filter(paciente=OuterRef('pk'))
+        .order_by().values('paciente')
+        .annotate(total=Sum('monto_total')).values('total')
+    )
+    return queryset.annotate(
+        nombre=Concat('usuario__nombre', Value(' '), 'usuario__apellido', output_field=CharField()),
+        email=F('usuario__email'),
+        telefono=Coalesce('usuario__telefono', Value(''), output_field=CharField()),
+        fecha_nacimiento=Coalesce('fecha_de_nacimiento', Value(date(1, 1, 1)), output_field=DateField()),
+        fecha_registro=F('usuario__date_joined'),
+        activo=F('usuario__is_active'),
+        total_citas=Coalesce(Subquery(citas, output_field=IntegerField()), 0),
+        total_gastado=Coalesce(
+            Subquery(gastado, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+    )
+
+
+def _fila_paciente(paciente):
+    """Fila formateada (en el orden de COLUMNAS_PACIENTES) de un paciente anotado."""
+    nacimiento = paciente['fecha_nacimiento']
+    return [
+        paciente['nombre'],
+        paciente['email'],
+        paciente['telefono'] or 'N/A',
+        format_date(nacimiento) if nacimiento and nacimiento.year > 1 else 'N/A',
+        format_date(paciente['fecha_registro']),
+        'Sí' if paciente['activo'] else 'No',
+        paciente['total_citas'],
+        format_currency(paciente['total_gastado']),
+    ]
+
+
+def _precio_item(prefijo=''):
+    """Precio total de un ItemPlanTratamiento (suma de sus snapshots) como expresión."""
+    return (
+        F(f'{prefijo}precio_servicio_snapshot')
+        + F(f'{prefijo}precio_materiales_fijos_snapshot')
+        + F(f'{prefijo}precio_insumo_seleccionado_snapshot')
+    )
+
+
+def _porcentaje(parte, total):
+    return (parte / total * 100) if total else 0
+
+
+def _rango_fechas(request):
+    """
+    ?desde / ?hasta (YYYY-MM-DD) como datetimes aware [inicio, fin), fin
+    exclusivo para incluir todo el día 'hasta'. ValueError si son inválidas.
+    """
+    limites = []
+    for nombre, dias in (('desde', 0), ('hasta', 1)):
+        valor = request.query_params.get(nombre)
+        if not valor:
+            limites.append(None)
+            continue
+        try:
+            dia = date.fromisoformat(valor)
+        except ValueError:
+            raise ValueError(f'{nombre} inválido. Use YYYY-MM-DD')
+        limites.append(aggregations.inicio_de_dia(dia + timedelta(days=dias)))
+    return tuple(limites)
+
+
+def _parse_limite(request, default=None):
+    """?limite= como entero positivo (top-N). ValueError si no es válido."""
+    valor = request.query_params.get('limite')
+    if not valor:
+        return default
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError('limite debe ser un número entero')
+    if limite < 1:
+        raise ValueError('limite debe ser mayor a 0')
+    return limite
+
+
+def _parse_mes(request):
+    """?mes=YYYY-MM como (anio, mes); mes actual por defecto. ValueError si es inválido."""
+    valor = request.query_params.get('mes')
+    if not valor:
+        hoy = timezone.localdate()
+        return hoy.year, hoy.month
+    try:
+        anio, mes = map(int, valor.split('-'))
+        date(anio, mes, 1)
+    except ValueError:
+        raise ValueError('Formato de mes inválido. Use YYYY-MM')
+    return anio, mes
+
+
+def _citas_por_odontologo(inicio, fin, estado=None):
+    """
+    Odontólogos activos con sus citas de [inicio, fin) contadas por estado
+    y por motivo_tipo, en una sola consulta agrupada (LEFT JOIN: los
+    odontólogos sin citas aparecen con ceros).
+    """
+    en_rango = Q(citas_atendidas__fecha_hora__gte=inicio, citas_atendidas__fecha_hora__lt=fin)
+    if estado:
+        en_rango &= Q(citas_atendidas__estado=estado)
+    
+    def contar(**condicion):
+        return Count(
+            'citas_atendidas',
+            filter=en_rango & Q(**{f'citas_atendidas__{k}': v for k, v in condicion.items()})
+        )
+    
+    motivos = {
+        f'motivo_{codigo.lower()}': contar(motivo_tipo=codigo)
+        for codigo, _ in MOTIVOS_CITA_CHOICES
+    }
+    return (
+        PerfilOdontologo.objects.filter(usuario__is_active=True)
+        .annotate(
+            total_citas=Count('citas_atendidas', filter=en_rango),
+            citas_pendientes=contar(estado='PENDIENTE'),
+            citas_confirmadas=contar(estado='CONFIRMADA'),
+            citas_completadas=contar(estado='ATENDIDA'),
+            citas_canceladas=contar(estado='CANCELADA'),
+            pacientes_atendidos=Count(
+                'citas_atendidas__paciente',
+                filter=en_rango & Q(citas_atendidas__estado='ATENDIDA'),
+                distinct=True
+            ),
+            **motivos
+        )
+        .values(
+            'pk', 'usuario__nombre', 'usuario__apellido', 'especialidad__nombre',
+            'total_citas', 'citas_pendientes', 'citas_confirmadas', 'citas_completadas',
+            'citas_canceladas', 'pacientes_atendidos', *motivos
+        )
+        .order_by('usuario__nombre', 'usuario__apellido')
+    )
+
+
+def _contar_hasta_limite(queryset):
+    """
+    Filas del queryset contando como máximo REPORTES_FILAS_ASINCRONO + 1
+    (COUNT sobre un LIMIT): alcanza para decidir si una exportación va a
+    segundo plano sin recorrer toda la tabla.
+    """
+    return queryset.order_by()[:settings.REPORTES_FILAS_ASINCRONO + 1].count()
+
+
+def _encolar_si_excede(request, endpoint, formato, filas):
+    """
+    Si una exportación PDF/Excel supera REPORTES_FILAS_ASINCRONO filas, la
+    convierte en un TrabajoReporte y devuelve 202 con el trabajo creado.
+    Devuelve None si debe generarse en la misma petición.
+    """
+    if formato not in ('pdf', 'excel') or filas <= settings.REPORTES_FILAS_ASINCRONO:
+        return None
+    if getattr(request, 'en_segundo_plano', False):
+        return None  # Ya estamos dentro del worker
+    
+    trabajo = trabajos.encolar(request.user, endpoint, request.query_params, formato)
+    logger.info(f"⏳ Exportación de {filas} filas enviada a segundo plano (trabajo #{trabajo.id})")
+    return Response(
+        {
+            'mensaje': 'El reporte es grande y se está generando en segundo plano',
+            'trabajo': TrabajoReporteSerializer(trabajo, context={'request': request}).data
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
 
 
 class ReportesViewSet(viewsets.ViewSet):
@@ -42,9 +252,10 @@ class ReportesViewSet(viewsets.ViewSet):
     Este ViewSet no tiene un modelo base, solo acciones personalizadas
     que consultan múltiples modelos para generar estadísticas.
     
-    TODOS LOS ENDPOINTS SOPORTAN EXPORTACIÓN A PDF Y EXCEL:
+    TODOS LOS ENDPOINTS SOPORTAN EXPORTACIÓN A PDF, EXCEL Y CSV:
     - Añadir parámetro ?formato=pdf para exportar a PDF
     - Añadir parámetro ?formato=excel para exportar a Excel
+    - Añadir parámetro ?formato=csv para exportar a CSV (streaming)
     - Sin parámetro: Devuelve JSON (por defecto)
     
     Endpoints disponibles:
@@ -60,6 +271,10 @@ class ReportesViewSet(viewsets.ViewSet):
     - GET /api/reportes/reporte-citas-odontologo/ - Citas por odontólogo
     - GET /api/reportes/reporte-ingresos-diarios/ - Ingresos día a día
     - GET /api/reportes/reporte-servicios-populares/ - Servicios más demandados
+    
+    Con Redis, las respuestas JSON se cachean por tenant (ver reportes/cache.py)
+    y se invalidan al escribir citas, pagos, facturas, planes o insumos.
+    Cabecera X-Report-Cache: HIT | MISS.
     """
     permission_classes = [permissions.IsAuthenticated]  # Solo usuarios logueados
 
@@ -73,7 +288,7 @@ class ReportesViewSet(viewsets.ViewSet):
     
     def _export_report(self, request, title, data, metrics=None):
         """
-        Método auxiliar para exportar reportes a PDF o Excel
+        Método auxiliar para exportar reportes a PDF, Excel o CSV
         
         Args:
             request: Request object
@@ -85,12 +300,20 @@ class ReportesViewSet(viewsets.ViewSet):
         
         logger.info(f"📊 _export_report llamado: formato={formato}, title={title}")
         
-        if formato not in ['pdf', 'excel']:
-            logger.info("📊 Formato no es pdf/excel, devolviendo None para JSON")
+        if formato not in ['pdf', 'excel', 'csv']:
+            logger.info("📊 Formato no es pdf/excel/csv, devolviendo None para JSON")
             return None  # Devolver JSON por defecto
         
+        # Reportes grandes en PDF/Excel se generan en segundo plano. Los que
+        # tienen una fila por registro ya lo decidieron antes de armar `data`
+        # (ver _encolar_exportacion); aquí solo llegan listas ya calculadas.
+        trabajo_response = _encolar_si_excede(request, f'reportes.{self.action}', formato, len(data or []))
+        if trabajo_response:
+            return trabajo_response
+        
         try:
             tenant_name = self._get_tenant_name(request)
+            headers = list(data[0].keys()) if data else []
             
             if formato == 'pdf':
                 logger.info(f"📄 Generando PDF: {title}")
@@ -102,10 +325,8 @@ class ReportesViewSet(viewsets.ViewSet):
                 
                 if data:
                     # Convertir lista de diccionarios a tabla
-                    if len(data) > 0:
-                        headers = list(data[0].keys())
-                        rows = [headers] + [[str(item.get(k, '')) for k in headers] for item in data]
-                        pdf.add_table(rows, title="Datos del Reporte")
+                    rows = [headers] + [[str(item.get(k, '')) for k in headers] for item in data]
+                    pdf.add_table(rows, title="Datos del Reporte")
                 
                 response = pdf.generate()
                 logger.info(f"✅ PDF generado exitosamente")
@@ -113,22 +334,32 @@ class ReportesViewSet(viewsets.ViewSet):
             
             elif formato == 'excel':
                 logger.info(f"📊 Generando Excel: {title}")
-                excel = ExcelReportGenerator(title, tenant_name)
+                excel = StreamingExcelReportGenerator(title, tenant_name)
+                excel.set_column_widths([
+                    min(max([len(str(h))] + [len(str(item.get(h, ''))) for item in data[:200]]) + 2, 50)
+                    for h in headers
+                ] or [30, 20])
                 excel.add_header()
                 
                 if metrics:
                     excel.add_key_metrics(metrics)
                 
                 if data:
-                    # Convertir lista de diccionarios a tabla
-                    if len(data) > 0:
-                        headers = list(data[0].keys())
-                        rows = [headers] + [[item.get(k, '') for k in headers] for item in data]
-                        excel.add_table(rows, title="Datos del Reporte")
+                    excel.add_rows(headers, ([item.get(k, '') for k in headers] for item in data))
                 
                 response = excel.generate()
                 logger.info(f"✅ Excel generado exitosamente")
                 return response
+            
+            elif formato == 'csv':
+                logger.info(f"📊 Generando CSV: {title}")
+                if not data and metrics:
+                    # Reportes que solo tienen métricas
+                    headers = ['Métrica', 'Valor']
+                    data = [{'Métrica': k, 'Valor': v} for k, v in metrics.items()]
+                return StreamingCSVReport(
+                    title, headers, ([item.get(k, '') for k in headers] for item in data)
+                ).generate()
         
         except Exception as e:
             logger.error(f"❌ Error en _export_report: {str(e)}")
@@ -138,7 +369,52 @@ class ReportesViewSet(viewsets.ViewSet):
         
         return None
 
+    def _encolar_exportacion(self, request, queryset, limite=None):
+        """
+        Para reportes de una fila por registro: si se pide PDF/Excel y el
+        queryset supera REPORTES_FILAS_ASINCRONO filas, encola la exportación
+        antes de consultar y serializar las filas. Devuelve la respuesta 202
+        o None si la exportación sigue en la misma petición.
+        """
+        formato = request.query_params.get('formato', '').lower()
+        if formato not in ('pdf', 'excel'):
+            return None
+        filas = _contar_hasta_limite(queryset)
+        if limite:
+            filas = min(filas, limite)
+        return _encolar_si_excede(request, f'reportes.{self.action}', formato, filas)
+
+    def _export_filas(self, request, title, headers, filas, contar):
+        """
+        Exporta filas (iterable de listas) sin materializarlas: CSV y Excel se
+        escriben a medida que se leen de la BD. PDF las carga en memoria.
+        
+        Args:
+            headers: Encabezados de columna
+            filas: Iterable perezoso de filas (p. ej. queryset.iterator())
+            contar: Callable que devuelve el total de filas (solo se invoca
+                    para decidir si PDF/Excel se envía a segundo plano)
+        """
+        formato = request.query_params.get('formato', '').lower()
+        
+        if formato == 'csv':
+            return StreamingCSVReport(title, headers, filas).generate()
+        
+        trabajo_response = _encolar_si_excede(request, f'reportes.{self.action}', formato, contar())
+        if trabajo_response:
+            return trabajo_response
+        
+        if formato == 'excel':
+            excel = StreamingExcelReportGenerator(title, self._get_tenant_name(request))
+            excel.set_column_widths([max(len(h) + 4, 18) for h in headers])
+            excel.add_header()
+            excel.add_rows(headers, filas)
+            return excel.generate()
+        
+        return self._export_report(request, title, [dict(zip(headers, fila)) for fila in filas])
+    
     @action(detail=False, methods=['get'], url_path='dashboard-kpis')
+    @cache_reporte
     def dashboard_kpis(self, request):
         """
         Devuelve los KPIs principales para el dashboard.
@@ -170,101 +446,41 @@ class ReportesViewSet(viewsets.ViewSet):
         
         VERSIÓN: 3.2 - Formato dual (array + objeto) para mejor usabilidad
         """
-        # Inicializar variables con valores por defecto
-        total_pacientes = 0
-        citas_hoy = 0
-        ingresos_mes = Decimal('0.00')
-        saldo_pendiente = Decimal('0.00')
-        tratamientos_activos = 0
-        planes_completados = 0
-        promedio_factura = Decimal('0.00')
-        facturas_vencidas = 0
-        total_procedimientos = 0
-        pacientes_nuevos_mes = 0
+        # Valores por defecto si falla el cálculo
+        kpis = {
+            'total_pacientes': 0,
+            'citas_hoy': 0,
+            'ingresos_mes': Decimal('0.00'),
+            'saldo_pendiente': Decimal('0.00'),
+            'tratamientos_activos': 0,
+            'planes_completados': 0,
+            'promedio_factura': Decimal('0.00'),
+            'facturas_vencidas': 0,
+            'total_procedimientos': 0,
+            'pacientes_nuevos_mes': 0,
+        }
+        consultas = 0
         
         try:
-            hoy = timezone.now().date()
-            mes_actual = hoy.month
-            anio_actual = hoy.year
-            
-            # 1. Total Pacientes Activos
-            total_pacientes = PerfilPaciente.objects.filter(
-                usuario__is_active=True
-            ).count()
-            
-            # 2. Citas del día (confirmadas y completadas)
-            citas_hoy = Cita.objects.filter(
-                fecha_hora__date=hoy,
-                estado__in=['CONFIRMADA', 'ATENDIDA']
-            ).count()
-            
-            # 3. Ingresos del Mes (Pagos completados este mes)
-            ingresos_mes = Pago.objects.filter(
-                fecha_pago__year=anio_actual,
-                fecha_pago__month=mes_actual,
-                estado_pago='COMPLETADO'
-            ).aggregate(total=Sum('monto_pagado'))['total'] or Decimal('0.00')
-            
-            # 4. Saldo Pendiente (Total de facturas pendientes)
-            facturas_pendientes = Factura.objects.filter(estado='PENDIENTE')
-            saldo_pendiente = Decimal('0.00')
-            for factura in facturas_pendientes:
-                try:
-                    saldo_pendiente += factura.saldo_pendiente
-                except Exception as e:
-                    # Si una factura tiene problemas, continuar con las demás
-                    continue
-            
-            # 5. Tratamientos Activos (Planes en progreso)
-            tratamientos_activos = PlanDeTratamiento.objects.filter(
-                estado__in=['en_progreso', 'propuesto', 'aprobado']
-            ).count()
-            
-            # 6. Planes Completados (este mes)
-            planes_completados = PlanDeTratamiento.objects.filter(
-                estado='completado',
-                fecha_creacion__year=anio_actual,
-                fecha_creacion__month=mes_actual
-            ).count()
-            
-            # 7. Promedio por Factura (del mes actual)
-            facturas_mes = Factura.objects.filter(
-                fecha_emision__year=anio_actual,
-                fecha_emision__month=mes_actual
-            )
-            total_facturado = facturas_mes.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-            num_facturas = facturas_mes.count()
-            promedio_factura = (total_facturado / num_facturas) if num_facturas > 0 else Decimal('0.00')
-            
-            # 8. Facturas Vencidas (pendientes del mes pasado o anteriores)
-            # Como no hay fecha_vencimiento, consideramos facturas PENDIENTES de meses anteriores
-            inicio_mes = timezone.datetime(anio_actual, mes_actual, 1).date()
-            facturas_vencidas = Factura.objects.filter(
-                estado='PENDIENTE',
-                fecha_emision__date__lt=inicio_mes
-            ).count()
-            
-            # 9. Total Procedimientos Completados (este mes)
-            # El campo correcto es fecha_realizada, no fecha_realizacion
-            total_procedimientos = ItemPlanTratamiento.objects.filter(
-                estado='COMPLETADO',
-                fecha_realizada__year=anio_actual,
-                fecha_realizada__month=mes_actual
-            ).count()
-            
-            # 10. Pacientes Nuevos del Mes
-            pacientes_nuevos_mes = Usuario.objects.filter(
-                date_joined__year=anio_actual,
-                date_joined__month=mes_actual,
-                perfil_paciente__isnull=False
-            ).count()
-
+            # Todos los KPIs en una sola consulta con agregados condicionales
+            calculados, consultas = aggregations.kpis_dashboard()
+            kpis.update(calculados)
+            logger.debug(f"📊 dashboard_kpis resuelto en {consultas} consulta(s)")
         except Exception as e:
             # En caso de cualquier error, usar los valores por defecto ya inicializados
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error en dashboard_kpis: {str(e)}", exc_info=True)
         
+        total_pacientes = kpis['total_pacientes']
+        citas_hoy = kpis['citas_hoy']
+        ingresos_mes = kpis['ingresos_mes']
+        saldo_pendiente = kpis['saldo_pendiente']
+        tratamientos_activos = kpis['tratamientos_activos']
+        planes_completados = kpis['planes_completados']
+        promedio_factura = kpis['promedio_factura']
+        facturas_vencidas = kpis['facturas_vencidas']
+        total_procedimientos = kpis['total_procedimientos']
+        pacientes_nuevos_mes = kpis['pacientes_nuevos_mes']
+        
         # Construir respuesta con los valores (ya sea calculados o por defecto)
         data = [
             {"etiqueta": "Pacientes Activos", "valor": total_pacientes},
@@ -318,17 +534,23 @@ class ReportesViewSet(viewsets.ViewSet):
             }
         }
         
-        return Response(response_data)
+        response = Response(response_data)
+        response['X-Report-Queries'] = consultas
+        return response
 
     @action(detail=False, methods=['get'], url_path='tendencia-citas')
+    @cache_reporte
     def tendencia_citas(self, request):
         """
         Reporte para el gráfico de "Tendencia de citas por día".
         
         GET /api/reportes/tendencia-citas/?dias=15
+        GET /api/reportes/tendencia-citas/?dias=365&granularidad=mes
         
         Parámetros:
         - dias: Número de días a analizar (default: 15)
+        - granularidad: dia, semana o mes (default: dia). En semana/mes la
+          'fecha' es el inicio del periodo (lunes o día 1).
         
         Retorna:
         [
@@ -340,31 +562,34 @@ class ReportesViewSet(viewsets.ViewSet):
             }
         ]
         """
-        dias_a_revisar = int(request.query_params.get('dias', 15))
+        try:
+            dias_a_revisar = int(request.query_params.get('dias', 15))
+            granularidad = series.parse_granularidad(request.query_params.get('granularidad'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         fecha_fin = timezone.now().date()
         fecha_inicio = fecha_fin - timedelta(days=dias_a_revisar - 1)
         
-        # Generar todos los días del rango (incluso sin citas)
-        data = []
-        fecha_actual = fecha_inicio
-        
-        # Llenar todos los días del rango con desglose por estado
-        while fecha_actual <= fecha_fin:
-            citas_del_dia = Cita.objects.filter(
-                fecha_hora__date=fecha_actual
+        # Toda la serie en una sola consulta, con desglose por estado.
+        # Si el resumen diario cubre el rango se lee de ahí en vez de Cita.
+        usar_resumen = rollups.resumen_disponible(rollups.TIPO_CITAS, fecha_inicio, fecha_fin)
+        if usar_resumen:
+            data = series.serie_temporal(
+                ResumenDiarioCitas.objects.all(), 'fecha',
+                fecha_inicio, fecha_fin, granularidad,
+                cantidad=Coalesce(Sum('cantidad'), 0),
+                completadas=Coalesce(Sum('cantidad', filter=Q(estado='ATENDIDA')), 0),
+                canceladas=Coalesce(Sum('cantidad', filter=Q(estado='CANCELADA')), 0),
+            )
+        else:
+            data = series.serie_temporal(
+                Cita.objects.all(), 'fecha_hora',
+                fecha_inicio, fecha_fin, granularidad,
+                cantidad=Count('id'),
+                completadas=Count('id', filter=Q(estado='ATENDIDA')),
+                canceladas=Count('id', filter=Q(estado='CANCELADA')),
             )
-            
-            total = citas_del_dia.count()
-            completadas = citas_del_dia.filter(estado='ATENDIDA').count()
-            canceladas = citas_del_dia.filter(estado='CANCELADA').count()
-            
-            data.append({
-                'fecha': fecha_actual,
-                'cantidad': total,
-                'completadas': completadas,
-                'canceladas': canceladas
-            })
-            fecha_actual += timedelta(days=1)
         
         # Intentar exportar si se solicitó formato
         export_data = [
@@ -378,7 +603,7 @@ class ReportesViewSet(viewsets.ViewSet):
         ]
         
         metrics = {
-            'Total de Días': len(data),
+            'Total de Periodos': len(data),
             'Total Citas': sum(item['cantidad'] for item in data),
             'Completadas': sum(item['completadas'] for item in data),
             'Canceladas': sum(item['canceladas'] for item in data)
@@ -395,9 +620,12 @@ class ReportesViewSet(viewsets.ViewSet):
             return export_response
         
         serializer = ReporteTendenciaSerializer(data, many=True)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        response['X-Report-Source'] = 'resumen' if usar_resumen else 'tablas'
+        return response
 
     @action(detail=False, methods=['get'], url_path='top-procedimientos')
+    @cache_reporte
     def top_procedimientos(self, request):
         """
         Reporte de los procedimientos más realizados.
@@ -454,6 +682,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='estadisticas-generales')
+    @cache_reporte
     def estadisticas_generales(self, request):
         """
         Estadísticas generales completas del sistema.
@@ -466,123 +695,24 @@ class ReportesViewSet(viewsets.ViewSet):
         - Financiero (ingresos, pendiente, facturas vencidas)
         - Tratamientos (planes activos, completados, procedimientos totales)
         """
-        hoy = timezone.now().date()
-        mes_actual = hoy.month
-        anio_actual = hoy.year
-        inicio_mes = date(anio_actual, mes_actual, 1)
-        
-        # ====== ESTADÍSTICAS DE PACIENTES ======
-        total_pacientes_activos = PerfilPaciente.objects.filter(
-            usuario__is_active=True
-        ).count()
-        
-        # Pacientes nuevos del mes (usuarios creados en mes actual que tienen perfil paciente)
-        pacientes_nuevos_mes = Usuario.objects.filter(
-            date_joined__year=anio_actual,
-            date_joined__month=mes_actual,
-            perfil_paciente__isnull=False
-        ).count()
-        
-        # ====== ESTADÍSTICAS DE ODONTÓLOGOS ======
-        total_odontologos = PerfilOdontologo.objects.filter(
-            usuario__is_active=True
-        ).count()
-        
-        # ====== ESTADÍSTICAS DE CITAS ======
-        # Total de citas del mes (excluyendo canceladas)
-        citas_mes_actual = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual
-        ).exclude(estado='CANCELADA').count()
-        
-        # Citas completadas del mes
-        citas_completadas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado='ATENDIDA'
-        ).count()
-        
-        # Citas pendientes del mes (PENDIENTE o CONFIRMADA)
-        citas_pendientes = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado__in=['PENDIENTE', 'CONFIRMADA']
-        ).count()
-        
-        # Citas canceladas del mes
-        citas_canceladas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado='CANCELADA'
-        ).count()
-        
-        # ====== ESTADÍSTICAS DE TRATAMIENTOS ======
-        # Planes completados
-        tratamientos_completados = PlanDeTratamiento.objects.filter(
-            estado='completado'
-        ).count()
-        
-        # Planes activos (en_progreso, propuesto, aprobado)
-        planes_activos = PlanDeTratamiento.objects.filter(
-            estado__in=['en_progreso', 'propuesto', 'aprobado']
-        ).count()
-        
-        # Total de procedimientos realizados
-        total_procedimientos = ItemPlanTratamiento.objects.filter(
-            estado='COMPLETADO'
-        ).count()
-        
-        # ====== ESTADÍSTICAS FINANCIERAS ======
-        # Ingresos del mes (pagos completados)
-        ingresos_mes = Pago.objects.filter(
-            fecha_pago__year=anio_actual,
-            fecha_pago__month=mes_actual,
-            estado_pago='COMPLETADO'
-        ).aggregate(total=Sum('monto_pagado'))['total'] or Decimal('0.00')
-        
-        # Monto pendiente de cobro (facturas emitidas - pagado)
-        facturas_mes = Factura.objects.filter(
-            fecha_emision__year=anio_actual,
-            fecha_emision__month=mes_actual
-        )
-        
-        total_facturado_mes = facturas_mes.aggregate(
-            total=Sum('monto_total')
-        )['total'] or Decimal('0.00')
-        
-        total_pagado_mes = facturas_mes.aggregate(
-            total=Sum('monto_pagado')
-        )['total'] or Decimal('0.00')
-        
-        monto_pendiente = total_facturado_mes - total_pagado_mes
-        
-        # Facturas pendientes (estado PENDIENTE con saldo > 0)
-        facturas_vencidas = Factura.objects.filter(
-            estado='PENDIENTE',
-            monto_pagado__lt=F('monto_total')
-        ).count()
-        
-        # Promedio de factura
-        promedio_factura = Factura.objects.aggregate(
-            promedio=Avg('monto_total')
-        )['promedio'] or Decimal('0.00')
-        
-        # ====== TASA DE OCUPACIÓN ======
-        total_citas_mes = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual
-        ).count()
-        
-        citas_efectivas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado__in=['CONFIRMADA', 'ATENDIDA']
-        ).count()
-        
-        tasa_ocupacion = (
-            (citas_efectivas / total_citas_mes * 100) 
-            if total_citas_mes > 0 else 0
-        )
+        # Todas las métricas en una sola consulta con agregados condicionales
+        stats, consultas = aggregations.estadisticas_generales()
+        
+        total_pacientes_activos = stats['total_pacientes_activos']
+        pacientes_nuevos_mes = stats['pacientes_nuevos_mes']
+        total_odontologos = stats['total_odontologos']
+        citas_mes_actual = stats['citas_mes_actual']
+        citas_completadas = stats['citas_completadas']
+        citas_pendientes = stats['citas_pendientes']
+        citas_canceladas = stats['citas_canceladas']
+        tratamientos_completados = stats['planes_completados']
+        planes_activos = stats['planes_activos']
+        total_procedimientos = stats['total_procedimientos']
+        ingresos_mes = stats['ingresos_mes_actual']
+        monto_pendiente = stats['monto_pendiente']
+        facturas_vencidas = stats['facturas_vencidas']
+        promedio_factura = stats['promedio_factura']
+        tasa_ocupacion = stats['tasa_ocupacion']
         
         # ====== RESPUESTA COMPLETA ======
         data = {
@@ -646,9 +776,12 @@ class ReportesViewSet(viewsets.ViewSet):
         if export_response:
             return export_response
         
-        return Response(data)
+        response = Response(data)
+        response['X-Report-Queries'] = consultas
+        return response
 
     @action(detail=False, methods=['get'], url_path='reporte-financiero')
+    @cache_reporte
     def reporte_financiero(self, request):
         """
         Reporte financiero detallado por período.
@@ -664,12 +797,11 @@ class ReportesViewSet(viewsets.ViewSet):
         if periodo_param:
             try:
                 if len(periodo_param) == 4:  # Año (YYYY)
-                    anio = int(periodo_param)
-                    filtro_fecha = Q(fecha_emision__year=anio)
+                    inicio, fin = aggregations.rango_anio(int(periodo_param))
                     periodo_label = periodo_param
                 elif len(periodo_param) == 7:  # Mes (YYYY-MM)
                     anio, mes = map(int, periodo_param.split('-'))
-                    filtro_fecha = Q(fecha_emision__year=anio, fecha_emision__month=mes)
+                    inicio, fin = aggregations.rango_mes(anio, mes)
                     periodo_label = periodo_param
                 else:
                     raise ValueError("Formato inválido")
@@ -680,38 +812,29 @@ class ReportesViewSet(viewsets.ViewSet):
                 )
         else:
             # Período por defecto: mes actual
-            filtro_fecha = Q(
-                fecha_emision__year=hoy.year, 
-                fecha_emision__month=hoy.month
-            )
+            inicio, fin = aggregations.rango_mes(hoy.year, hoy.month)
             periodo_label = f"{hoy.year}-{hoy.month:02d}"
         
-        # Calcular métricas financieras
-        facturas_periodo = Factura.objects.filter(filtro_fecha)
-        
-        total_facturado = facturas_periodo.aggregate(
-            total=Sum('monto_total')
-        )['total'] or Decimal('0.00')
-        
-        total_pagado = facturas_periodo.aggregate(
-            total=Sum('monto_pagado')
-        )['total'] or Decimal('0.00')
-        
-        saldo_pendiente = total_facturado - total_pagado
-        numero_facturas = facturas_periodo.count()
+        # Calcular métricas financieras en una sola consulta
+        resumen, consultas = aggregations.resumen_facturas(
+            Factura.objects.filter(fecha_emision__gte=inicio, fecha_emision__lt=fin)
+        )
         
         data = {
             'periodo': periodo_label,
-            'total_facturado': float(total_facturado),
-            'total_pagado': float(total_pagado),
-            'saldo_pendiente': float(saldo_pendiente),
-            'numero_facturas': numero_facturas
+            'total_facturado': float(resumen['total_facturado']),
+            'total_pagado': float(resumen['total_pagado']),
+            'saldo_pendiente': float(resumen['saldo_pendiente']),
+            'numero_facturas': resumen['numero_facturas']
         }
         
         serializer = ReporteFinancieroSerializer(data)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        response['X-Report-Queries'] = consultas
+        return response
 
     @action(detail=False, methods=['get'], url_path='ocupacion-odontologos')
+    @cache_reporte
     def ocupacion_odontologos(self, request):
         """
         Tasa de ocupación por odontólogo con detalles completos.
@@ -721,6 +844,10 @@ class ReportesViewSet(viewsets.ViewSet):
         Parámetros:
         - mes: YYYY-MM (default: mes actual)
         
+        La ocupación es horas reservadas (citas no canceladas × duración del
+        turno) sobre horas de atención del mes según el HorarioAtencion del
+        odontólogo (o el horario general de la clínica).
+        
         Retorna:
         [
             {
@@ -729,70 +856,42 @@ class ReportesViewSet(viewsets.ViewSet):
                 'total_citas': 7,
                 'citas_completadas': 5,
                 'citas_canceladas': 1,
-                'horas_ocupadas': 10,
-                'tasa_ocupacion': '71.43',
-                'pacientes_atendidos': 5
+                'horas_ocupadas': 3.0,
+                'horas_disponibles': 198.0,
+                'tasa_ocupacion': '1.52',
+                'pacientes_atendidos': 5,
+                'motivos': {'CONSULTA': 4, 'URGENCIA': 1, ...}
             }
         ]
         """
-        mes_param = request.query_params.get('mes')
-        hoy = timezone.now().date()
-        
-        if mes_param:
-            try:
-                anio, mes = map(int, mes_param.split('-'))
-            except ValueError:
-                return Response(
-                    {'error': 'Formato de mes inválido. Use YYYY-MM'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
-            anio, mes = hoy.year, hoy.month
+        try:
+            anio, mes = _parse_mes(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Obtener odontólogos activos
-        odontologos = PerfilOdontologo.objects.filter(
-            usuario__is_active=True
-        ).select_related('usuario')
+        inicio, fin = aggregations.rango_mes(anio, mes)
+        odontologos = list(_citas_por_odontologo(inicio, fin))
+        horarios = horarios_por_odontologo([o['pk'] for o in odontologos])
+        duracion_horas = settings.AGENDA_DURACION_CITA_MINUTOS / 60
+        ultimo_dia = (fin - timedelta(days=1)).date()
         
         data = []
-        
-        for odontologo in odontologos:
-            # Base de citas del mes
-            citas_mes = Cita.objects.filter(
-                odontologo=odontologo,
-                fecha_hora__year=anio,
-                fecha_hora__month=mes
-            )
+        for o in odontologos:
+            horas_ocupadas = (o['total_citas'] - o['citas_canceladas']) * duracion_horas
+            horas_disponibles = horas_disponibles_periodo(horarios[o['pk']], inicio.date(), ultimo_dia)
+            tasa_ocupacion = round(_porcentaje(horas_ocupadas, horas_disponibles), 2)
             
-            # Contar por estado
-            total_citas = citas_mes.count()
-            citas_completadas = citas_mes.filter(estado='ATENDIDA').count()
-            citas_canceladas = citas_mes.filter(estado='CANCELADA').count()
-            
-            # Calcular horas ocupadas (asumiendo 2 horas por cita completada)
-            horas_ocupadas = citas_completadas * 2
-            
-            # Pacientes únicos atendidos
-            pacientes_atendidos = citas_mes.filter(
-                estado='ATENDIDA'
-            ).values('paciente').distinct().count()
-            
-            # Calcular tasa de ocupación
-            if total_citas > 0:
-                tasa_ocupacion = round((citas_completadas / total_citas * 100), 2)
-            else:
-                tasa_ocupacion = 0.0
-            
-            # Enviar estructura completa
             data.append({
-                'usuario_id': odontologo.usuario.id,
-                'nombre_completo': odontologo.usuario.full_name,
-                'total_citas': total_citas,
-                'citas_completadas': citas_completadas,
-                'citas_canceladas': citas_canceladas,
-                'horas_ocupadas': horas_ocupadas,
+                'usuario_id': o['pk'],
+                'nombre_completo': f"{o['usuario__nombre']} {o['usuario__apellido']}",
+                'total_citas': o['total_citas'],
+                'citas_completadas': o['citas_completadas'],
+                'citas_canceladas': o['citas_canceladas'],
+                'horas_ocupadas': round(horas_ocupadas, 2),
+                'horas_disponibles': round(horas_disponibles, 2),
                 'tasa_ocupacion': str(tasa_ocupacion),
-                'pacientes_atendidos': pacientes_atendidos
+                'pacientes_atendidos': o['pacientes_atendidos'],
+                'motivos': {codigo: o[f'motivo_{codigo.lower()}'] for codigo, _ in MOTIVOS_CITA_CHOICES},
             })
         
         # Ordenar por tasa de ocupación descendente
@@ -801,7 +900,118 @@ class ReportesViewSet(viewsets.ViewSet):
         # Retornar directamente sin serializer genérico
         return Response(data)
     
+    @action(detail=False, methods=['get'], url_path='mapa-ocupacion')
+    @cache_reporte
+    def mapa_ocupacion(self, request):
+        """
+        Mapa de calor de utilización: día de la semana × hora.
+        
+        GET /api/reportes/mapa-ocupacion/?mes=2025-11&odontologo=12&formato=excel
+        
+        Parámetros:
+        - mes: YYYY-MM (default: mes actual)
+        - odontologo: ID de usuario del odontólogo (default: todos los activos)
+        - formato: json/pdf/excel/csv
+        
+        Cada celda compara las citas no canceladas que empiezan en esa franja
+        con los turnos disponibles en ella según los horarios de atención.
+        """
+        try:
+            anio, mes = _parse_mes(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        odontologo_id = request.query_params.get('odontologo')
+        if odontologo_id:
+            try:
+                odontologo_id = int(odontologo_id)
+            except ValueError:
+                return Response(
+                    {'error': 'odontologo debe ser un número entero'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        inicio, fin = aggregations.rango_mes(anio, mes)
+        citas = Cita.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin).exclude(estado='CANCELADA')
+        odontologos = PerfilOdontologo.objects.filter(usuario__is_active=True)
+        
+        if odontologo_id:
+            citas = citas.filter(odontologo_id=odontologo_id)
+            odontologos = odontologos.filter(pk=odontologo_id)
+        
+        # Citas por (día ISO 1-7, hora) en una sola consulta agrupada
+        conteo = {
+            (g['dia'] - 1, g['hora']): g['citas']
+            for g in citas
+            .annotate(dia=ExtractIsoWeekDay('fecha_hora'), hora=ExtractHour('fecha_hora'))
+            .order_by().values('dia', 'hora')
+            .annotate(citas=Count('id'))
+        }
+        
+        # Turnos disponibles por celda: minutos de atención en la franja ×
+        # cantidad de veces que ese día de la semana cae en el mes
+        horarios = horarios_por_odontologo(list(odontologos.values_list('pk', flat=True)))
+        ocurrencias = Counter(
+            (inicio.date() + timedelta(days=i)).weekday() for i in range((fin - inicio).days)
+        )
+        duracion = settings.AGENDA_DURACION_CITA_MINUTOS
+        capacidad = Counter()
+        for horario in horarios.values():
+            for dia in range(7):
+                for hora in range(24):
+                    minutos = minutos_en_hora(horario, dia, hora)
+                    if minutos:
+                        capacidad[(dia, hora)] += minutos * ocurrencias[dia] / duracion
+        
+        horas = sorted({hora for _, hora in capacidad} | {hora for _, hora in conteo})
+        dias = [nombre for _, nombre in HorarioAtencion.DIAS_SEMANA]
+        
+        celdas = []
+        matriz = []
+        for dia, nombre_dia in enumerate(dias):
+            fila = []
+            for hora in horas:
+                turnos_disponibles = capacidad.get((dia, hora), 0)
+                total = conteo.get((dia, hora), 0)
+                utilizacion = round(total / turnos_disponibles * 100, 1) if turnos_disponibles else None
+                fila.append(utilizacion)
+                if total or turnos_disponibles:
+                    celdas.append({
+                        'dia': nombre_dia,
+                        'dia_semana': dia,
+                        'hora': f'{hora:02d}:00',
+                        'citas': total,
+                        'turnos_disponibles': round(turnos_disponibles, 1),
+                        'utilizacion': utilizacion,
+                    })
+            matriz.append(fila)
+        
+        etiquetas_horas = [f'{hora:02d}:00' for hora in horas]
+        export_response = self._export_report(
+            request,
+            f"Mapa de Ocupación {anio}-{mes:02d}",
+            [
+                {'dia': nombre_dia, **{
+                    etiqueta: f'{valor:.0f}%' if valor is not None else '-'
+                    for etiqueta, valor in zip(etiquetas_horas, fila)
+                }}
+                for nombre_dia, fila in zip(dias, matriz)
+            ]
+        )
+        if export_response:
+            return export_response
+        
+        return Response({
+            'mes': f'{anio}-{mes:02d}',
+            'duracion_turno_minutos': duracion,
+            'dias': dias,
+            'horas': etiquetas_horas,
+            'matriz': matriz,
+            'celdas': celdas,
+        })
+    
     @action(detail=False, methods=['get'], url_path='reporte-pacientes')
+    @cache_reporte
     def reporte_pacientes(self, request):
         """
         Reporte detallado de pacientes con filtros dinámicos.
@@ -812,9 +1022,25 @@ class ReportesViewSet(viewsets.ViewSet):
         - activo: true/false (filtrar por estado)
         - desde: Fecha de registro desde (YYYY-MM-DD)
         - hasta: Fecha de registro hasta (YYYY-MM-DD)
-        - formato: json/pdf/excel
+        - ordenar: cualquier columna del reporte, con '-' para descendente (default: nombre)
+        - limite / cursor: paginación por cursor; la siguiente página llega en
+          la cabecera X-Next-Cursor (sin limite ni cursor se devuelven todos)
+        - formato: json/pdf/excel/csv
+        
+        Todo el reporte es una sola consulta: citas y total gastado se
+        calculan con subconsultas correlacionadas.
         """
-        queryset = PerfilPaciente.objects.select_related('usuario').all()
+        try:
+            columna, descendente = paginacion.parse_orden(
+                request.query_params.get('ordenar'), COLUMNAS_PACIENTES, 'nombre'
+            )
+            limite = request.query_params.get('limite')
+            cursor = request.query_params.get('cursor')
+            limite = paginacion.parse_limite(limite) if (limite or cursor) else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = PerfilPaciente.objects.all()
         
         # Filtros dinámicos
         activo = request.query_params.get('activo')
@@ -829,90 +1055,145 @@ class ReportesViewSet(viewsets.ViewSet):
         if hasta:
             queryset = queryset.filter(usuario__date_joined__lte=hasta)
         
-        # Preparar datos
-        data = []
-        for paciente in queryset:
-            # Calcular estadísticas del paciente
-            total_citas = Cita.objects.filter(paciente=paciente).count()
-            facturas = Factura.objects.filter(paciente=paciente)
-            total_gastado = facturas.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-            
-            data.append({
-                'nombre': paciente.usuario.full_name,
-                'email': paciente.usuario.email,
-                'telefono': paciente.telefono or 'N/A',
-                'fecha_nacimiento': format_date(paciente.fecha_nacimiento),
-                'fecha_registro': format_date(paciente.usuario.date_joined),
-                'activo': 'Sí' if paciente.usuario.is_active else 'No',
-                'total_citas': total_citas,
-                'total_gastado': format_currency(total_gastado)
-            })
+        pacientes_filtrados = queryset
+        queryset = _anotar_pacientes(queryset).values('pk', *COLUMNAS_PACIENTES)
         
-        # Exportar si se solicita
-        export_response = self._export_report(
-            request,
-            "Reporte de Pacientes",
-            data
-        )
-        if export_response:
-            return export_response
+        formato = request.query_params.get('formato', '').lower()
+        if formato in ['pdf', 'excel', 'csv']:
+            filas = (
+                _fila_paciente(p)
+                for p in paginacion.ordenar(queryset, columna, descendente).iterator(chunk_size=2000)
+            )
+            return self._export_filas(
+                request, "Reporte de Pacientes", list(COLUMNAS_PACIENTES), filas,
+                lambda: _contar_hasta_limite(pacientes_filtrados)
+            )
         
-        return Response(data)
+        siguiente = None
+        if limite:
+            try:
+                pacientes, siguiente = paginacion.paginar(queryset, columna, descendente, limite, cursor)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            pacientes = paginacion.ordenar(queryset, columna, descendente)
+        
+        data = [dict(zip(COLUMNAS_PACIENTES, _fila_paciente(p))) for p in pacientes]
+        response = Response(data)
+        if siguiente:
+            response['X-Next-Cursor'] = siguiente
+        return response
     
     @action(detail=False, methods=['get'], url_path='reporte-tratamientos')
+    @cache_reporte
     def reporte_tratamientos(self, request):
         """
         Reporte de tratamientos con filtros dinámicos.
         
-        GET /api/reportes/reporte-tratamientos/?estado=EN_PROGRESO&desde=2025-01-01&formato=pdf
+        GET /api/reportes/reporte-tratamientos/?estado=en_progreso&desde=2025-01-01&formato=pdf
+        GET /api/reportes/reporte-tratamientos/?agrupar=estado
         
         Parámetros:
-        - estado: PROPUESTO/EN_PROGRESO/COMPLETADO/CANCELADO
-        - desde: Fecha desde (YYYY-MM-DD)
-        - hasta: Fecha hasta (YYYY-MM-DD)
-        - formato: json/pdf/excel
+        - estado: propuesto/aceptado/en_progreso/completado/cancelado...
+        - desde: Fecha de creación desde (YYYY-MM-DD)
+        - hasta: Fecha de creación hasta (YYYY-MM-DD)
+        - agrupar: estado (totales por estado del plan en lugar de un plan por fila)
+        - limite: Máximo de planes (los más recientes)
+        - formato: json/pdf/excel/csv
+        
+        Conteos de ítems y montos (suma de snapshots de precio) se agregan
+        en la misma consulta que lista los planes.
         """
-        queryset = PlanDeTratamiento.objects.select_related('paciente__usuario', 'odontologo__usuario').all()
+        try:
+            inicio, fin = _rango_fechas(request)
+            limite = _parse_limite(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = PlanDeTratamiento.objects.all()
         
         # Filtros
         estado = request.query_params.get('estado')
         if estado:
-            queryset = queryset.filter(estado=estado.upper())
-        
-        desde = request.query_params.get('desde')
-        if desde:
-            queryset = queryset.filter(fecha_creacion__gte=desde)
-        
-        hasta = request.query_params.get('hasta')
-        if hasta:
-            queryset = queryset.filter(fecha_creacion__lte=hasta)
-        
-        # Preparar datos
-        data = []
-        for plan in queryset:
-            items = ItemPlanTratamiento.objects.filter(plan_tratamiento=plan)
-            total_items = items.count()
-            completados = items.filter(estado='COMPLETADO').count()
-            progreso = (completados / total_items * 100) if total_items > 0 else 0
+            queryset = queryset.filter(estado=estado.lower())
+        if inicio:
+            queryset = queryset.filter(fecha_creacion__gte=inicio)
+        if fin:
+            queryset = queryset.filter(fecha_creacion__lt=fin)
+        
+        completado = Q(items__estado=ItemPlanTratamiento.EstadoItem.COMPLETADO)
+        
+        if request.query_params.get('agrupar') == 'estado':
+            etiquetas = dict(PlanDeTratamiento.EstadoPlan.choices)
+            grupos = (
+                queryset.order_by().values('estado')
+                .annotate(
+                    planes=Count('id', distinct=True),
+                    total_items=Count('items'),
+                    completados=Count('items', filter=completado),
+                    monto_total=aggregations.suma_decimal(_precio_item('items__')),
+                    monto_completado=aggregations.suma_decimal(_precio_item('items__'), filter=completado),
+                )
+                .order_by('-planes')
+            )
+            data = [
+                {
+                    'estado': etiquetas.get(g['estado'], g['estado']),
+                    'planes': g['planes'],
+                    'total_items': g['total_items'],
+                    'completados': g['completados'],
+                    'progreso': f"{_porcentaje(g['completados'], g['total_items']):.1f}%",
+                    'monto_total': format_currency(g['monto_total']),
+                    'monto_completado': format_currency(g['monto_completado']),
+                }
+                for g in grupos
+            ]
+            titulo = "Tratamientos por Estado"
+        else:
+            trabajo_response = self._encolar_exportacion(request, queryset, limite)
+            if trabajo_response:
+                return trabajo_response
             
-            data.append({
-                'paciente': plan.paciente.usuario.full_name,
-                'odontologo': plan.odontologo.usuario.full_name,
-                'fecha_creacion': format_date(plan.fecha_creacion),
-                'estado': plan.get_estado_display(),
-                'total_items': total_items,
-                'completados': completados,
-                'progreso': f"{progreso:.1f}%",
-                'costo_total': format_currency(plan.costo_total)
-            })
-        
-        export_response = self._export_report(request, "Reporte de Tratamientos", data)
+            etiquetas = dict(PlanDeTratamiento.EstadoPlan.choices)
+            planes = (
+                queryset
+                .annotate(
+                    total_items=Count('items'),
+                    completados=Count('items', filter=completado),
+                    costo_total=aggregations.suma_decimal(_precio_item('items__')),
+                )
+                .values(
+                    'paciente__usuario__nombre', 'paciente__usuario__apellido',
+                    'odontologo__usuario__nombre', 'odontologo__usuario__apellido',
+                    'fecha_creacion', 'estado', 'total_items', 'completados', 'costo_total',
+                )
+                .order_by('-fecha_creacion', '-id')
+            )
+            if limite:
+                planes = planes[:limite]
+            data = [
+                {
+                    'paciente': f"{p['paciente__usuario__nombre']} {p['paciente__usuario__apellido']}",
+                    'odontologo': f"{p['odontologo__usuario__nombre']} {p['odontologo__usuario__apellido']}",
+                    'fecha_creacion': format_date(p['fecha_creacion']),
+                    'estado': etiquetas.get(p['estado'], p['estado']),
+                    'total_items': p['total_items'],
+                    'completados': p['completados'],
+                    'progreso': f"{_porcentaje(p['completados'], p['total_items']):.1f}%",
+                    'costo_total': format_currency(p['costo_total']),
+                }
+                for p in planes
+            ]
+            titulo = "Reporte de Tratamientos"
+        
+        export_response = self._export_report(request, titulo, data)
         if export_response:
             return export_response
         
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-inventario')
+    @cache_reporte
     def reporte_inventario(self, request):
         """
         Reporte del estado actual del inventario.
@@ -935,6 +1216,10 @@ class ReportesViewSet(viewsets.ViewSet):
         if categoria_id:
             queryset = queryset.filter(categoria_id=categoria_id)
         
+        trabajo_response = self._encolar_exportacion(request, queryset)
+        if trabajo_response:
+            return trabajo_response
+        
         # Preparar datos
         data = []
         for insumo in queryset:
@@ -967,6 +1252,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-citas-odontologo')
+    @cache_reporte
     def reporte_citas_odontologo(self, request):
         """
         Reporte de citas agrupadas por odontólogo.
@@ -977,44 +1263,35 @@ class ReportesViewSet(viewsets.ViewSet):
         - mes: YYYY-MM (default: mes actual)
         - estado: Filtrar por estado de cita
         - formato: json/pdf/excel
-        """
-        hoy = timezone.now().date()
-        mes_param = request.query_params.get('mes', f"{hoy.year}-{hoy.month:02d}")
         
+        Una sola consulta agrupada con conteos condicionales por estado y
+        por tipo de motivo.
+        """
         try:
-            anio, mes = map(int, mes_param.split('-'))
-        except:
-            return Response({'error': 'Formato de mes inválido'}, status=400)
+            anio, mes = _parse_mes(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        odontologos = PerfilOdontologo.objects.filter(usuario__is_active=True).select_related('usuario')
+        inicio, fin = aggregations.rango_mes(anio, mes)
+        estado = request.query_params.get('estado')
+        odontologos = _citas_por_odontologo(inicio, fin, estado.upper() if estado else None)
         
         data = []
-        for odontologo in odontologos:
-            queryset = Cita.objects.filter(
-                odontologo=odontologo,
-                fecha_hora__year=anio,
-                fecha_hora__month=mes
-            )
-            
-            # Filtro opcional por estado
-            estado = request.query_params.get('estado')
-            if estado:
-                queryset = queryset.filter(estado=estado.upper())
-            
-            total_citas = queryset.count()
-            confirmadas = queryset.filter(estado='CONFIRMADA').count()
-            completadas = queryset.filter(estado='ATENDIDA').count()
-            canceladas = queryset.filter(estado='CANCELADA').count()
-            
-            data.append({
-                'odontologo': odontologo.usuario.full_name,
-                'especialidad': odontologo.especialidad or 'General',
+        for o in odontologos:
+            total_citas = o['total_citas']
+            completadas = o['citas_completadas']
+            fila = {
+                'odontologo': f"{o['usuario__nombre']} {o['usuario__apellido']}",
+                'especialidad': o['especialidad__nombre'] or 'General',
                 'total_citas': total_citas,
-                'confirmadas': confirmadas,
+                'confirmadas': o['citas_confirmadas'],
                 'completadas': completadas,
-                'canceladas': canceladas,
+                'canceladas': o['citas_canceladas'],
                 'tasa_completado': f"{(completadas/total_citas*100):.1f}%" if total_citas > 0 else "0%"
-            })
+            }
+            for codigo, _ in MOTIVOS_CITA_CHOICES:
+                fila[codigo.lower()] = o[f'motivo_{codigo.lower()}']
+            data.append(fila)
         
         export_response = self._export_report(request, "Reporte de Citas por Odontólogo", data)
         if export_response:
@@ -1023,6 +1300,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-ingresos-diarios')
+    @cache_reporte
     def reporte_ingresos_diarios(self, request):
         """
         Reporte de ingresos día a día.
@@ -1032,8 +1310,14 @@ class ReportesViewSet(viewsets.ViewSet):
         Parámetros:
         - desde: Fecha inicio (YYYY-MM-DD)
         - hasta: Fecha fin (YYYY-MM-DD)
+        - granularidad: dia, semana o mes (default: dia)
         - formato: json/pdf/excel
         """
+        try:
+            granularidad = series.parse_granularidad(request.query_params.get('granularidad'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         desde = request.query_params.get('desde')
         hasta = request.query_params.get('hasta')
         
@@ -1048,79 +1332,115 @@ class ReportesViewSet(viewsets.ViewSet):
             except:
                 return Response({'error': 'Formato de fecha inválido'}, status=400)
         
-        # Agrupar pagos por día
-        pagos_por_dia = (
-            Pago.objects
-            .filter(fecha_pago__date__gte=desde_date, fecha_pago__date__lte=hasta_date, estado_pago='COMPLETADO')
-            .values('fecha_pago__date')
-            .annotate(
+        # Agrupar pagos por periodo en una sola consulta
+        # (desde el resumen diario si cubre el rango)
+        usar_resumen = rollups.resumen_disponible(rollups.TIPO_PAGOS, desde_date, hasta_date)
+        if usar_resumen:
+            serie = series.serie_temporal(
+                ResumenDiarioPagos.objects.all(), 'fecha',
+                desde_date, hasta_date, granularidad,
+                total=Sum('total'),
+                num_pagos=Coalesce(Sum('cantidad'), 0),
+            )
+        else:
+            serie = series.serie_temporal(
+                Pago.objects.filter(estado_pago='COMPLETADO'), 'fecha_pago',
+                desde_date, hasta_date, granularidad,
                 total=Sum('monto_pagado'),
-                num_pagos=Count('id')
+                num_pagos=Count('id'),
             )
-            .order_by('fecha_pago__date')
-        )
         
-        # Crear diccionario de pagos
-        pagos_dict = {item['fecha_pago__date']: item for item in pagos_por_dia}
-        
-        # Generar todos los días del rango
-        data = []
-        fecha_actual = desde_date
-        while fecha_actual <= hasta_date:
-            pago_data = pagos_dict.get(fecha_actual, {'total': Decimal('0.00'), 'num_pagos': 0})
-            
-            data.append({
-                'fecha': format_date(fecha_actual),
-                'ingresos': format_currency(pago_data['total']),
-                'num_pagos': pago_data['num_pagos']
-            })
-            fecha_actual += timedelta(days=1)
+        data = [
+            {
+                'fecha': format_date(punto['fecha']),
+                'ingresos': format_currency(punto['total']),
+                'num_pagos': punto['num_pagos']
+            }
+            for punto in serie
+        ]
         
         export_response = self._export_report(request, "Ingresos Diarios", data)
         if export_response:
             return export_response
         
-        return Response(data)
+        response = Response(data)
+        response['X-Report-Source'] = 'resumen' if usar_resumen else 'tablas'
+        return response
     
     @action(detail=False, methods=['get'], url_path='reporte-servicios-populares')
+    @cache_reporte
     def reporte_servicios_populares(self, request):
         """
         Reporte de servicios más solicitados con estadísticas.
         
-        GET /api/reportes/reporte-servicios-populares/?limite=20&formato=pdf
+        GET /api/reportes/reporte-servicios-populares/?limite=20&desde=2025-01-01&formato=pdf
+        GET /api/reportes/reporte-servicios-populares/?agrupar=categoria
         
         Parámetros:
-        - limite: Número de servicios a mostrar (default: 10)
-        - formato: json/pdf/excel
+        - limite: Número de servicios (o categorías) a mostrar (default: 10)
+        - desde / hasta: Ventana por fecha de creación del ítem (YYYY-MM-DD)
+        - agrupar: servicio (default) o categoria
+        - formato: json/pdf/excel/csv
+        
+        Una consulta agrupada sobre los ítems de plan: el costo depende del
+        número de grupos, no de servicios × ítems. Los ingresos salen de los
+        snapshots de precio de cada ítem.
         """
-        limite = int(request.query_params.get('limite', 10))
+        agrupar = request.query_params.get('agrupar', 'servicio')
+        if agrupar not in ('servicio', 'categoria'):
+            return Response(
+                {'error': "agrupar debe ser 'servicio' o 'categoria'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            inicio, fin = _rango_fechas(request)
+            limite = _parse_limite(request, default=10)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        items = ItemPlanTratamiento.objects.all()
+        if inicio:
+            items = items.filter(creado__gte=inicio)
+        if fin:
+            items = items.filter(creado__lt=fin)
+        
+        if agrupar == 'categoria':
+            columnas = ('servicio__categoria__nombre',)
+        else:
+            columnas = ('servicio', 'servicio__nombre', 'servicio__categoria__nombre', 'servicio__precio_base')
         
-        servicios = Servicio.objects.all()
+        completado = Q(estado=ItemPlanTratamiento.EstadoItem.COMPLETADO)
+        grupos = (
+            items.order_by().values(*columnas)
+            .annotate(
+                total_veces=Count('id'),
+                completados=Count('id', filter=completado),
+                ingreso_total=aggregations.suma_decimal(_precio_item()),
+                ingreso_completado=aggregations.suma_decimal(_precio_item(), filter=completado),
+            )
+            .order_by('-total_veces', '-ingreso_total')[:limite]
+        )
         
         data = []
-        for servicio in servicios:
-            items = ItemPlanTratamiento.objects.filter(servicio=servicio)
-            total_veces = items.count()
-            total_ingreso = items.aggregate(total=Sum('costo'))['total'] or Decimal('0.00')
-            completados = items.filter(estado='COMPLETADO').count()
-            
-            if total_veces > 0:
-                data.append({
-                    'servicio': servicio.nombre,
-                    'categoria': servicio.categoria,
-                    'total_veces': total_veces,
-                    'completados': completados,
-                    'tasa_completado': f"{(completados/total_veces*100):.1f}%",
-                    'precio_base': format_currency(servicio.precio_base),
-                    'ingreso_total': format_currency(total_ingreso),
-                    'ingreso_promedio': format_currency(total_ingreso / total_veces) if total_veces > 0 else "$0.00"
-                })
-        
-        # Ordenar por total de veces y limitar
-        data.sort(key=lambda x: x['total_veces'], reverse=True)
-        data = data[:limite]
-        
-        export_response = self._export_report(request, "Servicios Más Populares", data)
+        for g in grupos:
+            fila = {} if agrupar == 'categoria' else {'servicio': g['servicio__nombre']}
+            fila.update({
+                'categoria': g['servicio__categoria__nombre'],
+                'total_veces': g['total_veces'],
+                'completados': g['completados'],
+                'tasa_completado': f"{_porcentaje(g['completados'], g['total_veces']):.1f}%",
+            })
+            if agrupar == 'servicio':
+                fila['precio_base'] = format_currency(g['servicio__precio_base'])
+            fila.update({
+                'ingreso_total': format_currency(g['ingreso_total']),
+                'ingreso_completado': format_currency(g['ingreso_completado']),
+                'ingreso_promedio': format_currency(g['ingreso_total'] / g['total_veces']),
+            })
+            data.append(fila)
+        
+        titulo = "Categorías Más Populares" if agrupar == 'categoria' else "Servicios Más Populares"
+        export_response = self._export_report(request, titulo, data)
         if export_response:
             return export_response
         
@@ -1144,28 +1464,45 @@ class BitacoraViewSet(viewsets.ModelViewSet):
     - modelo: Nombre del modelo (ej: 'paciente', 'cita', 'factura')
     - ip: Dirección IP
     - descripcion: Búsqueda en descripción
+    - search: Búsqueda en descripción o IP (índices trigram en PostgreSQL)
+    
+    Paginación por cursor sobre (-fecha_hora, id), sin COUNT(*):
+    - limite: registros por página (default 50, máx. 1000)
+    - cursor: `siguiente_cursor` de la respuesta anterior
+    - total=1: agrega `total_aproximado` (estimación del planner)
     """
     queryset = BitacoraAccion.objects.select_related('usuario', 'content_type').all()
     serializer_class = BitacoraSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = PageNumberPagination  # Paginación solo para bitácora
-    filterset_fields = ['usuario', 'accion']
+    pagination_class = paginacion.KeysetPagination  # Orden fijo: -fecha_hora, -id
+    filter_backends = [SearchFilter]
     search_fields = ['descripcion', 'ip_address']
-    ordering_fields = ['fecha_hora', 'accion']
-    ordering = ['-fecha_hora']
     
     def get_queryset(self):
         """Aplicar filtros dinámicos a la bitácora"""
         queryset = super().get_queryset()
         
-        # Filtro por rango de fechas
-        desde = self.request.query_params.get('desde')
-        if desde:
-            queryset = queryset.filter(fecha_hora__date__gte=desde)
-        
-        hasta = self.request.query_params.get('hasta')
-        if hasta:
-            queryset = queryset.filter(fecha_hora__date__lte=hasta)
+        # Filtro por rango de fechas: rango sobre fecha_hora (no __date) para
+        # que PostgreSQL solo lea las particiones mensuales del rango
+        try:
+            inicio, fin = _rango_fechas(self.request)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        if inicio:
+            queryset = queryset.filter(fecha_hora__gte=inicio)
+        if fin:
+            queryset = queryset.filter(fecha_hora__lt=fin)
+        
+        # Filtros por usuario y acción (índices usuario/accion + fecha_hora)
+        usuario = self.request.query_params.get('usuario')
+        if usuario:
+            if not usuario.isdigit():
+                raise ValidationError({'error': 'usuario debe ser un ID numérico'})
+            queryset = queryset.filter(usuario_id=usuario)
+        
+        accion = self.request.query_params.get('accion')
+        if accion:
+            queryset = queryset.filter(accion=accion.upper())
         
         # Filtro por modelo
         modelo = self.request.query_params.get('modelo')
@@ -1205,7 +1542,7 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         
         # Usuarios más activos
         usuarios_activos = list(
-            queryset.values('usuario__first_name', 'usuario__last_name')
+            queryset.values('usuario__nombre', 'usuario__apellido')
             .annotate(total=Count('id'))
             .order_by('-total')[:10]
         )
@@ -1224,49 +1561,154 @@ class BitacoraViewSet(viewsets.ModelViewSet):
             'usuarios_mas_activos': usuarios_activos,
             'actividad_diaria': actividad_diaria
         })
-    
+
+    @action(detail=False, methods=['get'], url_path='estado-buffer')
+    def estado_buffer(self, request):
+        """
+        Contadores del buffer de escritura de la bitácora (solo staff).
+        Son del proceso que atiende la request: cada worker tiene los suyos.
+
+        GET /api/bitacora/estado-buffer/
+        """
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Solo el personal administrativo puede ver el estado del buffer'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(auditoria.estadisticas())
+
     @action(detail=False, methods=['get'], url_path='exportar')
     def exportar(self, request):
         """
-        Exportar bitácora a PDF o Excel.
+        Exportar bitácora a CSV, Excel o PDF.
         
         GET /api/bitacora/exportar/?formato=excel&desde=2025-01-01&hasta=2025-12-31
+        GET /api/bitacora/exportar/?formato=csv
+        
+        CSV y Excel se generan en streaming (memoria constante) y exportan
+        todos los registros filtrados. PDF se arma en memoria, por eso sigue
+        limitado a los primeros 1000 registros.
         """
         queryset = self.get_queryset()
         formato = request.query_params.get('formato', 'excel').lower()
-        
-        # Preparar datos
-        data = []
-        for registro in queryset[:1000]:  # Limitar a 1000 registros
-            data.append({
-                'fecha_hora': format_date(registro.fecha_hora),
-                'usuario': registro.usuario.full_name if registro.usuario else 'Sistema',
-                'accion': registro.get_accion_display(),
-                'descripcion': registro.descripcion,
-                'ip': registro.ip_address or 'N/A'
-            })
+        titulo = "Bitácora de Auditoría"
+        headers = ['fecha_hora', 'usuario', 'accion', 'descripcion', 'ip']
+        acciones = dict(BitacoraAccion.ACCION_CHOICES)
+        
+        def filas(limite=None):
+            # values_list + iterator: no instancia modelos ni carga todo en memoria
+            registros = queryset.values_list(
+                'fecha_hora', 'usuario__nombre', 'usuario__apellido',
+                'accion', 'descripcion', 'ip_address'
+            )
+            if limite:
+                registros = registros[:limite]
+            for fecha_hora, nombre, apellido, accion, descripcion, ip in registros.iterator(chunk_size=2000):
+                usuario = f"{nombre or ''} {apellido or ''}".strip() if (nombre or apellido) else 'Sistema'
+                yield [
+                    timezone.localtime(fecha_hora).strftime('%d/%m/%Y %H:%M'),
+                    usuario,
+                    acciones.get(accion, accion),
+                    descripcion,
+                    ip or 'N/A'
+                ]
         
         tenant_name = getattr(request.tenant, 'nombre', 'Clínica Dental')
         
+        if formato == 'csv':
+            return StreamingCSVReport(titulo, headers, filas()).generate()
+        
+        if formato == 'excel':
+            trabajo_response = _encolar_si_excede(request, 'bitacora.exportar', formato, _contar_hasta_limite(queryset))
+            if trabajo_response:
+                return trabajo_response
+        
         if formato == 'pdf':
-            pdf = PDFReportGenerator("Bitácora de Auditoría", tenant_name)
+            pdf = PDFReportGenerator(titulo, tenant_name)
             pdf.add_header()
             
-            if data:
-                headers = list(data[0].keys())
-                rows = [headers] + [[str(item.get(k, '')) for k in headers] for item in data]
+            rows = [headers] + [[str(valor) for valor in fila] for fila in filas(limite=1000)]
+            if len(rows) > 1:
                 pdf.add_table(rows, title="Registros de Bitácora")
             
             return pdf.generate()
         
-        else:  # Excel
-            excel = ExcelReportGenerator("Bitácora de Auditoría", tenant_name)
-            excel.add_header()
-            
-            if data:
-                headers = list(data[0].keys())
-                rows = [headers] + [[item.get(k, '') for k in headers] for item in data]
-                excel.add_table(rows, title="Registros de Bitácora")
-            
-            return excel.generate()
+        # Excel (write-only)
+        excel = StreamingExcelReportGenerator(titulo, tenant_name)
+        excel.set_column_widths([18, 30, 18, 80, 16])
+        excel.add_header()
+        excel.add_rows(headers, filas())
+        return excel.generate()
+
 
+class TrabajoReporteViewSet(mixins.CreateModelMixin,
+                            mixins.ListModelMixin,
+                            mixins.RetrieveModelMixin,
+                            viewsets.GenericViewSet):
+    """
+    Trabajos de reportes en segundo plano.
+    
+    Endpoints:
+    - POST /api/reportes/trabajos/ - Encolar un reporte
+      {"endpoint": "reporte-pacientes", "formato": "excel", "parametros": {...}}
+    - GET /api/reportes/trabajos/ - Mis trabajos (admin: todos)
+    - GET /api/reportes/trabajos/{id}/ - Consultar estado (polling)
+    - GET /api/reportes/trabajos/{id}/descargar/ - Descargar el archivo generado
+    
+    Los procesa el comando: python manage.py procesar_trabajos_reportes
+    """
+    serializer_class = TrabajoReporteSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PageNumberPagination
+    
+    def get_queryset(self):
+        queryset = TrabajoReporte.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(usuario=self.request.user)
+        estado = self.request.query_params.get('estado')
+        if estado:
+            queryset = queryset.filter(estado=estado.upper())
+        return queryset
+    
+    def create(self, request, *args, **kwargs):
+        serializer = TrabajoReporteCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            trabajo = trabajos.encolar(
+                request.user,
+                serializer.validated_data['endpoint'],
+                serializer.validated_data['parametros'],
+                serializer.validated_data['formato']
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(
+            TrabajoReporteSerializer(trabajo, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+    
+    @action(detail=True, methods=['get'], url_path='descargar')
+    def descargar(self, request, pk=None):
+        """Descarga el archivo de un trabajo COMPLETADO."""
+        trabajo = self.get_object()
+        
+        if trabajo.estado == 'EXPIRADO' or (trabajo.expira and trabajo.expira < timezone.now()):
+            return Response(
+                {'error': 'El archivo expiró, vuelva a solicitar el reporte'},
+                status=status.HTTP_410_GONE
+            )
+        
+        if trabajo.estado != 'COMPLETADO' or not trabajo.archivo:
+            return Response(
+                {'error': f'El reporte aún no está listo (estado: {trabajo.estado})'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return FileResponse(
+            trabajo.archivo.open('rb'),
+            as_attachment=True,
+            filename=trabajo.nombre_archivo,
+            content_type=trabajo.content_type or None
+        )
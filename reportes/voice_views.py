@@ -6,10 +6,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from django.core import signing
+from django.db.models import Count, F
 from django.utils import timezone
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import itertools
+import time
 
-from .nlp.voice_parser import parse_voice_command
+from .nlp.voice_parser import VoiceReportParser, parse_voice_command
+from .utils import PDFReportGenerator, StreamingExcelReportGenerator, StreamingCSVReport
+from . import aggregations, paginacion
 from agenda.models import Cita
 from facturacion.models import Factura, Pago
 from tratamientos.models import PlanDeTratamiento
@@ -19,6 +25,26 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Firma del token de continuación (el cliente no puede alterar filtros ni cursor)
+SALT_CONTINUACION = 'reportes.voz.continuacion'
+# Segundos de validez del token de continuación
+VIGENCIA_CONTINUACION = 60 * 60
+
+# Filas en la exportación PDF (se arma en memoria; CSV/Excel no tienen tope)
+LIMITE_PDF = 1000
+
+# Estados que reconoce el parser (nlp.voice_parser.ESTADOS) → estado de cada modelo
+ESTADOS_CITA = {
+    'pendiente': 'PENDIENTE',
+    'completado': 'ATENDIDA',
+    'cancelado': 'CANCELADA',
+}
+ESTADOS_FACTURA = {
+    'pendiente': Factura.EstadoFactura.PENDIENTE,
+    'completado': Factura.EstadoFactura.PAGADA,
+    'cancelado': Factura.EstadoFactura.ANULADA,
+}
+
 
 class VoiceReportQueryView(APIView):
     """
@@ -28,7 +54,14 @@ class VoiceReportQueryView(APIView):
     
     Body:
     {
-        "texto": "dame las citas del 1 al 5 de septiembre"
+        "texto": "dame las citas del 1 al 5 de septiembre",
+        "limite": 100,          (opcional, filas por página, máx. 1000)
+        "formato": "excel"      (opcional: csv | excel | pdf, exporta todo el resultado)
+    }
+    
+    Página siguiente (sin volver a interpretar el texto):
+    {
+        "continuacion": "<paginacion.siguiente de la respuesta anterior>"
     }
     
     Response:
@@ -41,44 +74,70 @@ class VoiceReportQueryView(APIView):
             "filtros": {},
             "interpretacion": "Reporte de citas desde el 01/09/2025 hasta el 05/09/2025"
         },
-        "datos": [...],
-        "resumen": {
+        "datos": [...],                    (una página)
+        "resumen": {                       (totales de TODO el resultado; solo en la primera página)
             "total": 10,
             "periodo": "01/09/2025 - 05/09/2025"
-        }
+        },
+        "paginacion": {"limite": 100, "siguiente": "<token>" | null}
     }
     """
     
     permission_classes = [IsAuthenticated]
+    LIMITE_POR_DEFECTO = 100
     
     def post(self, request):
-        texto = request.data.get('texto', '').strip()
+        texto = (request.data.get('texto') or '').strip()
+        token = request.data.get('continuacion')
         
-        if not texto:
+        if not texto and not token:
             return Response(
                 {'error': 'El campo "texto" es requerido'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         try:
-            # 1. Parsear el comando de voz
-            interpretacion = parse_voice_command(texto)
+            limite = paginacion.parse_limite(request.data.get('limite'), self.LIMITE_POR_DEFECTO)
+            cursor = None
+            if token:
+                # La continuación trae la interpretación original: "hoy" sigue
+                # siendo el mismo día aunque se pida la página pasada medianoche
+                interpretacion, cursor = self._leer_continuacion(token)
+            else:
+                # 1. Parsear el comando de voz
+                interpretacion = parse_voice_command(texto)
+                logger.info(f"👤 Usuario {request.user.email} solicitó: {texto}")
+                logger.info(f"🧠 Interpretación: {interpretacion['interpretacion']}")
             
-            logger.info(f"👤 Usuario {request.user.email} solicitó: {texto}")
-            logger.info(f"🧠 Interpretación: {interpretacion['interpretacion']}")
+            consulta = self._consulta(interpretacion)
             
-            # 2. Obtener datos según el tipo de reporte
-            datos = self._obtener_datos(interpretacion, request.user)
+            # 2. Exportación completa (streaming para CSV/Excel)
+            formato = (request.data.get('formato') or '').lower()
+            if formato:
+                return self._exportar(request, interpretacion, consulta, formato)
             
-            # 3. Generar resumen
-            resumen = self._generar_resumen(interpretacion, datos)
+            # 3. Una página de datos por cursor
+            datos, siguiente = [], None
+            if consulta:
+                queryset, campo, descendente, fila = consulta
+                objetos, cursor_siguiente = paginacion.paginar(queryset, campo, descendente, limite, cursor)
+                datos = [fila(obj) for obj in objetos]
+                if cursor_siguiente:
+                    siguiente = self._continuacion(interpretacion, cursor_siguiente)
             
-            return Response({
+            respuesta = {
                 'interpretacion': interpretacion,
                 'datos': datos,
-                'resumen': resumen
-            }, status=status.HTTP_200_OK)
+                'paginacion': {'limite': limite, 'siguiente': siguiente},
+            }
+            # 4. Resumen con agregados sobre todo el resultado (no sobre la página)
+            if not token:
+                respuesta['resumen'] = self._generar_resumen(interpretacion, consulta)
             
+            return Response(respuesta, status=status.HTTP_200_OK)
+        
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"❌ Error procesando comando de voz: {str(e)}")
             return Response(
@@ -86,79 +145,94 @@ class VoiceReportQueryView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    def _obtener_datos(self, interpretacion, user):
-        """Obtiene los datos según el tipo de reporte y filtros."""
-        tipo_reporte = interpretacion['tipo_reporte']
+    # --- continuación ------------------------------------------------------
+    
+    def _continuacion(self, interpretacion, cursor):
+        return signing.dumps({'i': interpretacion, 'c': cursor}, salt=SALT_CONTINUACION, compress=True)
+    
+    def _leer_continuacion(self, token):
+        """(interpretacion, cursor). ValueError si el token no es válido."""
+        try:
+            datos = signing.loads(token, salt=SALT_CONTINUACION, max_age=VIGENCIA_CONTINUACION)
+        except signing.SignatureExpired:
+            raise ValueError('Token de continuación vencido, vuelva a realizar la consulta')
+        except signing.BadSignature:
+            raise ValueError('Token de continuación inválido')
+        return datos['i'], datos['c']
+    
+    # --- consultas -----------------------------------------------------------
+    
+    def _consulta(self, interpretacion):
+        """
+        (queryset, campo_orden, descendente, fila) del tipo de reporte, o None
+        si el tipo no tiene datos tabulares.
+        """
         fecha_inicio = interpretacion['fecha_inicio']
         fecha_fin = interpretacion['fecha_fin']
+        rango = None
+        if fecha_inicio and fecha_fin:
+            # Rango aware [inicio, fin): incluye todo el último día y usa los índices
+            rango = (
+                aggregations.inicio_de_dia(date.fromisoformat(fecha_inicio)),
+                aggregations.inicio_de_dia(date.fromisoformat(fecha_fin) + timedelta(days=1)),
+            )
         filtros = interpretacion['filtros']
         
-        # Convertir strings de fecha a objetos datetime
-        if fecha_inicio:
-            fecha_inicio = datetime.fromisoformat(fecha_inicio).date()
-        if fecha_fin:
-            fecha_fin = datetime.fromisoformat(fecha_fin).date()
-        
-        if tipo_reporte == 'citas':
-            return self._obtener_citas(fecha_inicio, fecha_fin, filtros)
-        elif tipo_reporte == 'facturas':
-            return self._obtener_facturas(fecha_inicio, fecha_fin, filtros)
-        elif tipo_reporte == 'tratamientos':
-            return self._obtener_tratamientos(fecha_inicio, fecha_fin, filtros)
-        elif tipo_reporte == 'pacientes':
-            return self._obtener_pacientes(fecha_inicio, fecha_fin, filtros)
-        elif tipo_reporte == 'ingresos':
-            return self._obtener_ingresos(fecha_inicio, fecha_fin, filtros)
-        else:
-            return []
+        consultas = {
+            'citas': self._consulta_citas,
+            'facturas': self._consulta_facturas,
+            'tratamientos': self._consulta_tratamientos,
+            'pacientes': self._consulta_pacientes,
+            'ingresos': self._consulta_ingresos,
+        }
+        consulta = consultas.get(interpretacion['tipo_reporte'])
+        return consulta(rango, filtros) if consulta else None
+    
+    def _filtrar_estado(self, queryset, estados, estado):
+        """Filtra por el estado del modelo que corresponde al del parser (ninguno si no hay)."""
+        if estado not in estados:
+            return queryset.none()
+        return queryset.filter(estado=estados[estado])
     
-    def _obtener_citas(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene citas filtradas."""
+    def _consulta_citas(self, rango, filtros):
+        """Citas filtradas, por fecha ascendente."""
         queryset = Cita.objects.all()
         
-        if fecha_inicio and fecha_fin:
-            from datetime import datetime, time
-            # Crear datetime para el rango completo del día
-            inicio_dt = datetime.combine(fecha_inicio, time.min)
-            fin_dt = datetime.combine(fecha_fin, time.max)
-            queryset = queryset.filter(
-                fecha_hora__gte=inicio_dt,
-                fecha_hora__lte=fin_dt
-            )
+        if rango:
+            queryset = queryset.filter(fecha_hora__gte=rango[0], fecha_hora__lt=rango[1])
         
         if filtros.get('estado'):
-            queryset = queryset.filter(estado=filtros['estado'].upper())
+            queryset = self._filtrar_estado(queryset, ESTADOS_CITA, filtros['estado'])
         
         if filtros.get('paciente_nombre'):
             queryset = queryset.filter(
                 paciente__usuario__nombre__icontains=filtros['paciente_nombre']
             )
         
-        citas = queryset.select_related('paciente__usuario', 'odontologo__usuario').order_by('fecha_hora')
-        
-        return [{
-            'id': cita.id,
-            'fecha': cita.fecha_hora.strftime('%d/%m/%Y'),
-            'hora': cita.fecha_hora.strftime('%H:%M'),
-            'paciente': cita.paciente.usuario.full_name if cita.paciente else 'N/A',
-            'odontologo': cita.odontologo.usuario.full_name if cita.odontologo else 'N/A',
-            'motivo': cita.motivo or 'N/A',
-            'motivo_tipo': cita.get_motivo_tipo_display(),
-            'estado': cita.get_estado_display()
-        } for cita in citas[:100]]  # Limitar a 100 resultados
+        def fila(cita):
+            return {
+                'id': cita.id,
+                'fecha': timezone.localtime(cita.fecha_hora).strftime('%d/%m/%Y'),
+                'hora': timezone.localtime(cita.fecha_hora).strftime('%H:%M'),
+                'paciente': cita.paciente.usuario.full_name if cita.paciente else 'N/A',
+                'odontologo': cita.odontologo.usuario.full_name if cita.odontologo else 'N/A',
+                'motivo': cita.motivo or 'N/A',
+                'motivo_tipo': cita.get_motivo_tipo_display(),
+                'estado': cita.get_estado_display()
+            }
+        
+        queryset = queryset.select_related('paciente__usuario', 'odontologo__usuario')
+        return queryset, 'fecha_hora', False, fila
     
-    def _obtener_facturas(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene facturas filtradas."""
+    def _consulta_facturas(self, rango, filtros):
+        """Facturas filtradas, de la más reciente a la más antigua."""
         queryset = Factura.objects.all()
         
-        if fecha_inicio and fecha_fin:
-            queryset = queryset.filter(
-                fecha_emision__gte=fecha_inicio,
-                fecha_emision__lte=fecha_fin
-            )
+        if rango:
+            queryset = queryset.filter(fecha_emision__gte=rango[0], fecha_emision__lt=rango[1])
         
         if filtros.get('estado'):
-            queryset = queryset.filter(estado=filtros['estado'])
+            queryset = self._filtrar_estado(queryset, ESTADOS_FACTURA, filtros['estado'])
         
         if filtros.get('monto_minimo'):
             queryset = queryset.filter(monto_total__gte=filtros['monto_minimo'])
@@ -166,95 +240,96 @@ class VoiceReportQueryView(APIView):
         if filtros.get('monto_maximo'):
             queryset = queryset.filter(monto_total__lte=filtros['monto_maximo'])
         
-        facturas = queryset.select_related('paciente__usuario').order_by('-fecha_emision')
-        
-        return [{
-            'id': factura.id,
-            'numero': f"FAC-{factura.id:06d}",
-            'fecha': factura.fecha_emision.strftime('%d/%m/%Y'),
-            'paciente': factura.paciente.usuario.full_name if factura.paciente else 'N/A',
-            'monto_total': float(factura.monto_total),
-            'monto_pagado': float(factura.monto_pagado),
-            'saldo': float(factura.saldo_pendiente),
-            'estado': factura.get_estado_display()
-        } for factura in facturas[:100]]
+        def fila(factura):
+            return {
+                'id': factura.id,
+                'numero': f"FAC-{factura.id:06d}",
+                'fecha': timezone.localtime(factura.fecha_emision).strftime('%d/%m/%Y'),
+                'paciente': factura.paciente.usuario.full_name if factura.paciente else 'N/A',
+                'monto_total': float(factura.monto_total),
+                'monto_pagado': float(factura.monto_pagado),
+                'saldo': float(factura.saldo_pendiente),
+                'estado': factura.get_estado_display()
+            }
+        
+        return queryset.select_related('paciente__usuario'), 'fecha_emision', True, fila
     
-    def _obtener_tratamientos(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene planes de tratamiento filtrados."""
+    def _consulta_tratamientos(self, rango, filtros):
+        """Planes de tratamiento filtrados, con su total calculado en la BD."""
         queryset = PlanDeTratamiento.objects.all()
         
-        if fecha_inicio and fecha_fin:
-            queryset = queryset.filter(
-                fecha_creacion__date__gte=fecha_inicio,
-                fecha_creacion__date__lte=fecha_fin
-            )
+        if rango:
+            queryset = queryset.filter(fecha_creacion__gte=rango[0], fecha_creacion__lt=rango[1])
         
         if filtros.get('estado'):
             queryset = queryset.filter(estado=filtros['estado'])
         
-        planes = queryset.select_related('paciente__usuario', 'odontologo__usuario').order_by('-fecha_creacion')
-        
-        return [{
-            'id': plan.id,
-            'fecha': plan.fecha_creacion.strftime('%d/%m/%Y'),
-            'paciente': plan.paciente.usuario.full_name if plan.paciente else 'N/A',
-            'odontologo': plan.odontologo.usuario.full_name if plan.odontologo else 'N/A',
-            'titulo': plan.titulo,
-            'estado': plan.get_estado_display(),
-            'total': float(plan.precio_total_plan)
-        } for plan in planes[:100]]
+        # Total guardado en el plan (lo mantienen los ítems al guardarse)
+        queryset = queryset.annotate(total_plan=F('precio_total'))
+        
+        def fila(plan):
+            return {
+                'id': plan.id,
+                'fecha': timezone.localtime(plan.fecha_creacion).strftime('%d/%m/%Y'),
+                'paciente': plan.paciente.usuario.full_name if plan.paciente else 'N/A',
+                'odontologo': plan.odontologo.usuario.full_name if plan.odontologo else 'N/A',
+                'titulo': plan.titulo,
+                'estado': plan.get_estado_display(),
+                'total': float(plan.total_plan or 0)
+            }
+        
+        queryset = queryset.select_related('paciente__usuario', 'odontologo__usuario')
+        return queryset, 'fecha_creacion', True, fila
     
-    def _obtener_pacientes(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene pacientes registrados."""
+    def _consulta_pacientes(self, rango, filtros):
+        """Pacientes registrados, del más reciente al más antiguo."""
         queryset = Usuario.objects.filter(tipo_usuario='PACIENTE')
         
-        if fecha_inicio and fecha_fin:
-            queryset = queryset.filter(
-                date_joined__date__gte=fecha_inicio,
-                date_joined__date__lte=fecha_fin
-            )
+        if rango:
+            queryset = queryset.filter(date_joined__gte=rango[0], date_joined__lt=rango[1])
+        
+        def fila(paciente):
+            return {
+                'id': paciente.id,
+                'nombre': paciente.full_name,
+                'email': paciente.email,
+                'telefono': paciente.telefono or 'N/A',
+                'ci': paciente.ci or 'N/A',
+                'fecha_registro': timezone.localtime(paciente.date_joined).strftime('%d/%m/%Y'),
+                'activo': paciente.is_active
+            }
         
-        pacientes = queryset.order_by('-date_joined')
-        
-        return [{
-            'id': paciente.id,
-            'nombre': paciente.full_name,
-            'email': paciente.email,
-            'telefono': paciente.telefono or 'N/A',
-            'ci': paciente.ci or 'N/A',
-            'fecha_registro': paciente.date_joined.strftime('%d/%m/%Y'),
-            'activo': paciente.is_active
-        } for paciente in pacientes[:100]]
+        return queryset, 'date_joined', True, fila
     
-    def _obtener_ingresos(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene resumen de ingresos."""
+    def _consulta_ingresos(self, rango, filtros):
+        """Pagos completados, del más reciente al más antiguo."""
         queryset = Pago.objects.filter(estado_pago='COMPLETADO')
         
-        if fecha_inicio and fecha_fin:
-            queryset = queryset.filter(
-                fecha_pago__date__gte=fecha_inicio,
-                fecha_pago__date__lte=fecha_fin
-            )
+        if rango:
+            queryset = queryset.filter(fecha_pago__gte=rango[0], fecha_pago__lt=rango[1])
         
-        pagos = queryset.select_related('factura__paciente__usuario').order_by('-fecha_pago')
+        def fila(pago):
+            return {
+                'id': pago.id,
+                'fecha': timezone.localtime(pago.fecha_pago).strftime('%d/%m/%Y %H:%M'),
+                'monto': float(pago.monto_pagado),
+                'metodo_pago': pago.get_metodo_pago_display(),
+                'factura': f"FAC-{pago.factura.id:06d}" if pago.factura else 'N/A',
+                'paciente': pago.factura.paciente.usuario.full_name if pago.factura and pago.factura.paciente else 'N/A'
+            }
         
-        return [{
-            'id': pago.id,
-            'fecha': pago.fecha_pago.strftime('%d/%m/%Y %H:%M'),
-            'monto': float(pago.monto_pagado),
-            'metodo_pago': pago.get_metodo_pago_display(),
-            'factura': f"FAC-{pago.factura.id:06d}" if pago.factura else 'N/A',
-            'paciente': pago.factura.paciente.usuario.full_name if pago.factura and pago.factura.paciente else 'N/A'
-        } for pago in pagos[:100]]
+        return queryset.select_related('factura__paciente__usuario'), 'fecha_pago', True, fila
     
-    def _generar_resumen(self, interpretacion, datos):
-        """Genera un resumen del reporte."""
+    # --- resumen -------------------------------------------------------------
+    
+    def _generar_resumen(self, interpretacion, consulta):
+        """Resumen del reporte con agregados sobre el queryset filtrado completo."""
         tipo_reporte = interpretacion['tipo_reporte']
         fecha_inicio = interpretacion['fecha_inicio']
         fecha_fin = interpretacion['fecha_fin']
         
         resumen = {
-            'total': len(datos),
+            'total': 0,
             'tipo': tipo_reporte
         }
         
@@ -263,17 +338,155 @@ class VoiceReportQueryView(APIView):
             ff = datetime.fromisoformat(fecha_fin).strftime('%d/%m/%Y')
             resumen['periodo'] = f"{fi} - {ff}"
         
+        if not consulta:
+            return resumen
+        
+        # Sin select_related ni anotaciones: solo COUNT/SUM en una consulta
+        queryset = consulta[0].select_related(None).order_by()
+        agregados = {'total': Count('pk')}
+        
+        if tipo_reporte == 'ingresos':
+            agregados['total_ingresos'] = aggregations.suma_decimal('monto_pagado')
+        elif tipo_reporte == 'facturas':
+            agregados['total_facturado'] = aggregations.suma_decimal('monto_total')
+            agregados['total_cobrado'] = aggregations.suma_decimal('monto_pagado')
+        elif tipo_reporte == 'tratamientos':
+            agregados['monto_total'] = aggregations.suma_decimal('precio_total')
+        
+        totales = queryset.aggregate(**agregados)
+        resumen['total'] = totales['total']
+        
         # Agregar estadísticas específicas por tipo
-        if tipo_reporte == 'ingresos' and datos:
-            total_ingresos = sum(d['monto'] for d in datos)
+        if tipo_reporte == 'ingresos' and totales['total']:
+            total_ingresos = float(totales['total_ingresos'])
             resumen['total_ingresos'] = round(total_ingresos, 2)
-            resumen['promedio'] = round(total_ingresos / len(datos), 2)
+            resumen['promedio'] = round(total_ingresos / totales['total'], 2)
         
-        if tipo_reporte == 'facturas' and datos:
-            total_monto = sum(d['monto_total'] for d in datos)
-            total_pagado = sum(d['monto_pagado'] for d in datos)
+        if tipo_reporte == 'facturas' and totales['total']:
+            total_monto = float(totales['total_facturado'])
+            total_pagado = float(totales['total_cobrado'])
             resumen['total_facturado'] = round(total_monto, 2)
             resumen['total_cobrado'] = round(total_pagado, 2)
             resumen['saldo_pendiente'] = round(total_monto - total_pagado, 2)
         
+        if tipo_reporte == 'tratamientos' and totales['total']:
+            resumen['monto_total'] = round(float(totales['monto_total']), 2)
+        
         return resumen
+    
+    # --- exportación ---------------------------------------------------------
+    
+    def _exportar(self, request, interpretacion, consulta, formato):
+        """
+        Exporta el resultado completo. CSV y Excel se escriben en streaming a
+        medida que se leen las filas; PDF se limita a LIMITE_PDF filas.
+        """
+        if formato not in ('csv', 'excel', 'pdf'):
+            raise ValueError('formato inválido. Use csv, excel o pdf')
+        if not consulta:
+            raise ValueError(f"El reporte de {interpretacion['tipo_reporte']} no tiene datos exportables")
+        
+        queryset, campo, descendente, fila = consulta
+        queryset = paginacion.ordenar(queryset, campo, descendente)
+        if formato == 'pdf':
+            queryset = queryset[:LIMITE_PDF]
+        titulo = f"Reporte por voz - {interpretacion['interpretacion']}"
+        
+        # Los encabezados salen de la primera fila; el resto se lee en streaming
+        registros = (fila(obj) for obj in queryset.iterator(chunk_size=2000))
+        primera = next(registros, None)
+        headers = list(primera) if primera else []
+        filas = (list(r.values()) for r in itertools.chain([primera] if primera else [], registros))
+        
+        tenant_name = getattr(request.tenant, 'nombre', 'Clínica Dental')
+        logger.info(f"📤 Exportación de voz ({formato}): {interpretacion['interpretacion']}")
+        
+        if formato == 'csv':
+            return StreamingCSVReport(titulo, headers, filas).generate()
+        
+        if formato == 'excel':
+            excel = StreamingExcelReportGenerator(titulo, tenant_name)
+            excel.set_column_widths([max(len(h) + 4, 18) for h in headers])
+            excel.add_header()
+            excel.add_rows(headers, filas)
+            return excel.generate()
+        
+        pdf = PDFReportGenerator(titulo, tenant_name)
+        pdf.add_header()
+        rows = [headers] + [[str(valor) for valor in f] for f in filas]
+        if len(rows) > 1:
+            pdf.add_table(rows, title=interpretacion['interpretacion'])
+        return pdf.generate()
+
+
+class VoiceReportBatchView(APIView):
+    """
+    Interpreta muchos comandos de voz de una vez (sin consultar datos).
+    Pensado para corpus de regresión y pruebas de rendimiento del parser.
+    
+    POST /api/reportes/voice-query/batch/
+    
+    Body:
+    {
+        "textos": ["citas de hoy", "facturas del mes pasado", ...],
+        "fecha_referencia": "2025-09-15"   (opcional, para resultados reproducibles)
+    }
+    
+    Response:
+    {
+        "total": 2,
+        "errores": 0,
+        "resultados": [{...interpretación...}, ...],   (mismo orden que "textos")
+        "duracion_ms": 0.41,
+        "cache": {"aciertos": 10, "fallos": 2, "tamano": 2, "maximo": 2048}
+    }
+    """
+    
+    permission_classes = [IsAuthenticated]
+    MAXIMO_TEXTOS = 1000
+    
+    def post(self, request):
+        textos = request.data.get('textos')
+        if not isinstance(textos, list) or not textos:
+            return Response(
+                {'error': 'El campo "textos" debe ser una lista no vacía'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(textos) > self.MAXIMO_TEXTOS:
+            return Response(
+                {'error': f'Máximo {self.MAXIMO_TEXTOS} textos por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        hoy = timezone.localdate()
+        fecha_referencia = request.data.get('fecha_referencia')
+        if fecha_referencia:
+            try:
+                hoy = date.fromisoformat(fecha_referencia)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'fecha_referencia inválida. Use YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        parser = VoiceReportParser()
+        resultados = []
+        errores = 0
+        inicio = time.perf_counter()
+        for texto in textos:
+            if not isinstance(texto, str) or not texto.strip():
+                resultados.append({'texto_original': texto, 'error': 'Texto vacío o inválido'})
+                errores += 1
+                continue
+            resultados.append(parser.parse(texto.strip(), hoy=hoy))
+        duracion = (time.perf_counter() - inicio) * 1000
+        
+        logger.info(f"🎤 Lote de {len(textos)} comandos de voz interpretado en {duracion:.1f} ms")
+        
+        return Response({
+            'total': len(textos),
+            'errores': errores,
+            'resultados': resultados,
+            'duracion_ms': round(duracion, 2),
+            'cache': parser.cache_info(),
+        })
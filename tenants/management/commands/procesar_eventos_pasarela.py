@@ -0,0 +1,92 @@
+"""
+Comando Django que aplica los webhooks de pasarelas de pago (EventoPasarela).
+
+Uso:
+    python manage.py procesar_eventos_pasarela                 # loop continuo
+    python manage.py procesar_eventos_pasarela --una-vez       # vacía la cola y termina (cron)
+    python manage.py procesar_eventos_pasarela --intervalo=2
+
+Se pueden levantar varios workers en paralelo: cada evento se reclama con
+SELECT ... FOR UPDATE SKIP LOCKED, así que dos workers nunca toman el mismo.
+En cada vuelta también reencola eventos de workers interrumpidos.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from tenants import webhooks
+
+
+class Command(BaseCommand):
+    help = 'Aplica en segundo plano los webhooks recibidos de las pasarelas de pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los eventos pendientes y termina'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=5,
+            help='Segundos de espera cuando no hay eventos (default: 5)'
+        )
+        parser.add_argument(
+            '--max-eventos',
+            type=int,
+            default=0,
+            help='Termina tras procesar N eventos (default: 0 = sin límite)'
+        )
+        parser.add_argument(
+            '--minutos-colgado',
+            type=int,
+            default=15,
+            help='Minutos en PROCESANDO tras los que un evento se reencola (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        worker = webhooks.identificador_worker()
+        procesados = 0
+
+        self.stdout.write(self.style.WARNING(f'⏳ Worker de pasarelas {worker} iniciado...'))
+
+        try:
+            while True:
+                reencolados = webhooks.reencolar_colgados(minutos=options['minutos_colgado'])
+                if reencolados:
+                    self.stdout.write(f'🧹 {reencolados} evento(s) reencolado(s)')
+
+                procesados_vuelta = 0
+                while not (options['max_eventos'] and procesados >= options['max_eventos']):
+                    evento = webhooks.reclamar_siguiente(worker)
+                    if evento is None:
+                        break
+                    self._procesar(evento)
+                    procesados += 1
+                    procesados_vuelta += 1
+
+                if options['una_vez'] or (options['max_eventos'] and procesados >= options['max_eventos']):
+                    break
+                if not procesados_vuelta:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Worker detenido'))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Worker finalizado: {procesados} evento(s) procesado(s).'))
+
+    def _procesar(self, evento):
+        self.stdout.write(f'💳 Evento #{evento.id}: {evento.proveedor} {evento.tipo} ({evento.referencia})')
+        webhooks.procesar(evento)
+
+        if evento.estado == 'PROCESADO':
+            self.stdout.write(self.style.SUCCESS('   ✅ Aplicado'))
+        elif evento.estado == 'IGNORADO':
+            self.stdout.write(f'   ⏭️ Ignorado: {evento.error}')
+        elif evento.estado == 'PENDIENTE':
+            self.stdout.write(self.style.WARNING(
+                f'   🔁 Reintento {evento.intentos} a las {evento.siguiente_intento:%H:%M:%S}: {evento.error}'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f'   ❌ {evento.error}'))
@@ -0,0 +1,88 @@
+"""
+Comando Django que emite un webhook firmado de la pasarela fake (desarrollo).
+
+Requiere PAGOS_PASARELA_FAKE=True. El evento entra por el mismo camino que
+un POST a /api/tenants/webhooks/fake/ (verificación de firma incluida).
+
+Uso:
+    python manage.py simular_evento_pasarela fake_3f2a...             # pago exitoso
+    python manage.py simular_evento_pasarela fake_3f2a... --fallido
+    python manage.py simular_evento_pasarela fake_3f2a... --procesar  # además lo aplica
+    python manage.py simular_evento_pasarela fake_3f2a... --tenant=clinica_demo --pago=12
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tenants import webhooks
+from tenants.payment_handlers import FakePaymentHandler, WebhookInvalido
+
+
+class Command(BaseCommand):
+    help = 'Simula un webhook de la pasarela fake para una transacción'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'referencia',
+            type=str,
+            help='transaccion_id devuelto al iniciar el pago (fake_...)'
+        )
+        parser.add_argument(
+            '--fallido',
+            action='store_true',
+            help='Envía un pago fallido en lugar de exitoso'
+        )
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema de la clínica del pago (metadata.schema)'
+        )
+        parser.add_argument(
+            '--pago',
+            type=int,
+            help='ID del pago en la clínica (metadata.pago_id)'
+        )
+        parser.add_argument(
+            '--evento-id',
+            type=str,
+            help='ID del evento (repetirlo simula un reenvío de la pasarela)'
+        )
+        parser.add_argument(
+            '--procesar',
+            action='store_true',
+            help='Aplica los eventos pendientes después de recibirlo'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.PAGOS_PASARELA_FAKE:
+            raise CommandError('La pasarela fake está deshabilitada (PAGOS_PASARELA_FAKE=False)')
+
+        metadata = {}
+        if options['tenant']:
+            metadata['schema'] = options['tenant']
+        if options['pago']:
+            metadata['pago_id'] = str(options['pago'])
+
+        body, headers = FakePaymentHandler.firmar_evento(
+            options['referencia'],
+            exitoso=not options['fallido'],
+            metadata=metadata,
+            evento_id=options['evento_id']
+        )
+        try:
+            evento, creado = webhooks.recibir('FAKE', body, headers)
+        except WebhookInvalido as e:
+            raise CommandError(f'Webhook rechazado: {e}')
+
+        if creado:
+            self.stdout.write(self.style.SUCCESS(f'📥 Evento #{evento.id} ({evento.evento_id}) recibido'))
+        else:
+            self.stdout.write(self.style.WARNING(f'♻️ Evento {evento.evento_id} duplicado: no se guardó de nuevo'))
+
+        if options['procesar']:
+            procesados = 0
+            while (pendiente := webhooks.reclamar_siguiente()) is not None:
+                webhooks.procesar(pendiente)
+                self.stdout.write(f'   💳 Evento #{pendiente.id}: {pendiente.estado} {pendiente.error}'.rstrip())
+                procesados += 1
+            self.stdout.write(self.style.SUCCESS(f'✅ {procesados} evento(s) procesado(s)'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_solicitudregistro_credenciales_descargadas_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoPasarela',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proveedor', models.CharField(choices=[('STRIPE', 'Stripe'), ('PAYPAL', 'PayPal'), ('MERCADOPAGO', 'MercadoPago'), ('FAKE', 'Pasarela local de pruebas')], max_length=20)),
+                ('evento_id', models.CharField(help_text='ID del evento en la pasarela', max_length=255)),
+                ('tipo', models.CharField(blank=True, max_length=100)),
+                ('referencia', models.CharField(blank=True, db_index=True, help_text='ID de la transacción (sesión, orden o pago) a la que se refiere el evento', max_length=255)),
+                ('resultado', models.CharField(blank=True, choices=[('EXITOSO', 'Pago exitoso'), ('FALLIDO', 'Pago fallido'), ('CONSULTAR', 'Consultar a la pasarela'), ('', 'Sin efecto')], max_length=20)),
+                ('schema_name', models.CharField(blank=True, help_text='Schema de la clínica del pago, si la pasarela lo devuelve en la metadata', max_length=63)),
+                ('datos', models.JSONField(blank=True, default=dict, help_text='Evento normalizado (metadata y datos del pago)')),
+                ('payload', models.JSONField(blank=True, default=dict, help_text='Cuerpo crudo del webhook')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('PROCESADO', 'Procesado'), ('IGNORADO', 'Ignorado (sin efecto)'), ('ERROR', 'Error (se agotaron los intentos)')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('recibido', models.DateTimeField(auto_now_add=True)),
+                ('siguiente_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('procesado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Pasarela',
+                'verbose_name_plural': 'Eventos de Pasarela',
+                'ordering': ['-recibido'],
+                'indexes': [models.Index(fields=['estado', 'siguiente_intento'], name='evento_pasarela_cola_idx')],
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'evento_id'), name='evento_pasarela_unico')],
+            },
+        ),
+    ]
@@ -350,3 +350,77 @@ class SolicitudRegistro(models.Model):
     
     def __str__(self):
         return f"{self.nombre_clinica} - {self.get_estado_display()}"
+
+
+class EventoPasarela(models.Model):
+    """Bandeja de entrada de webhooks de pasarelas de pago (esquema público).
+
+    El endpoint de webhooks solo verifica la firma y guarda el evento crudo;
+    el comando procesar_eventos_pasarela lo aplica en segundo plano (ver
+    tenants/webhooks.py). (proveedor, evento_id) es único, así que los
+    reenvíos de la pasarela no duplican eventos.
+    """
+    
+    PROVEEDOR_CHOICES = [
+        ('STRIPE', 'Stripe'),
+        ('PAYPAL', 'PayPal'),
+        ('MERCADOPAGO', 'MercadoPago'),
+        ('FAKE', 'Pasarela local de pruebas'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('PROCESADO', 'Procesado'),
+        ('IGNORADO', 'Ignorado (sin efecto)'),
+        ('ERROR', 'Error (se agotaron los intentos)'),
+    ]
+    
+    RESULTADO_CHOICES = [
+        ('EXITOSO', 'Pago exitoso'),
+        ('FALLIDO', 'Pago fallido'),
+        ('CONSULTAR', 'Consultar a la pasarela'),
+        ('', 'Sin efecto'),
+    ]
+    
+    proveedor = models.CharField(max_length=20, choices=PROVEEDOR_CHOICES)
+    evento_id = models.CharField(max_length=255, help_text="ID del evento en la pasarela")
+    tipo = models.CharField(max_length=100, blank=True)
+    referencia = models.CharField(
+        max_length=255,
+        blank=True,
+        db_index=True,
+        help_text="ID de la transacción (sesión, orden o pago) a la que se refiere el evento"
+    )
+    resultado = models.CharField(max_length=20, choices=RESULTADO_CHOICES, blank=True)
+    schema_name = models.CharField(
+        max_length=63,
+        blank=True,
+        help_text="Schema de la clínica del pago, si la pasarela lo devuelve en la metadata"
+    )
+    datos = models.JSONField(default=dict, blank=True, help_text="Evento normalizado (metadata y datos del pago)")
+    payload = models.JSONField(default=dict, blank=True, help_text="Cuerpo crudo del webhook")
+    
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    
+    recibido = models.DateTimeField(auto_now_add=True)
+    siguiente_intento = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    procesado = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Evento de Pasarela"
+        verbose_name_plural = "Eventos de Pasarela"
+        ordering = ['-recibido']
+        constraints = [
+            models.UniqueConstraint(fields=['proveedor', 'evento_id'], name='evento_pasarela_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'siguiente_intento'], name='evento_pasarela_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.proveedor} {self.evento_id} ({self.get_estado_display()})"
@@ -1,11 +1,79 @@
 """
 Manejadores de pagos para diferentes pasarelas.
 Cada handler implementa la lógica específica de la pasarela de pago.
+
+Además de crear y verificar pagos, cada handler sabe verificar la firma de
+los webhooks de su pasarela (verify_webhook) y normalizar el evento
+(parse_webhook) para la bandeja de entrada de tenants/webhooks.py.
 """
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
 import requests
 from django.conf import settings
+from django.db import connection
 from decimal import Decimal
 
+# Resultado normalizado de un evento de webhook
+EXITOSO = 'EXITOSO'
+FALLIDO = 'FALLIDO'
+CONSULTAR = 'CONSULTAR'  # El evento solo avisa: hay que preguntar a la pasarela
+SIN_EFECTO = ''
+
+
+class WebhookInvalido(Exception):
+    """Firma ausente, inválida o vencida, o cuerpo que no es un evento."""
+
+
+def _json(body):
+    try:
+        evento = json.loads(body)
+    except (TypeError, ValueError):
+        raise WebhookInvalido('El cuerpo no es JSON válido')
+    if not isinstance(evento, dict):
+        raise WebhookInvalido('El cuerpo no es un evento')
+    return evento
+
+
+def _partes_firma(cabecera):
+    """'t=123,v1=abc,v1=def' -> {'t': ['123'], 'v1': ['abc', 'def']}"""
+    partes = {}
+    for parte in (cabecera or '').split(','):
+        clave, _, valor = parte.strip().partition('=')
+        if valor:
+            partes.setdefault(clave, []).append(valor)
+    return partes
+
+
+def _hmac_sha256(secreto, mensaje):
+    return hmac.new(secreto.encode('utf-8'), mensaje, hashlib.sha256).hexdigest()
+
+
+def _verificar_firma_hmac(cabecera, secreto, construir_mensaje):
+    """
+    Verifica una cabecera 't=<timestamp>,v1=<hmac>' (formato de Stripe,
+    MercadoPago y la pasarela fake). `construir_mensaje(ts)` arma los bytes
+    firmados. Rechaza firmas fuera de PAGOS_WEBHOOK_TOLERANCIA_SEGUNDOS.
+    """
+    if not secreto:
+        raise WebhookInvalido('Webhook no configurado')
+    partes = _partes_firma(cabecera)
+    ts = (partes.get('t') or partes.get('ts') or [''])[0]
+    firmas = partes.get('v1', [])
+    if not ts.isdigit() or not firmas:
+        raise WebhookInvalido('Firma ausente o mal formada')
+
+    segundos = int(ts) / 1000 if len(ts) > 11 else int(ts)  # MercadoPago puede enviar milisegundos
+    if abs(time.time() - segundos) > settings.PAGOS_WEBHOOK_TOLERANCIA_SEGUNDOS:
+        raise WebhookInvalido('Firma vencida')
+
+    esperada = _hmac_sha256(secreto, construir_mensaje(ts))
+    if not any(hmac.compare_digest(esperada, firma) for firma in firmas):
+        raise WebhookInvalido('Firma inválida')
+
 
 class PaymentHandler:
     """Clase base para manejadores de pago."""
@@ -17,6 +85,26 @@ class PaymentHandler:
     def verify_payment(self, payment_id, transaction_data=None):
         """Verifica un pago. Retorna (success: bool, data: dict)."""
         raise NotImplementedError
+    
+    @classmethod
+    def webhook_configurado(cls):
+        """True si la pasarela notifica por webhook (secreto/ID configurado)."""
+        return False
+    
+    def verify_webhook(self, body, headers, params=None):
+        """
+        Verifica la firma de un webhook. `headers` con claves en minúsculas.
+        Retorna el evento (dict) o lanza WebhookInvalido.
+        """
+        raise NotImplementedError
+    
+    def parse_webhook(self, evento):
+        """
+        Normaliza un evento verificado. Retorna dict con evento_id, tipo,
+        referencia (ID de la transacción), resultado (EXITOSO, FALLIDO,
+        CONSULTAR o SIN_EFECTO), metadata y datos (para datos_pago).
+        """
+        raise NotImplementedError
 
 
 class StripePaymentHandler(PaymentHandler):
@@ -48,6 +136,8 @@ class StripePaymentHandler(PaymentHandler):
             metadata = {
                 'pago_id': str(solicitud_o_pago.id),
                 'descripcion': solicitud_o_pago.descripcion,
+                # Los pagos viven en el schema de la clínica: el webhook lo necesita
+                'schema': connection.schema_name,
             }
         
         try:
@@ -107,6 +197,47 @@ class StripePaymentHandler(PaymentHandler):
             }
         except Exception as e:
             return False, {'error': str(e)}
+    
+    @classmethod
+    def webhook_configurado(cls):
+        return bool(settings.STRIPE_WEBHOOK_SECRET)
+    
+    def verify_webhook(self, body, headers, params=None):
+        """Cabecera Stripe-Signature: HMAC-SHA256 de '<t>.<body>'."""
+        _verificar_firma_hmac(
+            headers.get('stripe-signature'),
+            settings.STRIPE_WEBHOOK_SECRET,
+            lambda ts: f'{ts}.'.encode('utf-8') + body
+        )
+        return _json(body)
+    
+    def parse_webhook(self, evento):
+        tipo = evento.get('type', '')
+        session = (evento.get('data') or {}).get('object') or {}
+        
+        if tipo in ('checkout.session.completed', 'checkout.session.async_payment_succeeded'):
+            # Con medios asíncronos 'completed' llega unpaid: se espera al async_payment_*
+            resultado = EXITOSO if session.get('payment_status') == 'paid' else SIN_EFECTO
+        elif tipo in ('checkout.session.async_payment_failed', 'checkout.session.expired'):
+            resultado = FALLIDO
+        else:
+            resultado = SIN_EFECTO
+        
+        return {
+            'evento_id': evento.get('id', ''),
+            'tipo': tipo,
+            'referencia': session.get('id', ''),
+            'resultado': resultado,
+            'metadata': session.get('metadata') or {},
+            'datos': {
+                'session_id': session.get('id'),
+                'payment_intent': session.get('payment_intent'),
+                'amount_total': (session.get('amount_total') or 0) / 100,
+                'currency': session.get('currency'),
+                'payment_status': session.get('payment_status'),
+                'customer_email': (session.get('customer_details') or {}).get('email'),
+            },
+        }
 
 
 class PayPalPaymentHandler(PaymentHandler):
@@ -215,6 +346,90 @@ class PayPalPaymentHandler(PaymentHandler):
             'currency': order['purchase_units'][0]['amount']['currency_code'],
             'payer_email': order.get('payer', {}).get('email_address'),
         }
+    
+    @classmethod
+    def webhook_configurado(cls):
+        return bool(settings.PAYPAL_WEBHOOK_ID)
+    
+    def verify_webhook(self, body, headers, params=None):
+        """
+        PayPal no firma con un secreto compartido: la firma se valida con su
+        API verify-webhook-signature usando las cabeceras PAYPAL-TRANSMISSION-*.
+        """
+        if not settings.PAYPAL_WEBHOOK_ID:
+            raise WebhookInvalido('Webhook no configurado')
+        evento = _json(body)
+        
+        base_url = "https://api-m.sandbox.paypal.com" if settings.PAYPAL_MODE == 'sandbox' else "https://api-m.paypal.com"
+        try:
+            auth_response = requests.post(
+                f"{base_url}/v1/oauth2/token",
+                headers={"Accept": "application/json"},
+                auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET),
+                data={"grant_type": "client_credentials"},
+                timeout=10
+            )
+            if auth_response.status_code != 200:
+                raise WebhookInvalido('Error obteniendo token de PayPal')
+            
+            verify_response = requests.post(
+                f"{base_url}/v1/notifications/verify-webhook-signature",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {auth_response.json()['access_token']}"
+                },
+                json={
+                    'auth_algo': headers.get('paypal-auth-algo'),
+                    'cert_url': headers.get('paypal-cert-url'),
+                    'transmission_id': headers.get('paypal-transmission-id'),
+                    'transmission_sig': headers.get('paypal-transmission-sig'),
+                    'transmission_time': headers.get('paypal-transmission-time'),
+                    'webhook_id': settings.PAYPAL_WEBHOOK_ID,
+                    'webhook_event': evento,
+                },
+                timeout=10
+            )
+        except requests.RequestException as e:
+            raise WebhookInvalido(f'No se pudo verificar con PayPal: {e}')
+        
+        if verify_response.status_code != 200 or verify_response.json().get('verification_status') != 'SUCCESS':
+            raise WebhookInvalido('Firma inválida')
+        return evento
+    
+    def parse_webhook(self, evento):
+        tipo = evento.get('event_type', '')
+        recurso = evento.get('resource') or {}
+        
+        if tipo.startswith('PAYMENT.CAPTURE.'):
+            # Las capturas apuntan a la orden, que es lo que guardamos como transaccion_id
+            referencia = ((recurso.get('supplementary_data') or {}).get('related_ids') or {}).get('order_id', '')
+        else:
+            referencia = recurso.get('id', '')
+        
+        if tipo in ('CHECKOUT.ORDER.COMPLETED', 'PAYMENT.CAPTURE.COMPLETED'):
+            resultado = EXITOSO
+        elif tipo in ('PAYMENT.CAPTURE.DENIED', 'PAYMENT.CAPTURE.DECLINED', 'CHECKOUT.ORDER.VOIDED'):
+            resultado = FALLIDO
+        else:
+            resultado = SIN_EFECTO
+        
+        unidad = (recurso.get('purchase_units') or [{}])[0]
+        monto = recurso.get('amount') or unidad.get('amount') or {}
+        metadata = {'solicitud_id': unidad['reference_id']} if unidad.get('reference_id') else {}
+        
+        return {
+            'evento_id': evento.get('id', ''),
+            'tipo': tipo,
+            'referencia': referencia,
+            'resultado': resultado,
+            'metadata': metadata,
+            'datos': {
+                'order_id': referencia,
+                'status': recurso.get('status'),
+                'amount': monto.get('value'),
+                'currency': monto.get('currency_code'),
+            },
+        }
 
 
 class MercadoPagoPaymentHandler(PaymentHandler):
@@ -281,22 +496,151 @@ class MercadoPagoPaymentHandler(PaymentHandler):
                 'amount': payment['transaction_amount'],
                 'currency': payment['currency_id'],
                 'payer_email': payment.get('payer', {}).get('email'),
+                'external_reference': payment.get('external_reference'),
             }
         except Exception as e:
             return False, {'error': str(e)}
+    
+    @classmethod
+    def webhook_configurado(cls):
+        return bool(settings.MERCADOPAGO_WEBHOOK_SECRET)
+    
+    def verify_webhook(self, body, headers, params=None):
+        """
+        Cabecera x-signature 'ts=...,v1=...': HMAC-SHA256 del manifiesto
+        'id:<data.id>;request-id:<x-request-id>;ts:<ts>;'.
+        """
+        evento = _json(body)
+        data_id = str((params or {}).get('data.id') or (evento.get('data') or {}).get('id') or '')
+        if data_id.isalnum():
+            data_id = data_id.lower()  # MercadoPago firma los IDs alfanuméricos en minúsculas
+        request_id = headers.get('x-request-id', '')
+        
+        _verificar_firma_hmac(
+            headers.get('x-signature'),
+            settings.MERCADOPAGO_WEBHOOK_SECRET,
+            lambda ts: f'id:{data_id};request-id:{request_id};ts:{ts};'.encode('utf-8')
+        )
+        return evento
+    
+    def parse_webhook(self, evento):
+        tipo = evento.get('type') or evento.get('topic') or ''
+        accion = evento.get('action', '')
+        referencia = str((evento.get('data') or {}).get('id') or '')
+        
+        return {
+            'evento_id': str(evento.get('id') or f'{accion or tipo}:{referencia}'),
+            'tipo': accion or tipo,
+            # El aviso no trae el estado del pago: el worker lo consulta con verify_payment
+            'referencia': referencia,
+            'resultado': CONSULTAR if tipo == 'payment' and referencia else SIN_EFECTO,
+            'metadata': {},
+            'datos': {},
+        }
+
+
+class FakePaymentHandler(PaymentHandler):
+    """
+    Pasarela local de pruebas (PAGOS_PASARELA_FAKE=True). No sale a la red:
+    create_payment devuelve una sesión 'fake_...' y el resultado llega como
+    webhook firmado con PAGOS_FAKE_WEBHOOK_SECRET (ver firmar_evento y el
+    comando simular_evento_pasarela).
+    """
+    
+    TIPOS = {'pago.exitoso': EXITOSO, 'pago.fallido': FALLIDO}
+    
+    def create_payment(self, solicitud_o_pago, return_url, cancel_url):
+        payment_id = f'fake_{secrets.token_hex(12)}'
+        if hasattr(solicitud_o_pago, 'plan_solicitado'):
+            metadata = {'solicitud_id': str(solicitud_o_pago.id)}
+        else:
+            metadata = {'pago_id': str(solicitud_o_pago.id), 'schema': connection.schema_name}
+        separador = '&' if '?' in (return_url or '') else '?'
+        return {
+            'success': True,
+            'payment_url': f"{return_url or ''}{separador}session_id={payment_id}",
+            'payment_id': payment_id,
+            'metadata': metadata,
+        }
+    
+    def verify_payment(self, payment_id, transaction_data=None):
+        """La pasarela fake solo informa por webhook."""
+        return False, {'session_id': payment_id, 'status': 'pending'}
+    
+    @classmethod
+    def webhook_configurado(cls):
+        return settings.PAGOS_PASARELA_FAKE
+    
+    def verify_webhook(self, body, headers, params=None):
+        if not settings.PAGOS_PASARELA_FAKE:
+            raise WebhookInvalido('Pasarela fake deshabilitada')
+        _verificar_firma_hmac(
+            headers.get('x-fake-signature'),
+            settings.PAGOS_FAKE_WEBHOOK_SECRET,
+            lambda ts: f'{ts}.'.encode('utf-8') + body
+        )
+        return _json(body)
+    
+    def parse_webhook(self, evento):
+        tipo = evento.get('tipo', '')
+        return {
+            'evento_id': evento.get('id', ''),
+            'tipo': tipo,
+            'referencia': evento.get('referencia', ''),
+            'resultado': self.TIPOS.get(tipo, SIN_EFECTO),
+            'metadata': evento.get('metadata') or {},
+            'datos': evento.get('datos') or {},
+        }
+    
+    @staticmethod
+    def firmar_evento(referencia, exitoso=True, metadata=None, evento_id=None):
+        """Arma un webhook firmado como lo enviaría la pasarela: (body, headers)."""
+        body = json.dumps({
+            'id': evento_id or f'evt_fake_{secrets.token_hex(8)}',
+            'tipo': 'pago.exitoso' if exitoso else 'pago.fallido',
+            'referencia': referencia,
+            'metadata': metadata or {},
+            'datos': {'session_id': referencia, 'status': 'paid' if exitoso else 'failed'},
+        }).encode('utf-8')
+        ts = str(int(time.time()))
+        firma = _hmac_sha256(settings.PAGOS_FAKE_WEBHOOK_SECRET, f'{ts}.'.encode('utf-8') + body)
+        return body, {'X-Fake-Signature': f't={ts},v1={firma}'}
+
+
+HANDLERS = {
+    'STRIPE': StripePaymentHandler,
+    'PAYPAL': PayPalPaymentHandler,
+    'MERCADOPAGO': MercadoPagoPaymentHandler,
+}
 
 
 # Factory para obtener el handler correcto
 def get_payment_handler(metodo_pago):
     """Retorna el handler apropiado según el método de pago."""
-    handlers = {
-        'STRIPE': StripePaymentHandler,
-        'PAYPAL': PayPalPaymentHandler,
-        'MERCADOPAGO': MercadoPagoPaymentHandler,
-    }
-    
-    handler_class = handlers.get(metodo_pago)
+    handler_class = HANDLERS.get(metodo_pago)
     if not handler_class:
         raise ValueError(f"Método de pago '{metodo_pago}' no soportado")
     
+    if settings.PAGOS_PASARELA_FAKE:
+        return FakePaymentHandler()
+    return handler_class()
+
+
+def get_webhook_handler(proveedor):
+    """Handler que verifica los webhooks de `proveedor` (incluye 'FAKE')."""
+    handler_class = {**HANDLERS, 'FAKE': FakePaymentHandler}.get(proveedor)
+    if not handler_class:
+        raise ValueError(f"Proveedor '{proveedor}' no soportado")
     return handler_class()
+
+
+def webhooks_activos(metodo_pago):
+    """
+    True si el resultado de los pagos con este método llega por webhook: en
+    ese caso los endpoints de confirmación leen el estado local en vez de
+    consultar a la pasarela en cada poll.
+    """
+    if settings.PAGOS_PASARELA_FAKE:
+        return metodo_pago in HANDLERS
+    handler_class = HANDLERS.get(metodo_pago)
+    return bool(handler_class and handler_class.webhook_configurado())
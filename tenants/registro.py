@@ -0,0 +1,187 @@
+# tenants/registro.py
+"""
+Alta automática de clínicas a partir de una SolicitudRegistro pagada.
+
+aplicar_resultado() es el único punto que pasa una solicitud de "pago en
+proceso" a COMPLETADA (o PAGO_FALLIDO): lo usan el endpoint
+solicitudes/{id}/confirmar_pago/ y el worker de webhooks
+(tenants/webhooks.py). Bloquea la solicitud y relee su estado, así que un
+webhook repetido o un poll concurrente no crean la clínica dos veces.
+"""
+
+import secrets
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from .models import Clinica, Domain, SolicitudRegistro
+
+User = get_user_model()
+
+ESTADOS_ABIERTOS = ('PENDIENTE_PAGO', 'PAGO_PROCESANDO')
+
+
+def aplicar_resultado(solicitud_id, exitoso, datos):
+    """
+    Si la solicitud sigue esperando el pago: con pago exitoso crea la
+    clínica y el usuario admin y deja la solicitud COMPLETADA (el email con
+    las credenciales se envía tras el commit); si no, PAGO_FALLIDO.
+    Devuelve la solicitud si cambió de estado, None si ya estaba resuelta.
+    """
+    with transaction.atomic():
+        solicitud = SolicitudRegistro.objects.select_for_update().get(pk=solicitud_id)
+        if solicitud.estado not in ESTADOS_ABIERTOS:
+            return None
+        
+        solicitud.datos_pago = {**(solicitud.datos_pago or {}), **datos}
+        if not exitoso:
+            solicitud.estado = 'PAGO_FALLIDO'
+            solicitud.save()
+            return solicitud
+        
+        solicitud.estado = 'PAGO_EXITOSO'
+        solicitud.pago_exitoso = True
+        solicitud.fecha_pago = timezone.now()
+        solicitud.monto_pagado = solicitud.plan_solicitado.precio
+        solicitud.save()
+        
+        # Crear clínica y usuario admin
+        clinica, credenciales = crear_clinica_automatica(solicitud)
+        
+        # Actualizar solicitud con credenciales
+        solicitud.estado = 'COMPLETADA'
+        solicitud.clinica_creada = clinica
+        solicitud.usuario_admin_generado = credenciales['email']
+        solicitud.password_admin_generado = credenciales['password']
+        solicitud.procesada = timezone.now()
+        solicitud.token_expira = timezone.now() + timedelta(days=7)  # Token válido 7 días
+        solicitud.save()
+        
+        # Enviar email con link de descarga
+        transaction.on_commit(lambda: enviar_email_credenciales(solicitud))
+    return solicitud
+
+
+def crear_clinica_automatica(solicitud):
+    """Crear clínica, schema, dominio y usuario admin automáticamente."""
+    # Generar contraseña segura
+    alphabet = string.ascii_letters + string.digits + "!@#$%&*"
+    password = ''.join(secrets.choice(alphabet) for _ in range(16))
+    
+    # Crear schema_name único
+    schema_name = f"tenant_{solicitud.dominio_deseado.replace('-', '_')}"
+    
+    # Crear la clínica (tenant)
+    clinica = Clinica.objects.create(
+        schema_name=schema_name,
+        nombre=solicitud.nombre_clinica,
+        dominio=solicitud.dominio_deseado,
+        email_admin=solicitud.email,
+        telefono=solicitud.telefono,
+        direccion=solicitud.direccion,
+        ciudad=solicitud.ciudad,
+        pais=solicitud.pais,
+        plan=solicitud.plan_solicitado,
+        estado='ACTIVA',
+        activo=True
+    )
+    
+    # Activar el plan
+    clinica.activar_plan()
+    
+    # Crear dominio principal
+    Domain.objects.create(
+        domain=f"{solicitud.dominio_deseado}.localhost",
+        tenant=clinica,
+        is_primary=True
+    )
+    
+    # Si está en producción, agregar dominio de producción
+    if not settings.DEBUG and hasattr(settings, 'RENDER_EXTERNAL_HOSTNAME'):
+        Domain.objects.create(
+            domain=f"{solicitud.dominio_deseado}.{settings.RENDER_EXTERNAL_HOSTNAME}",
+            tenant=clinica,
+            is_primary=False
+        )
+    
+    # Crear usuario administrador en el schema del tenant
+    with schema_context(clinica.schema_name):
+        admin_user = User.objects.create_user(
+            username=solicitud.email.split('@')[0],
+            email=solicitud.email,
+            password=password,
+            first_name=solicitud.nombre_contacto.split()[0] if solicitud.nombre_contacto else 'Admin',
+            last_name=' '.join(solicitud.nombre_contacto.split()[1:]) if len(solicitud.nombre_contacto.split()) > 1 else '',
+            is_staff=True,
+            is_superuser=True,
+            is_active=True
+        )
+        
+        # Crear perfil de usuario si existe el modelo
+        try:
+            from usuarios.models import Perfil
+            Perfil.objects.create(
+                usuario=admin_user,
+                rol='ADMIN',
+                telefono=solicitud.telefono,
+                direccion=solicitud.direccion,
+                ciudad=solicitud.ciudad,
+                pais=solicitud.pais
+            )
+        except ImportError:
+            pass  # Modelo Perfil no existe
+    
+    return clinica, {
+        'email': solicitud.email,
+        'password': password,
+        'username': solicitud.email.split('@')[0]
+    }
+
+
+def enviar_email_credenciales(solicitud):
+    """Enviar email con link de descarga de credenciales."""
+    base_url = 'clinica-dental-backend.onrender.com'
+    download_url = f"https://{base_url}/api/tenants/solicitudes/{solicitud.id}/descargar_credenciales/?token={solicitud.token_descarga}"
+    
+    asunto = f"¡Tu clínica {solicitud.nombre_clinica} está lista!"
+    mensaje = f"""
+Hola {solicitud.nombre_contacto},
+
+¡Excelentes noticias! Tu pago ha sido procesado exitosamente y tu clínica "{solicitud.clinica_creada.nombre}" está lista para usar.
+
+📥 DESCARGA TUS CREDENCIALES:
+{download_url}
+
+⚠️ IMPORTANTE:
+- El link de descarga es válido hasta: {solicitud.token_expira.strftime('%d/%m/%Y %H:%M') if solicitud.token_expira else 'N/A'}
+- Descarga el archivo TXT con tus credenciales de acceso
+- Cambia la contraseña inmediatamente después del primer acceso
+- Guarda el archivo en un lugar seguro
+
+📋 Detalles de tu clínica:
+- Nombre: {solicitud.clinica_creada.nombre}
+- Dominio: {solicitud.clinica_creada.dominio}
+- Plan: {solicitud.plan_solicitado.nombre}
+- Válido hasta: {solicitud.clinica_creada.fecha_expiracion.strftime('%d/%m/%Y') if solicitud.clinica_creada.fecha_expiracion else 'N/A'}
+
+Si tienes alguna pregunta, no dudes en contactarnos.
+
+¡Bienvenido a Clínica Dental System!
+
+Saludos,
+El equipo de Clínica Dental
+"""
+    
+    send_mail(
+        asunto,
+        mensaje,
+        settings.DEFAULT_FROM_EMAIL,
+        [solicitud.email],
+        fail_silently=True
+    )
@@ -0,0 +1,172 @@
+"""
+Tests de la bandeja de entrada de webhooks (tenants/webhooks.py) con la
+pasarela fake: firma, idempotencia de reenvíos y procesamiento en segundo
+plano (reintentos con espera exponencial hasta ERROR).
+"""
+
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from facturacion.models import Pago
+
+from . import webhooks
+from .models import EventoPasarela
+from .payment_handlers import FakePaymentHandler
+
+URL_WEBHOOK_FAKE = '/api/tenants/webhooks/fake/'
+
+
+class WebhooksPasarelaTests(TenantTestCase):
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.nombre = 'Clínica de pruebas'
+        tenant.dominio = 'test'
+        tenant.activo = True
+
+    def setUp(self):
+        super().setUp()
+        # El webhook se atiende en el esquema público (PUBLIC_SCHEMA_URLCONF)
+        ajustes = override_settings(
+            PAGOS_PASARELA_FAKE=True,
+            PAGOS_EVENTOS_MAX_INTENTOS=2,
+            SHOW_PUBLIC_IF_NO_TENANT_FOUND=True,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _post_webhook(self, body, headers):
+        cabeceras = {
+            f"HTTP_{nombre.upper().replace('-', '_')}": valor for nombre, valor in headers.items()
+        }
+        response = self.client.post(URL_WEBHOOK_FAKE, body, content_type='application/json', **cabeceras)
+        # El middleware deja la conexión en el esquema público
+        connection.set_tenant(self.tenant)
+        return response
+
+    def _eventos(self, **filtros):
+        with schema_context(get_public_schema_name()):
+            return list(EventoPasarela.objects.filter(**filtros))
+
+    def _crear_pago(self, referencia):
+        return Pago.objects.create(
+            tipo_pago=Pago.TipoPago.OTRO,
+            monto_pagado=Decimal('50.00'),
+            metodo_pago=Pago.MetodoPago.STRIPE,
+            estado_pago=Pago.EstadoPago.PENDIENTE,
+            transaccion_id=referencia,
+        )
+
+    def _procesar_siguiente(self):
+        evento = webhooks.reclamar_siguiente('tests')
+        self.assertIsNotNone(evento)
+        return webhooks.procesar(evento)
+
+    # --- recepción ---------------------------------------------------------
+
+    def test_firma_valida_guarda_el_evento_pendiente(self):
+        body, headers = FakePaymentHandler.firmar_evento('fake_ref_1', evento_id='evt_valido')
+
+        response = self._post_webhook(body, headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['recibido'])
+        self.assertFalse(response.json()['duplicado'])
+        eventos = self._eventos(proveedor='FAKE', evento_id='evt_valido')
+        self.assertEqual(len(eventos), 1)
+        self.assertEqual(eventos[0].estado, 'PENDIENTE')
+        self.assertEqual(eventos[0].referencia, 'fake_ref_1')
+
+    def test_firma_invalida_responde_400(self):
+        body, headers = FakePaymentHandler.firmar_evento('fake_ref_1', evento_id='evt_manipulado')
+
+        response = self._post_webhook(body.replace(b'fake_ref_1', b'fake_ref_2'), headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Firma inválida')
+        self.assertEqual(self._eventos(evento_id='evt_manipulado'), [])
+
+    def test_firma_vencida_responde_400(self):
+        hace_una_hora = time.time() - 3600
+        with mock.patch('tenants.payment_handlers.time.time', return_value=hace_una_hora):
+            body, headers = FakePaymentHandler.firmar_evento('fake_ref_1', evento_id='evt_vencido')
+
+        response = self._post_webhook(body, headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Firma vencida')
+        self.assertEqual(self._eventos(evento_id='evt_vencido'), [])
+
+    def test_reenvio_del_mismo_evento_no_lo_duplica(self):
+        body, headers = FakePaymentHandler.firmar_evento('fake_ref_1', evento_id='evt_reenviado')
+
+        primera = self._post_webhook(body, headers)
+        segunda = self._post_webhook(body, headers)
+
+        self.assertEqual(segunda.status_code, 200)
+        self.assertFalse(primera.json()['duplicado'])
+        self.assertTrue(segunda.json()['duplicado'])
+        self.assertEqual(segunda.json()['evento'], primera.json()['evento'])
+        self.assertEqual(len(self._eventos(proveedor='FAKE', evento_id='evt_reenviado')), 1)
+
+    # --- procesamiento -----------------------------------------------------
+
+    def test_procesar_completa_el_pago_una_sola_vez(self):
+        pago = self._crear_pago('fake_ref_pago')
+        metadata = {'pago_id': str(pago.pk), 'schema': self.tenant.schema_name}
+        # Dos eventos distintos de la pasarela sobre el mismo pago
+        for evento_id in ('evt_pago_1', 'evt_pago_2'):
+            body, headers = FakePaymentHandler.firmar_evento(
+                'fake_ref_pago', metadata=metadata, evento_id=evento_id
+            )
+            webhooks.recibir('fake', body, headers)
+
+        primero = self._procesar_siguiente()
+        pago.refresh_from_db()
+        completado = pago.fecha_completado
+
+        self.assertEqual(primero.estado, 'PROCESADO')
+        self.assertEqual(pago.estado_pago, Pago.EstadoPago.COMPLETADO)
+        self.assertIsNotNone(completado)
+
+        segundo = self._procesar_siguiente()
+        pago.refresh_from_db()
+
+        self.assertEqual(segundo.estado, 'IGNORADO')
+        self.assertIn('ya estaba procesado', segundo.error)
+        self.assertEqual(pago.fecha_completado, completado)
+        self.assertIsNone(webhooks.reclamar_siguiente('tests'))
+
+    def test_referencia_desconocida_se_reintenta_y_termina_en_error(self):
+        body, headers = FakePaymentHandler.firmar_evento(
+            'fake_ref_inexistente', metadata={'schema': self.tenant.schema_name}, evento_id='evt_huerfano'
+        )
+        webhooks.recibir('fake', body, headers)
+
+        antes = timezone.now()
+        evento = self._procesar_siguiente()
+
+        # Primer fallo: vuelve a PENDIENTE con 30s de espera
+        self.assertEqual(evento.estado, 'PENDIENTE')
+        self.assertEqual(evento.intentos, 1)
+        self.assertIn('fake_ref_inexistente', evento.error)
+        self.assertGreaterEqual(evento.siguiente_intento, antes + timedelta(seconds=30))
+        self.assertIsNone(webhooks.reclamar_siguiente('tests'))
+
+        with schema_context(get_public_schema_name()):
+            EventoPasarela.objects.filter(pk=evento.pk).update(siguiente_intento=timezone.now())
+        evento = self._procesar_siguiente()
+
+        # Se agotaron los intentos (PAGOS_EVENTOS_MAX_INTENTOS=2)
+        self.assertEqual(evento.estado, 'ERROR')
+        self.assertEqual(evento.intentos, 2)
+        self.assertIsNotNone(evento.procesado)
+        self.assertIsNone(webhooks.reclamar_siguiente('tests'))
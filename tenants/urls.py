@@ -14,6 +14,9 @@ urlpatterns = [
     # Endpoint informativo público
     path('registro/info/', views.info_registro, name='info-registro'),
     
+    # Webhooks de pasarelas de pago (stripe, paypal, mercadopago, fake)
+    path('webhooks/<str:proveedor>/', views.webhook_pasarela, name='webhook-pasarela'),
+    
     # APIs REST (las rutas del router)
     path('', include(router.urls)),
 ]
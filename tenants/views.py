@@ -1,11 +1,12 @@
+import logging
+
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser
 from django.utils import timezone
-from django.db import transaction
 from django.http import JsonResponse, HttpResponse
-from .models import PlanSuscripcion, SolicitudRegistro, Clinica, Domain
+from .models import PlanSuscripcion, SolicitudRegistro, Clinica
 from .serializers import (
     PlanSuscripcionSerializer,
     SolicitudRegistroSerializer,
@@ -13,15 +14,12 @@ from .serializers import (
     ClinicaAdminSerializer
 )
 from django.template.loader import render_to_string
-from django.core.mail import send_mail
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from .payment_handlers import get_payment_handler
+from .payment_handlers import get_payment_handler, webhooks_activos, WebhookInvalido
+from . import registro, webhooks
 import secrets
-import string
-from datetime import timedelta
 
-User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 class PlanSuscripcionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -137,7 +135,12 @@ class SolicitudRegistroViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post', 'get'], permission_classes=[AllowAny])
     def confirmar_pago(self, request, pk=None):
-        """Confirmar pago y crear clínica automáticamente (PASO 3 - Webhook/Callback)."""
+        """
+        Confirmar pago y crear clínica automáticamente (PASO 3 - Callback).
+        
+        Si la pasarela tiene webhook configurado devuelve el estado local
+        (202 mientras se espera el evento); si no, verifica con la pasarela.
+        """
         solicitud = self.get_object()
         
         if solicitud.estado not in ['PAGO_PROCESANDO', 'PENDIENTE_PAGO']:
@@ -147,6 +150,15 @@ class SolicitudRegistroViewSet(viewsets.ModelViewSet):
                 'solicitud_id': solicitud.id
             })
         
+        if webhooks_activos(solicitud.metodo_pago):
+            # El resultado lo aplica el worker de webhooks (procesar_eventos_pasarela):
+            # el poll solo lee el estado local, sin llamar a la pasarela
+            return Response({
+                'message': 'Esperando la confirmación de la pasarela',
+                'estado': solicitud.estado,
+                'solicitud_id': solicitud.id
+            }, status=status.HTTP_202_ACCEPTED)
+        
         # Obtener ID de transacción (puede venir en query params o body)
         payment_id = request.GET.get('session_id') or request.GET.get('payment_id') or request.data.get('payment_id') or solicitud.transaccion_id
         
@@ -161,31 +173,19 @@ class SolicitudRegistroViewSet(viewsets.ModelViewSet):
             handler = get_payment_handler(solicitud.metodo_pago)
             success, payment_data = handler.verify_payment(payment_id, request.data)
             
+            # Crea la clínica si el pago fue exitoso (no-op si otro proceso ya lo aplicó)
+            actualizada = registro.aplicar_resultado(solicitud.id, success, payment_data)
+            if actualizada is None:
+                solicitud.refresh_from_db()
+                return Response({
+                    'message': 'Pago ya procesado',
+                    'estado': solicitud.estado,
+                    'solicitud_id': solicitud.id
+                })
+            solicitud = actualizada
+            
             if success:
-                # PAGO EXITOSO - CREAR CLÍNICA AUTOMÁTICAMENTE
-                with transaction.atomic():
-                    solicitud.estado = 'PAGO_EXITOSO'
-                    solicitud.pago_exitoso = True
-                    solicitud.fecha_pago = timezone.now()
-                    solicitud.monto_pagado = solicitud.plan_solicitado.precio
-                    solicitud.datos_pago.update(payment_data)
-                    solicitud.save()
-                    
-                    # Crear clínica y usuario admin
-                    clinica, credenciales = self._crear_clinica_automatica(solicitud)
-                    
-                    # Actualizar solicitud con credenciales
-                    solicitud.estado = 'COMPLETADA'
-                    solicitud.clinica_creada = clinica
-                    solicitud.usuario_admin_generado = credenciales['email']
-                    solicitud.password_admin_generado = credenciales['password']
-                    solicitud.procesada = timezone.now()
-                    solicitud.token_expira = timezone.now() + timedelta(days=7)  # Token válido 7 días
-                    solicitud.save()
-                    
-                    # Enviar email con link de descarga
-                    self._enviar_email_credenciales(solicitud)
-                
+                clinica = solicitud.clinica_creada
                 return Response({
                     'message': '¡Pago exitoso! Clínica creada automáticamente.',
                     'solicitud_id': solicitud.id,
@@ -197,11 +197,6 @@ class SolicitudRegistroViewSet(viewsets.ModelViewSet):
                     'credenciales_nota': 'Descarga el archivo con tus credenciales usando el link proporcionado'
                 })
             else:
-                # Pago fallido
-                solicitud.estado = 'PAGO_FALLIDO'
-                solicitud.datos_pago.update(payment_data)
-                solicitud.save()
-                
                 return Response({
                     'error': 'Pago no exitoso',
                     'detalles': payment_data,
@@ -338,127 +333,30 @@ ID Solicitud: {solicitud.id}
         
         return response
     
-    def _crear_clinica_automatica(self, solicitud):
-        """Crear clínica, schema, dominio y usuario admin automáticamente."""
-        # Generar contraseña segura
-        alphabet = string.ascii_letters + string.digits + "!@#$%&*"
-        password = ''.join(secrets.choice(alphabet) for _ in range(16))
-        
-        # Crear schema_name único
-        schema_name = f"tenant_{solicitud.dominio_deseado.replace('-', '_')}"
-        
-        # Crear la clínica (tenant)
-        clinica = Clinica.objects.create(
-            schema_name=schema_name,
-            nombre=solicitud.nombre_clinica,
-            dominio=solicitud.dominio_deseado,
-            email_admin=solicitud.email,
-            telefono=solicitud.telefono,
-            direccion=solicitud.direccion,
-            ciudad=solicitud.ciudad,
-            pais=solicitud.pais,
-            plan=solicitud.plan_solicitado,
-            estado='ACTIVA',
-            activo=True
-        )
-        
-        # Activar el plan
-        clinica.activar_plan()
-        
-        # Crear dominio principal
-        Domain.objects.create(
-            domain=f"{solicitud.dominio_deseado}.localhost",
-            tenant=clinica,
-            is_primary=True
-        )
-        
-        # Si está en producción, agregar dominio de producción
-        if not settings.DEBUG and hasattr(settings, 'RENDER_EXTERNAL_HOSTNAME'):
-            Domain.objects.create(
-                domain=f"{solicitud.dominio_deseado}.{settings.RENDER_EXTERNAL_HOSTNAME}",
-                tenant=clinica,
-                is_primary=False
-            )
-        
-        # Crear usuario administrador en el schema del tenant
-        from django.db import connection
-        from django_tenants.utils import schema_context
-        
-        with schema_context(clinica.schema_name):
-            admin_user = User.objects.create_user(
-                username=solicitud.email.split('@')[0],
-                email=solicitud.email,
-                password=password,
-                first_name=solicitud.nombre_contacto.split()[0] if solicitud.nombre_contacto else 'Admin',
-                last_name=' '.join(solicitud.nombre_contacto.split()[1:]) if len(solicitud.nombre_contacto.split()) > 1 else '',
-                is_staff=True,
-                is_superuser=True,
-                is_active=True
-            )
-            
-            # Crear perfil de usuario si existe el modelo
-            try:
-                from usuarios.models import Perfil
-                Perfil.objects.create(
-                    usuario=admin_user,
-                    rol='ADMIN',
-                    telefono=solicitud.telefono,
-                    direccion=solicitud.direccion,
-                    ciudad=solicitud.ciudad,
-                    pais=solicitud.pais
-                )
-            except ImportError:
-                pass  # Modelo Perfil no existe
-        
-        return clinica, {
-            'email': solicitud.email,
-            'password': password,
-            'username': solicitud.email.split('@')[0]
-        }
-    
-    def _enviar_email_credenciales(self, solicitud):
-        """Enviar email con link de descarga de credenciales."""
-        base_url = 'clinica-dental-backend.onrender.com'
-        download_url = f"https://{base_url}/api/tenants/solicitudes/{solicitud.id}/descargar_credenciales/?token={solicitud.token_descarga}"
-        
-        asunto = f"¡Tu clínica {solicitud.nombre_clinica} está lista!"
-        mensaje = f"""
-Hola {solicitud.nombre_contacto},
-
-¡Excelentes noticias! Tu pago ha sido procesado exitosamente y tu clínica "{solicitud.clinica_creada.nombre}" está lista para usar.
-
-📥 DESCARGA TUS CREDENCIALES:
-{download_url}
-
-⚠️ IMPORTANTE:
-- El link de descarga es válido hasta: {solicitud.token_expira.strftime('%d/%m/%Y %H:%M') if solicitud.token_expira else 'N/A'}
-- Descarga el archivo TXT con tus credenciales de acceso
-- Cambia la contraseña inmediatamente después del primer acceso
-- Guarda el archivo en un lugar seguro
-
-📋 Detalles de tu clínica:
-- Nombre: {solicitud.clinica_creada.nombre}
-- Dominio: {solicitud.clinica_creada.dominio}
-- Plan: {solicitud.plan_solicitado.nombre}
-- Válido hasta: {solicitud.clinica_creada.fecha_expiracion.strftime('%d/%m/%Y') if solicitud.clinica_creada.fecha_expiracion else 'N/A'}
-
-Si tienes alguna pregunta, no dudes en contactarnos.
+    # Métodos antiguos removidos (aprobar/rechazar manual)
 
-¡Bienvenido a Clínica Dental System!
 
-Saludos,
-El equipo de Clínica Dental
-"""
-        
-        send_mail(
-            asunto,
-            mensaje,
-            settings.DEFAULT_FROM_EMAIL,
-            [solicitud.email],
-            fail_silently=True
-        )
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def webhook_pasarela(request, proveedor):
+    """
+    Webhook de pasarelas de pago: POST /api/tenants/webhooks/<proveedor>/
+    (stripe, paypal, mercadopago o fake).
     
-    # Métodos antiguos removidos (aprobar/rechazar manual)
+    Solo verifica la firma y guarda el evento en la bandeja de entrada;
+    lo aplica el worker procesar_eventos_pasarela. Un reenvío del mismo
+    evento responde 200 sin duplicarlo.
+    """
+    try:
+        evento, creado = webhooks.recibir(proveedor, request.body, request.headers, request.GET)
+    except ValueError:
+        return Response({'error': 'Proveedor no soportado'}, status=status.HTTP_404_NOT_FOUND)
+    except WebhookInvalido as e:
+        logger.warning(f"⚠️ Webhook {proveedor} rechazado: {e}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'recibido': True, 'evento': evento.id, 'duplicado': not creado})
 
 
 @api_view(['GET'])
@@ -0,0 +1,227 @@
+# tenants/webhooks.py
+"""
+Webhooks de pasarelas de pago con bandeja de entrada (EventoPasarela).
+
+1. POST /api/tenants/webhooks/<proveedor>/ verifica la firma (handler de la
+   pasarela en payment_handlers.py), normaliza el evento y lo guarda crudo.
+   Responde enseguida: crear una clínica o confirmar un pago no ocurre
+   dentro de la request de la pasarela.
+2. El comando procesar_eventos_pasarela reclama eventos con
+   SELECT ... FOR UPDATE SKIP LOCKED y los aplica a la SolicitudRegistro
+   (esquema público) o al Pago (esquema de su clínica) de la referencia.
+   Los errores se reintentan con espera exponencial hasta
+   PAGOS_EVENTOS_MAX_INTENTOS.
+
+Idempotencia: (proveedor, evento_id) es único, así que un reenvío no crea
+otro evento; y registro.aplicar_resultado / facturacion.pasarela solo
+cambian estados todavía abiertos, así que dos eventos sobre el mismo pago
+(p. ej. completed y async_payment_succeeded) no lo procesan dos veces.
+"""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from facturacion import pasarela
+from facturacion.models import Pago
+
+from . import registro
+from .models import Clinica, EventoPasarela, SolicitudRegistro
+from .payment_handlers import EXITOSO, FALLIDO, CONSULTAR, WebhookInvalido, get_webhook_handler
+
+logger = logging.getLogger(__name__)
+
+# Estados de MercadoPago que todavía pueden terminar aprobados
+_ESTADOS_EN_CURSO = ('pending', 'in_process', 'authorized')
+
+
+def identificador_worker():
+    """host:pid del proceso actual."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def recibir(proveedor, body, headers, params=None):
+    """
+    Verifica y guarda un webhook. Devuelve (evento, creado); creado es False
+    si la pasarela reenvió un evento ya recibido. Lanza ValueError si el
+    proveedor no existe y WebhookInvalido si la firma no es válida.
+    """
+    proveedor = (proveedor or '').upper()
+    handler = get_webhook_handler(proveedor)
+    cabeceras = {clave.lower(): valor for clave, valor in headers.items()}
+
+    payload = handler.verify_webhook(body, cabeceras, params or {})
+    normalizado = handler.parse_webhook(payload)
+    if not normalizado['evento_id']:
+        raise WebhookInvalido('Evento sin identificador')
+
+    metadata = normalizado['metadata']
+    with schema_context(get_public_schema_name()):
+        evento, creado = EventoPasarela.objects.get_or_create(
+            proveedor=proveedor,
+            evento_id=normalizado['evento_id'][:255],
+            defaults={
+                'tipo': normalizado['tipo'][:100],
+                'referencia': normalizado['referencia'][:255],
+                'resultado': normalizado['resultado'],
+                'schema_name': str(metadata.get('schema') or '')[:63],
+                'datos': {'metadata': metadata, 'datos': normalizado['datos']},
+                'payload': payload,
+            }
+        )
+
+    if creado:
+        logger.info(f"📥 Webhook {proveedor} {evento.evento_id} ({evento.tipo}) recibido")
+    return evento, creado
+
+
+def reclamar_siguiente(worker=None):
+    """
+    Toma el evento PENDIENTE más antiguo cuyo reintento ya venció y lo marca
+    PROCESANDO. FOR UPDATE SKIP LOCKED permite varios workers en paralelo.
+    """
+    with schema_context(get_public_schema_name()), transaction.atomic():
+        evento = (
+            EventoPasarela.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado='PENDIENTE', siguiente_intento__lte=timezone.now())
+            .order_by('recibido')
+            .first()
+        )
+        if evento is None:
+            return None
+        evento.estado = 'PROCESANDO'
+        evento.iniciado = timezone.now()
+        evento.intentos += 1
+        evento.worker = worker or identificador_worker()
+        evento.save(update_fields=['estado', 'iniciado', 'intentos', 'worker'])
+    return evento
+
+
+def reencolar_colgados(minutos=15):
+    """Devuelve a PENDIENTE los eventos PROCESANDO de workers que murieron."""
+    with schema_context(get_public_schema_name()):
+        return EventoPasarela.objects.filter(
+            estado='PROCESANDO', iniciado__lt=timezone.now() - timedelta(minutes=minutos)
+        ).update(estado='PENDIENTE')
+
+
+def procesar(evento):
+    """Aplica un evento reclamado y guarda el resultado (o agenda el reintento)."""
+    try:
+        estado, detalle = aplicar(evento)
+    except Exception as e:
+        evento.error = str(e)
+        if evento.intentos >= settings.PAGOS_EVENTOS_MAX_INTENTOS:
+            evento.estado = 'ERROR'
+            evento.procesado = timezone.now()
+            logger.error(f"❌ Evento {evento.proveedor} {evento.evento_id} en ERROR: {e}", exc_info=True)
+        else:
+            # 30s, 1min, 2min, 4min...
+            evento.estado = 'PENDIENTE'
+            evento.siguiente_intento = timezone.now() + timedelta(seconds=30 * 2 ** (evento.intentos - 1))
+            logger.warning(f"⚠️ Evento {evento.proveedor} {evento.evento_id} se reintentará: {e}")
+    else:
+        evento.estado = estado
+        evento.error = detalle
+        evento.procesado = timezone.now()
+
+    with schema_context(get_public_schema_name()):
+        evento.save(update_fields=['estado', 'error', 'procesado', 'siguiente_intento'])
+    return evento
+
+
+def aplicar(evento):
+    """
+    Aplica el evento a su solicitud o pago. Devuelve (estado, detalle) con
+    estado PROCESADO o IGNORADO; lanza excepción si hay que reintentar (p. ej.
+    la pasarela no responde o la referencia todavía no está guardada).
+    """
+    resultado = evento.resultado
+    metadata = evento.datos.get('metadata') or {}
+    datos = evento.datos.get('datos') or {}
+
+    if resultado == CONSULTAR:
+        exitoso, datos = get_webhook_handler(evento.proveedor).verify_payment(evento.referencia)
+        if 'error' in datos:
+            raise RuntimeError(datos['error'])
+        if not exitoso and datos.get('status') in _ESTADOS_EN_CURSO:
+            return 'IGNORADO', f"El pago sigue en curso en la pasarela ({datos['status']})"
+        if datos.get('external_reference'):
+            metadata = {**metadata, 'solicitud_id': str(datos['external_reference'])}
+        resultado = EXITOSO if exitoso else FALLIDO
+
+    if resultado not in (EXITOSO, FALLIDO):
+        return 'IGNORADO', f'Evento {evento.tipo} sin efecto sobre pagos'
+    exitoso = resultado == EXITOSO
+
+    if not metadata.get('pago_id'):
+        solicitud_id = _buscar_solicitud(evento.referencia, metadata)
+        if solicitud_id:
+            with schema_context(get_public_schema_name()):
+                aplicado = registro.aplicar_resultado(solicitud_id, exitoso, datos)
+            return _resultado(aplicado, f'Solicitud #{solicitud_id}')
+
+    ubicacion = _buscar_pago(evento.referencia, metadata, evento.schema_name)
+    if ubicacion:
+        schema, pago_id = ubicacion
+        with schema_context(schema):
+            aplicado = pasarela.aplicar_resultado(pago_id, exitoso, datos)
+        return _resultado(aplicado, f'Pago #{pago_id} ({schema})')
+
+    # El webhook puede llegar antes de que se guarde transaccion_id: se reintenta
+    raise LookupError(f'No hay solicitud ni pago con referencia {evento.referencia!r}')
+
+
+def _resultado(aplicado, objetivo):
+    if aplicado is None:
+        return 'IGNORADO', f'{objetivo} ya estaba procesado'
+    return 'PROCESADO', ''
+
+
+def _buscar_solicitud(referencia, metadata):
+    """ID de la SolicitudRegistro por transaccion_id o por metadata.solicitud_id."""
+    with schema_context(get_public_schema_name()):
+        solicitudes = SolicitudRegistro.objects.values_list('pk', flat=True)
+        if referencia:
+            solicitud_id = solicitudes.filter(transaccion_id=referencia).first()
+            if solicitud_id:
+                return solicitud_id
+        solicitud_id = str(metadata.get('solicitud_id') or '')
+        if solicitud_id.isdigit():
+            return solicitudes.filter(pk=solicitud_id).first()
+    return None
+
+
+def _buscar_pago(referencia, metadata, schema_name):
+    """
+    (schema, pago_id) del Pago con esa transaccion_id. Con el schema en la
+    metadata se busca solo ahí; si no, en todas las clínicas activas.
+    """
+    if schema_name:
+        esquemas = [schema_name]
+    else:
+        with schema_context(get_public_schema_name()):
+            esquemas = list(
+                Clinica.objects.exclude(schema_name=get_public_schema_name())
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+    pago_id = str(metadata.get('pago_id') or '')
+    for esquema in esquemas:
+        with schema_context(esquema):
+            pagos = Pago.objects.values_list('pk', flat=True)
+            encontrado = pagos.filter(transaccion_id=referencia).first() if referencia else None
+            # Los IDs de pago solo son únicos dentro de una clínica
+            if encontrado is None and schema_name and pago_id.isdigit():
+                encontrado = pagos.filter(pk=pago_id).first()
+            if encontrado:
+                return esquema, encontrado
+    return None
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TratamientosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tratamientos'
+
+    def ready(self):
+        """Registra los signals que mantienen los costos precalculados."""
+        import tratamientos.signals  # noqa
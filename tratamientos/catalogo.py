@@ -0,0 +1,149 @@
+# tratamientos/catalogo.py
+"""
+Catálogo de servicios versionado y cacheado por tenant.
+
+Los endpoints catalogo y por_categoria de ServicioViewSet no se arman en
+cada request: se sirve un snapshot ya serializado guardado en la caché bajo
+la clave schema + revisión del catálogo + tipo. La revisión es la versión
+del tenant en el espacio 'catalogo' de reportes/cache.py, y se incrementa
+(signals en tratamientos/signals.py, al confirmar la transacción) cuando
+cambia un Servicio, CategoriaServicio, MaterialServicioFijo/Opcional,
+CategoriaInsumo o el precio, estado o categoría de un Insumo. Al cambiar la
+revisión, el snapshot anterior deja de usarse y expira solo.
+
+Como los reportes, el snapshot solo se cachea si la caché es compartida
+entre procesos (Redis): con LocMemCache el incremento de un worker no
+llegaría a los demás, así que el catálogo se arma en cada request.
+
+Cada snapshot lleva un ETag fuerte (hash de su contenido): si el cliente
+envía If-None-Match con ese valor, se responde 304 sin cuerpo. Solo con
+caché compartida el 304 sale sin consultar la base (el ETag se lee del
+snapshot guardado); sin ella el snapshot se arma igual para calcular el
+ETag y el 304 solo ahorra la transferencia del cuerpo.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from inventario.models import Insumo
+from reportes.cache import cache_compartida, etag_contenido, invalidar_tenant, schema_actual, version_tenant
+
+from .models import CategoriaServicio, Servicio, MaterialServicioOpcional
+from .serializers import CategoriaServicioSerializer, ServicioCatalogoSerializer
+
+logger = logging.getLogger(__name__)
+
+CATALOGO = 'catalogo'
+POR_CATEGORIA = 'por_categoria'
+
+
+ESPACIO_CACHE = 'catalogo'
+
+
+def revision(schema=None):
+    """Revisión actual del catálogo del tenant."""
+    return version_tenant(schema, espacio=ESPACIO_CACHE)
+
+
+def incrementar_revision(schema=None):
+    """Incrementa la revisión del catálogo del tenant (descarta sus snapshots)."""
+    return invalidar_tenant(schema, espacio=ESPACIO_CACHE)
+
+
+def programar_incremento():
+    """Incrementa la revisión del tenant actual al confirmar la transacción."""
+    schema = schema_actual()
+    transaction.on_commit(lambda: incrementar_revision(schema))
+
+
+def _servicios_activos():
+    return Servicio.objects.filter(activo=True).select_related('categoria').prefetch_related(
+        Prefetch(
+            'materiales_opcionales',
+            queryset=MaterialServicioOpcional.objects.select_related('categoria_insumo')
+        )
+    )
+
+
+def _contexto(servicios):
+    """
+    Contexto del serializer con los precios de los insumos activos de todas
+    las categorías opcionales del catálogo, cargados en una sola consulta.
+    """
+    categorias = {
+        material.categoria_insumo_id
+        for servicio in servicios
+        for material in servicio.materiales_opcionales.all()
+    }
+    precios = defaultdict(list)
+    for categoria_id, precio in Insumo.objects.filter(
+        categoria_id__in=categorias, activo=True
+    ).values_list('categoria_id', 'precio_venta'):
+        precios[categoria_id].append(precio)
+    return {'precios_por_categoria': precios}
+
+
+def _construir_catalogo():
+    servicios = list(_servicios_activos().order_by('categoria__orden', 'categoria__nombre', 'nombre'))
+    datos = ServicioCatalogoSerializer(servicios, many=True, context=_contexto(servicios)).data
+    return {
+        'servicios': list(datos),
+        # (categoria_id, precio_base) de cada servicio, para filtrar sin consultar
+        'filtros': [(servicio.categoria_id, servicio.precio_base) for servicio in servicios],
+    }
+
+
+def _construir_por_categoria():
+    servicios = list(_servicios_activos())
+    contexto = _contexto(servicios)
+    por_categoria = defaultdict(list)
+    for servicio in servicios:
+        por_categoria[servicio.categoria_id].append(servicio)
+
+    resultado = []
+    for categoria in CategoriaServicio.objects.filter(activo=True).order_by('orden', 'nombre'):
+        if por_categoria[categoria.pk]:  # Solo incluir si tiene servicios
+            categoria_data = dict(CategoriaServicioSerializer(categoria).data)
+            categoria_data['servicios'] = list(ServicioCatalogoSerializer(
+                por_categoria[categoria.pk], many=True, context=contexto
+            ).data)
+            resultado.append(categoria_data)
+    return {'categorias': resultado, 'total_categorias': len(resultado)}
+
+
+CONSTRUCTORES = {
+    CATALOGO: _construir_catalogo,
+    POR_CATEGORIA: _construir_por_categoria,
+}
+
+
+def snapshot(tipo, schema=None):
+    """
+    Devuelve (snapshot, desde_cache) con snapshot = {'datos': ..., 'etag': ...}
+    para la revisión actual del tenant, construyéndolo si no está en caché.
+    Sin caché compartida se construye siempre (también para responder 304).
+    """
+    if not cache_compartida():
+        datos = CONSTRUCTORES[tipo]()
+        return {'datos': datos, 'etag': etag_contenido(datos)}, False
+
+    schema = schema or schema_actual()
+    # La revisión se lee antes que los datos: un snapshot nunca queda
+    # guardado con datos más viejos que su revisión
+    clave = f'catalogo:{schema}:r{revision(schema)}:{tipo}'
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return guardado, True
+
+    datos = CONSTRUCTORES[tipo]()
+    guardado = {'datos': datos, 'etag': etag_contenido(datos)}
+    try:
+        cache.set(clave, guardado, timeout=settings.CATALOGO_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"❌ No se pudo guardar en caché el catálogo {tipo}: {e}")
+    return guardado, False
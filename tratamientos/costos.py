@@ -0,0 +1,96 @@
+# tratamientos/costos.py
+"""
+Costo de materiales fijos precalculado en Servicio (costo_materiales_fijos).
+
+Es la suma de precio_venta × cantidad de los MaterialServicioFijo del
+servicio. Lo mantienen los signals de tratamientos/signals.py cuando se
+crea, cambia o borra un material fijo, o cambia el precio de venta de un
+Insumo. Las actualizaciones masivas (.update(), bulk_create, importaciones
+de listas de precios) no disparan signals: después de ellas ejecutar
+`python manage.py recalcular_costos_servicios`.
+"""
+
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db.models import DecimalField, F, OuterRef, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+CENTAVO = Decimal('0.01')
+
+
+def _suma_materiales():
+    return Sum(
+        F('insumo__precio_venta') * F('cantidad'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def costos_reales(servicio_ids=None, apps=django_apps):
+    """
+    {servicio_id: costo de sus materiales fijos} en una sola consulta
+    agrupada. Los servicios sin materiales fijos no aparecen (costo cero).
+    """
+    Material = apps.get_model('tratamientos', 'MaterialServicioFijo')
+    materiales = Material.objects.all()
+    if servicio_ids is not None:
+        materiales = materiales.filter(servicio_id__in=servicio_ids)
+    filas = materiales.order_by().values('servicio_id').annotate(costo=_suma_materiales())
+    return {
+        fila['servicio_id']: Decimal(str(fila['costo'] or 0)).quantize(CENTAVO)
+        for fila in filas
+    }
+
+
+def actualizar(servicios, apps=django_apps):
+    """
+    Recalcula en la base el costo de los servicios indicados (queryset o
+    lista de ids) con un único UPDATE. Devuelve la cantidad de servicios.
+    """
+    Servicio = apps.get_model('tratamientos', 'Servicio')
+    Material = apps.get_model('tratamientos', 'MaterialServicioFijo')
+    if not isinstance(servicios, QuerySet):
+        servicios = Servicio.objects.filter(pk__in=list(servicios))
+
+    costo = (
+        Material.objects.filter(servicio_id=OuterRef('pk'))
+        .order_by()
+        .values('servicio_id')
+        .annotate(costo=_suma_materiales())
+        .values('costo')
+    )
+    return servicios.update(costo_materiales_fijos=Coalesce(
+        Subquery(costo),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))
+
+
+def actualizar_por_insumos(insumo_ids, apps=django_apps):
+    """Recalcula el costo de los servicios que usan esos insumos como material fijo."""
+    Servicio = apps.get_model('tratamientos', 'Servicio')
+    Material = apps.get_model('tratamientos', 'MaterialServicioFijo')
+    usados = Material.objects.filter(insumo_id__in=insumo_ids).values('servicio_id')
+    return actualizar(Servicio.objects.filter(pk__in=Subquery(usados)), apps=apps)
+
+
+def recalcular(apps=django_apps, corregir=True):
+    """
+    Compara el costo guardado de cada servicio con el real y, con
+    `corregir`, ajusta los que difieren.
+
+    Devuelve (revisados, diferencias) con diferencias = [(servicio_id, guardado, real)].
+    """
+    Servicio = apps.get_model('tratamientos', 'Servicio')
+    cero = Decimal('0.00')
+
+    guardados = dict(Servicio.objects.values_list('id', 'costo_materiales_fijos'))
+    reales = costos_reales(apps=apps)
+    diferencias = [
+        (servicio_id, guardado, reales.get(servicio_id, cero))
+        for servicio_id, guardado in sorted(guardados.items())
+        if guardado != reales.get(servicio_id, cero)
+    ]
+    if corregir and diferencias:
+        actualizar([servicio_id for servicio_id, _, _ in diferencias], apps=apps)
+    return len(guardados), diferencias
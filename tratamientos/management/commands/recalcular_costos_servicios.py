@@ -0,0 +1,72 @@
+"""
+Comando Django para recalcular el costo de materiales fijos precalculado de
+los servicios (Servicio.costo_materiales_fijos).
+
+Uso:
+    python manage.py recalcular_costos_servicios                       # todas las clínicas
+    python manage.py recalcular_costos_servicios --tenant=clinica_demo
+    python manage.py recalcular_costos_servicios --solo-informe
+
+El costo se mantiene con signals al guardar o borrar materiales fijos y al
+cambiar el precio de venta de un insumo. Las cargas masivas (.update(),
+bulk_create, importación de listas de precios) no pasan por ahí: después de
+ellas ejecutar este comando, que además descarta el catálogo cacheado de
+cada clínica (tratamientos/catalogo.py). Es idempotente.
+"""
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from tratamientos import catalogo, costos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el costo de materiales fijos precalculado de los servicios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--solo-informe',
+            action='store_true',
+            help='Informa las diferencias sin corregirlas'
+        )
+
+    def handle(self, *args, **options):
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        corregir = not options['solo_informe']
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Recalculando costos de servicios en {len(schemas)} clínica(s)'
+            f'{"" if corregir else " (solo informe)"}...'
+        ))
+
+        for schema in schemas:
+            with schema_context(schema):
+                revisados, diferencias = costos.recalcular(corregir=corregir)
+            if corregir:
+                catalogo.incrementar_revision(schema)
+
+            for servicio_id, guardado, real in diferencias:
+                self.stdout.write(f'  🔍 [{schema}] Servicio #{servicio_id}: guardado ${guardado}, real ${real}')
+
+            mensaje = f'[{schema}] {revisados} servicio(s) revisados, {len(diferencias)} con diferencias'
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS(f'✅ {mensaje}'))
+            elif corregir:
+                self.stdout.write(self.style.SUCCESS(f'🔧 {mensaje}, corregidos'))
+            else:
+                self.stdout.write(self.style.WARNING(f'⚠️ {mensaje}'))
+
+        self.stdout.write(self.style.SUCCESS('✅ Recálculo finalizado.'))
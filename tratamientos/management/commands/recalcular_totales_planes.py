@@ -0,0 +1,95 @@
+"""
+Comando Django para recalcular los totales desnormalizados de los planes de
+tratamiento (precio_total, items_total, items_completados).
+
+Uso:
+    python manage.py recalcular_totales_planes                       # todas las clínicas
+    python manage.py recalcular_totales_planes --tenant=clinica_demo
+    python manage.py recalcular_totales_planes --solo-informe
+    python manage.py recalcular_totales_planes --lote=1000 --mostrar=50
+
+Los totales se mantienen de forma incremental al guardar o borrar ítems
+(ItemPlanTratamiento.save/delete). Las cargas masivas (bulk_create,
+.update(), scripts de población) no pasan por ahí: después de ellas
+ejecutar este comando. Es idempotente.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from tratamientos import totales
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el precio total y los contadores de ítems de los planes de tratamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Planes por lote (default: 500)'
+        )
+        parser.add_argument(
+            '--solo-informe',
+            action='store_true',
+            help='Informa las diferencias sin corregirlas'
+        )
+        parser.add_argument(
+            '--mostrar',
+            type=int,
+            default=20,
+            help='Máximo de planes con diferencias a listar por clínica (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        corregir = not options['solo_informe']
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Recalculando totales de planes en {len(schemas)} clínica(s)'
+            f'{"" if corregir else " (solo informe)"}...'
+        ))
+
+        for schema in schemas:
+            with schema_context(schema):
+                revisados, diferencias = totales.recalcular(lote=options['lote'], corregir=corregir)
+
+            for plan_id, guardado, real in diferencias[:options['mostrar']]:
+                self.stdout.write(
+                    f'  🔍 [{schema}] Plan #{plan_id}: guardado {self._formato(guardado)}, '
+                    f'real {self._formato(real)}'
+                )
+            if len(diferencias) > options['mostrar']:
+                self.stdout.write(f'  ... y {len(diferencias) - options["mostrar"]} más')
+
+            mensaje = f'[{schema}] {revisados} plan(es) revisados, {len(diferencias)} con diferencias'
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS(f'✅ {mensaje}'))
+            elif corregir:
+                self.stdout.write(self.style.SUCCESS(f'🔧 {mensaje}, corregidos'))
+            else:
+                self.stdout.write(self.style.WARNING(f'⚠️ {mensaje}'))
+
+        self.stdout.write(self.style.SUCCESS('✅ Recálculo finalizado.'))
+
+    @staticmethod
+    def _formato(totales_plan):
+        precio, items, completados = totales_plan
+        return f'${precio}, {completados}/{items} ítems'
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:39
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0005_alter_plandetratamiento_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plandetratamiento',
+            name='items_completados',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Cantidad de ítems COMPLETADO del plan'),
+        ),
+        migrations.AddField(
+            model_name='plandetratamiento',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Cantidad de ítems del plan'),
+        ),
+        migrations.AddField(
+            model_name='plandetratamiento',
+            name='precio_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Suma del precio de todos los ítems del plan', max_digits=12),
+        ),
+    ]
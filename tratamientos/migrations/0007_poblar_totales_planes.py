@@ -0,0 +1,19 @@
+# Carga inicial de los totales desnormalizados de los planes desde sus ítems.
+
+from django.db import migrations
+
+
+def poblar_totales(apps, schema_editor):
+    from tratamientos.totales import recalcular
+    recalcular(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0006_plandetratamiento_totales'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_totales, migrations.RunPython.noop),
+    ]
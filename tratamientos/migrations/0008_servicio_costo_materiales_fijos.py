@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:47
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0007_poblar_totales_planes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='costo_materiales_fijos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Suma de precio de venta × cantidad de los materiales fijos', max_digits=12),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Carga inicial del costo de materiales fijos precalculado de cada servicio.
+
+from django.db import migrations
+
+
+def poblar_costos(apps, schema_editor):
+    from tratamientos.costos import recalcular
+    recalcular(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0008_servicio_costo_materiales_fijos'),
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_costos, migrations.RunPython.noop),
+    ]
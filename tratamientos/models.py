@@ -1,8 +1,13 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import F, Max
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 
+from .totales import CAMPOS as CAMPOS_TOTALES
+
 # --- IMPORTACIONES ADICIONALES PARA PASO 2.B ---
 # Importamos los modelos del Paso 1 (Inventario) para crear las "recetas"
 from inventario.models import Insumo, CategoriaInsumo
@@ -88,6 +93,16 @@ class Servicio(models.Model):
         help_text="Honorarios base del servicio (sin materiales)"
     )
     
+    # Costo de materiales fijos precalculado: lo mantienen los signals de
+    # tratamientos/signals.py. Reparar con `python manage.py recalcular_costos_servicios`
+    costo_materiales_fijos = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        help_text="Suma de precio de venta × cantidad de los materiales fijos"
+    )
+    
     # Información operacional
     tiempo_estimado = models.PositiveIntegerField(
         default=30,
@@ -313,9 +328,20 @@ class MaterialServicioOpcional(models.Model):
     @property
     def rango_precios(self):
         """Retorna el rango de precios de los insumos disponibles"""
-        opciones = self.opciones_disponibles
-        if opciones.exists():
-            precios = [insumo.precio_venta * self.cantidad for insumo in opciones]
+        return self.calcular_rango(
+            self.opciones_disponibles.values_list('precio_venta', flat=True),
+            self.cantidad
+        )
+
+    @staticmethod
+    def calcular_rango(precios_venta, cantidad):
+        """
+        Rango (mínimo, máximo, promedio) de precio_venta × cantidad. Permite
+        calcularlo con precios ya cargados (p. ej. el catálogo, que los trae
+        todos en una consulta).
+        """
+        precios = [precio * cantidad for precio in precios_venta]
+        if precios:
             return {
                 'minimo': min(precios),
                 'maximo': max(precios),
@@ -437,6 +463,26 @@ class PlanDeTratamiento(models.Model):
         help_text="Notas internas para el equipo médico"
     )
     
+    # Totales desnormalizados: los mantiene ItemPlanTratamiento.save/delete.
+    # Reparar con `python manage.py recalcular_totales_planes`
+    precio_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        help_text="Suma del precio de todos los ítems del plan"
+    )
+    items_total = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Cantidad de ítems del plan"
+    )
+    items_completados = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Cantidad de ítems COMPLETADO del plan"
+    )
+    
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
     
@@ -456,25 +502,58 @@ class PlanDeTratamiento(models.Model):
     @property
     def precio_total_plan(self):
         """
-        Calcula el precio total del plan sumando todos sus ítems.
+        Precio total del plan (suma de todos sus ítems).
         Este es el precio final que verá el paciente.
         """
-        return sum(item.precio_total for item in self.items.all())
+        return self.precio_total
     
     @property
     def cantidad_items(self):
         """Retorna la cantidad de ítems en el plan"""
-        return self.items.count()
+        return self.items_total
     
     @property
     def porcentaje_completado(self):
         """Calcula el porcentaje de ítems completados"""
-        total_items = self.cantidad_items
-        if total_items == 0:
+        if self.items_total == 0:
             return 0
-        items_completados = self.items.filter(estado='COMPLETADO').count()
-        return int((items_completados / total_items) * 100)
+        return int((self.items_completados / self.items_total) * 100)
     
+    @classmethod
+    def aplicar_items(cls, plan_id, precio=Decimal('0'), items=0, completados=0, instancia=None):
+        """
+        Suma los deltas a los totales del plan en un único UPDATE con F():
+        cambios concurrentes de distintos ítems no se pisan.
+        
+        Si se pasa la instancia en memoria, se actualizan sus valores.
+        """
+        cls.objects.filter(pk=plan_id).update(
+            precio_total=F('precio_total') + precio,
+            items_total=F('items_total') + items,
+            items_completados=F('items_completados') + completados,
+        )
+        if instancia is not None:
+            instancia.precio_total += precio
+            instancia.items_total += items
+            instancia.items_completados += completados
+
+    def save(self, *args, **kwargs):
+        """
+        Al actualizar un plan existente no se escriben los totales: la
+        instancia en memoria puede tenerlos desactualizados y un save()
+        completo (aprobar, marcar_como_*, serializers...) pisaría los deltas
+        de aplicar_items. Solo aplicar_items y totales.recalcular los escriben.
+        """
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    campo.name for campo in self._meta.concrete_fields
+                    if not campo.primary_key and campo.name not in CAMPOS_TOTALES
+                ]
+            kwargs['update_fields'] = [campo for campo in update_fields if campo not in CAMPOS_TOTALES]
+        super().save(*args, **kwargs)
+
     def puede_ser_editado(self):
         """Determina si el plan puede ser editado"""
         return self.estado in ['PROPUESTO', 'PRESENTADO']
@@ -497,67 +576,34 @@ class PlanDeTratamiento(models.Model):
     
     def actualizar_progreso(self):
         """
-        Actualiza automáticamente el estado del plan basado en el progreso de sus ítems.
+        Actualiza el estado del plan basado en el progreso de sus ítems, en
+        el momento (una consulta de contadores y como mucho un UPDATE).
         
-        Este método implementa la lógica del MODELO HÍBRIDO:
-        - Se llama automáticamente desde los signals cuando se crea un episodio vinculado
-        - Actualiza el estado del plan según el progreso de los ítems
+        Este método implementa la lógica del MODELO HÍBRIDO. Los signals de
+        ítems y episodios no lo llaman directamente: usan
+        tratamientos.progreso.programar(), que agrupa los recálculos de toda
+        la transacción en uno por plan al hacer commit.
         
         Transiciones de estado:
-        - ACEPTADO → EN_PROGRESO: Cuando se completa el primer ítem
+        - ACEPTADO → EN_PROGRESO: Cuando hay un ítem en progreso o completado
         - EN_PROGRESO → COMPLETADO: Cuando se completan todos los ítems
         
         También actualiza las fechas de inicio y finalización.
         """
-        from django.utils import timezone
-        
-        # Obtener estadísticas de los ítems
-        total_items = self.items.count()
+        from .progreso import contadores, aplicar
         
-        if total_items == 0:
+        fila = contadores([self.pk]).get(self.pk)
+        if not fila or fila['total'] == 0:
             return  # Plan sin ítems, no hacer nada
         
-        items_completados = self.items.filter(estado='COMPLETADO').count()
-        items_en_progreso = self.items.filter(estado='EN_PROGRESO').count()
-        
-        # ============================================================================
-        # TRANSICIÓN: ACEPTADO → EN_PROGRESO
-        # ============================================================================
-        
-        if self.estado == self.EstadoPlan.ACEPTADO:
-            # Si hay al menos un ítem EN_PROGRESO o COMPLETADO
-            if items_en_progreso > 0 or items_completados > 0:
-                self.estado = self.EstadoPlan.EN_PROGRESO
-                self.fecha_inicio = timezone.now()
-                self.save(update_fields=['estado', 'fecha_inicio'])
-                print(f"   🚀 Plan iniciado: ACEPTADO → EN_PROGRESO")
-        
-        # ============================================================================
-        # TRANSICIÓN: EN_PROGRESO → COMPLETADO
-        # ============================================================================
-        
-        elif self.estado == self.EstadoPlan.EN_PROGRESO:
-            # Si TODOS los ítems están completados
-            if items_completados == total_items:
-                self.estado = self.EstadoPlan.COMPLETADO
-                self.fecha_finalizacion = timezone.now()
-                self.save(update_fields=['estado', 'fecha_finalizacion'])
-                print(f"   🎉 Plan completado: EN_PROGRESO → COMPLETADO")
-        
-        # ============================================================================
-        # ACTUALIZACIÓN DE METADATOS
-        # ============================================================================
-        
-        # Actualizar fecha_inicio si no existe y hay progreso
-        if not self.fecha_inicio and (items_en_progreso > 0 or items_completados > 0):
-            self.fecha_inicio = timezone.now()
-            self.save(update_fields=['fecha_inicio'])
+        for campo, valor in aplicar(fila).items():
+            setattr(self, campo, valor)
         
         return {
-            'total_items': total_items,
-            'items_completados': items_completados,
-            'items_en_progreso': items_en_progreso,
-            'porcentaje': self.porcentaje_completado,
+            'total_items': fila['total'],
+            'items_completados': fila['completados'],
+            'items_en_progreso': fila['en_progreso'],
+            'porcentaje': int((fila['completados'] / fila['total']) * 100),
             'estado': self.estado
         }
 
@@ -707,12 +753,8 @@ class ItemPlanTratamiento(models.Model):
         # Snapshot del precio base del servicio
         self.precio_servicio_snapshot = self.servicio.precio_base
         
-        # Snapshot del costo de materiales fijos
-        materiales_fijos_total = sum(
-            material.costo_adicional 
-            for material in self.servicio.materiales_fijos.all()
-        )
-        self.precio_materiales_fijos_snapshot = materiales_fijos_total
+        # Snapshot del costo de materiales fijos (precalculado en el servicio)
+        self.precio_materiales_fijos_snapshot = self.servicio.costo_materiales_fijos
         
         # Snapshot del precio del insumo seleccionado
         if self.insumo_seleccionado:
@@ -720,6 +762,46 @@ class ItemPlanTratamiento(models.Model):
         else:
             self.precio_insumo_seleccionado_snapshot = Decimal('0.00')
     
+    @classmethod
+    def crear_en_lote(cls, plan, datos):
+        """
+        Crea varios ítems PENDIENTE en el plan con un número fijo de consultas.
+        
+        `datos` es una lista de dicts con servicio e insumo_seleccionado ya
+        cargados (instancias) y, opcionalmente, orden, notas y fecha_estimada.
+        Los ítems sin orden van después del último del plan. Los snapshots se
+        toman en memoria (el servicio trae su costo de materiales fijos
+        precalculado), se insertan con bulk_create y los totales del plan se
+        ajustan con un único UPDATE.
+        """
+        from reportes.cache import invalidar_tenant, schema_actual
+        
+        with transaction.atomic():
+            siguiente = (cls.objects.filter(plan=plan).aggregate(ultimo=Max('orden'))['ultimo'] or 0) + 1
+            
+            items = []
+            for dato in datos:
+                item = cls(plan=plan, **dato)
+                if dato.get('orden') is None:
+                    item.orden = siguiente
+                    siguiente += 1
+                item.actualizar_snapshots()
+                items.append(item)
+            
+            # bulk_create no pasa por save(): los totales se aplican aquí
+            cls.objects.bulk_create(items)
+            PlanDeTratamiento.aplicar_items(
+                plan.pk,
+                precio=sum((item.precio_total for item in items), Decimal('0')),
+                items=len(items),
+                instancia=plan,
+            )
+            # Ni bulk_create ni el UPDATE disparan los signals que invalidan
+            # la caché de reportes
+            schema = schema_actual()
+            transaction.on_commit(lambda: invalidar_tenant(schema))
+        return items
+    
     def marcar_como_completado(self):
         """Marca este ítem como completado"""
         self.estado = self.EstadoItem.COMPLETADO
@@ -727,15 +809,85 @@ class ItemPlanTratamiento(models.Model):
         self.fecha_realizada = timezone.now()
         self.save()
     
+    # Campos que determinan lo que el ítem aporta a los totales de su plan
+    CAMPOS_TOTALES = (
+        'plan_id', 'estado', 'precio_servicio_snapshot',
+        'precio_materiales_fijos_snapshot', 'precio_insumo_seleccionado_snapshot',
+    )
+    
+    def _aporte_guardado(self):
+        """Plan, estado y precios persistidos del ítem, con la fila bloqueada."""
+        if self._state.adding or not self.pk:
+            return None
+        return (
+            ItemPlanTratamiento.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values(*self.CAMPOS_TOTALES)
+            .first()
+        )
+    
+    def _aporte_actual(self, anterior, update_fields):
+        """Lo que el ítem aporta tras guardar (con update_fields, el resto sigue igual)."""
+        actual = {campo: getattr(self, campo) for campo in self.CAMPOS_TOTALES}
+        if anterior and update_fields is not None:
+            guardados = {'plan_id' if campo == 'plan' else campo for campo in update_fields}
+            actual.update({campo: valor for campo, valor in anterior.items() if campo not in guardados})
+        return actual
+    
+    def _aplicar_a_planes(self, anterior, actual):
+        """
+        Aplica a cada plan la diferencia entre lo que el ítem aportaba antes
+        (`anterior`) y lo que aporta ahora (`actual`): precio, cantidad y
+        completados.
+        """
+        deltas = defaultdict(lambda: [Decimal('0'), 0, 0])
+        for aporte, signo in ((anterior, -1), (actual, 1)):
+            if aporte and aporte['plan_id']:
+                delta = deltas[aporte['plan_id']]
+                delta[0] += signo * (
+                    aporte['precio_servicio_snapshot']
+                    + aporte['precio_materiales_fijos_snapshot']
+                    + aporte['precio_insumo_seleccionado_snapshot']
+                )
+                delta[1] += signo
+                delta[2] += signo if aporte['estado'] == self.EstadoItem.COMPLETADO else 0
+        
+        for plan_id, (precio, items, completados) in deltas.items():
+            if precio or items or completados:
+                instancia = self.plan if ItemPlanTratamiento.plan.is_cached(self) and self.plan_id == plan_id else None
+                PlanDeTratamiento.aplicar_items(plan_id, precio, items, completados, instancia=instancia)
+    
     def save(self, *args, **kwargs):
-        """Override save para actualizar snapshots automáticamente"""
+        """
+        Override save para actualizar snapshots automáticamente y aplicar a
+        los totales del plan solo el cambio que produce el ítem, en la misma
+        transacción y con la fila del ítem bloqueada.
+        """
         # Actualizar snapshots de precios si es la primera vez o si cambiaron los materiales
         if not self.pk or 'actualizar_precios' in kwargs:
             if 'actualizar_precios' in kwargs:
                 kwargs.pop('actualizar_precios')
             self.actualizar_snapshots()
         
-        super().save(*args, **kwargs)
+        # Un ítem completado sin fecha toma la actual (en este mismo guardado)
+        if self.estado == self.EstadoItem.COMPLETADO and not self.fecha_realizada:
+            from django.utils import timezone
+            self.fecha_realizada = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'fecha_realizada'}
+        
+        with transaction.atomic():
+            anterior = self._aporte_guardado()
+            super().save(*args, **kwargs)
+            self._aplicar_a_planes(anterior, self._aporte_actual(anterior, kwargs.get('update_fields')))
+    
+    def delete(self, *args, **kwargs):
+        """Al eliminar un ítem, se descuenta de los totales de su plan."""
+        with transaction.atomic():
+            anterior = self._aporte_guardado()
+            resultado = super().delete(*args, **kwargs)
+            self._aplicar_a_planes(anterior, None)
+        return resultado
 
 
 # ===============================================================================
@@ -874,13 +1026,18 @@ class Presupuesto(models.Model):
         """
         Copia los precios calculados del Plan de Tratamiento.
         ¡Esto "congela" el precio para siempre!
+        
+        Los subtotales se suman en la base (una consulta agregada); para
+        generar presupuestos completos usar tratamientos.presupuestos.generar().
         """
-        # Calcular subtotales desde los ítems del plan
-        items = self.plan_tratamiento.items.all()
+        from .presupuestos import subtotales
         
-        self.subtotal_servicios = sum(item.precio_servicio_snapshot for item in items)
-        self.subtotal_materiales_fijos = sum(item.precio_materiales_fijos_snapshot for item in items)
-        self.subtotal_materiales_opcionales = sum(item.precio_insumo_seleccionado_snapshot for item in items)
+        cero = Decimal('0.00')
+        (
+            self.subtotal_servicios,
+            self.subtotal_materiales_fijos,
+            self.subtotal_materiales_opcionales,
+        ) = subtotales([self.plan_tratamiento_id]).get(self.plan_tratamiento_id, (cero, cero, cero))
         
         # Por ahora no hay descuentos, pero se puede agregar lógica aquí
         self.descuento_total = Decimal('0.00')
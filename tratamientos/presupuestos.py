@@ -0,0 +1,189 @@
+# tratamientos/presupuestos.py
+"""
+Generación de presupuestos (snapshots) a partir de planes de tratamiento.
+
+Todo el lote se genera en una sola transacción y con un número fijo de
+consultas, sin importar cuántos planes o ítems tenga:
+- los planes se bloquean (SELECT ... FOR UPDATE) para que dos pedidos no
+  generen la misma versión ni se editen los ítems en el medio;
+- los ítems se leen una sola vez con su servicio e insumo;
+- los subtotales y la última versión salen de agregaciones en la base;
+- presupuestos e ítems se insertan con bulk_create.
+
+Con `actualizar_precios` primero se vuelven a tomar los precios vigentes del
+catálogo en los ítems del plan (p. ej. después de cambiar una lista de
+precios), y el presupuesto se genera con esos precios.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import PlanDeTratamiento, ItemPlanTratamiento, Presupuesto, ItemPresupuesto
+
+logger = logging.getLogger(__name__)
+
+Estado = PlanDeTratamiento.EstadoPlan
+
+# Estados del plan desde los que se puede generar un presupuesto
+ESTADOS_PRESUPUESTABLES = (Estado.PROPUESTO, Estado.PRESENTADO)
+
+DIAS_VENCIMIENTO = 30
+SIN_MATERIAL = "Sin material específico"
+CERO = Decimal('0.00')
+
+
+def subtotales(plan_ids):
+    """
+    {plan_id: (servicios, materiales_fijos, materiales_opcionales)} sumando
+    los snapshots de los ítems, en una sola consulta agrupada.
+    """
+    filas = (
+        ItemPlanTratamiento.objects.filter(plan_id__in=plan_ids)
+        .order_by()
+        .values('plan_id')
+        .annotate(
+            servicios=Sum('precio_servicio_snapshot'),
+            fijos=Sum('precio_materiales_fijos_snapshot'),
+            opcionales=Sum('precio_insumo_seleccionado_snapshot'),
+        )
+    )
+    return {
+        fila['plan_id']: (fila['servicios'] or CERO, fila['fijos'] or CERO, fila['opcionales'] or CERO)
+        for fila in filas
+    }
+
+
+def _actualizar_precios(items):
+    """
+    Vuelve a tomar en los ítems (ya cargados con servicio e insumo) los
+    precios vigentes del catálogo y los guarda todos con un bulk_update.
+    Devuelve los ítems que cambiaron.
+    """
+    campos = ('precio_servicio_snapshot', 'precio_materiales_fijos_snapshot', 'precio_insumo_seleccionado_snapshot')
+
+    cambiados = []
+    for item in items:
+        antes = [getattr(item, campo) for campo in campos]
+        item.actualizar_snapshots()
+        if [getattr(item, campo) for campo in campos] != antes:
+            cambiados.append(item)
+
+    if cambiados:
+        # bulk_update no pasa por ItemPlanTratamiento.save: el precio_total de
+        # los planes se recalcula al generar (ver generar())
+        ItemPlanTratamiento.objects.bulk_update(cambiados, campos)
+    return cambiados
+
+
+def _snapshot_item(presupuesto, item):
+    return ItemPresupuesto(
+        presupuesto=presupuesto,
+        item_plan_original=item,
+        orden=item.orden,
+        nombre_servicio=item.servicio.nombre,
+        nombre_insumo_seleccionado=item.insumo_seleccionado.nombre if item.insumo_seleccionado else SIN_MATERIAL,
+        precio_servicio=item.precio_servicio_snapshot,
+        precio_materiales_fijos=item.precio_materiales_fijos_snapshot,
+        precio_insumo_seleccionado=item.precio_insumo_seleccionado_snapshot,
+        precio_total_item=item.precio_total,
+    )
+
+
+def generar(plan_ids, fecha_vencimiento=None, actualizar_precios=False):
+    """
+    Genera un presupuesto PRESENTADO (nueva versión) para cada plan de
+    `plan_ids` y deja los planes en PRESENTADO, todo en una transacción.
+
+    Los planes que no están en un estado presupuestable o no tienen ítems se
+    omiten. Devuelve (presupuestos, omitidos) con omitidos = {plan_id: motivo}.
+    """
+    plan_ids = list(dict.fromkeys(plan_ids))
+    ahora = timezone.now()
+    if not fecha_vencimiento:
+        fecha_vencimiento = ahora.date() + timedelta(days=DIAS_VENCIMIENTO)
+
+    with transaction.atomic():
+        planes = {
+            plan.pk: plan
+            for plan in PlanDeTratamiento.objects.select_for_update().filter(pk__in=plan_ids).order_by('pk')
+        }
+        omitidos = {plan_id: 'Plan no encontrado' for plan_id in plan_ids if plan_id not in planes}
+        for plan_id, plan in list(planes.items()):
+            if plan.estado not in ESTADOS_PRESUPUESTABLES:
+                omitidos[plan_id] = 'Solo se pueden generar presupuestos de planes propuestos o presentados'
+                del planes[plan_id]
+        if not planes:
+            return [], omitidos
+
+        items = ItemPlanTratamiento.objects.filter(plan_id__in=planes).select_related(
+            'servicio', 'insumo_seleccionado'
+        ).order_by('plan_id', 'orden', 'id')
+        if actualizar_precios:
+            # Los ítems se bloquean (no sus servicios/insumos) hasta el commit
+            items = items.select_for_update(of=('self',))
+        items_por_plan = defaultdict(list)
+        for item in items:
+            items_por_plan[item.plan_id].append(item)
+
+        for plan_id in list(planes):
+            if not items_por_plan[plan_id]:
+                omitidos[plan_id] = 'No se puede generar un presupuesto de un plan sin tratamientos'
+                del planes[plan_id]
+        if not planes:
+            return [], omitidos
+
+        if actualizar_precios:
+            _actualizar_precios([item for plan_id in planes for item in items_por_plan[plan_id]])
+
+        totales = subtotales(list(planes))
+        versiones = dict(
+            Presupuesto.objects.filter(plan_tratamiento_id__in=planes)
+            .order_by()
+            .values('plan_tratamiento_id')
+            .annotate(ultima=Max('version'))
+            .values_list('plan_tratamiento_id', 'ultima')
+        )
+
+        presupuestos = []
+        for plan_id, plan in planes.items():
+            servicios, fijos, opcionales = totales[plan_id]
+            presupuestos.append(Presupuesto(
+                plan_tratamiento=plan,
+                version=versiones.get(plan_id, 0) + 1,
+                estado=Presupuesto.EstadoPresupuesto.PRESENTADO,
+                subtotal_servicios=servicios,
+                subtotal_materiales_fijos=fijos,
+                subtotal_materiales_opcionales=opcionales,
+                descuento_total=CERO,
+                total_presupuestado=servicios + fijos + opcionales,
+                fecha_presentacion=ahora,
+                fecha_vencimiento=fecha_vencimiento,
+            ))
+        Presupuesto.objects.bulk_create(presupuestos)
+
+        ItemPresupuesto.objects.bulk_create([
+            _snapshot_item(presupuesto, item)
+            for presupuesto in presupuestos
+            for item in items_por_plan[presupuesto.plan_tratamiento_id]
+        ])
+
+        campos = ['estado', 'fecha_presentacion', 'actualizado']
+        if actualizar_precios:
+            campos.append('precio_total')
+        for presupuesto in presupuestos:
+            plan = presupuesto.plan_tratamiento
+            plan.estado = Estado.PRESENTADO
+            plan.fecha_presentacion = plan.fecha_presentacion or ahora
+            plan.actualizado = ahora
+            if actualizar_precios:
+                plan.precio_total = presupuesto.total_presupuestado
+        PlanDeTratamiento.objects.bulk_update(list(planes.values()), campos)
+
+    logger.info(f"📄 {len(presupuestos)} presupuesto(s) generado(s), {len(omitidos)} plan(es) omitido(s)")
+    return presupuestos, omitidos
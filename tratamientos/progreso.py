@@ -0,0 +1,139 @@
+# tratamientos/progreso.py
+"""
+Recálculo del estado de los planes según el progreso de sus ítems.
+
+Guardar ítems o episodios no recalcula el plan en el momento: programar()
+anota el plan y, al confirmarse la transacción, se recalculan una sola vez
+todos los planes anotados (da igual cuántos ítems o episodios se tocaron).
+El recálculo lee los contadores de todos los planes con una consulta
+(agregación condicional) y hace como mucho un UPDATE por plan, solo si
+cambia algo.
+
+Transiciones (solo hacia adelante):
+- ACEPTADO → EN_PROGRESO: algún ítem EN_PROGRESO o COMPLETADO
+- EN_PROGRESO → COMPLETADO: todos los ítems COMPLETADO
+Además se fija fecha_inicio con el primer progreso y fecha_finalizacion
+al completarse.
+"""
+
+import logging
+import weakref
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import PlanDeTratamiento, ItemPlanTratamiento
+
+logger = logging.getLogger(__name__)
+
+Estado = PlanDeTratamiento.EstadoPlan
+
+
+class _Pendientes:
+    """Planes a recalcular al confirmar la transacción actual."""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.planes = set()
+
+    def ejecutar(self):
+        self.conexion.planes_progreso_pendientes = None
+        planes, self.planes = self.planes, set()
+        recalcular(planes)
+
+
+def _pendientes_programados(conexion):
+    """
+    _Pendientes con callback en la transacción actual, o None. La conexión
+    guarda una referencia débil: si la transacción (o el savepoint) se
+    revierte, Django descarta el callback, el objeto deja de estar referenciado
+    y la referencia queda vacía.
+    """
+    referencia = getattr(conexion, 'planes_progreso_pendientes', None)
+    return referencia() if referencia is not None else None
+
+
+def programar(plan_id):
+    """
+    Programa el recálculo del plan para cuando se confirme la transacción
+    actual (inmediato si no hay transacción abierta). Varias llamadas en la
+    misma transacción se agrupan en un solo recálculo por plan.
+    """
+    if not plan_id:
+        return
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        recalcular([plan_id])
+        return
+
+    pendientes = _pendientes_programados(conexion)
+    if pendientes is None:
+        pendientes = _Pendientes(conexion)
+        conexion.planes_progreso_pendientes = weakref.ref(pendientes)
+        transaction.on_commit(pendientes.ejecutar)
+    pendientes.planes.add(plan_id)
+
+
+def contadores(plan_ids):
+    """
+    {plan_id: fila} con estado, fecha_inicio y los contadores de ítems
+    (total, completados, en_progreso) de cada plan, en una sola consulta.
+    """
+    filas = (
+        PlanDeTratamiento.objects.filter(pk__in=plan_ids)
+        .order_by()
+        .annotate(
+            total=Count('items'),
+            completados=Count('items', filter=Q(items__estado=ItemPlanTratamiento.EstadoItem.COMPLETADO)),
+            en_progreso=Count('items', filter=Q(items__estado=ItemPlanTratamiento.EstadoItem.EN_PROGRESO)),
+        )
+        .values('pk', 'estado', 'fecha_inicio', 'total', 'completados', 'en_progreso')
+    )
+    return {fila['pk']: fila for fila in filas}
+
+
+def cambios_de_estado(fila, ahora):
+    """Campos que cambian en el plan según sus contadores ({} si ninguno)."""
+    if fila['total'] == 0:
+        return {}
+
+    cambios = {}
+    hay_progreso = fila['en_progreso'] > 0 or fila['completados'] > 0
+    estado = fila['estado']
+
+    if estado == Estado.ACEPTADO and hay_progreso:
+        estado = cambios['estado'] = Estado.EN_PROGRESO
+    if estado == Estado.EN_PROGRESO and fila['completados'] == fila['total']:
+        cambios['estado'] = Estado.COMPLETADO
+        cambios['fecha_finalizacion'] = ahora
+    if hay_progreso and not fila['fecha_inicio']:
+        cambios['fecha_inicio'] = ahora
+    return cambios
+
+
+def aplicar(fila, ahora=None):
+    """
+    Aplica al plan los cambios que indican sus contadores (`fila` de
+    contadores()) con un único UPDATE, condicionado al estado leído: si otro
+    proceso lo cambió en el medio, no se pisa. Devuelve los cambios aplicados.
+    """
+    cambios = cambios_de_estado(fila, ahora or timezone.now())
+    if not cambios:
+        return {}
+    if not PlanDeTratamiento.objects.filter(pk=fila['pk'], estado=fila['estado']).update(**cambios):
+        return {}
+    if 'estado' in cambios:
+        logger.info(f"📈 Plan #{fila['pk']}: {fila['estado']} → {cambios['estado']}")
+    return cambios
+
+
+def recalcular(plan_ids):
+    """Recalcula los planes indicados. Devuelve {plan_id: cambios} de los que cambiaron."""
+    ahora = timezone.now()
+    aplicados = {}
+    for plan_id, fila in contadores(list(plan_ids)).items():
+        cambios = aplicar(fila, ahora)
+        if cambios:
+            aplicados[plan_id] = cambios
+    return aplicados
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import (
     CategoriaServicio, Servicio, 
@@ -5,6 +7,7 @@ from .models import (
     PlanDeTratamiento, ItemPlanTratamiento,
     Presupuesto, ItemPresupuesto  # Nuevos modelos del Paso 2.D
 )
+from inventario.models import Insumo
 from inventario.serializers import InsumoSerializer, CategoriaInsumoSerializer
 from usuarios.serializers import UsuarioSerializer
 
@@ -137,8 +140,8 @@ class ServicioListSerializer(serializers.ModelSerializer):
         ]
     
     def get_costo_materiales_fijos(self, obj):
-        """Calcula el costo total de los materiales fijos"""
-        return sum(material.costo_adicional for material in obj.materiales_fijos.all())
+        """Costo total de los materiales fijos (precalculado en el servicio)"""
+        return obj.costo_materiales_fijos
     
     def get_tiene_materiales_opcionales(self, obj):
         """Indica si el servicio tiene materiales opcionales"""
@@ -194,8 +197,8 @@ class ServicioSerializer(serializers.ModelSerializer):
         ]
     
     def get_costo_materiales_fijos(self, obj):
-        """Calcula el costo total de los materiales fijos"""
-        return sum(material.costo_adicional for material in obj.materiales_fijos.all())
+        """Costo total de los materiales fijos (precalculado en el servicio)"""
+        return obj.costo_materiales_fijos
     
     def get_tiene_materiales_opcionales(self, obj):
         """Indica si el servicio tiene materiales opcionales"""
@@ -242,6 +245,34 @@ class ServicioSerializer(serializers.ModelSerializer):
         return value
 
 
+class MaterialServicioOpcionalCatalogoSerializer(serializers.ModelSerializer):
+    """
+    Material opcional dentro del catálogo: qué hay que elegir y su rango de
+    precios. Si el contexto trae 'precios_por_categoria' ({categoria_id:
+    [precio_venta, ...]}), el rango se calcula con esos precios en lugar de
+    consultar los insumos de cada material.
+    """
+    categoria_nombre = serializers.CharField(source='categoria_insumo.nombre', read_only=True)
+    nombre_mostrar = serializers.SerializerMethodField()
+    rango_precios = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MaterialServicioOpcional
+        fields = [
+            'id', 'categoria_insumo', 'categoria_nombre', 'nombre_mostrar',
+            'cantidad', 'es_obligatorio', 'rango_precios'
+        ]
+
+    def get_nombre_mostrar(self, obj):
+        return obj.nombre_personalizado or f"Elegir {obj.categoria_insumo.nombre}"
+
+    def get_rango_precios(self, obj):
+        precios = self.context.get('precios_por_categoria')
+        if precios is None:
+            return obj.rango_precios
+        return obj.calcular_rango(precios.get(obj.categoria_insumo_id, []), obj.cantidad)
+
+
 class ServicioCatalogoSerializer(serializers.ModelSerializer):
     """
     Serializer específico para el endpoint del catálogo público (CU22).
@@ -249,6 +280,7 @@ class ServicioCatalogoSerializer(serializers.ModelSerializer):
     """
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     duracion_formateada = serializers.CharField(read_only=True)
+    materiales_opcionales = MaterialServicioOpcionalCatalogoSerializer(many=True, read_only=True)
 
     class Meta:
         model = Servicio
@@ -261,7 +293,8 @@ class ServicioCatalogoSerializer(serializers.ModelSerializer):
             'precio_base',
             'duracion_formateada',
             'requiere_cita_previa',
-            'requiere_autorizacion'
+            'requiere_autorizacion',
+            'materiales_opcionales'
         ]
 
 
@@ -375,6 +408,64 @@ class ItemPlanTratamientoSimpleSerializer(serializers.ModelSerializer):
         ]
 
 
+class ItemPlanLoteSerializer(serializers.Serializer):
+    """Un ítem dentro de una carga en lote (servicio e insumo por ID)."""
+    servicio = serializers.IntegerField(min_value=1)
+    insumo_seleccionado = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    orden = serializers.IntegerField(min_value=0, required=False)
+    notas = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    fecha_estimada = serializers.DateField(required=False, allow_null=True)
+
+
+class ItemsPlanLoteSerializer(serializers.Serializer):
+    """
+    Serializer para crear varios ítems de un plan de una vez.
+    Se usa en la acción 'agregar-items' del PlanDeTratamientoViewSet.
+    
+    Aplica las mismas validaciones que ItemPlanTratamientoSerializer, pero
+    carga servicios, insumos y materiales opcionales de todos los ítems con
+    una consulta cada uno (no una por ítem).
+    """
+    items = ItemPlanLoteSerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate_items(self, items):
+        servicios = Servicio.objects.in_bulk({item['servicio'] for item in items})
+        insumos = Insumo.objects.in_bulk({
+            item['insumo_seleccionado'] for item in items if item.get('insumo_seleccionado')
+        })
+        categorias_obligatorias = defaultdict(set)
+        for servicio_id, categoria_id in MaterialServicioOpcional.objects.filter(
+            servicio_id__in=servicios, es_obligatorio=True
+        ).values_list('servicio_id', 'categoria_insumo_id'):
+            categorias_obligatorias[servicio_id].add(categoria_id)
+        
+        validados = []
+        errores = []
+        for item in items:
+            servicio = servicios.get(item['servicio'])
+            insumo_id = item.get('insumo_seleccionado')
+            insumo = insumos.get(insumo_id) if insumo_id else None
+            error = {}
+            
+            if servicio is None:
+                error['servicio'] = [f'Servicio {item["servicio"]} no encontrado.']
+            elif insumo_id and insumo is None:
+                error['insumo_seleccionado'] = [f'Insumo {insumo_id} no encontrado.']
+            elif categorias_obligatorias[servicio.pk] and not insumo:
+                error['non_field_errors'] = [
+                    f"El servicio '{servicio.nombre}' requiere seleccionar un material específico."
+                ]
+            elif insumo and insumo.categoria_id not in categorias_obligatorias[servicio.pk]:
+                error['non_field_errors'] = ["El insumo seleccionado no es válido para este servicio."]
+            
+            errores.append(error)
+            validados.append({**item, 'servicio': servicio, 'insumo_seleccionado': insumo})
+        
+        if any(errores):
+            raise serializers.ValidationError(errores)
+        return validados
+
+
 class PlanDeTratamientoSerializer(serializers.ModelSerializer):
     """
     Serializer completo para planes de tratamiento.
@@ -482,7 +573,7 @@ class PlanDeTratamientoListSerializer(serializers.ModelSerializer):
     progreso = serializers.IntegerField(source='porcentaje_completado', read_only=True)
     num_items = serializers.IntegerField(source='cantidad_items', read_only=True)
     total_items = serializers.IntegerField(source='cantidad_items', read_only=True)
-    items_completados = serializers.SerializerMethodField()
+    items_completados = serializers.IntegerField(read_only=True)
     paciente_id = serializers.IntegerField(source='paciente.usuario.id', read_only=True)
     observaciones = serializers.CharField(default='', read_only=True)
 
@@ -514,10 +605,6 @@ class PlanDeTratamientoListSerializer(serializers.ModelSerializer):
             'observaciones'
         ]
     
-    def get_items_completados(self, obj):
-        """Calcula cuántos items están completados"""
-        return obj.items.filter(estado='COMPLETADO').count()
-
     def get_paciente_nombre(self, obj):
         return f"{obj.paciente.usuario.nombre} {obj.paciente.usuario.apellido}"
 
@@ -554,7 +641,7 @@ class ItemPresupuestoSerializer(serializers.ModelSerializer):
             'precio_total_formateado',
             'creado'
         ]
-        read_only_fields = '__all__'  # TODO es de solo lectura
+        read_only_fields = fields
 
 
 class PresupuestoSerializer(serializers.ModelSerializer):
@@ -633,7 +720,7 @@ class PresupuestoSerializer(serializers.ModelSerializer):
         """Información del paciente"""
         paciente = obj.plan_tratamiento.paciente
         return {
-            'id': paciente.id,
+            'id': paciente.pk,
             'nombre_completo': f"{paciente.usuario.nombre} {paciente.usuario.apellido}",
             'email': paciente.usuario.email
         }
@@ -642,7 +729,7 @@ class PresupuestoSerializer(serializers.ModelSerializer):
         """Información del odontólogo"""
         odontologo = obj.plan_tratamiento.odontologo
         return {
-            'id': odontologo.id,
+            'id': odontologo.pk,
             'nombre_completo': f"Dr. {odontologo.usuario.nombre} {odontologo.usuario.apellido}",
             'especialidad': odontologo.especialidad.nombre if odontologo.especialidad else None
         }
@@ -713,4 +800,31 @@ class PresupuestoCreacionSerializer(serializers.Serializer):
         Esta lógica se ejecuta en el ViewSet.
         """
         # Esta lógica se maneja en el ViewSet
-        pass
\ No newline at end of file
+        pass
+
+class RegeneracionPresupuestosSerializer(serializers.Serializer):
+    """
+    Datos para regenerar presupuestos de varios planes a la vez.
+    Se usa en la acción 'regenerar-presupuestos' del PlanDeTratamientoViewSet.
+    """
+    planes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=5000,
+        help_text="IDs de los planes (opcional, por defecto todos los planes presentados)"
+    )
+    actualizar_precios = serializers.BooleanField(
+        default=False,
+        help_text="Tomar los precios vigentes del catálogo antes de generar"
+    )
+    fecha_vencimiento = serializers.DateField(
+        required=False,
+        help_text="Fecha límite para aceptar (opcional, por defecto 30 días)"
+    )
+    lote = serializers.IntegerField(
+        default=200,
+        min_value=1,
+        max_value=1000,
+        help_text="Planes por transacción"
+    )
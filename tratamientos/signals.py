@@ -0,0 +1,122 @@
+# tratamientos/signals.py
+
+"""
+Signals que mantienen Servicio.costo_materiales_fijos (ver tratamientos/costos.py)
+y la revisión del catálogo cacheado (ver tratamientos/catalogo.py).
+
+- Alta, cambio o baja de un MaterialServicioFijo → se recalcula su servicio
+  (y el anterior, si el material se movió de servicio).
+- Cambio de precio_venta de un Insumo → se recalculan los servicios que lo
+  usan como material fijo.
+
+Cada recálculo es un único UPDATE que se ejecuta junto al cambio que lo
+originó (en su misma transacción, si la hay). Cualquier cambio en servicios,
+categorías o materiales, y los cambios de precio, estado o categoría de un
+insumo, incrementan la revisión del catálogo al hacer commit.
+"""
+
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from inventario.models import CategoriaInsumo, Insumo
+
+from . import catalogo, costos
+from .models import CategoriaServicio, Servicio, MaterialServicioFijo, MaterialServicioOpcional
+
+
+@receiver(pre_save, sender=MaterialServicioFijo)
+def recordar_servicio_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el servicio que tenía el material antes de este cambio."""
+    if raw or instance._state.adding or not instance.pk:
+        instance._servicio_anterior_id = None
+        return
+    instance._servicio_anterior_id = (
+        MaterialServicioFijo.objects.filter(pk=instance.pk)
+        .values_list('servicio_id', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=MaterialServicioFijo)
+@receiver(post_delete, sender=MaterialServicioFijo)
+def actualizar_costo_servicio(sender, instance, raw=False, **kwargs):
+    """Recalcula el costo de materiales fijos del servicio del material."""
+    if raw:
+        return
+    servicios = {instance.servicio_id, getattr(instance, '_servicio_anterior_id', None)}
+    costos.actualizar([servicio_id for servicio_id in servicios if servicio_id])
+
+
+# Campos del Insumo que afectan costos o catálogo
+CAMPOS_INSUMO = ('precio_venta', 'activo', 'categoria_id')
+
+
+@receiver(pre_save, sender=Insumo)
+def recordar_insumo_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Guarda precio de venta, estado y categoría anteriores si este guardado
+    puede cambiarlos (un ajuste de stock con update_fields no consulta nada).
+    """
+    instance._insumo_anterior = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    if update_fields is not None and not {'precio_venta', 'activo', 'categoria'} & set(update_fields):
+        return
+    instance._insumo_anterior = (
+        Insumo.objects.filter(pk=instance.pk).values(*CAMPOS_INSUMO).first()
+    )
+
+
+@receiver(post_save, sender=Insumo)
+def actualizar_por_cambio_insumo(sender, instance, created, raw=False, **kwargs):
+    """
+    Si cambió el precio de venta, recalcula los servicios que usan el insumo
+    como material fijo (un insumo recién creado todavía no está en ninguno).
+    Un insumo nuevo o con otro precio, estado o categoría cambia los rangos
+    de precio del catálogo.
+    """
+    if raw:
+        return
+    if created:
+        catalogo.programar_incremento()
+        return
+
+    anterior = getattr(instance, '_insumo_anterior', None)
+    if not anterior:
+        return
+    if anterior['precio_venta'] != Decimal(str(instance.precio_venta)):
+        costos.actualizar_por_insumos([instance.pk])
+        catalogo.programar_incremento()
+    elif anterior['activo'] != instance.activo or anterior['categoria_id'] != instance.categoria_id:
+        catalogo.programar_incremento()
+
+
+# ============================================================================
+# REVISIÓN DEL CATÁLOGO CACHEADO (ver tratamientos/catalogo.py)
+# ============================================================================
+
+MODELOS_CATALOGO = (
+    Servicio, CategoriaServicio, MaterialServicioFijo, MaterialServicioOpcional,
+    CategoriaInsumo, Insumo,
+)
+
+
+def invalidar_catalogo(sender, instance, raw=False, **kwargs):
+    """Incrementa la revisión del catálogo del tenant al confirmar la transacción."""
+    if not raw:
+        catalogo.programar_incremento()
+
+
+for _modelo in MODELOS_CATALOGO:
+    post_delete.connect(
+        invalidar_catalogo, sender=_modelo,
+        dispatch_uid=f'invalidar_catalogo_delete_{_modelo.__name__}'
+    )
+    # Los guardados de Insumo se filtran arriba (solo si cambia algo visible)
+    if _modelo is not Insumo:
+        post_save.connect(
+            invalidar_catalogo, sender=_modelo,
+            dispatch_uid=f'invalidar_catalogo_save_{_modelo.__name__}'
+        )
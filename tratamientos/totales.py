@@ -0,0 +1,95 @@
+# tratamientos/totales.py
+"""
+Recálculo de los totales desnormalizados de PlanDeTratamiento
+(precio_total, items_total, items_completados).
+
+En el día a día los mantiene ItemPlanTratamiento.save/delete de forma
+incremental. bulk_create, .update() y los borrados masivos no pasan por
+ahí: después de ellos ejecutar `python manage.py recalcular_totales_planes`.
+"""
+
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+CAMPOS = ('precio_total', 'items_total', 'items_completados')
+CENTAVO = Decimal('0.01')
+
+
+def totales_reales(plan_ids, apps=django_apps):
+    """
+    {plan_id: (precio_total, items_total, items_completados)} calculados
+    desde los ítems, en una sola consulta agrupada. Los planes sin ítems no
+    aparecen (sus totales son cero).
+    """
+    Item = apps.get_model('tratamientos', 'ItemPlanTratamiento')
+    filas = (
+        Item.objects.filter(plan_id__in=plan_ids)
+        .order_by()
+        .values('plan_id')
+        .annotate(
+            precio=Sum(
+                F('precio_servicio_snapshot')
+                + F('precio_materiales_fijos_snapshot')
+                + F('precio_insumo_seleccionado_snapshot'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            items=Count('id'),
+            completados=Count('id', filter=Q(estado='COMPLETADO')),
+        )
+    )
+    return {
+        fila['plan_id']: (
+            Decimal(str(fila['precio'] or 0)).quantize(CENTAVO),
+            fila['items'],
+            fila['completados'],
+        )
+        for fila in filas
+    }
+
+
+def recalcular(apps=django_apps, lote=500, corregir=True):
+    """
+    Recorre los planes por lotes de ids y compara sus totales con los reales.
+    Con `corregir`, ajusta los que difieren (filas del lote bloqueadas para
+    no pisar ítems que se guarden mientras tanto).
+
+    Devuelve (revisados, diferencias) con diferencias = [(plan_id, guardado, real)].
+    """
+    Plan = apps.get_model('tratamientos', 'PlanDeTratamiento')
+    vacio = (Decimal('0.00'), 0, 0)
+
+    revisados = 0
+    diferencias = []
+    ultimo_id = 0
+    while True:
+        ids = list(
+            Plan.objects.filter(id__gt=ultimo_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            break
+        ultimo_id = ids[-1]
+        revisados += len(ids)
+
+        with transaction.atomic():
+            planes = Plan.objects.filter(id__in=ids).order_by('id')
+            if corregir:
+                planes = planes.select_for_update()
+            guardados = {fila[0]: fila[1:] for fila in planes.values_list('id', *CAMPOS)}
+            reales = totales_reales(ids, apps=apps)
+
+            ajustes = []
+            for plan_id, guardado in guardados.items():
+                real = reales.get(plan_id, vacio)
+                if tuple(guardado) != real:
+                    diferencias.append((plan_id, guardado, real))
+                    ajustes.append(Plan(id=plan_id, **dict(zip(CAMPOS, real))))
+
+            if corregir and ajustes:
+                Plan.objects.bulk_update(ajustes, CAMPOS, batch_size=lote)
+
+    return revisados, diferencias
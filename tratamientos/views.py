@@ -1,15 +1,19 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from reportes.cache import etag_contenido
 from .models import (
     CategoriaServicio, Servicio, PlanDeTratamiento, ItemPlanTratamiento,
-    Presupuesto, ItemPresupuesto  # Nuevos modelos del Paso 2.D
+    Presupuesto  # Nuevo modelo del Paso 2.D
 )
+from . import presupuestos
+from .catalogo import CATALOGO, POR_CATEGORIA, snapshot as snapshot_catalogo
 from .serializers import (
     CategoriaServicioSerializer,
     ServicioSerializer,
@@ -19,10 +23,12 @@ from .serializers import (
     PlanDeTratamientoListSerializer,
     ItemPlanTratamientoSerializer,
     ItemPlanTratamientoSimpleSerializer,
+    ItemsPlanLoteSerializer,
     # Nuevos serializers del Paso 2.D
     PresupuestoSerializer,
     PresupuestoListSerializer,
     PresupuestoCreacionSerializer,
+    RegeneracionPresupuestosSerializer,
     ItemPresupuestoSerializer
 )
 
@@ -124,37 +130,50 @@ class ServicioViewSet(viewsets.ModelViewSet):
         GET /api/tratamientos/servicios/catalogo/
         
         Endpoint público del catálogo de servicios (CU22).
-        Retorna solo servicios activos con información esencial.
+        Retorna solo servicios activos con información esencial y el rango
+        de precios de sus materiales opcionales.
+        
+        Se sirve desde un snapshot cacheado por revisión del catálogo (ver
+        tratamientos/catalogo.py), con ETag: si el cliente envía
+        If-None-Match con el mismo valor, devuelve 304 sin cuerpo. Sin caché
+        compartida (Redis) el catálogo se consulta igual para calcular el ETag.
         """
-        servicios = self.get_queryset().filter(activo=True)
+        snapshot, desde_cache = snapshot_catalogo(CATALOGO)
+        servicios = snapshot['datos']['servicios']
+        etag = snapshot['etag']
         
         # Aplicar filtros de query params si existen
+        filtros = {}
         categoria_id = request.query_params.get('categoria')
         if categoria_id:
-            servicios = servicios.filter(categoria_id=categoria_id)
+            filtros['categoria'] = categoria_id
         
         # Filtro por precio máximo
         precio_max = request.query_params.get('precio_max')
         if precio_max:
             try:
-                servicios = servicios.filter(precio_base__lte=float(precio_max))
+                filtros['precio_max'] = float(precio_max)
             except ValueError:
                 pass
         
-        # Ordenar por categoría y nombre
-        servicios = servicios.order_by('categoria__orden', 'categoria__nombre', 'nombre')
+        if filtros:
+            servicios = [
+                servicio
+                for servicio, (categoria, precio) in zip(servicios, snapshot['datos']['filtros'])
+                if ('categoria' not in filtros or str(categoria) == filtros['categoria'])
+                and ('precio_max' not in filtros or float(precio) <= filtros['precio_max'])
+            ]
+            etag = etag_contenido([etag, sorted(filtros.items())])
         
         # Paginación si hay muchos resultados
         page = self.paginate_queryset(servicios)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(page)
         
-        serializer = self.get_serializer(servicios, many=True)
-        return Response({
-            'total': servicios.count(),
-            'servicios': serializer.data
-        })
+        return self._respuesta_catalogo(request, {
+            'total': len(servicios),
+            'servicios': servicios
+        }, etag, desde_cache)
 
     @action(detail=False, methods=['get'])
     def por_categoria(self, request):
@@ -163,33 +182,25 @@ class ServicioViewSet(viewsets.ModelViewSet):
         
         Retorna servicios agrupados por categoría.
         Útil para mostrar en interfaces organizadas.
-        """
-        from django.db.models import Prefetch
-        
-        # Obtener categorías con sus servicios
-        categorias = CategoriaServicio.objects.filter(
-            activo=True
-        ).prefetch_related(
-            Prefetch(
-                'servicios',
-                queryset=self.get_queryset().filter(activo=True),
-                to_attr='servicios_activos'
-            )
-        ).order_by('orden', 'nombre')
-        
-        resultado = []
-        for categoria in categorias:
-            if categoria.servicios_activos:  # Solo incluir si tiene servicios
-                categoria_data = CategoriaServicioSerializer(categoria).data
-                categoria_data['servicios'] = ServicioCatalogoSerializer(
-                    categoria.servicios_activos, many=True
-                ).data
-                resultado.append(categoria_data)
         
-        return Response({
-            'categorias': resultado,
-            'total_categorias': len(resultado)
-        })
+        Igual que catalogo: snapshot cacheado por revisión y ETag.
+        """
+        snapshot, desde_cache = snapshot_catalogo(POR_CATEGORIA)
+        return self._respuesta_catalogo(request, snapshot['datos'], snapshot['etag'], desde_cache)
+
+    @staticmethod
+    def _respuesta_catalogo(request, datos, etag, desde_cache):
+        """Respuesta con ETag fuerte (304 si el cliente ya tiene esta versión)."""
+        etag = quote_etag(etag)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(datos)
+        response['ETag'] = etag
+        response['X-Catalog-Cache'] = 'HIT' if desde_cache else 'MISS'
+        # Los clientes guardan el catálogo pero lo revalidan en cada uso
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
@@ -261,6 +272,9 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
     - POST /api/tratamientos/planes/{id}/aceptar/ - Paciente acepta plan
     - POST /api/tratamientos/planes/{id}/iniciar/ - Iniciar tratamiento
     - POST /api/tratamientos/planes/{id}/finalizar/ - Finalizar tratamiento
+    - POST /api/tratamientos/planes/{id}/agregar-items/ - Agregar varios ítems de una vez
+    - POST /api/tratamientos/planes/{id}/generar-presupuesto/ - Generar presupuesto
+    - POST /api/tratamientos/planes/regenerar-presupuestos/ - Regenerar presupuestos en lote
     - GET /api/tratamientos/planes/mis_planes/ - Planes del doctor actual
     - GET /api/tratamientos/planes/por_paciente/ - Planes de un paciente específico
     """
@@ -287,7 +301,7 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
         'odontologo__usuario__nombre',
         'odontologo__usuario__apellido'
     ]
-    ordering_fields = ['fecha_creacion', 'precio_total_plan', 'estado']
+    ordering_fields = ['fecha_creacion', 'precio_total', 'estado']
     ordering = ['-fecha_creacion']
 
     def get_serializer_class(self):
@@ -303,6 +317,10 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
         """
         queryset = super().get_queryset()
         
+        # Estas acciones leen o crean los ítems por su cuenta
+        if self.action in ('generar_presupuesto', 'regenerar_presupuestos', 'agregar_items'):
+            queryset = queryset.prefetch_related(None)
+        
         # Si es paciente, solo ve sus propios planes
         if hasattr(self.request.user, 'perfil_paciente'):
             queryset = queryset.filter(paciente=self.request.user.perfil_paciente)
@@ -740,6 +758,51 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
             'planes': serializer.data
         })
 
+    @action(detail=True, methods=['post'], url_path='agregar-items')
+    def agregar_items(self, request, pk=None):
+        """
+        POST /api/tratamientos/planes/{id}/agregar-items/
+        
+        Agrega varios ítems al plan en una sola operación, congelando sus
+        precios igual que al crearlos de a uno.
+        
+        Body:
+        {
+            "items": [
+                {"servicio": 3, "insumo_seleccionado": 12, "notas": "Pieza 16"},
+                {"servicio": 5, "orden": 4, "fecha_estimada": "2025-03-01"}
+            ]
+        }
+        
+        Usa un número fijo de consultas sin importar cuántos ítems se envíen.
+        """
+        plan = self.get_object()
+        
+        if hasattr(request.user, 'perfil_odontologo'):
+            if plan.odontologo != request.user.perfil_odontologo:
+                return Response(
+                    {'error': 'No tienes permisos para modificar este plan'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif not request.user.is_staff:
+            return Response(
+                {'error': 'Solo el odontólogo puede agregar tratamientos al plan'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = ItemsPlanLoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        items = ItemPlanTratamiento.crear_en_lote(plan, serializer.validated_data['items'])
+        
+        return Response({
+            'message': f'{len(items)} tratamiento(s) agregado(s) al plan',
+            'items': ItemPlanTratamientoSimpleSerializer(items, many=True).data,
+            'precio_total_plan': plan.precio_total_plan,
+            'cantidad_items': plan.cantidad_items
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'], url_path='generar-presupuesto')
     def generar_presupuesto(self, request, pk=None):
         """
@@ -765,61 +828,23 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Verificar que el plan esté en estado apropiado
-        if plan.estado not in ['borrador', 'presentado']:
-            return Response(
-                {'error': 'Solo se pueden generar presupuestos de planes en Borrador o Presentado'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        if plan.items.count() == 0:
-            return Response(
-                {'error': 'No se puede generar un presupuesto de un plan sin tratamientos'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Usar el serializer de creación para validar datos adicionales
         serializer = PresupuestoCreacionSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calcular la siguiente versión
-        version_actual = plan.presupuestos.count() + 1
-        
-        # Calcular fecha de vencimiento
-        fecha_vencimiento = serializer.validated_data.get('fecha_vencimiento')
-        if not fecha_vencimiento:
-            fecha_vencimiento = timezone.now().date() + timedelta(days=30)  # 30 días por defecto
-        
-        # Crear el Presupuesto
-        presupuesto = Presupuesto.objects.create(
-            plan_tratamiento=plan,
-            version=version_actual,
-            estado=Presupuesto.EstadoPresupuesto.PRESENTADO,
-            fecha_presentacion=timezone.now(),
-            fecha_vencimiento=fecha_vencimiento
+        # ¡AQUÍ OCURRE LA MAGIA! Crear el presupuesto y "congelar" totales e
+        # ítems en una sola transacción (también deja el plan PRESENTADO)
+        generados, omitidos = presupuestos.generar(
+            [plan.pk],
+            fecha_vencimiento=serializer.validated_data.get('fecha_vencimiento')
         )
-        
-        # ¡AQUÍ OCURRE LA MAGIA! Calcular y "congelar" los totales
-        presupuesto.calcular_totales_desde_plan()
-        
-        # "Congelar" cada ítem del plan en el presupuesto
-        for item_plan in plan.items.all():
-            ItemPresupuesto.objects.create(
-                presupuesto=presupuesto,
-                item_plan_original=item_plan,
-                orden=item_plan.orden,
-                nombre_servicio=item_plan.servicio.nombre,
-                nombre_insumo_seleccionado=item_plan.insumo_seleccionado.nombre if item_plan.insumo_seleccionado else "Sin material específico",
-                precio_servicio=item_plan.precio_servicio_snapshot,
-                precio_materiales_fijos=item_plan.precio_materiales_fijos_snapshot,
-                precio_insumo_seleccionado=item_plan.precio_insumo_seleccionado_snapshot,
-                precio_total_item=item_plan.precio_total
+        if omitidos:
+            return Response(
+                {'error': omitidos[plan.pk]},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-        # Actualizar el estado del plan
-        plan.estado = PlanDeTratamiento.EstadoPlan.PRESENTADO
-        plan.save()
+        presupuesto = generados[0]
         
         # Retornar el presupuesto creado
         result_serializer = PresupuestoSerializer(presupuesto)
@@ -830,6 +855,83 @@ class PlanDeTratamientoViewSet(viewsets.ModelViewSet):
             'url_aceptacion': f"/api/tratamientos/presupuestos/{presupuesto.id}/aceptar/{presupuesto.token_aceptacion}/"
         }, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='regenerar-presupuestos')
+    def regenerar_presupuestos(self, request):
+        """
+        POST /api/tratamientos/planes/regenerar-presupuestos/
+        
+        Genera una nueva versión del presupuesto para muchos planes a la vez
+        (p. ej. después de cambiar la lista de precios).
+        
+        Body (todo opcional):
+        - planes: [ids] (por defecto, todos los planes presentados)
+        - actualizar_precios: true para tomar antes los precios vigentes del catálogo
+        - fecha_vencimiento: fecha límite para aceptar (por defecto 30 días)
+        - lote: planes por transacción (default: 200)
+        
+        Cada lote se genera en una transacción con un número fijo de
+        consultas. Los odontólogos solo regeneran sus propios planes.
+        """
+        if hasattr(request.user, 'perfil_odontologo'):
+            queryset = self.get_queryset().filter(odontologo=request.user.perfil_odontologo)
+        elif request.user.is_staff:
+            queryset = self.get_queryset()
+        else:
+            return Response(
+                {'error': 'Solo el odontólogo puede generar presupuestos'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = RegeneracionPresupuestosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = serializer.validated_data
+        
+        omitidos = {}
+        if 'planes' in datos:
+            solicitados = list(dict.fromkeys(datos['planes']))
+            plan_ids = list(
+                queryset.filter(pk__in=solicitados).order_by('pk').values_list('pk', flat=True)
+            )
+            encontrados = set(plan_ids)
+            omitidos.update({
+                plan_id: 'Plan no encontrado' for plan_id in solicitados if plan_id not in encontrados
+            })
+        else:
+            plan_ids = list(
+                queryset.filter(estado=PlanDeTratamiento.EstadoPlan.PRESENTADO)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+        
+        generados = []
+        lote = datos['lote']
+        for inicio in range(0, len(plan_ids), lote):
+            creados, omitidos_lote = presupuestos.generar(
+                plan_ids[inicio:inicio + lote],
+                fecha_vencimiento=datos.get('fecha_vencimiento'),
+                actualizar_precios=datos['actualizar_precios']
+            )
+            generados.extend(creados)
+            omitidos.update(omitidos_lote)
+        
+        return Response({
+            'message': f'{len(generados)} presupuesto(s) generado(s)',
+            'generados': len(generados),
+            'presupuestos': [
+                {
+                    'plan': presupuesto.plan_tratamiento_id,
+                    'presupuesto': presupuesto.id,
+                    'version': presupuesto.version,
+                    'total_presupuestado': presupuesto.total_presupuestado,
+                }
+                for presupuesto in generados
+            ],
+            'omitidos': [
+                {'plan': plan_id, 'motivo': motivo}
+                for plan_id, motivo in omitidos.items()
+            ]
+        }, status=status.HTTP_200_OK)
+
 
 class ItemPlanTratamientoViewSet(viewsets.ModelViewSet):
     """
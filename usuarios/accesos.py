@@ -0,0 +1,151 @@
+# usuarios/accesos.py
+"""
+Índice de acceso odontólogo ↔ paciente (AccesoOdontologoPaciente).
+
+Un odontólogo "atiende" a un paciente si comparte con él alguna cita,
+episodio de atención o plan de tratamiento (FUENTES). En lugar de calcular
+esa lista en cada request (DISTINCT sobre joins + IN (...)), se mantiene
+una tabla de pares que se actualiza con signals (usuarios/signals.py):
+
+- al guardar una fuente se inserta el par (INSERT ... ON CONFLICT DO NOTHING);
+- al borrarla, o al cambiarle odontólogo/paciente, se revisa si el par
+  anterior sigue teniendo alguna fuente y si no, se elimina.
+
+bulk_create / .update() no disparan signals: después de cargas masivas
+ejecutar `python manage.py reconstruir_accesos_pacientes`.
+
+Los viewsets que limitan lo que ve un odontólogo a sus pacientes usan
+AlcanceOdontologoMixin (semi-join EXISTS contra el índice único).
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+# (app, modelo, campo odontólogo, campo paciente)
+FUENTES = (
+    ('agenda', 'Cita', 'odontologo_id', 'paciente_id'),
+    # El pk del historial es el del paciente (OneToOne con primary_key=True)
+    ('historial_clinico', 'EpisodioAtencion', 'odontologo_id', 'historial_clinico_id'),
+    ('tratamientos', 'PlanDeTratamiento', 'odontologo_id', 'paciente_id'),
+)
+
+
+def _modelo_acceso(apps=django_apps):
+    return apps.get_model('usuarios', 'AccesoOdontologoPaciente')
+
+
+def fuentes(apps=django_apps):
+    """[(modelo, campo_odontologo, campo_paciente)] de las fuentes de acceso."""
+    return [
+        (apps.get_model(app, modelo), campo_odontologo, campo_paciente)
+        for app, modelo, campo_odontologo, campo_paciente in FUENTES
+    ]
+
+
+def vincular(odontologo_id, paciente_id):
+    """Registra el par si no existe (una sola sentencia, sin carreras)."""
+    if not (odontologo_id and paciente_id):
+        return
+    Acceso = _modelo_acceso()
+    Acceso.objects.bulk_create(
+        [Acceso(odontologo_id=odontologo_id, paciente_id=paciente_id)],
+        ignore_conflicts=True
+    )
+
+
+def revisar(odontologo_id, paciente_id):
+    """Vuelve a calcular un par: lo mantiene si alguna fuente lo respalda."""
+    if not (odontologo_id and paciente_id):
+        return
+    respaldado = any(
+        modelo.objects.filter(**{campo_odontologo: odontologo_id, campo_paciente: paciente_id}).exists()
+        for modelo, campo_odontologo, campo_paciente in fuentes()
+    )
+    if respaldado:
+        vincular(odontologo_id, paciente_id)
+    else:
+        _modelo_acceso().objects.filter(odontologo_id=odontologo_id, paciente_id=paciente_id).delete()
+
+
+def reconstruir(apps=django_apps, lote=1000):
+    """
+    Sincroniza la tabla con las fuentes: agrega los pares que faltan y elimina
+    los que ya no tienen respaldo. Devuelve (agregados, eliminados).
+    """
+    Acceso = _modelo_acceso(apps)
+
+    esperados = set()
+    for modelo, campo_odontologo, campo_paciente in fuentes(apps):
+        esperados.update(
+            modelo.objects.filter(**{f'{campo_odontologo}__isnull': False, f'{campo_paciente}__isnull': False})
+            .order_by()
+            .values_list(campo_odontologo, campo_paciente)
+            .distinct()
+        )
+
+    with transaction.atomic():
+        existentes = {
+            (odontologo_id, paciente_id): pk
+            for pk, odontologo_id, paciente_id in Acceso.objects.values_list('pk', 'odontologo_id', 'paciente_id')
+        }
+        faltantes = [
+            Acceso(odontologo_id=odontologo_id, paciente_id=paciente_id)
+            for odontologo_id, paciente_id in esperados - existentes.keys()
+        ]
+        Acceso.objects.bulk_create(faltantes, batch_size=lote, ignore_conflicts=True)
+
+        sobrantes = [pk for par, pk in existentes.items() if par not in esperados]
+        for inicio in range(0, len(sobrantes), lote):
+            Acceso.objects.filter(pk__in=sobrantes[inicio:inicio + lote]).delete()
+
+    return len(faltantes), len(sobrantes)
+
+
+def es_admin(user):
+    """
+    True si el usuario es administrador de la clínica (tipo ADMIN). Los
+    odontólogos también se crean con is_staff=True (acceso al admin de
+    Django), así que is_staff no distingue a un administrador.
+    """
+    Usuario = django_apps.get_model('usuarios', 'Usuario')
+    return getattr(user, 'tipo_usuario', None) == Usuario.TipoUsuario.ADMIN
+
+
+def tiene_acceso(odontologo, paciente_id):
+    """True si el paciente está entre los pacientes del odontólogo."""
+    return _modelo_acceso().objects.filter(odontologo=odontologo, paciente_id=paciente_id).exists()
+
+
+class AlcanceOdontologoMixin:
+    """
+    Mixin de viewsets para limitar el queryset de un odontólogo a sus
+    pacientes. `campos_paciente_alcance` son las rutas al paciente desde el
+    modelo del queryset; si hay varias, basta con que una coincida.
+
+    Ejemplo:
+        class PagoViewSet(AlcanceOdontologoMixin, viewsets.ModelViewSet):
+            campos_paciente_alcance = ('factura__paciente', 'paciente')
+
+            def get_queryset(self):
+                ...
+                if hasattr(user, 'perfil_odontologo'):
+                    return self.filtrar_por_odontologo(queryset, user.perfil_odontologo)
+                if es_admin(user):
+                    return queryset
+
+    El odontólogo se comprueba antes que el administrador: los odontólogos
+    también son staff.
+    """
+    campos_paciente_alcance = ('paciente',)
+
+    def filtrar_por_odontologo(self, queryset, odontologo):
+        accesos = _modelo_acceso().objects.filter(odontologo=odontologo)
+        condiciones = [
+            Exists(accesos.filter(paciente=OuterRef(campo)))
+            for campo in self.campos_paciente_alcance
+        ]
+        return queryset.filter(reduce(or_, condiciones))
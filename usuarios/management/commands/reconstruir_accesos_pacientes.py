@@ -0,0 +1,52 @@
+"""
+Comando Django para reconstruir el índice de acceso odontólogo ↔ paciente.
+
+Uso:
+    python manage.py reconstruir_accesos_pacientes                      # todas las clínicas
+    python manage.py reconstruir_accesos_pacientes --tenant=clinica_demo
+
+El índice (usuarios.AccesoOdontologoPaciente) se mantiene con signals al
+guardar o borrar citas, episodios y planes. Las cargas masivas
+(bulk_create, .update(), scripts de población) no disparan signals: después
+de ellas ejecutar este comando. Es idempotente.
+"""
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from tenants.models import Clinica
+from usuarios import accesos
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza el índice odontólogo ↔ paciente con citas, episodios y planes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Schema del tenant (default: todas las clínicas activas)'
+        )
+
+    def handle(self, *args, **options):
+        if options['tenant']:
+            schemas = [options['tenant']]
+        else:
+            schemas = list(
+                Clinica.objects.exclude(schema_name='public')
+                .filter(activo=True)
+                .values_list('schema_name', flat=True)
+            )
+
+        self.stdout.write(self.style.WARNING(
+            f'⏳ Reconstruyendo accesos odontólogo-paciente en {len(schemas)} clínica(s)...'
+        ))
+
+        for schema in schemas:
+            with schema_context(schema):
+                agregados, eliminados = accesos.reconstruir()
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ [{schema}] {agregados} acceso(s) agregados, {eliminados} eliminados'
+            ))
+
+        self.stdout.write(self.style.SUCCESS('✅ Reconstrucción finalizada.'))
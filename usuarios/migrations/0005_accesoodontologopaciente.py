@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_usuario_fcm_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccesoOdontologoPaciente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('odontologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesos_pacientes', to='usuarios.perfilodontologo')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesos_odontologos', to='usuarios.perfilpaciente')),
+            ],
+            options={
+                'verbose_name': 'Acceso Odontólogo-Paciente',
+                'verbose_name_plural': 'Accesos Odontólogo-Paciente',
+                'constraints': [models.UniqueConstraint(fields=('odontologo', 'paciente'), name='acceso_odontologo_paciente_unico')],
+            },
+        ),
+    ]
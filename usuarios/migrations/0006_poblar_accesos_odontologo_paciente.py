@@ -0,0 +1,22 @@
+# Carga inicial del índice odontólogo ↔ paciente desde citas, episodios y planes.
+
+from django.db import migrations
+
+
+def poblar_accesos(apps, schema_editor):
+    from usuarios.accesos import reconstruir
+    reconstruir(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_accesoodontologopaciente'),
+        ('agenda', '0004_horarioatencion'),
+        ('historial_clinico', '0002_documentoclinico_episodio'),
+        ('tratamientos', '0005_alter_plandetratamiento_estado'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_accesos, migrations.RunPython.noop),
+    ]
@@ -207,3 +207,39 @@ class PerfilPaciente(models.Model):
 
     def __str__(self):
         return self.usuario.full_name
+
+
+class AccesoOdontologoPaciente(models.Model):
+    """
+    Relación odontólogo ↔ paciente, mantenida automáticamente (ver
+    usuarios/accesos.py): existe una fila si el odontólogo tiene con el
+    paciente alguna cita, episodio de atención o plan de tratamiento.
+
+    Es la base del filtrado por odontólogo (AlcanceOdontologoMixin): la
+    restricción única (odontologo, paciente) sirve de índice para el
+    semi-join EXISTS.
+    """
+    odontologo = models.ForeignKey(
+        PerfilOdontologo,
+        on_delete=models.CASCADE,
+        related_name='accesos_pacientes'
+    )
+    paciente = models.ForeignKey(
+        PerfilPaciente,
+        on_delete=models.CASCADE,
+        related_name='accesos_odontologos'
+    )
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Acceso Odontólogo-Paciente'
+        verbose_name_plural = 'Accesos Odontólogo-Paciente'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['odontologo', 'paciente'],
+                name='acceso_odontologo_paciente_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.odontologo_id} → {self.paciente_id}'
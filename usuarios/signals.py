@@ -1,9 +1,10 @@
 """
 Señales para crear automáticamente perfiles de usuario según su tipo.
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Usuario, PerfilOdontologo, PerfilPaciente
+from . import accesos
 
 
 @receiver(post_save, sender=Usuario)
@@ -28,3 +29,37 @@ def crear_perfil_usuario(sender, instance, created, **kwargs):
             # Asegurar que tenga perfil de paciente
             if not hasattr(instance, 'perfil_paciente'):
                 PerfilPaciente.objects.get_or_create(usuario=instance)
+
+
+# ============================================================================
+# ÍNDICE DE ACCESO ODONTÓLOGO ↔ PACIENTE (ver usuarios/accesos.py)
+# ============================================================================
+
+def _conectar_fuente_acceso(modelo, campo_odontologo, campo_paciente):
+    def par(instancia):
+        return getattr(instancia, campo_odontologo), getattr(instancia, campo_paciente)
+
+    def guardar_par_anterior(sender, instance, **kwargs):
+        instance._acceso_anterior = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list(campo_odontologo, campo_paciente)
+            .first()
+        ) if instance.pk else None
+
+    def actualizar_acceso(sender, instance, **kwargs):
+        accesos.vincular(*par(instance))
+        anterior = getattr(instance, '_acceso_anterior', None)
+        if anterior and anterior != par(instance):
+            accesos.revisar(*anterior)
+
+    def revisar_acceso(sender, instance, **kwargs):
+        accesos.revisar(*par(instance))
+
+    nombre = modelo.__name__
+    pre_save.connect(guardar_par_anterior, sender=modelo, weak=False, dispatch_uid=f'acceso_pre_save_{nombre}')
+    post_save.connect(actualizar_acceso, sender=modelo, weak=False, dispatch_uid=f'acceso_post_save_{nombre}')
+    post_delete.connect(revisar_acceso, sender=modelo, weak=False, dispatch_uid=f'acceso_post_delete_{nombre}')
+
+
+for _fuente in accesos.fuentes():
+    _conectar_fuente_acceso(*_fuente)